@@ -0,0 +1,10 @@
+"""
+ASGI application of the benchmarks, served by uvicorn in bench_async.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+application = get_asgi_application()
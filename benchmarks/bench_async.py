@@ -0,0 +1,201 @@
+"""
+Concurrent reads of a Patient over HTTP from a single uvicorn worker, with
+the sync views of rest_fhir.urls and the async views of
+rest_fhir.async_urls.
+
+On Django 3.1 and 3.2 the async views add no capacity per worker. There
+is neither an async ORM nor an async cache API, so their `a*` methods
+(`aget`, `asave`, `aget_content`, ...) are `sync_to_async` wrappers, with
+asgiref's default `thread_sensitive=True`. They run their queries in the
+one thread the ASGI handler keeps for sync code, where the sync views run
+as well: concurrent requests queue for that thread either way, and a slow
+database or cache call holds up all of them.
+
+    python -m benchmarks.bench_async [requests]
+
+Requires uvicorn. Runs against a temporary SQLite database file, or the
+PostgreSQL database of BENCHMARK_DATABASE.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from .utils import setup
+
+CONCURRENCY = (1, 10, 50)
+
+
+def start_server(env):
+    """
+    Start uvicorn with one worker in a subprocess, return it with its port
+    once it accepts connections.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'benchmarks.asgi:application',
+            '--host',
+            '127.0.0.1',
+            '--port',
+            str(port),
+            '--workers',
+            '1',
+            '--log-level',
+            'warning',
+            '--no-access-log',
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, port
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError('uvicorn did not start')
+            time.sleep(0.1)
+
+
+async def get(reader, writer, request):
+    writer.write(request)
+    status_line = await reader.readline()
+    assert b' 200 ' in status_line, status_line
+
+    length = None
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, _sep, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    assert length is not None, 'response without Content-Length'
+    await reader.readexactly(length)
+
+
+async def load(port, path, requests, concurrency):
+    """
+    Send `requests` GET requests to `path` over `concurrency` keep-alive
+    connections. Returns the requests per second and the mean latency in
+    milliseconds.
+    """
+    request = (
+        'GET %s HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/fhir+json'
+        '\r\n\r\n' % path
+    ).encode()
+    per_connection = requests // concurrency
+    latencies = []
+
+    async def connection():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            await get(reader, writer, request)
+            await barrier.wait()
+            for _ in range(per_connection):
+                start = time.perf_counter()
+                await get(reader, writer, request)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    # Connections are opened and warmed up before the clock starts
+    barrier = Barrier(concurrency)
+    tasks = [asyncio.ensure_future(connection()) for _ in range(concurrency)]
+    await barrier.ready.wait()
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, 1000 * sum(latencies) / len(latencies)
+
+
+class Barrier:
+    # asyncio.Barrier is new in Python 3.11
+    def __init__(self, parties):
+        self.parties = parties
+        self.ready = asyncio.Event()
+
+    async def wait(self):
+        self.parties -= 1
+        if not self.parties:
+            self.ready.set()
+        await self.ready.wait()
+
+
+def main(requests=2000):
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit('bench_async requires uvicorn')
+
+    if os.environ.get('BENCHMARK_DATABASE') != 'postgresql':
+        os.environ.setdefault(
+            'BENCHMARK_SQLITE_FILE',
+            os.path.join(tempfile.mkdtemp(), 'bench_async.sqlite3'),
+        )
+    setup()
+
+    import django
+    from django.db import connection
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    resource = Resource()
+    resource.save(
+        resource_content={
+            'resourceType': 'Patient',
+            'name': [{'use': 'official', 'family': 'Duck', 'given': ['D']}],
+        }
+    )
+    kwargs = {'type': 'Patient', 'id': str(resource.id)}
+    paths = {
+        'sync': reverse('read-update-delete', kwargs=kwargs),
+        'async': reverse('async:read-update-delete', kwargs=kwargs),
+    }
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings')
+    if connection.vendor == 'postgresql':
+        # The test database created by setup()
+        env['PGDATABASE'] = connection.settings_dict['NAME']
+    connection.close()
+
+    server, port = start_server(env)
+    loop = asyncio.new_event_loop()
+    try:
+        print(
+            'read Patient, uvicorn with 1 worker, Django %s, %s'
+            % (django.get_version(), connection.vendor)
+        )
+        print(
+            '  %-8s %12s %10s %12s'
+            % ('views', 'connections', 'req/s', 'mean (ms)')
+        )
+        for concurrency in CONCURRENCY:
+            for name, path in paths.items():
+                rate, latency = loop.run_until_complete(
+                    load(port, path, requests, concurrency)
+                )
+                print(
+                    '  %-8s %12d %10.0f %12.2f'
+                    % (name, concurrency, rate, latency)
+                )
+    finally:
+        loop.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
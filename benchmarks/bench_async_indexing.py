@@ -0,0 +1,86 @@
+"""
+Creates with the search index written in the request, against enqueued in
+the outbox (ASYNC_INDEXING), and the throughput of the worker draining the
+outbox by batch size.
+
+    python -m benchmarks.bench_async_indexing
+"""
+import time
+
+from .utils import measure, report, setup
+
+
+def make_observation(i):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'category': [
+            {
+                'coding': [
+                    {
+                        'system': 'http://terminology.hl7.org/CodeSystem/'
+                        'observation-category',
+                        'code': 'vital-signs',
+                    }
+                ]
+            }
+        ],
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]},
+        'subject': {'reference': 'Patient/%d' % (i % 100)},
+        'effectiveDateTime': '2024-05-%02dT08:30:00Z' % (i % 28 + 1),
+        'valueQuantity': {
+            'value': 60 + i % 40,
+            'unit': 'beats/minute',
+            'system': 'http://unitsofmeasure.org',
+            'code': '/min',
+        },
+        'identifier': [{'system': 'urn:bench', 'value': str(i)}],
+    }
+
+
+def main(iterations=2000, batch_sizes=(50, 500, 2000)):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from rest_fhir.indexer import run_worker
+    from rest_fhir.models import IndexingTask, Resource
+
+    client = APIClient()
+    url = reverse('search-create', kwargs={'type': 'Observation'})
+    counter = iter(range(10**9))
+
+    def create():
+        client.post(url, make_observation(next(counter)), format='json')
+
+    results = {}
+    for async_indexing in (False, True):
+        mode = 'outbox' if async_indexing else 'in request'
+        with override_settings(REST_FHIR={'ASYNC_INDEXING': async_indexing}):
+            results['create (%s)' % mode] = measure(create, iterations)
+            Resource.objects.all().delete()
+            IndexingTask.objects.all().delete()
+
+    report('Observation create', results)
+
+    print('worker throughput')
+    with override_settings(REST_FHIR={'ASYNC_INDEXING': True}):
+        for batch_size in batch_sizes:
+            Resource.objects.bulk_create_resources(
+                [make_observation(i) for i in range(iterations * 5)]
+            )
+            started = time.perf_counter()
+            processed = run_worker(batch_size=batch_size, once=True)
+            elapsed = time.perf_counter() - started
+            print(
+                '  batch of %-22d %10.0f versions/s'
+                % (batch_size, processed / elapsed)
+            )
+            Resource.objects.all().delete()
+
+
+if __name__ == '__main__':
+    main()
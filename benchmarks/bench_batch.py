@@ -0,0 +1,62 @@
+"""
+Per-resource cost of uploading a Bundle of 500 entries as a transaction,
+compared to 500 separate creates.
+
+    python -m benchmarks.bench_batch
+"""
+from .utils import measure, report, setup
+
+
+def main(entries=500, iterations=10):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    client = APIClient()
+    content = {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]},
+        'valueQuantity': {'value': 72, 'unit': 'beats/minute'},
+    }
+    bundle = {
+        'resourceType': 'Bundle',
+        'type': 'transaction',
+        'entry': [
+            {
+                'fullUrl': 'urn:uuid:%d' % i,
+                'resource': content,
+                'request': {'method': 'POST', 'url': 'Observation'},
+            }
+            for i in range(entries)
+        ],
+    }
+    create_url = reverse('search-create', kwargs={'type': 'Observation'})
+    bundle_url = reverse('batch-transaction')
+
+    def create_each():
+        for _ in range(entries):
+            client.post(create_url, content, format='json')
+
+    results = {
+        '%d x POST /Observation' % entries: measure(create_each, iterations),
+        'POST transaction Bundle': measure(
+            lambda: client.post(bundle_url, bundle, format='json'), iterations
+        ),
+        'POST transaction Bundle (minimal)': measure(
+            lambda: client.post(
+                bundle_url, bundle, format='json', HTTP_PREFER='return=minimal'
+            ),
+            iterations,
+        ),
+    }
+    report('create %d Observations' % entries, results)
+
+    for name, result in results.items():
+        print('  %-32s %8.3f ms/resource' % (name, result['mean'] / entries))
+
+
+if __name__ == '__main__':
+    main()
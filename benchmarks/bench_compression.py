@@ -0,0 +1,175 @@
+"""
+Stored size of resource contents of different shapes and sizes, plain and
+compressed with zlib (with and without a trained dictionary) and zstd
+when installed, with the CPU time to compress and decompress them.
+
+Decompression costs well under a millisecond up to ~100 KiB, so a
+COMPRESSION_THRESHOLD of 16 KiB is not about CPU: smaller contents
+are the bulk of the rows and stay plain JSON, which PostgreSQL can patch
+and query in place.
+
+    python -m benchmarks.bench_compression
+"""
+import base64
+import os
+import random
+
+from .utils import measure_cpu, report_cpu, setup
+
+
+def make_observation(components):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'code': {
+            'coding': [
+                {
+                    'system': 'http://loinc.org',
+                    'code': '85354-9',
+                    'display': 'Blood pressure panel',
+                }
+            ]
+        },
+        'subject': {'reference': 'Patient/example'},
+        'effectiveDateTime': '2021-03-04T10:%02d:00Z' % (components % 60),
+        'component': [
+            {
+                'code': {
+                    'coding': [
+                        {
+                            'system': 'http://loinc.org',
+                            'code': '%d-%d' % (8000 + i, i % 10),
+                        }
+                    ]
+                },
+                'valueQuantity': {
+                    'value': round(random.uniform(50, 150), 1),
+                    'unit': 'mm[Hg]',
+                    'system': 'http://unitsofmeasure.org',
+                    'code': 'mm[Hg]',
+                },
+            }
+            for i in range(components)
+        ],
+    }
+
+
+def make_document_reference(size):
+    return {
+        'resourceType': 'DocumentReference',
+        'status': 'current',
+        'subject': {'reference': 'Patient/example'},
+        'content': [
+            {
+                'attachment': {
+                    'contentType': 'application/pdf',
+                    'data': base64.b64encode(os.urandom(size)).decode(),
+                }
+            }
+        ],
+    }
+
+
+def make_imaging_study(series):
+    return {
+        'resourceType': 'ImagingStudy',
+        'status': 'available',
+        'subject': {'reference': 'Patient/example'},
+        'series': [
+            {
+                'uid': '2.16.124.113543.6003.%d' % number,
+                'modality': {
+                    'system': 'http://dicom.nema.org/resources/ontology/DCM',
+                    'code': 'CT',
+                },
+                'instance': [
+                    {
+                        'uid': '2.16.124.113543.6003.%d.%d'
+                        % (number, instance),
+                        'sopClass': {
+                            'system': 'urn:ietf:rfc:3986',
+                            'code': 'urn:oid:1.2.840.10008.5.1.4.1.1.2',
+                        },
+                        'number': instance,
+                    }
+                    for instance in range(10)
+                ],
+            }
+            for number in range(series)
+        ],
+    }
+
+
+CASES = {
+    'Observation': (make_observation, (5, 50, 500)),
+    'DocumentReference': (make_document_reference, (1024, 16384, 262144)),
+    'ImagingStudy': (make_imaging_study, (1, 10, 100)),
+}
+
+
+def main(iterations=100):
+    setup()
+
+    from rest_fhir.compression import (
+        compress,
+        decompress,
+        encode_content,
+        train_dictionary,
+        zstandard,
+    )
+
+    random.seed(0)
+    samples = [
+        encode_content(make(size))
+        for make, sizes in CASES.values()
+        for size in sizes
+        for _ in range(20)
+    ]
+    codecs = {
+        'zlib': ('zlib', (0, None)),
+        'zlib+dict': ('zlib', (1, train_dictionary(samples))),
+    }
+    if zstandard is not None:
+        codecs['zstd'] = ('zstd', (0, None))
+        codecs['zstd+dict'] = (
+            'zstd',
+            (2, train_dictionary(samples, 'zstd')),
+        )
+
+    from rest_fhir import compression
+
+    # Serve the dictionaries above to decompress() without a database
+    compression.dictionaries._dictionaries.update(
+        {dictionary[0]: dictionary[1] for _, dictionary in codecs.values()}
+    )
+
+    print('stored bytes')
+    print(
+        '  %-32s %10s' % ('case', 'plain')
+        + ''.join(' %10s' % name for name in codecs)
+    )
+    cpu = {}
+    for resource_type, (make, sizes) in CASES.items():
+        for size in sizes:
+            data = encode_content(make(size))
+            name = '%s %d' % (resource_type, size)
+            row = '  %-32s %10d' % (name, len(data))
+            for codec_name, (codec, dictionary) in codecs.items():
+                compressed = compress(data, codec, dictionary)
+                row += ' %9.1f%%' % (100 * len(compressed) / len(data))
+            print(row)
+
+            codec, dictionary = codecs['zlib+dict']
+            compressed = compress(data, codec, dictionary)
+            cpu['%s compress' % name] = measure_cpu(
+                lambda: compress(data, codec, dictionary), iterations
+            )
+            cpu['%s decompress' % name] = measure_cpu(
+                lambda: decompress(compressed), iterations
+            )
+
+    report_cpu('zlib+dict cpu', cpu)
+
+
+if __name__ == '__main__':
+    main()
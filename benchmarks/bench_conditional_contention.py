@@ -0,0 +1,105 @@
+"""
+Concurrent conditional creates (POST with If-None-Exist) by many threads,
+all upserting the same business identifier or each its own. Reports the
+throughput and checks that exactly one resource exists per identifier.
+
+    python -m benchmarks.bench_conditional_contention [requests per thread]
+
+Runs against a temporary SQLite database file.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from .utils import setup
+
+THREADS = (1, 4, 16)
+
+SYSTEM = 'urn:oid:1.2.36.146.595.217.0.1'
+
+
+def upsert(url, threads, requests, shared):
+    from rest_framework.test import APIClient
+
+    from django.db import connection
+
+    statuses = []
+    run = uuid.uuid4().hex
+
+    def worker(number):
+        client = APIClient()
+        try:
+            for _ in range(requests):
+                value = run if shared else '%s-%d' % (run, number)
+                response = client.post(
+                    url,
+                    {
+                        'resourceType': 'Patient',
+                        'identifier': [{'system': SYSTEM, 'value': value}],
+                    },
+                    format='json',
+                    HTTP_IF_NONE_EXIST='identifier=%s|%s' % (SYSTEM, value),
+                )
+                statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    workers = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(threads)
+    ]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    assert set(statuses) <= {200, 201}, set(statuses)
+    return run, statuses.count(201), len(statuses) / elapsed
+
+
+def main(requests=20):
+    os.environ.setdefault(
+        'BENCHMARK_SQLITE_FILE',
+        os.path.join(tempfile.mkdtemp(), 'bench_conditional.sqlite3'),
+    )
+    setup()
+
+    from django.db import connection
+    from django.urls import reverse
+
+    from rest_fhir.models import TokenIndex
+
+    url = reverse('search-create', kwargs={'type': 'Patient'})
+
+    print('POST with If-None-Exist (%s)' % connection.vendor)
+    print(
+        '  %-12s %8s %10s %10s %12s'
+        % ('identifier', 'threads', 'created', 'expected', 'requests/s')
+    )
+    for shared in (True, False):
+        for threads in THREADS:
+            run, created, throughput = upsert(url, threads, requests, shared)
+            expected = 1 if shared else threads
+            stored = TokenIndex.objects.filter(
+                name='identifier', code__startswith=run
+            ).count()
+            assert created == stored == expected, (created, stored)
+            print(
+                '  %-12s %8d %10d %10d %12.0f'
+                % (
+                    'same' if shared else 'per thread',
+                    threads,
+                    created,
+                    expected,
+                    throughput,
+                )
+            )
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
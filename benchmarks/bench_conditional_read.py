@@ -0,0 +1,63 @@
+"""
+Compare a plain read against a revalidation (If-None-Match) read for
+resources of increasing size.
+
+    python -m benchmarks.bench_conditional_read
+"""
+from .utils import measure, report, setup
+
+
+def make_observation(components):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'code': {'text': 'Panel'},
+        'component': [
+            {
+                'code': {'text': 'component %d' % i},
+                'valueQuantity': {'value': i, 'unit': 'mg'},
+            }
+            for i in range(components)
+        ],
+    }
+
+
+def main(iterations=500):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    client = APIClient()
+
+    for components in (10, 1000):
+        resource = Resource()
+        resource.save(resource_content=make_observation(components))
+
+        url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Observation', 'id': str(resource.id)},
+        )
+        etag = 'W/"%s"' % resource.version_id
+
+        report(
+            'read Observation with %d components' % components,
+            {
+                'read': measure(lambda: client.get(url), iterations),
+                'read If-None-Match (304)': measure(
+                    lambda: client.get(url, HTTP_IF_NONE_MATCH=etag),
+                    iterations,
+                ),
+                'read If-None-Match (200)': measure(
+                    lambda: client.get(url, HTTP_IF_NONE_MATCH='W/"0"'),
+                    iterations,
+                ),
+            },
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Latency, throughput and SQL statements of the create interaction.
+
+    python -m benchmarks.bench_create
+"""
+from .utils import measure, report, setup
+
+
+def main(iterations=2000):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.db import connection
+    from django.urls import reverse
+
+    client = APIClient()
+    url = reverse('search-create', kwargs={'type': 'Patient'})
+    content = {
+        'resourceType': 'Patient',
+        'identifier': [
+            {'system': 'urn:oid:1.2.36.146.595.217.0.1', 'value': '12345'}
+        ],
+        'name': [{'use': 'official', 'family': 'Chalmers', 'given': ['Peter']}],
+        'gender': 'male',
+        'birthDate': '1974-12-25',
+    }
+
+    report(
+        'create Patient (%s)' % connection.vendor,
+        {
+            'SearchCreateAPIView.post': measure(
+                lambda: client.post(url, content, format='json'), iterations
+            ),
+        },
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Storage of a history of 200 versions of an Observation (one component
+value changed per version) with full contents and with delta encoding,
+and vread latency of past versions against the number of patches applied
+to rebuild them (chain length).
+
+    python -m benchmarks.bench_delta_history
+"""
+from .bench_conditional_read import make_observation
+from .utils import measure, report, setup
+
+VERSIONS = 200
+
+
+def main(iterations=200):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.core.cache import cache
+    from django.db.models import Sum, TextField
+    from django.db.models.functions import Cast, Coalesce, Length
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource, ResourceVersion
+
+    client = APIClient()
+
+    def write_history():
+        resource = Resource()
+        content = make_observation(100)
+        for number in range(VERSIONS):
+            content['component'][number % 100]['valueQuantity'] = {
+                'value': number,
+                'unit': 'mg',
+            }
+            resource.save(resource_content=content)
+            resource = Resource.objects.select_related('version').get(
+                id=resource.id
+            )
+        return resource
+
+    def stored_bytes(resource):
+        return ResourceVersion.objects.filter(resource=resource).aggregate(
+            size=Sum(
+                Coalesce(Length(Cast('resource_content', TextField())), 0)
+                + Coalesce(Length(Cast('resource_delta', TextField())), 0)
+            )
+        )['size']
+
+    full = write_history()
+    full_size = stored_bytes(full)
+    print('history of %d versions' % VERSIONS)
+    print('  %-32s %10d B' % ('full contents', full_size))
+
+    for interval in (10, 50):
+        with override_settings(
+            REST_FHIR={'HISTORY_SNAPSHOT_INTERVAL': interval}
+        ):
+            resource = write_history()
+            size = stored_bytes(resource)
+        print(
+            '  %-32s %10d B %6.1f%%'
+            % ('snapshot every %d' % interval, size, 100 * size / full_size)
+        )
+
+    def vread(resource, version_id):
+        url = reverse(
+            'vread',
+            kwargs={
+                'type': 'Observation',
+                'id': str(resource.id),
+                'vid': version_id,
+            },
+        )
+        return lambda: client.get(url)
+
+    # Version 100 is a snapshot, the ones below it are rebuilt from it
+    with override_settings(REST_FHIR={'HISTORY_SNAPSHOT_INTERVAL': 50}):
+        results = {'full content': measure(vread(full, 99), iterations)}
+        for chain in (1, 10, 49):
+            results['chain of %d' % chain] = measure(
+                vread(resource, 100 - chain), iterations
+            )
+    with override_settings(
+        REST_FHIR={'HISTORY_SNAPSHOT_INTERVAL': 50, 'CACHE_ALIAS': 'default'}
+    ):
+        cache.clear()
+        results['chain of 49, cached'] = measure(
+            vread(resource, 51), iterations
+        )
+
+    report('vread of past versions', results)
+
+
+if __name__ == '__main__':
+    main()
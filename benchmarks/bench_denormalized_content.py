@@ -0,0 +1,99 @@
+"""
+Reads and updates with the content of the current version joined from
+`fhir_resource_ver`, against its copy on the `fhir_resource` rows
+(DENORMALIZED_CONTENT), and the bytes of content each update writes.
+
+    python -m benchmarks.bench_denormalized_content
+"""
+import random
+
+from .utils import measure, report, setup
+
+
+def make_observation(i):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]},
+        'subject': {'reference': 'Patient/%d' % (i % 100)},
+        'effectiveDateTime': '2024-05-%02dT08:30:00Z' % (i % 28 + 1),
+        'valueQuantity': {'value': 60 + i % 40, 'unit': 'beats/minute'},
+        'note': [{'text': 'Resting heart rate, measurement %d.' % i}],
+    }
+
+
+def main(count=20000, iterations=1000):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.db.models import Avg, F, TextField
+    from django.db.models.functions import Cast, Length
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource, ResourceVersion
+
+    client = APIClient()
+
+    def average_bytes(queryset, field):
+        size = Length(Cast(F(field), TextField()))
+        return queryset.aggregate(size=Avg(size))['size'] or 0
+
+    results = {}
+    amplification = {}
+    for denormalized in (False, True):
+        mode = 'copy' if denormalized else 'join'
+        with override_settings(
+            REST_FHIR={'DENORMALIZED_CONTENT': denormalized}
+        ):
+            resources = Resource.objects.bulk_create_resources(
+                [make_observation(i) for i in range(count)]
+            )
+            urls = [
+                reverse(
+                    'read-update-delete',
+                    kwargs={'type': 'Observation', 'id': str(resource.id)},
+                )
+                for resource in resources
+            ]
+
+            results['read (%s)' % mode] = measure(
+                lambda: client.get(random.choice(urls)), iterations
+            )
+            results['search, 20 per page (%s)' % mode] = measure(
+                lambda: client.get(
+                    reverse('search-create', kwargs={'type': 'Observation'}),
+                    {'_count': 20},
+                ),
+                iterations // 10,
+            )
+
+            def update():
+                i = random.randrange(count)
+                content = make_observation(i + 1)
+                content['id'] = str(resources[i].id)
+                client.put(urls[i], content, format='json')
+
+            results['update (%s)' % mode] = measure(update, iterations)
+
+            # Each update writes a version, and rewrites the copy
+            amplification[mode] = average_bytes(
+                ResourceVersion.objects.filter(version_id__gt=1),
+                'resource_content',
+            ) + average_bytes(
+                Resource.objects.filter(version_id__gt=1), 'current_content'
+            )
+
+            Resource.objects.all().delete()
+
+    report('Observation, %d resources' % count, results)
+    print('content bytes written per update')
+    for mode, size in amplification.items():
+        print(
+            '  %-32s %10.0f %9.2fx' % (mode, size, size / amplification['join'])
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Throughput and peak memory of the NDJSON exporter, with one worker and
+with one worker per resource type.
+
+    python -m benchmarks.bench_export
+"""
+import tempfile
+import time
+import tracemalloc
+
+from .utils import setup
+
+RESOURCE_TYPES = ('Observation', 'Condition', 'Encounter', 'Procedure')
+
+
+def populate(count):
+    from rest_fhir.models import Resource
+
+    for resource_type in RESOURCE_TYPES:
+        Resource.objects.bulk_create_resources(
+            [
+                {'resourceType': resource_type, 'status': 'final', 'n': i}
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+
+
+def export(max_workers):
+    from rest_fhir.exporter import NDJSONExporter
+    from rest_fhir.models import ExportJob
+
+    job = ExportJob.objects.create(level=ExportJob.SYSTEM)
+    started = time.perf_counter()
+    NDJSONExporter(job, max_workers=max_workers).run()
+    elapsed = time.perf_counter() - started
+
+    job.refresh_from_db()
+    assert job.status == ExportJob.COMPLETED, job.error
+    return elapsed
+
+
+def main(count=10000, workers=(1, 4)):
+    setup()
+
+    from django.db import connection
+    from django.test import override_settings
+
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        # Worker threads open their own connection to a new empty database
+        workers = [w for w in workers if w == 1]
+
+    populate(count)
+    total = count * len(RESOURCE_TYPES)
+
+    print('NDJSON export (%s, %d resources)' % (connection.vendor, total))
+    print(
+        '  %10s %10s %12s %12s' % ('workers', 'seconds', 'rows/s', 'peak KiB')
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with override_settings(REST_FHIR={'EXPORT_DIR': tmpdir}):
+            for max_workers in workers:
+                elapsed = export(max_workers)
+
+                # Tracing allocations slows the export down, so the peak is
+                # taken from a second run
+                tracemalloc.start()
+                export(max_workers)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                print(
+                    '  %10d %10.2f %12.0f %12.1f'
+                    % (max_workers, elapsed, total / elapsed, peak / 1024)
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Latency of system and type level history pages at increasing depths: the
+keyset query of the `_history` interaction against the same page fetched
+with OFFSET, and the whole keyset request.
+
+    python -m benchmarks.bench_history
+"""
+from .utils import measure, report, setup
+
+
+def populate(count, batch_size=100):
+    from rest_fhir.models import Resource
+
+    # Small batches, so versions get (mostly) distinct timestamps like
+    # they do under a regular write load
+    for offset in range(0, count, batch_size):
+        Resource.objects.bulk_create_resources(
+            [
+                {'resourceType': 'Patient' if i % 4 else 'Observation'}
+                for i in range(offset, min(offset + batch_size, count))
+            ]
+        )
+
+
+def main(
+    count=200000, page_size=20, depths=(1, 100, 1000, 5000), iterations=200
+):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.db.models import Q
+    from django.urls import reverse
+
+    from rest_fhir.models import ResourceVersion
+    from rest_fhir.pagination import HistoryPagination
+
+    populate(count)
+    client = APIClient()
+
+    for name, url, queryset in [
+        ('system', reverse('system-history'), ResourceVersion.objects.all()),
+        (
+            'type',
+            reverse('type-history', kwargs={'type': 'Patient'}),
+            ResourceVersion.objects.filter(resource_type='Patient'),
+        ),
+    ]:
+        queryset = queryset.order_by('-published_at', '-id')
+        results = {}
+        for depth in depths:
+            offset = (depth - 1) * page_size
+            params = {'_count': page_size}
+            keyset = queryset
+            if offset:
+                last = queryset[offset - 1]
+                params['_cursor'] = HistoryPagination.encode_position(
+                    last.published_at, last.pk
+                )
+                keyset = queryset.filter(
+                    published_at__lte=last.published_at
+                ).filter(
+                    Q(published_at__lt=last.published_at) | Q(id__lt=last.pk)
+                )
+
+            results['page %d (keyset query)' % depth] = measure(
+                lambda keyset=keyset: list(keyset[:page_size]), iterations
+            )
+            results['page %d (OFFSET query)' % depth] = measure(
+                lambda offset=offset, queryset=queryset: list(
+                    queryset[offset : offset + page_size]
+                ),
+                iterations,
+            )
+            results['page %d (keyset request)' % depth] = measure(
+                lambda params=params, url=url: client.get(url, params),
+                iterations,
+            )
+
+        report('%s history (%d versions)' % (name, count), results)
+
+
+if __name__ == '__main__':
+    main()
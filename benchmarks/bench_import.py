@@ -0,0 +1,61 @@
+"""
+Throughput and peak memory of the NDJSON importer for files of increasing
+size. Peak memory should stay flat as the file grows.
+
+    python -m benchmarks.bench_import
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from .utils import setup
+
+
+def write_ndjson(path, lines):
+    with open(path, 'w') as f:
+        for i in range(lines):
+            resource = {
+                'resourceType': 'Observation',
+                'status': 'final',
+                'code': {
+                    'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]
+                },
+                'valueQuantity': {'value': i % 200, 'unit': 'beats/minute'},
+            }
+            f.write(json.dumps(resource) + '\n')
+
+
+def main(sizes=(10000, 50000), batch_size=1000):
+    setup()
+
+    from django.db import connection
+
+    from rest_fhir.importer import NDJSONImporter
+
+    print('NDJSON import (%s, batch size %d)' % (connection.vendor, batch_size))
+    print('  %10s %10s %12s %12s' % ('lines', 'seconds', 'lines/s', 'peak KiB'))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for lines in sizes:
+            path = os.path.join(tmpdir, '%d.ndjson' % lines)
+            write_ndjson(path, lines)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            with open(path, 'rb') as stream:
+                for _chunk in NDJSONImporter(batch_size=batch_size).run(stream):
+                    pass
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                '  %10d %10.2f %12.0f %12.1f'
+                % (lines, elapsed, lines / elapsed, peak / 1024)
+            )
+
+
+if __name__ == '__main__':
+    main()
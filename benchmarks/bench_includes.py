@@ -0,0 +1,126 @@
+"""
+A clinician dashboard: an Encounter with its Observations and Conditions
+and their performers, fetched by N+1 reads against a single search with
+`_revinclude` and `_include:iterate`.
+
+    python -m benchmarks.bench_includes
+"""
+from .utils import measure, report, setup
+
+
+def make_dashboard(linked, practitioners=10):
+    """
+    Create an Encounter of a Patient with `linked` Observations and
+    Conditions, and return the references of the Encounter and of the
+    resources of its dashboard.
+    """
+    from rest_fhir.models import Resource
+
+    [patient, *performers] = Resource.objects.bulk_create_resources(
+        [{'resourceType': 'Patient'}]
+        + [{'resourceType': 'Practitioner'}] * practitioners
+    )
+    [encounter] = Resource.objects.bulk_create_resources(
+        [
+            {
+                'resourceType': 'Encounter',
+                'status': 'finished',
+                'subject': {'reference': 'Patient/%s' % patient.id},
+            }
+        ]
+    )
+    linked_contents = []
+    for i in range(linked):
+        content = {
+            'subject': {'reference': 'Patient/%s' % patient.id},
+            'encounter': {'reference': 'Encounter/%s' % encounter.id},
+            'code': {
+                'coding': [{'system': 'http://loinc.org', 'code': str(i)}]
+            },
+        }
+        if i % 4:
+            content.update(
+                resourceType='Observation',
+                status='final',
+                performer=[
+                    {
+                        'reference': 'Practitioner/%s'
+                        % performers[i % practitioners].id
+                    }
+                ],
+            )
+        else:
+            content['resourceType'] = 'Condition'
+        linked_contents.append(content)
+    return [
+        '%s/%s' % (resource.resource_type, resource.id)
+        for resource in [
+            encounter,
+            patient,
+            *performers,
+            *Resource.objects.bulk_create_resources(linked_contents),
+        ]
+    ]
+
+
+def main(iterations=200):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    client = APIClient()
+
+    def search(resource_type, params):
+        return client.get(
+            reverse('search-create', kwargs={'type': resource_type}), params
+        ).data
+
+    def read(reference):
+        resource_type, resource_id = reference.split('/')
+        return client.get(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': resource_type, 'id': resource_id},
+            )
+        ).data
+
+    results = {}
+    for linked in (50, 200):
+        references = make_dashboard(linked)
+        encounter_id = references[0].split('/')[1]
+
+        def reads():
+            for reference in references:
+                read(reference)
+
+        def includes():
+            search(
+                'Encounter',
+                {
+                    '_id': encounter_id,
+                    '_include': 'Encounter:subject',
+                    '_revinclude': [
+                        'Observation:encounter',
+                        'Condition:encounter',
+                    ],
+                    '_include:iterate': 'Observation:performer',
+                },
+            )
+
+        results['N+1 reads, %d linked' % linked] = measure(
+            reads, iterations // 10
+        )
+        results['_revinclude, %d linked' % linked] = measure(
+            includes, iterations
+        )
+        Resource.objects.all().delete()
+
+    report('Encounter dashboard', results)
+
+
+if __name__ == '__main__':
+    main()
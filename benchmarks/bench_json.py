@@ -0,0 +1,86 @@
+"""
+Encode and decode throughput of resources with DRF's JSON renderer and
+parser, and with rest_fhir.encoders (orjson, and its standard library
+fallback). Decimals written with trailing zeros (`1.50`) are decoded as
+Decimal and take the exact, slower, path.
+
+    python -m benchmarks.bench_json
+"""
+import io
+import time
+from unittest import mock
+
+from .bench_compression import make_imaging_study, make_observation
+from .utils import setup
+
+
+def throughput(func, size, iterations):
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    return size * iterations / elapsed / 1024 / 1024
+
+
+def main(iterations=200):
+    setup()
+
+    from rest_framework.parsers import JSONParser as DRFJSONParser
+    from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+
+    from rest_fhir import encoders
+
+    documents = {
+        'Observation 50': make_observation(50),
+        'Observation 500': make_observation(500),
+        'ImagingStudy 100': make_imaging_study(100),
+    }
+    # Same Observation with its values written with 2 decimals
+    decimals = encoders.dumps(make_observation(500)).replace(b'.0,', b'.00,')
+    documents['Observation 500 (1.50)'] = encoders.loads(decimals)
+
+    drf_renderer = DRFJSONRenderer()
+    drf_parser = DRFJSONParser()
+
+    print(
+        '  %-28s %-10s %12s %12s'
+        % ('case', 'library', 'encode MB/s', 'decode MB/s')
+    )
+    for name, document in documents.items():
+        data = encoders.dumps(document)
+        size = len(data)
+        cases = {
+            'drf': (
+                lambda: drf_renderer.render(document),
+                lambda: drf_parser.parse(io.BytesIO(data)),
+            ),
+            'orjson': (
+                lambda: encoders.dumps(document),
+                lambda: encoders.loads(data),
+            ),
+        }
+        for library, (encode, decode) in cases.items():
+            print(
+                '  %-28s %-10s %12.1f %12.1f'
+                % (
+                    name,
+                    library,
+                    throughput(encode, size, iterations),
+                    throughput(decode, size, iterations),
+                )
+            )
+        with mock.patch.object(encoders, 'orjson', None):
+            print(
+                '  %-28s %-10s %12.1f %12.1f'
+                % (
+                    name,
+                    'stdlib',
+                    throughput(lambda: encoders.dumps(document), size, 20),
+                    throughput(lambda: encoders.loads(data), size, 20),
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Latency of the queries of read, vread, search and history on a dataset of
+millions of resources, before and after partitioning the resource tables
+with the `fhir_partition` command, and the number of partitions each
+query scans. PostgreSQL only:
+
+    BENCHMARK_DATABASE=postgresql python -m benchmarks.bench_partitioning
+    BENCHMARK_DATABASE=postgresql python -m benchmarks.bench_partitioning \
+        --versions hash --count 5000000
+
+Rows are generated by the database (`generate_series`): two versions per
+resource, published over the last two years.
+"""
+import argparse
+import random
+import re
+import sys
+
+from .utils import measure, report, setup
+
+RESOURCE_TYPES = ['Observation', 'Observation', 'Patient', 'Encounter']
+HOT_TYPES = ['Observation', 'Patient', 'Encounter']
+
+POPULATE = [
+    """
+    INSERT INTO fhir_resource
+        (id, resource_type, vid, published_at, updated_at)
+    SELECT md5('resource' || i)::uuid, (%(types)s)[i %% 4 + 1], 2,
+        now() - interval '730 days' * (%(count)s - i) / %(count)s,
+        now() - interval '365 days' * (%(count)s - i) / %(count)s
+    FROM generate_series(1, %(count)s) i
+    """,
+    """
+    INSERT INTO fhir_resource_ver
+        (vid, resource_id, resource_type, resource_content, published_at)
+    SELECT v.vid, r.id, r.resource_type,
+        jsonb_build_object(
+            'resourceType', r.resource_type, 'id', r.id, 'status', 'final'
+        ),
+        CASE v.vid WHEN 1 THEN r.published_at ELSE r.updated_at END
+    FROM fhir_resource r CROSS JOIN (VALUES (1), (2)) v (vid)
+    """,
+    'ANALYZE fhir_resource',
+    'ANALYZE fhir_resource_ver',
+]
+
+
+def scanned_tables(queryset) -> list:
+    """
+    Tables and partitions of the resource tables in the plan of `queryset`.
+    """
+    return sorted(
+        set(re.findall(r' on (fhir_resource\w*)', queryset.explain()))
+    )
+
+
+def run(title, queries, iterations):
+    report(
+        title,
+        {
+            name: measure(
+                lambda queryset=queryset: list(queryset.all()), iterations
+            )
+            for name, queryset in queries.items()
+        },
+    )
+    print('  %-32s %s' % ('case', 'scanned tables'))
+    for name, queryset in queries.items():
+        tables = scanned_tables(queryset)
+        print('  %-32s %d (%s)' % (name, len(tables), ', '.join(tables)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000000)
+    parser.add_argument(
+        '--versions', choices=['range', 'hash'], default='range'
+    )
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from rest_fhir.models import Resource, ResourceVersion
+
+    if connection.vendor != 'postgresql':
+        sys.exit('Set BENCHMARK_DATABASE=postgresql to run this benchmark.')
+
+    types = 'ARRAY[%s]' % ', '.join("'%s'" % name for name in RESOURCE_TYPES)
+    with connection.cursor() as cursor:
+        for statement in POPULATE:
+            cursor.execute(statement % {'count': args.count, 'types': types})
+        cursor.execute(
+            'SELECT id FROM fhir_resource WHERE resource_type = %s '
+            'ORDER BY random() LIMIT 1',
+            ['Patient'],
+        )
+        [patient_id] = cursor.fetchone()
+
+    page = random.randrange(args.count // 8)
+    queries = {
+        'read': Resource.objects.select_related('version').filter(
+            resource_type='Patient', id=patient_id
+        ),
+        'vread': ResourceVersion.objects.filter(
+            resource__resource_type='Patient',
+            resource_id=patient_id,
+            version_id=1,
+        ),
+        'instance history': ResourceVersion.objects.filter(
+            resource_id=patient_id
+        ).order_by('-published_at', '-id')[:20],
+        'search (type, deep page)': Resource.objects.select_related('version')
+        .filter(resource_type='Patient', deleted_at__isnull=True)
+        .order_by('id')[page : page + 20],
+        'type history': ResourceVersion.objects.filter(
+            resource_type='Patient'
+        ).order_by('-published_at', '-id')[:20],
+        'system history': ResourceVersion.objects.order_by(
+            '-published_at', '-id'
+        )[:20],
+    }
+
+    dataset = '%d resources, %d versions' % (args.count, 2 * args.count)
+    run('unpartitioned (%s)' % dataset, queries, args.iterations)
+
+    call_command(
+        'fhir_partition',
+        *['--type=%s' % name for name in HOT_TYPES],
+        versions=args.versions,
+        stdout=sys.stderr,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE fhir_resource')
+        cursor.execute('ANALYZE fhir_resource_ver')
+
+    run(
+        'partitioned, %s of versions (%s)' % (args.versions, dataset),
+        queries,
+        args.iterations,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+CPU time and memory allocated per read, vread and create request, for
+resources of increasing size, with the stored JSON passed through versus
+decoded, serialized and encoded again.
+
+    python -m benchmarks.bench_passthrough_render
+"""
+from .utils import measure_cpu, report_cpu, setup
+
+
+def make_bundle(entries):
+    return {
+        'resourceType': 'Bundle',
+        'type': 'collection',
+        'entry': [
+            {
+                'fullUrl': 'urn:uuid:%08d-0000-0000-0000-000000000000' % i,
+                'resource': {
+                    'resourceType': 'Observation',
+                    'status': 'final',
+                    'code': {
+                        'coding': [
+                            {
+                                'system': 'http://loinc.org',
+                                'code': '8867-4',
+                                'display': 'Heart rate',
+                            }
+                        ]
+                    },
+                    'valueQuantity': {
+                        'value': 60 + i % 40,
+                        'unit': 'beats/minute',
+                    },
+                },
+            }
+            for i in range(entries)
+        ],
+    }
+
+
+def main(iterations=50):
+    setup()
+
+    from unittest import mock
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+    from rest_fhir.serializers import ResourceSerializer
+
+    client = APIClient()
+
+    # Force the previous decode/serialize/encode path
+    decode = mock.patch.object(
+        ResourceSerializer, 'to_raw_representation', return_value=None
+    )
+
+    for entries in (1, 100, 2000):
+        content = make_bundle(entries)
+        resource = Resource()
+        resource.save(resource_content=content)
+
+        read_url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Bundle', 'id': str(resource.id)},
+        )
+        vread_url = reverse(
+            'vread',
+            kwargs={'type': 'Bundle', 'id': str(resource.id), 'vid': 1},
+        )
+        create_url = reverse('search-create', kwargs={'type': 'Bundle'})
+
+        cases = {
+            'read': lambda: client.get(read_url),
+            'vread': lambda: client.get(vread_url),
+            'create': lambda: client.post(create_url, content, format='json'),
+        }
+
+        results = {}
+        for name, func in cases.items():
+            results['%s (pass-through)' % name] = measure_cpu(func, iterations)
+            with decode:
+                results['%s (decode/encode)' % name] = measure_cpu(
+                    func, iterations
+                )
+
+        size = len(client.get(read_url).content)
+        report_cpu(
+            'Bundle with %d entries (%d bytes)' % (entries, size), results
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare changing the status of resources of increasing size with a read
+followed by a full update (GET + PUT) against a JSON Patch, and print the
+bytes each one sends and receives.
+
+    python -m benchmarks.bench_patch
+"""
+import json
+
+from .bench_conditional_read import make_observation
+from .utils import measure, report, setup
+
+
+def main(iterations=200):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    client = APIClient()
+
+    for components in (10, 1000):
+        resource = Resource()
+        resource.save(resource_content=make_observation(components))
+
+        url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Observation', 'id': str(resource.id)},
+        )
+        statuses = iter(['amended', 'final'] * (iterations + 2))
+        transferred = {}
+
+        def read_update():
+            read = client.get(url)
+            body = json.dumps({**read.data, 'status': next(statuses)})
+            response = client.put(url, body, content_type='application/json')
+            transferred['read + update'] = (
+                len(body),
+                len(read.content) + len(response.content),
+            )
+
+        def patch():
+            body = json.dumps(
+                [{'op': 'replace', 'path': '/status', 'value': next(statuses)}]
+            )
+            response = client.patch(
+                url, body, content_type='application/json-patch+json'
+            )
+            transferred['patch'] = (len(body), len(response.content))
+
+        report(
+            'change status of Observation with %d components' % components,
+            {
+                'read + update': measure(read_update, iterations),
+                'patch': measure(patch, iterations),
+            },
+        )
+        for name, (sent, received) in transferred.items():
+            print('  %-32s sent %8d B  received %8d B' % (name, sent, received))
+
+
+if __name__ == '__main__':
+    main()
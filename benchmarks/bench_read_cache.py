@@ -0,0 +1,50 @@
+"""
+Compare uncached reads against reads served by the version-keyed
+resource cache.
+
+    python -m benchmarks.bench_read_cache
+"""
+from .utils import measure, report, setup
+
+
+def main(iterations=1000):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from rest_fhir.cache import stats
+    from rest_fhir.models import Resource
+
+    client = APIClient()
+
+    resource = Resource()
+    resource.save(
+        resource_content={
+            'resourceType': 'Patient',
+            'name': [{'use': 'official', 'family': 'Duck', 'given': ['D']}],
+            'gender': 'male',
+        }
+    )
+    url = reverse(
+        'read-update-delete',
+        kwargs={'type': 'Patient', 'id': str(resource.id)},
+    )
+    etag = 'W/"%s"' % resource.version_id
+
+    results = {'read (no cache)': measure(lambda: client.get(url), iterations)}
+
+    with override_settings(REST_FHIR={'CACHE_ALIAS': 'default'}):
+        results['read (cached)'] = measure(lambda: client.get(url), iterations)
+        results['read If-None-Match (cached)'] = measure(
+            lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), iterations
+        )
+
+    report('read Patient', results)
+    print('cache stats', stats.as_dict())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Latency of indexed searches as the number of resources grows. Searches
+driven by a selective parameter match a handful of resources, so their cost
+should stay nearly flat (index lookups are logarithmic) while the table
+grows by orders of magnitude. The last case is driven by a code that
+matches a sixth of all Observations, its cost grows with the number of
+matches.
+
+    python -m benchmarks.bench_search [size ...]
+
+Sizes default to 10k, 100k and 1M Observations. Populating 1M resources
+takes a few minutes.
+"""
+import sys
+import time
+
+from .utils import measure, report, setup
+
+CODES = ['8867-4', '8480-6', '8462-4', '8310-5', '29463-7', '8302-2']
+
+
+def observation(i, patient_ids):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final' if i % 10 else 'amended',
+        'code': {
+            'coding': [
+                {'system': 'http://loinc.org', 'code': CODES[i % len(CODES)]}
+            ]
+        },
+        'subject': {
+            'reference': 'Patient/%s' % patient_ids[i % len(patient_ids)]
+        },
+        'effectiveDateTime': '20%02d-%02d-%02dT10:00:00Z'
+        % (i % 20, i % 12 + 1, i % 28 + 1),
+        'valueQuantity': {
+            'value': i % 200,
+            'system': 'http://unitsofmeasure.org',
+            'code': '/min',
+        },
+    }
+
+
+def populate(start, end, patient_ids, batch_size=5000):
+    from django.db import transaction
+
+    from rest_fhir.models import Resource
+
+    for offset in range(start, end, batch_size):
+        with transaction.atomic():
+            Resource.objects.bulk_create_resources(
+                [
+                    observation(i, patient_ids)
+                    for i in range(offset, min(offset + batch_size, end))
+                ]
+            )
+
+
+def main(sizes=(10000, 100000, 1000000), iterations=200):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    client = APIClient()
+    url = reverse('search-create', kwargs={'type': 'Observation'})
+
+    patients = Resource.objects.bulk_create_resources(
+        [{'resourceType': 'Patient', 'gender': 'male'} for _ in range(2000)]
+    )
+    patient_ids = [str(patient.id) for patient in patients]
+    patient = patient_ids[0]
+
+    searches = {
+        'patient': {'patient': patient},
+        'patient + code': {
+            'patient': patient,
+            'code': 'http://loinc.org|8867-4',
+        },
+        'patient + date range': {
+            'patient': patient,
+            'date': ['ge2005-01-01', 'lt2006-01-01'],
+        },
+        'code (unselective) + value-quantity': {
+            'code': '29463-7',
+            'value-quantity': 'gt198',
+            '_count': 10,
+        },
+    }
+
+    populated = 0
+    for size in sizes:
+        started = time.perf_counter()
+        populate(populated, size, patient_ids)
+        print(
+            'populated %d Observations in %.0fs'
+            % (size, time.perf_counter() - started)
+        )
+        populated = size
+
+        report(
+            'search Observation (%d resources)' % size,
+            {
+                name: measure(
+                    lambda params=params: client.get(url, params), iterations
+                )
+                for name, params in searches.items()
+            },
+        )
+
+
+if __name__ == '__main__':
+    main(*([[int(size) for size in sys.argv[1:]]] if sys.argv[1:] else []))
@@ -0,0 +1,97 @@
+"""
+Latency and response size of reads and searches returning some elements
+only, with `_summary` and `_elements`. Observations carry a narrative and
+a few dozen components, like lab panels do: the database projects them,
+so the narrative and components are neither fetched nor decoded. The
+"after decoding" cases project in Python, as on databases that can't.
+
+    python -m benchmarks.bench_summary [resources]
+"""
+import sys
+from unittest import mock
+
+from .utils import measure, report, setup
+
+
+def observation(i):
+    return {
+        'resourceType': 'Observation',
+        'text': {
+            'status': 'generated',
+            'div': '<div xmlns="http://www.w3.org/1999/xhtml">%s</div>'
+            % (('<p>Result %d of the panel</p>' % i) * 40),
+        },
+        'status': 'final',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '24323-8'}]},
+        'effectiveDateTime': '2021-03-04T10:00:00Z',
+        'valueQuantity': {'value': i % 200, 'unit': '/min'},
+        'component': [
+            {
+                'code': {
+                    'coding': [
+                        {'system': 'http://loinc.org', 'code': '%d-%d' % (n, i)}
+                    ]
+                },
+                'valueQuantity': {'value': n + 0.25, 'unit': 'mmol/L'},
+                'interpretation': [{'text': 'Normal'}],
+            }
+            for n in range(40)
+        ],
+    }
+
+
+def main(resources=1000, iterations=200):
+    setup()
+
+    from rest_framework.test import APIClient
+
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+    from rest_fhir.projection import Projection
+
+    client = APIClient()
+    instances = Resource.objects.bulk_create_resources(
+        [observation(i) for i in range(resources)]
+    )
+    read_url = reverse(
+        'read-update-delete',
+        kwargs={'type': 'Observation', 'id': str(instances[0].id)},
+    )
+    search_url = reverse('search-create', kwargs={'type': 'Observation'})
+
+    cases = {
+        'whole': {},
+        '_summary=true': {'_summary': 'true'},
+        '_elements=valueQuantity': {'_elements': 'valueQuantity'},
+    }
+
+    for interaction, url, base in (
+        ('read', read_url, {}),
+        ('search', search_url, {'_count': 50}),
+    ):
+        results, sizes = {}, {}
+        for name, params in cases.items():
+            params = {**base, **params}
+            results[name] = measure(
+                lambda params=params: client.get(url, params), iterations
+            )
+            sizes[name] = len(client.get(url, params).content)
+            if not params.keys() - base.keys():
+                continue
+
+            fallback = '%s after decoding' % name
+            with mock.patch.object(
+                Projection, 'is_supported', return_value=False
+            ):
+                results[fallback] = measure(
+                    lambda params=params: client.get(url, params), iterations
+                )
+
+        report('%s Observation' % interaction, results)
+        for name, size in sizes.items():
+            print('  %-32s %10d bytes' % (name, size))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,103 @@
+"""
+Updates of a single resource by many threads, each one in a loop of read,
+PUT with If-Match and read again on a 412. Reports the throughput of the
+applied updates and checks that none of them is lost.
+
+    python -m benchmarks.bench_update_contention [updates per thread]
+
+Runs against a temporary SQLite database file.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from .utils import setup
+
+THREADS = (1, 2, 4, 8, 16)
+
+
+def hammer(url, threads, updates):
+    from rest_framework.test import APIClient
+
+    from django.db import connection
+
+    applied = []
+    conflicts = []
+    errors = []
+
+    def increment():
+        client = APIClient()
+        remaining = updates
+        try:
+            while remaining:
+                read = client.get(url)
+                response = client.put(
+                    url,
+                    {**read.data, 'count': read.data['count'] + 1},
+                    format='json',
+                    HTTP_IF_MATCH=read['ETag'],
+                )
+                if response.status_code == 200:
+                    applied.append(response.data['meta']['versionId'])
+                    remaining -= 1
+                elif response.status_code == 412:
+                    conflicts.append(1)
+                else:
+                    errors.append(response.status_code)
+                    return
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=increment) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    assert not errors, errors
+    assert len(set(applied)) == len(applied)
+    return len(applied), len(conflicts), elapsed
+
+
+def main(updates=50):
+    os.environ.setdefault(
+        'BENCHMARK_SQLITE_FILE',
+        os.path.join(tempfile.mkdtemp(), 'bench_update.sqlite3'),
+    )
+    setup()
+
+    from django.db import connection
+    from django.urls import reverse
+
+    from rest_fhir.models import Resource
+
+    print('PUT with If-Match on one resource (%s)' % connection.vendor)
+    print(
+        '  %8s %10s %10s %12s %10s'
+        % ('threads', 'applied', '412s', 'updates/s', 'lost')
+    )
+    for threads in THREADS:
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Basic', 'count': 0})
+        url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Basic', 'id': str(resource.id)},
+        )
+
+        applied, conflicts, elapsed = hammer(url, threads, updates)
+
+        resource = Resource.objects.get(id=resource.id)
+        lost = applied - resource.resource_content['count']
+        assert resource.version_id == applied + 1
+        print(
+            '  %8d %10d %10d %12.0f %10d'
+            % (threads, applied, conflicts, applied / elapsed, lost)
+        )
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,37 @@
+import os
+
+from tests.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+# The WSGI server of the benchmark suite listens on the loopback
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+ROOT_URLCONF = 'benchmarks.urls'
+
+# Benchmarks with concurrent threads need a database file, threads don't
+# share an in-memory SQLite database
+if os.environ.get('BENCHMARK_SQLITE_FILE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ['BENCHMARK_SQLITE_FILE'],
+            'OPTIONS': {'timeout': 60},
+        }
+    }
+
+# PostgreSQL, e.g. BENCHMARK_DATABASE=postgresql PGHOST=localhost. The
+# benchmarks run in a test database created next to PGDATABASE.
+if os.environ.get('BENCHMARK_DATABASE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PGDATABASE', 'rest_fhir'),
+            'USER': os.environ.get('PGUSER', ''),
+            'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            'HOST': os.environ.get('PGHOST', ''),
+            'PORT': os.environ.get('PGPORT', ''),
+            # Reused by the requests to the WSGI server of the suite
+            'CONN_MAX_AGE': 60,
+        }
+    }
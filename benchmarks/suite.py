@@ -0,0 +1,552 @@
+"""
+Benchmark suite of the REST interactions, with query and latency budgets.
+
+Every interaction is measured through the Django test client, or through
+a WSGI server on the loopback with `--server`, against the database of
+benchmarks.settings (SQLite in memory, or PostgreSQL with
+BENCHMARK_DATABASE=postgresql). It reports the number of SQL queries of a
+request, p50/p99 latency, throughput and the peak of memory allocated.
+
+    python -m benchmarks.suite [interaction ...] [--server]
+    python -m benchmarks.suite --check [--tolerance 2] [--fail-on kind ...]
+    python -m benchmarks.suite --update
+
+`--check` compares the results with benchmarks/baselines.json, recorded
+by `--update` for each database and transport, and exits with status 1
+on a regression, or when an interaction has no baseline. A different
+number of queries is a regression (update the baselines along with a
+change that is expected to save or add queries). Latencies may exceed
+their baseline by a tolerance factor, after scaling by the speed of the
+machine measured by `calibrate`, and allocations by
+ALLOCATION_TOLERANCE. `--fail-on` restricts the kinds of regressions
+failing the check, the others are reported as warnings: latencies vary
+with the load of the machine, allocations with the Python version.
+
+Interactions are registered with the `interaction` decorator: a function
+of the transport and the number of iterations returning the request to
+measure.
+"""
+import argparse
+import gc
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+from .utils import measure, peak_allocations, setup
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+# Allocations vary little from run to run, the tail of latencies a lot
+ALLOCATION_TOLERANCE = 1.25
+P99_SLACK = 2
+
+# Kinds of regressions `--fail-on` may select
+REGRESSIONS = ('queries', 'latency', 'allocations')
+
+INTERACTIONS = {}
+
+
+def interaction(name):
+    def decorator(func):
+        INTERACTIONS[name] = func
+        return func
+
+    return decorator
+
+
+class TestClientTransport:
+    """
+    Requests through the Django test client, in process.
+    """
+
+    name = 'client'
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def request(self, method, path, body=b'', headers=None, expect=200):
+        extra = {
+            'HTTP_%s' % name.upper().replace('-', '_'): value
+            for name, value in (headers or {}).items()
+        }
+        content_type = extra.pop('HTTP_CONTENT_TYPE', 'application/fhir+json')
+        response = self.client.generic(
+            method, path, body, content_type=content_type, **extra
+        )
+        check_status(method, path, response.status_code, expect)
+        return response
+
+
+class ServerTransport:
+    """
+    Requests over HTTP to a WSGI server running in a thread. The server
+    shares the database connection of the main thread (like Django's
+    LiveServerTestCase), an in-memory SQLite database isn't shared
+    otherwise. Like the test client, the server doesn't close it at the
+    end of the requests, the main thread may be using it meanwhile.
+    """
+
+    name = 'server'
+
+    def __enter__(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+        from django.core.signals import request_finished, request_started
+        from django.db import close_old_connections, connections
+
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = WSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        self.httpd.set_app(WSGIHandler())
+
+        shared = {alias: connections[alias] for alias in connections}
+        for connection in shared.values():
+            connection.inc_thread_sharing()
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+
+        def serve():
+            for alias, connection in shared.items():
+                connections[alias] = connection
+            self.httpd.serve_forever(poll_interval=0.05)
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        self.shared = shared
+        self.connection = http.client.HTTPConnection(
+            '127.0.0.1', self.httpd.server_address[1]
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.core.signals import request_finished, request_started
+        from django.db import close_old_connections
+
+        self.connection.close()
+        self.httpd.shutdown()
+        self.thread.join()
+        self.httpd.server_close()
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+        for connection in self.shared.values():
+            connection.dec_thread_sharing()
+
+    def request(self, method, path, body=b'', headers=None, expect=200):
+        # The development server closes connections after every response,
+        # HTTPConnection opens a new one on the next request
+        self.connection.request(
+            method,
+            path,
+            body=body or None,
+            headers={
+                'Content-Type': 'application/fhir+json',
+                **(headers or {}),
+            },
+        )
+        response = self.connection.getresponse()
+        response.read()
+        check_status(method, path, response.status, expect)
+        return response
+
+
+def check_status(method, path, status_code, expect):
+    if status_code != expect:
+        raise AssertionError(
+            '%s %s answered %d instead of %d'
+            % (method, path, status_code, expect)
+        )
+
+
+def patient(i=0):
+    return {
+        'resourceType': 'Patient',
+        'identifier': [{'system': 'urn:benchmark', 'value': 'P%d' % i}],
+        'name': [{'use': 'official', 'family': 'Duck', 'given': ['Donald']}],
+        'gender': 'male',
+        'birthDate': '1934-06-09',
+    }
+
+
+def create_patient():
+    from rest_fhir.models import Resource
+
+    resource = Resource()
+    resource.save(resource_content=patient())
+    return resource
+
+
+def resource_url(resource):
+    from django.urls import reverse
+
+    return reverse(
+        'read-update-delete',
+        kwargs={'type': resource.resource_type, 'id': str(resource.id)},
+    )
+
+
+@interaction('read')
+def read(transport, iterations):
+    url = resource_url(create_patient())
+    return lambda: transport.request('GET', url)
+
+
+@interaction('read If-None-Match')
+def read_not_modified(transport, iterations):
+    resource = create_patient()
+    url = resource_url(resource)
+    headers = {'If-None-Match': 'W/"%s"' % resource.version_id}
+    return lambda: transport.request('GET', url, headers=headers, expect=304)
+
+
+@interaction('vread')
+def vread(transport, iterations):
+    from django.urls import reverse
+
+    resource = create_patient()
+    resource.save(resource_content={**patient(), 'gender': 'other'})
+    url = reverse(
+        'vread',
+        kwargs={'type': 'Patient', 'id': str(resource.id), 'vid': 1},
+    )
+    return lambda: transport.request('GET', url)
+
+
+@interaction('history')
+def history(transport, iterations):
+    from django.urls import reverse
+
+    resource = create_patient()
+    for gender in ('other', 'female'):
+        resource.save(resource_content={**patient(), 'gender': gender})
+    url = reverse(
+        'instance-history', kwargs={'type': 'Patient', 'id': str(resource.id)}
+    )
+    return lambda: transport.request('GET', url)
+
+
+@interaction('search')
+def search(transport, iterations):
+    from django.urls import reverse
+    from django.utils.http import urlencode
+
+    from rest_fhir.models import Resource
+
+    patients = Resource.objects.bulk_create_resources(
+        [patient(i) for i in range(20)]
+    )
+    Resource.objects.bulk_create_resources(
+        [
+            {
+                'resourceType': 'Observation',
+                'status': 'final',
+                'code': {
+                    'coding': [
+                        {
+                            'system': 'http://loinc.org',
+                            'code': ('8867-4', '8480-6')[i % 2],
+                        }
+                    ]
+                },
+                'subject': {'reference': 'Patient/%s' % patients[i % 20].id},
+                'effectiveDateTime': '2021-03-%02dT10:00:00Z' % (i % 28 + 1),
+                'valueQuantity': {'value': 60 + i % 40, 'unit': '/min'},
+            }
+            for i in range(400)
+        ]
+    )
+    url = '%s?%s' % (
+        reverse('search-create', kwargs={'type': 'Observation'}),
+        urlencode(
+            {
+                'patient': str(patients[0].id),
+                'code': 'http://loinc.org|8867-4',
+            }
+        ),
+    )
+    return lambda: transport.request('GET', url)
+
+
+@interaction('create')
+def create(transport, iterations):
+    from django.urls import reverse
+
+    url = reverse('search-create', kwargs={'type': 'Patient'})
+    body = json.dumps(patient()).encode()
+    return lambda: transport.request('POST', url, body, expect=201)
+
+
+@interaction('update')
+def update(transport, iterations):
+    resource = create_patient()
+    url = resource_url(resource)
+    body = json.dumps({**patient(), 'id': str(resource.id)}).encode()
+    return lambda: transport.request('PUT', url, body)
+
+
+@interaction('patch')
+def patch(transport, iterations):
+    url = resource_url(create_patient())
+    body = json.dumps(
+        [{'op': 'replace', 'path': '/gender', 'value': 'other'}]
+    ).encode()
+    headers = {'Content-Type': 'application/json-patch+json'}
+    return lambda: transport.request('PATCH', url, body, headers)
+
+
+@interaction('delete')
+def delete(transport, iterations):
+    from rest_fhir.models import Resource
+
+    # One resource per request: the iterations, the warm-up and query
+    # counting requests of `measure`, and the allocations one
+    resources = Resource.objects.bulk_create_resources(
+        [patient(i) for i in range(iterations + 3)]
+    )
+    urls = [resource_url(resource) for resource in resources]
+    return lambda: transport.request('DELETE', urls.pop(), expect=204)
+
+
+def run(names, transport, iterations):
+    results = {}
+    for name in names:
+        request = INTERACTIONS[name](transport, iterations)
+        # Keep full collections of the objects built so far, e.g. by the
+        # setup of the interaction, out of the timings (gc.freeze is new in
+        # Python 3.7)
+        gc.collect()
+        freeze = hasattr(gc, 'freeze')
+        if freeze:
+            gc.freeze()
+        try:
+            result = measure(request, iterations)
+        finally:
+            if freeze:
+                gc.unfreeze()
+        results[name] = {
+            'queries': result['queries'],
+            'p50': result['p50'],
+            'p99': result['p99'],
+            'throughput': 1000 / result['mean'],
+            'alloc_kb': peak_allocations(request),
+        }
+    return results
+
+
+def report(title, results):
+    print(title)
+    print(
+        '  %-24s %8s %10s %10s %10s %12s'
+        % ('interaction', 'queries', 'p50 ms', 'p99 ms', 'req/s', 'peak KiB')
+    )
+    for name, result in results.items():
+        print(
+            '  %-24s %8d %10.3f %10.3f %10.0f %12.1f'
+            % (
+                name,
+                result['queries'],
+                result['p50'],
+                result['p99'],
+                result['throughput'],
+                result['alloc_kb'],
+            )
+        )
+
+
+def calibrate(rounds=9) -> float:
+    """
+    Milliseconds taken by a fixed CPU bound workload, the median of
+    `rounds`. Latency budgets are scaled by the ratio of the calibration
+    of the machine running the checks to the one of the baselines.
+    """
+    document = [patient(i) for i in range(500)]
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(10):
+            json.loads(json.dumps(document))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def compare(results, baselines, tolerance, calibration):
+    """
+    Regressions of `results` against their `baselines`, as `(kind,
+    message)` tuples where the kind is `baseline` (missing), `queries`,
+    `latency` or `allocations`.
+    """
+    interactions = baselines.get('interactions', {})
+    speed = calibration / baselines.get('calibration', calibration)
+    regressions = []
+    for name, result in results.items():
+        baseline = interactions.get(name)
+        if baseline is None:
+            regressions.append(
+                ('baseline', '%s: no baseline, record one with --update' % name)
+            )
+            continue
+
+        if result['queries'] != baseline['queries']:
+            regressions.append(
+                (
+                    'queries',
+                    '%s: %d queries instead of %d'
+                    % (name, result['queries'], baseline['queries']),
+                )
+            )
+        for key, slack in (('p50', 1), ('p99', P99_SLACK)):
+            budget = baseline[key] * speed * tolerance * slack
+            if result[key] > budget:
+                regressions.append(
+                    (
+                        'latency',
+                        '%s: %s of %.3f ms over the budget of %.3f ms'
+                        % (name, key, result[key], budget),
+                    )
+                )
+        budget = baseline['alloc_kb'] * ALLOCATION_TOLERANCE
+        if result['alloc_kb'] > budget:
+            regressions.append(
+                (
+                    'allocations',
+                    '%s: %.1f KiB allocated, over the budget of %.1f KiB'
+                    % (name, result['alloc_kb'], budget),
+                )
+            )
+    return regressions
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+def save_baselines(baselines):
+    with open(BASELINES, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite', description=__doc__.split('\n')[1]
+    )
+    parser.add_argument(
+        'interactions',
+        nargs='*',
+        metavar='interaction',
+        help='Interactions to measure, all of them by default: %s'
+        % ', '.join(INTERACTIONS),
+    )
+    parser.add_argument(
+        '--server',
+        action='store_true',
+        help='Send requests to a WSGI server instead of the test client',
+    )
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='Exit with status 1 when results regress from the baselines',
+    )
+    parser.add_argument(
+        '--update', action='store_true', help='Record results as baselines'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=2,
+        help='Factor by which latencies may exceed their baseline (and '
+        'twice as much for p99), after scaling to the machine speed',
+    )
+    parser.add_argument(
+        '--fail-on',
+        nargs='+',
+        choices=REGRESSIONS,
+        default=REGRESSIONS,
+        metavar='kind',
+        help='Kinds of regressions failing --check, all of them by default '
+        '(%s), the others are reported as warnings. A missing baseline '
+        'always fails' % ', '.join(REGRESSIONS),
+    )
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.interactions) - INTERACTIONS.keys()
+    if unknown:
+        parser.error('unknown interactions: %s' % ', '.join(sorted(unknown)))
+
+    setup()
+
+    from django.db import connection
+
+    transport = ServerTransport() if args.server else TestClientTransport()
+    with transport:
+        results = run(
+            args.interactions or list(INTERACTIONS), transport, args.iterations
+        )
+
+    key = [connection.vendor, transport.name]
+    report('%s (%s)' % tuple(key), results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'.'.join(key): results}, f, indent=2)
+
+    calibration = calibrate()
+    print('calibration %.3f ms' % calibration)
+
+    baselines = load_baselines()
+    if args.update:
+        recorded = baselines.setdefault(key[0], {}).setdefault(key[1], {})
+        recorded['calibration'] = round(calibration, 3)
+        for name, result in results.items():
+            recorded.setdefault('interactions', {})[name] = {
+                'queries': result['queries'],
+                'p50': round(result['p50'], 3),
+                'p99': round(result['p99'], 3),
+                'alloc_kb': round(result['alloc_kb'], 1),
+            }
+        save_baselines(baselines)
+        print('baselines of %s recorded in %s' % ('/'.join(key), BASELINES))
+
+    if args.check:
+        regressions = compare(
+            results,
+            baselines.get(key[0], {}).get(key[1], {}),
+            args.tolerance,
+            calibration,
+        )
+        failures = [
+            message
+            for kind, message in regressions
+            if kind == 'baseline' or kind in args.fail_on
+        ]
+        for _kind, message in regressions:
+            print(
+                '%s %s'
+                % ('REGRESSION' if message in failures else 'WARNING', message)
+            )
+        if failures:
+            return 1
+        print('no regression against the baselines of %s' % '/'.join(key))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
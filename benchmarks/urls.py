@@ -0,0 +1,8 @@
+from django.urls import include, path
+
+urlpatterns = [
+    path('fhir/', include('rest_fhir.urls')),
+    # The async views of the read, vread, create and delete interactions,
+    # see bench_async
+    path('fhir-async/', include(('rest_fhir.async_urls', 'async'))),
+]
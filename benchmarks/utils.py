@@ -0,0 +1,111 @@
+import os
+import statistics
+import time
+import tracemalloc
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    if connection.vendor == 'sqlite':
+        call_command('migrate', verbosity=0)
+    else:
+        # Never populate the configured database itself
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def measure(func, iterations=1000):
+    """
+    Call `func` `iterations` times and return latency percentiles (in
+    milliseconds) together with the number of SQL queries of one warm call.
+    """
+    from django.db import connection
+
+    func()
+
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'queries': len(queries),
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def measure_cpu(func, iterations=100):
+    """
+    Return the CPU time (in milliseconds) and the peak of memory allocated
+    (in kilobytes) by one call of `func`.
+    """
+    func()
+
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    cpu = (time.process_time() - start) * 1000 / iterations
+
+    return {'cpu': cpu, 'peak_kb': peak_allocations(func)}
+
+
+def peak_allocations(func) -> float:
+    """
+    Return the peak of memory allocated (in kilobytes) by one call of
+    `func`.
+    """
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def report_cpu(title, results):
+    print(title)
+    print('  %-32s %10s %12s' % ('case', 'cpu ms', 'peak KiB'))
+    for name, result in results.items():
+        print(
+            '  %-32s %10.3f %12.1f' % (name, result['cpu'], result['peak_kb'])
+        )
+
+
+def report(title, results):
+    print(title)
+    print(
+        '  %-32s %8s %10s %10s %10s %10s'
+        % ('case', 'queries', 'mean ms', 'p50 ms', 'p99 ms', 'req/s')
+    )
+    for name, result in results.items():
+        print(
+            '  %-32s %8d %10.3f %10.3f %10.3f %10.0f'
+            % (
+                name,
+                result['queries'],
+                result['mean'],
+                result['p50'],
+                result['p99'],
+                1000 / result['mean'],
+            )
+        )
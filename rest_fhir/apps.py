@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RestFhirConfig(AppConfig):
     name = 'rest_fhir'
+
+    def ready(self):
+        from .indexing import search_parameters
+
+        # Compile search parameters once, before the first write
+        search_parameters.load()
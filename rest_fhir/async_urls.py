@@ -0,0 +1,31 @@
+"""
+The URL patterns of rest_fhir.urls, with the async views of the read,
+vread, create and delete interactions. Include them instead under ASGI:
+
+    path('fhir/', include('rest_fhir.async_urls'))
+"""
+from django.urls import path
+
+from .urls import urlpatterns as sync_urlpatterns
+from .views import (
+    AsyncReadUpdateDeleteAPIView,
+    AsyncSearchCreateAPIView,
+    AsyncVReadAPIView,
+)
+
+ASYNC_VIEWS = {
+    'read-update-delete': AsyncReadUpdateDeleteAPIView,
+    'vread': AsyncVReadAPIView,
+    'search-create': AsyncSearchCreateAPIView,
+}
+
+urlpatterns = [
+    path(
+        str(pattern.pattern),
+        ASYNC_VIEWS[pattern.name].as_view(),
+        name=pattern.name,
+    )
+    if pattern.name in ASYNC_VIEWS
+    else pattern
+    for pattern in sync_urlpatterns
+]
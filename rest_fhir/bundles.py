@@ -0,0 +1,183 @@
+import re
+import uuid
+from collections import namedtuple
+from typing import Optional
+
+from rest_framework import status
+from rest_framework.fields import DateTimeField
+
+from django.http.response import responses
+
+# Relative url of a batch/transaction entry request, e.g. `Patient`,
+# `Patient/123` or `Patient/123/_history/2`, optionally prefixed by the
+# base url and followed by a query string
+ENTRY_URL_RE = re.compile(
+    r'^(?:[a-z]+://[^?]*?/)?(?P<type>[A-Z][A-Za-z]+)'
+    r'(?:/(?P<id>[A-Za-z0-9\-\.]{1,64})'
+    r'(?:/_history/(?P<vid>[0-9]+))?)?/?'
+    r'(?:\?(?P<query>.*))?$'
+)
+
+EntryRequest = namedtuple(
+    'EntryRequest', ['method', 'type', 'id', 'vid', 'query']
+)
+
+# Transactions are processed in this order, regardless of the order of the
+# entries in the bundle https://www.hl7.org/fhir/http.html#trules
+TRANSACTION_ORDER = ('DELETE', 'POST', 'PUT', 'PATCH', 'GET', 'HEAD')
+
+
+def parse_entry_request(entry) -> Optional[EntryRequest]:
+    request = entry.get('request') if isinstance(entry, dict) else None
+    if not isinstance(request, dict):
+        return None
+
+    method = str(request.get('method', '')).upper()
+    match = ENTRY_URL_RE.match(str(request.get('url', '')))
+    if method not in TRANSACTION_ORDER or match is None:
+        return None
+
+    resource_id = match.group('id')
+    if resource_id is not None:
+        try:
+            resource_id = uuid.UUID(resource_id)
+        except ValueError:
+            # Logical ids on this server are always UUIDs
+            resource_id = False
+
+    return EntryRequest(
+        method=method,
+        type=match.group('type'),
+        id=resource_id,
+        vid=match.group('vid') and int(match.group('vid')),
+        query=match.group('query'),
+    )
+
+
+def resolve_references(value, references: dict):
+    """
+    Replace the `reference` elements found in `value` that point to one of
+    the `references` keys (e.g. `urn:uuid:...` full urls) by their target.
+    """
+    if isinstance(value, list):
+        return [resolve_references(item, references) for item in value]
+
+    if isinstance(value, dict):
+        ret = dict()
+        for key, item in value.items():
+            if key == 'reference' and isinstance(item, str):
+                ret[key] = references.get(item, item)
+            else:
+                ret[key] = resolve_references(item, references)
+        return ret
+
+    return value
+
+
+def status_line(status_code) -> str:
+    return '%d %s' % (status_code, responses.get(status_code, ''))
+
+
+def operation_outcome(diagnostics, code='processing', severity='error'):
+    return {
+        'resourceType': 'OperationOutcome',
+        'issue': [
+            {
+                'severity': severity,
+                'code': code,
+                'diagnostics': str(diagnostics),
+            }
+        ],
+    }
+
+
+def response_entry(
+    status_code, resource_type=None, instance=None, resource=None, outcome=None
+):
+    response = {'status': status_line(status_code)}
+
+    if instance is not None:
+        response['location'] = '%s/%s/_history/%s' % (
+            resource_type,
+            instance.resource_id,
+            instance.version_id,
+        )
+        response['etag'] = 'W/"%s"' % instance.version_id
+        response['lastModified'] = DateTimeField().to_representation(
+            instance.last_updated
+        )
+
+    if outcome is not None:
+        response['outcome'] = outcome
+
+    entry = {'response': response}
+    if resource is not None:
+        entry = {'resource': resource, **entry}
+    return entry
+
+
+def error_entry(exc):
+    status_code = getattr(exc, 'status_code', status.HTTP_400_BAD_REQUEST)
+    detail = getattr(exc, 'detail', exc)
+    return response_entry(status_code, outcome=operation_outcome(detail))
+
+
+def make_bundle(bundle_type, entries, links=None, total=None) -> dict:
+    bundle = {
+        'resourceType': 'Bundle',
+        'id': str(uuid.uuid4()),
+        'type': bundle_type,
+    }
+    if total is not None:
+        bundle['total'] = total
+    if links:
+        bundle['link'] = [
+            {'relation': relation, 'url': url}
+            for relation, url in links
+            if url is not None
+        ]
+    bundle['entry'] = entries
+    return bundle
+
+
+def searchset_bundle(entries, links=None, total=None) -> dict:
+    return make_bundle('searchset', entries, links=links, total=total)
+
+
+def search_entry(full_url, resource, mode='match') -> dict:
+    return {
+        'fullUrl': full_url,
+        'resource': resource,
+        'search': {'mode': mode},
+    }
+
+
+def history_entry(full_url, instance, resource=None) -> dict:
+    """
+    Entry of a history Bundle for a version, with the interaction that
+    created it https://www.hl7.org/fhir/http.html#history
+    """
+    resource_url = '%s/%s' % (instance.resource_type, instance.resource_id)
+    if instance.deleted_at is not None:
+        method, url, status_code = (
+            'DELETE',
+            resource_url,
+            status.HTTP_204_NO_CONTENT,
+        )
+    elif instance.version_id == 1:
+        method, url, status_code = (
+            'POST',
+            instance.resource_type,
+            status.HTTP_201_CREATED,
+        )
+    else:
+        method, url, status_code = 'PUT', resource_url, status.HTTP_200_OK
+
+    entry = {'fullUrl': full_url}
+    if resource is not None:
+        entry['resource'] = resource
+    entry['request'] = {'method': method, 'url': url}
+    entry['response'] = response_entry(
+        status_code, resource_type=instance.resource_type, instance=instance
+    )['response']
+    return entry
@@ -0,0 +1,205 @@
+import threading
+from collections import Counter, namedtuple
+from typing import Optional
+
+from django.core.cache import caches
+
+from .compat import sync_to_async
+from .routers import is_replica
+from .settings import fhir_settings
+
+# Metadata of the current version of a resource, enough to answer
+# preconditions (and 410 for deleted resources) without a database query
+CachedVersion = namedtuple(
+    'CachedVersion', ['version_id', 'last_updated', 'deleted']
+)
+
+
+class CacheStats:
+    """
+    Process wide hit/miss/eviction counters of the resource cache, by
+    resource type. An eviction is a content entry that was cached but has
+    been dropped by the cache backend.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def incr(self, resource_type, name):
+        with self._lock:
+            self._counters[(resource_type, name)] += 1
+
+    def get(self, resource_type, name) -> int:
+        return self._counters[(resource_type, name)]
+
+    def as_dict(self):
+        with self._lock:
+            ret = dict()
+            for (resource_type, name), value in self._counters.items():
+                ret.setdefault(resource_type, {})[name] = value
+            return ret
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+
+class ResourceCache:
+    """
+    Read-through cache of the current version of the resources of a type.
+
+    Two kinds of entries are stored: a small "current version pointer"
+    keyed by (resource_type, id), and the representation of the resource
+    keyed by (resource_type, id, version_id). Content entries are immutable
+    so only the pointer has to be replaced when a new version is written.
+
+    Past versions rebuilt from delta encoded history (see
+    materialize_versions) are cached as well, by version.
+
+    The `a` prefixed methods are used by the async views, Django 3.2 cache
+    backends have no async API.
+    """
+
+    def __init__(self, resource_type, cache, timeout, key_prefix):
+        self.resource_type = resource_type
+        self.cache = cache
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def make_key(self, kind, *parts) -> str:
+        return ':'.join(
+            [self.key_prefix, kind, self.resource_type, *map(str, parts)]
+        )
+
+    def pointer_key(self, resource_id) -> str:
+        return self.make_key('ptr', resource_id)
+
+    def content_key(self, resource_id, version_id) -> str:
+        return self.make_key('res', resource_id, version_id)
+
+    def marker_key(self, resource_id, version_id) -> str:
+        return self.make_key('seen', resource_id, version_id)
+
+    def version_key(self, resource_id, version_id) -> str:
+        return self.make_key('ver', resource_id, version_id)
+
+    def to_pointer(self, instance) -> CachedVersion:
+        return CachedVersion(
+            version_id=instance.version_id,
+            last_updated=instance.last_updated,
+            deleted=instance.deleted_at is not None,
+        )
+
+    def get_pointer(self, resource_id) -> Optional[CachedVersion]:
+        pointer = self.cache.get(self.pointer_key(resource_id))
+        if pointer is None:
+            stats.incr(self.resource_type, 'misses')
+            return None
+        return CachedVersion(*pointer)
+
+    def add_pointer(self, instance):
+        # Readers only add the pointer, so a reader that loaded an older
+        # version never overwrites the pointer set by a concurrent writer.
+        # Versions read from a replica may be stale for longer, their
+        # pointer would outlive the replication lag.
+        if is_replica(instance._state.db):
+            return
+        self.cache.add(
+            self.pointer_key(instance.id),
+            tuple(self.to_pointer(instance)),
+            self.timeout,
+        )
+
+    def set_pointer(self, instance):
+        self.cache.set(
+            self.pointer_key(instance.id),
+            tuple(self.to_pointer(instance)),
+            self.timeout,
+        )
+
+    def get_content(self, resource_id, version_id):
+        content = self.cache.get(self.content_key(resource_id, version_id))
+        if content is not None:
+            stats.incr(self.resource_type, 'hits')
+        elif self.cache.get(self.marker_key(resource_id, version_id)):
+            stats.incr(self.resource_type, 'evictions')
+        else:
+            stats.incr(self.resource_type, 'misses')
+        return content
+
+    def set_content(self, instance, content):
+        self.cache.set_many(
+            {
+                self.content_key(instance.id, instance.version_id): content,
+                self.marker_key(instance.id, instance.version_id): True,
+            },
+            self.timeout,
+        )
+        self.add_pointer(instance)
+
+    async def aget_pointer(self, resource_id) -> Optional[CachedVersion]:
+        return await sync_to_async(self.get_pointer)(resource_id)
+
+    async def aadd_pointer(self, instance):
+        await sync_to_async(self.add_pointer)(instance)
+
+    async def aget_content(self, resource_id, version_id):
+        return await sync_to_async(self.get_content)(resource_id, version_id)
+
+    async def aset_content(self, instance, content):
+        await sync_to_async(self.set_content)(instance, content)
+
+    def get_version_contents(self, resource_id, version_ids) -> dict:
+        """
+        Contents of past versions rebuilt from their deltas, by version id.
+        """
+        keys = {
+            self.version_key(resource_id, version_id): version_id
+            for version_id in version_ids
+        }
+        return {
+            keys[key]: content
+            for key, content in self.cache.get_many(list(keys)).items()
+        }
+
+    def set_version_contents(self, resource_id, contents):
+        self.cache.set_many(
+            {
+                self.version_key(resource_id, version_id): content
+                for version_id, content in contents.items()
+            },
+            self.timeout,
+        )
+
+
+def get_resource_cache(resource_type) -> Optional[ResourceCache]:
+    alias = fhir_settings.CACHE_ALIAS
+    timeout = fhir_settings.CACHE_TIMEOUT
+
+    options = fhir_settings.CACHE_RESOURCE_TYPES.get(resource_type, {})
+    alias = options.get('ALIAS', alias)
+    timeout = options.get('TIMEOUT', timeout)
+
+    if alias is None:
+        return None
+
+    return ResourceCache(
+        resource_type,
+        cache=caches[alias],
+        timeout=timeout,
+        key_prefix=fhir_settings.CACHE_KEY_PREFIX,
+    )
+
+
+def invalidate_resource(resource):
+    """
+    Point the cached current version of `resource` to its latest version.
+    Called once the transaction that wrote the version is committed.
+    """
+    resource_cache = get_resource_cache(resource.resource_type)
+    if resource_cache is not None:
+        resource_cache.set_pointer(resource)
@@ -0,0 +1,34 @@
+"""
+Compatibility with the older versions of Python and of the dependencies.
+"""
+import sys
+from contextvars import copy_context
+from functools import wraps
+
+from asgiref.sync import sync_to_async as asgiref_sync_to_async
+
+
+def sync_to_async(func):
+    """
+    `asgiref.sync.sync_to_async`, with `func` running in the context
+    variables of the caller, where the database routing is kept (see
+    rest_fhir.routers and rest_fhir.sharding). asgiref only copies them
+    on Python 3.7+, where contextvars isn't a backport.
+    """
+    if sys.version_info >= (3, 7):
+        return asgiref_sync_to_async(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        variables = list(copy_context().items())
+
+        def run():
+            for variable, value in variables:
+                variable.set(value)
+            return func(*args, **kwargs)
+
+        # On top of the variables of the thread, set before it entered the
+        # event loop, which async_to_sync doesn't copy either
+        return await asgiref_sync_to_async(lambda: copy_context().run(run))()
+
+    return wrapper
@@ -0,0 +1,210 @@
+"""
+Compression of large resource contents, see CompressedJSONField.
+
+Documents are compressed with zlib, or with zstd when the `zstandard`
+package is installed, and a dictionary shared by all the documents:
+trained on the stored resources by the `fhir_train_compression` command,
+it holds the element names and values resources of a server have in
+common, which a single document is too small to learn.
+
+Compressed documents start with their codec and the id of the dictionary
+they were compressed with (0 for none), so that they can still be read
+once a new dictionary is trained or the codec is changed.
+"""
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+
+from .encoders import dumps, loads
+from .settings import fhir_settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB = 1
+ZSTD = 2
+CODECS = {'zlib': ZLIB, 'zstd': ZSTD}
+
+HEADER = struct.Struct('>BI')
+
+# zlib only uses the last 32 KiB of a dictionary
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+ZSTD_DICTIONARY_SIZE = 110 * 1024
+
+# Element names with their value when it is short, e.g. `"system":"http:
+# //loinc.org"` or `"valueQuantity":{`
+FRAGMENT_RE = re.compile(
+    rb'"[^"\\]{1,64}":(?:"[^"\\]{0,64}"|[-\w.]{1,32}|[\[{])?'
+)
+
+
+def encode_content(content) -> bytes:
+    return dumps(content)
+
+
+def get_codec(codec):
+    if codec not in CODECS:
+        raise ImproperlyConfigured('Unknown compression codec %r.' % codec)
+    if codec == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured(
+            'The zstd compression codec requires the zstandard package.'
+        )
+    return CODECS[codec]
+
+
+class DictionaryRegistry:
+    """
+    Compression dictionaries by id, and the latest one of each codec that
+    documents are compressed with. They are loaded once per process, so a
+    dictionary trained by another process is used after a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        self._latest = {}
+
+    @property
+    def model(self):
+        return apps.get_model('rest_fhir', 'CompressionDictionary')
+
+    def get(self, dictionary_id) -> bytes:
+        data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            data = bytes(
+                self.model.objects.values_list('data', flat=True).get(
+                    pk=dictionary_id
+                )
+            )
+            with self._lock:
+                self._dictionaries[dictionary_id] = data
+        return data
+
+    def latest(self, codec) -> Tuple[int, Optional[bytes]]:
+        latest = self._latest.get(codec)
+        if latest is None:
+            row = (
+                self.model.objects.filter(codec=codec)
+                .order_by('-pk')
+                .values_list('pk', 'data')
+                .first()
+            )
+            latest = (row[0], bytes(row[1])) if row else (0, None)
+            with self._lock:
+                self._latest[codec] = latest
+                if row:
+                    self._dictionaries[row[0]] = latest[1]
+        return latest
+
+    def reset(self):
+        with self._lock:
+            self._dictionaries.clear()
+            self._latest.clear()
+
+
+dictionaries = DictionaryRegistry()
+
+
+def compress(data: bytes, codec='zlib', dictionary=None) -> bytes:
+    """
+    Compress `data` with `codec` and the latest dictionary of the codec, or
+    with `dictionary` (a `(id, data)` tuple) when given.
+    """
+    codec_id = get_codec(codec)
+    dictionary_id, dictionary_data = dictionary or dictionaries.latest(codec)
+
+    if codec_id == ZSTD:
+        compressor = zstandard.ZstdCompressor(
+            dict_data=zstandard.ZstdCompressionDict(dictionary_data)
+            if dictionary_data
+            else None
+        )
+        payload = compressor.compress(data)
+    else:
+        options = {'zdict': dictionary_data} if dictionary_data else {}
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS, **options)
+        payload = compressor.compress(data) + compressor.flush()
+
+    return HEADER.pack(codec_id, dictionary_id) + payload
+
+
+def decompress(data) -> bytes:
+    data = memoryview(data)
+    codec_id, dictionary_id = HEADER.unpack_from(data)
+    dictionary_data = dictionaries.get(dictionary_id) if dictionary_id else None
+    payload = data[HEADER.size :]
+
+    if codec_id == ZSTD:
+        get_codec('zstd')
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(dictionary_data)
+            if dictionary_data
+            else None
+        )
+        return decompressor.decompress(payload)
+
+    options = {'zdict': dictionary_data} if dictionary_data else {}
+    decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS, **options)
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+def compress_content(content) -> Optional[bytes]:
+    """
+    Compressed JSON document of `content`. None when its JSON encoding is
+    smaller than COMPRESSION_THRESHOLD bytes, or doesn't compress.
+    """
+    threshold = fhir_settings.COMPRESSION_THRESHOLD
+    if threshold is None:
+        return None
+
+    data = encode_content(content)
+    if len(data) < threshold:
+        return None
+
+    compressed = compress(data, fhir_settings.COMPRESSION_CODEC)
+    return compressed if len(compressed) < len(data) else None
+
+
+def decompress_content(data) -> dict:
+    return loads(decompress(data))
+
+
+def train_dictionary(samples: List[bytes], codec='zlib', size=None) -> bytes:
+    """
+    Dictionary for the compression of documents like `samples`.
+
+    zstd trains its own. For zlib, the element names and short values found
+    in most samples are kept, the ones that save the most last (they are
+    the closest to the compressed data, so the cheapest to reference).
+    """
+    if get_codec(codec) == ZSTD:
+        return zstandard.train_dictionary(
+            size or ZSTD_DICTIONARY_SIZE, samples
+        ).as_bytes()
+
+    size = size or ZLIB_DICTIONARY_SIZE
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(FRAGMENT_RE.findall(sample)))
+
+    fragments = []
+    total = 0
+    for fragment, count in sorted(
+        counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True
+    ):
+        if count < 2:
+            break
+        if total + len(fragment) > size:
+            continue
+        fragments.append(fragment)
+        total += len(fragment)
+
+    return b''.join(reversed(fragments))
@@ -0,0 +1,96 @@
+import hashlib
+from typing import Optional
+
+from rest_framework.exceptions import ParseError
+
+from django.db import connections, router
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.utils.translation import gettext_lazy as _
+
+from .exceptions import PreconditionFailed
+from .filters import RESULT_PARAMETERS, search_queryset
+from .models import CriteriaLock, Resource
+from .sharding import sharded
+
+
+def parse_criteria(query) -> QueryDict:
+    """
+    Search criteria of a conditional interaction, from a query string such
+    as the value of an If-None-Exist header.
+    """
+    params = query if isinstance(query, QueryDict) else QueryDict(query or '')
+    if not any(
+        key.partition(':')[0] not in RESULT_PARAMETERS for key in params
+    ):
+        raise ParseError(_('Conditional interactions require search criteria.'))
+    return params
+
+
+def criteria_key(resource_type, params) -> bytes:
+    query = urlencode(
+        sorted((key, value) for key in params for value in params.getlist(key))
+    )
+    return hashlib.sha256(
+        ('%s?%s' % (resource_type, query)).encode('utf-8')
+    ).digest()
+
+
+def lock_criteria(resource_type, params, using=None):
+    """
+    Serialize the conditional interactions with the same criteria until
+    the end of the current transaction, so that concurrent requests can't
+    both find no match and create the same resource twice.
+
+    PostgreSQL takes a transaction level advisory lock on a hash of the
+    criteria. Other databases lock a row of `fhir_criteria_lock`, inserted
+    on first use; SQLite serializes the transaction from that first write.
+    Neither blocks the interactions with other criteria.
+    """
+    using = using or router.db_for_write(CriteriaLock)
+    connection = connections[using]
+    key = criteria_key(resource_type, params)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)',
+                [int.from_bytes(key[:8], 'big', signed=True)],
+            )
+        return
+
+    locks = CriteriaLock.objects.using(using)
+    locks.bulk_create([CriteriaLock(key=key.hex())], ignore_conflicts=True)
+    locks.filter(key=key.hex()).update(locked_at=timezone.now())
+
+
+def resolve_criteria(
+    resource_type, params, queryset=None
+) -> Optional[Resource]:
+    """
+    The resource of `resource_type` matching the search criteria, None if
+    there is none. Raises PreconditionFailed if there are several.
+
+    Criteria are resolved like searches, with the index tables: a business
+    identifier is a single lookup of the `fhir_idx_token` index.
+    """
+    if queryset is None:
+        queryset = Resource.objects.with_current_content()
+
+    matches = list(
+        search_queryset(
+            sharded(queryset).filter(
+                resource_type=resource_type, deleted_at__isnull=True
+            ),
+            resource_type,
+            params,
+            strict=True,
+        )[:2]
+    )
+
+    if len(matches) > 1:
+        raise PreconditionFailed(
+            _('The search criteria match more than one resource.')
+        )
+    return matches[0] if matches else None
@@ -0,0 +1,173 @@
+"""
+JSON encoding of resources, with orjson when it is installed and the
+standard library otherwise.
+
+FHIR decimals keep their precision, e.g. `1.50` is not `1.5`: numbers that
+a float doesn't represent exactly are decoded as Decimal, and Decimals are
+encoded as written. Documents without them, most of them, are decoded by
+orjson alone.
+"""
+import json
+import re
+import uuid
+from decimal import Decimal
+
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fractions that a float may not write back the same way, at the end of a
+# number: ending with a zero, with 8 digits or more on a side of the point
+# (repr() keeps up to 17 significant digits), of small numbers or with an
+# exponent. Led by the point and tried once on the digits that follow it,
+# so that documents are scanned at nearly the speed of a string search:
+# `(?=([0-9]*))\1` takes all of them without backtracking, like the
+# possessive `[0-9]*+` of Python 3.11.
+INEXACT_RE = re.compile(
+    rb'\.(?=[0-9]+(?:[eE][-+]?[0-9]+)?[,}\]\s])'
+    rb'(?:(?<=[0-9]{8}\.)|0000|'
+    rb'(?=([0-9]*))\1(?:(?<=[0-9]0)|(?<=[0-9]{8})|[eE]))'
+)
+
+# A JSON number with a fraction, not part of a string such as an OID
+NUMBER_RE = re.compile(
+    rb'(?<=[:,\[\s])-?[0-9]+\.[0-9]+(?:[eE][-+]?[0-9]+)?(?=[,}\]\s])'
+)
+DIGITS = b'-0123456789'
+
+# Decimals are encoded as strings of this marker and their index, which
+# are replaced by the decimal afterwards. It can't be found in documents
+# (the control character is escaped, and the rest isn't known to clients)
+DECIMAL_MARKER_ID = uuid.uuid4().hex
+DECIMAL_MARKER = '\x00%s:' % DECIMAL_MARKER_ID
+DECIMAL_MARKER_RE = re.compile(
+    rb'"\\u0000%s:([0-9]+)"' % DECIMAL_MARKER_ID.encode()
+)
+
+# Escaped by DRF's JSONRenderer for JavaScript, like it
+LINE_SEPARATORS = (('\u2028', '\\u2028'), ('\u2029', '\\u2029'))
+
+
+def parse_float(text):
+    value = float(text)
+    return value if repr(value) == text else Decimal(text)
+
+
+def parse_constant(text):
+    raise ValueError('Out of range float values are not JSON compliant')
+
+
+def is_exact(data: bytes) -> bool:
+    """
+    Whether the numbers of `data` with a fraction are all written the way
+    Python writes floats, so that decoding them as floats loses nothing.
+    Numbers with an exponent and no fraction are decoded as floats.
+    """
+    for match in INEXACT_RE.finditer(data):
+        start = match.start()
+        while start and data[start - 1] in DIGITS:
+            start -= 1
+        number = NUMBER_RE.match(data, start)
+        if number is None:
+            continue
+        text = number.group()
+        if repr(float(text)).encode() != text:
+            return False
+    return True
+
+
+def loads(data):
+    """
+    Decode JSON `data` (bytes or str), with Decimals for the numbers that
+    aren't exact floats.
+    """
+    if orjson is not None:
+        raw = data.encode('utf-8') if isinstance(data, str) else data
+        if is_exact(raw):
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # Integers beyond 64 bits, or an error to report like the
+                # standard library does
+                pass
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return json.loads(
+        data, parse_float=parse_float, parse_constant=parse_constant
+    )
+
+
+def dumps(obj, indent=None) -> bytes:
+    """
+    Compact (or indented by `indent` spaces) UTF-8 JSON encoding of `obj`.
+    Values other than JSON ones are encoded like DRF's JSONRenderer does.
+    """
+    decimals = []
+
+    def default(value):
+        if isinstance(value, Decimal):
+            if not value.is_finite():
+                raise ValueError('%s is not JSON compliant' % value)
+            decimals.append(str(value))
+            return '%s%d' % (DECIMAL_MARKER, len(decimals) - 1)
+        return encoders.JSONEncoder().default(value)
+
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            data = orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, or nested too deep
+            decimals.clear()
+            data = None
+    else:
+        data = None
+
+    if data is None:
+        data = json.dumps(
+            obj,
+            default=default,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=indent,
+            separators=(',', ': ') if indent else (',', ':'),
+        ).encode('utf-8')
+
+    if decimals:
+        data = DECIMAL_MARKER_RE.sub(
+            lambda match: decimals[int(match.group(1))].encode(), data
+        )
+    return data
+
+
+def escape_line_separators(data: bytes) -> bytes:
+    if b'\xe2\x80\xa8' in data or b'\xe2\x80\xa9' in data:
+        text = data.decode('utf-8')
+        for separator, escaped in LINE_SEPARATORS:
+            text = text.replace(separator, escaped)
+        data = text.encode('utf-8')
+    return data
+
+
+class FHIRJSONEncoder(json.JSONEncoder):
+    """
+    JSONField encoder storing Decimals as written, see dumps.
+    """
+
+    def encode(self, o):
+        return dumps(o).decode('utf-8')
+
+
+class FHIRJSONDecoder(json.JSONDecoder):
+    """
+    JSONField decoder of the contents stored by FHIRJSONEncoder.
+    """
+
+    def decode(self, s, *args, **kwargs):
+        return loads(s)
@@ -8,3 +8,31 @@ class Gone(APIException):
     status_code = status.HTTP_410_GONE
     default_detail = _('The resource requested is no longer available.')
     default_code = 'gone'
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('The resource was modified concurrently.')
+    default_code = 'conflict'
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _(
+        'The resource version does not match the If-Match header.'
+    )
+    default_code = 'precondition_failed'
+
+
+class IndexNotReady(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _(
+        'The search index has not caught up with the consistency token.'
+    )
+    default_code = 'index_not_ready'
+
+
+class UnprocessableEntity(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = _('The request can not be applied to the resource.')
+    default_code = 'unprocessable_entity'
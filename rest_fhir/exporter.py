@@ -0,0 +1,193 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .encoders import dumps
+from .models import ExportJob, ReferenceIndex, Resource
+from .serializers import ResourceSerializer
+from .settings import fhir_settings
+from .sharding import sharded
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def get_export_dir(job_id) -> str:
+    root = fhir_settings.EXPORT_DIR or os.path.join(
+        tempfile.gettempdir(), 'rest_fhir_export'
+    )
+    return os.path.join(root, str(job_id))
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix='fhir-export'
+            )
+        return _executor
+
+
+class NDJSONExporter:
+    """
+    Write the resources selected by an export job to one NDJSON file per
+    resource type. Rows are streamed with `QuerySet.iterator()` (a server
+    side cursor where the backend supports it) and the stored JSON is
+    passed through, so memory use per worker does not depend on the
+    number of resources. Resource types are exported in parallel threads.
+    """
+
+    def __init__(self, job: ExportJob, chunk_size=None, max_workers=None):
+        self.job = job
+        self.chunk_size = chunk_size or fhir_settings.EXPORT_CHUNK_SIZE
+        self.max_workers = max_workers or fhir_settings.EXPORT_MAX_WORKERS
+        self.serializer = ResourceSerializer()
+
+    def run(self):
+        job = self.job
+        ExportJob.objects.filter(pk=job.pk, status=ExportJob.ACCEPTED).update(
+            status=ExportJob.IN_PROGRESS
+        )
+
+        try:
+            os.makedirs(get_export_dir(job.pk), exist_ok=True)
+            resource_types = self.get_resource_types()
+
+            if self.max_workers > 1 and len(resource_types) > 1:
+                with ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='fhir-export-type',
+                ) as executor:
+                    outputs = list(
+                        executor.map(self.export_type_in_thread, resource_types)
+                    )
+            else:
+                outputs = [self.export_type(t) for t in resource_types]
+        except ExportCancelled:
+            return
+        except Exception as exc:
+            logger.exception('Export %s failed', job.pk)
+            self.finish(status=ExportJob.FAILED, error=str(exc))
+        else:
+            self.finish(
+                status=ExportJob.COMPLETED,
+                output=[output for output in outputs if output['count']],
+            )
+
+    def finish(self, **fields):
+        ExportJob.objects.filter(
+            pk=self.job.pk, status=ExportJob.IN_PROGRESS
+        ).update(completed_at=timezone.now(), **fields)
+
+    def get_resource_types(self):
+        job = self.job
+        if job.level == ExportJob.TYPE:
+            return list(job.resource_types)
+
+        queryset = sharded(
+            Resource.objects.order_by().filter(deleted_at__isnull=True)
+        )
+        if job.resource_types:
+            queryset = queryset.filter(resource_type__in=job.resource_types)
+
+        # Shards may have the same types
+        return sorted(
+            set(queryset.values_list('resource_type', flat=True).distinct())
+        )
+
+    def get_queryset(self, resource_type):
+        queryset = (
+            Resource.objects.with_current_content()
+            .with_raw_content()
+            .order_by()
+            .filter(
+                resource_type=resource_type,
+                deleted_at__isnull=True,
+                updated_at__lte=self.job.created_at,
+            )
+        )
+        if self.job.since is not None:
+            queryset = queryset.filter(updated_at__gt=self.job.since)
+        if self.job.level == ExportJob.PATIENT and resource_type != 'Patient':
+            # Resources of a Patient level export are Patient resources and
+            # resources that reference a Patient, from a search parameter
+            queryset = queryset.filter(
+                id__in=ReferenceIndex.objects.filter(
+                    resource_type=resource_type, target_type='Patient'
+                ).values('resource_id')
+            )
+        return sharded(queryset)
+
+    def check_cancelled(self):
+        if not ExportJob.objects.filter(pk=self.job.pk).exists():
+            raise ExportCancelled()
+
+    def export_type_in_thread(self, resource_type):
+        try:
+            return self.export_type(resource_type)
+        finally:
+            connections.close_all()
+
+    def export_type(self, resource_type):
+        name = '%s.ndjson' % resource_type
+        path = os.path.join(get_export_dir(self.job.pk), name)
+        count = 0
+
+        with open(path, 'wb') as f:
+            rows = self.get_queryset(resource_type).iterator(
+                chunk_size=self.chunk_size
+            )
+            for row, instance in enumerate(rows):
+                if row % self.chunk_size == 0:
+                    self.check_cancelled()
+
+                data = self.serializer.to_raw_representation(instance)
+                if data is None:
+                    f.write(dumps(self.serializer.to_representation(instance)))
+                else:
+                    f.write(data.raw)
+                f.write(b'\n')
+                count += 1
+
+        return {'type': resource_type, 'name': name, 'count': count}
+
+
+def run_export(job_id, in_thread=False):
+    try:
+        job = ExportJob.objects.get(pk=job_id)
+        NDJSONExporter(job).run()
+    finally:
+        if in_thread:
+            connections.close_all()
+
+
+def start_export(job: ExportJob):
+    if fhir_settings.EXPORT_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_export, job.pk, in_thread=True)
+        )
+    else:
+        run_export(job.pk)
+
+
+def cancel_export(job: ExportJob):
+    """
+    Cancel a running job, or delete the files of a completed one. Running
+    exporters stop at their next chunk once the job is gone.
+    """
+    export_dir = get_export_dir(job.pk)
+    job.delete()
+    shutil.rmtree(export_dir, ignore_errors=True)
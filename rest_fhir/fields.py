@@ -0,0 +1,92 @@
+from typing import Optional
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .compression import compress_content, decompress, decompress_content
+
+
+class CompressedJSONDescriptor(DeferredAttribute):
+    """
+    Decompress a compressed document on first access.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        self.field.load_deferred(instance)
+        value = super().__get__(instance, cls)
+        if value is None:
+            compressed = getattr(instance, self.field.compressed_field)
+            if compressed is not None:
+                value = decompress_content(compressed)
+                instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedJSONField(models.JSONField):
+    """
+    JSON field that stores documents above COMPRESSION_THRESHOLD bytes
+    compressed (see rest_fhir.compression) in the binary field named by
+    `compressed_field`, which must be declared after it. The JSON column
+    is NULL for those: smaller documents stay plain JSON and queryable.
+    """
+
+    descriptor_class = CompressedJSONDescriptor
+
+    def __init__(self, *args, compressed_field=None, **kwargs):
+        self.compressed_field = compressed_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['compressed_field'] = self.compressed_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        values = self.get_column_values(super().pre_save(model_instance, add))
+        setattr(
+            model_instance,
+            self.compressed_field,
+            values[self.compressed_field],
+        )
+        return values[self.attname]
+
+    def get_column_values(self, value) -> dict:
+        """
+        Values of the JSON and binary columns storing `value`, e.g. for
+        `QuerySet.update()` which doesn't call `pre_save`.
+        """
+        compressed = None
+        if value is not None and not hasattr(value, 'resolve_expression'):
+            compressed = compress_content(value)
+        return {
+            self.attname: value if compressed is None else None,
+            self.compressed_field: compressed,
+        }
+
+    def load_deferred(self, instance):
+        # Fetch both columns with one query when they are deferred
+        deferred = [
+            attname
+            for attname in (self.attname, self.compressed_field)
+            if attname not in instance.__dict__
+        ]
+        if deferred and instance.pk is not None:
+            instance.refresh_from_db(fields=deferred)
+
+    def get_raw_value(self, instance) -> Optional[str]:
+        """
+        JSON text of the document of `instance` when it is compressed,
+        without decoding it. None otherwise.
+        """
+        if self.compressed_field not in instance.__dict__:
+            self.load_deferred(instance)
+        compressed = getattr(instance, self.compressed_field)
+        if compressed is None:
+            return None
+        return decompress(compressed).decode('utf-8')
@@ -0,0 +1,349 @@
+import re
+import uuid
+from collections import namedtuple
+from operator import attrgetter
+
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils.translation import gettext_lazy as _
+
+from .indexing import (
+    MAX_VALUE_LENGTH,
+    normalize_string,
+    parse_date_range,
+    search_parameters,
+)
+from .models import INDEX_MODELS
+
+# Parameters that control the result set instead of filtering it
+# https://www.hl7.org/fhir/search.html#return
+RESULT_PARAMETERS = (
+    '_count',
+    '_cursor',
+    '_total',
+    '_sort',
+    '_format',
+    '_pretty',
+    '_summary',
+    '_elements',
+    '_include',
+    '_revinclude',
+    '_contained',
+    '_containedType',
+)
+
+PREFIX_RE = re.compile(r'^(eq|ne|gt|lt|ge|le|sa|eb|ap)(?=[0-9])')
+
+NUMBER_RE = re.compile(r'^-?[0-9]+(?:\.([0-9]+))?(?:[eE][+-]?[0-9]+)?$')
+
+
+def split_prefix(value):
+    match = PREFIX_RE.match(value)
+    if match is None:
+        return 'eq', value
+    return match.group(1), value[match.end() :]
+
+
+def split_values(value):
+    """
+    Split a parameter value on the commas that are not escaped.
+    """
+    values = re.split(r'(?<!\\),', value)
+    return [
+        item.replace('\\,', ',').replace('\\|', '|').replace('\\$', '$')
+        for item in values
+    ]
+
+
+def split_token(value):
+    """
+    Split a token on its first unescaped `|`.
+    """
+    parts = re.split(r'(?<!\\)\|', value, maxsplit=1)
+    return [part.replace('\\|', '|') for part in parts]
+
+
+def date_q(prefix, low, high, low_field='low', high_field='high'):
+    """
+    Compare the range of the indexed value to the range of the parameter
+    value https://www.hl7.org/fhir/search.html#prefix
+    """
+    if prefix == 'eq':
+        return Q(**{low_field + '__gte': low, high_field + '__lte': high})
+    if prefix == 'ne':
+        return Q(**{low_field + '__lt': low}) | Q(**{high_field + '__gt': high})
+    if prefix == 'gt':
+        return Q(**{high_field + '__gt': high})
+    if prefix == 'lt':
+        return Q(**{low_field + '__lt': low})
+    if prefix == 'ge':
+        return Q(**{high_field + '__gte': low})
+    if prefix == 'le':
+        return Q(**{low_field + '__lte': high})
+    if prefix == 'sa':
+        return Q(**{low_field + '__gt': high})
+    if prefix == 'eb':
+        return Q(**{high_field + '__lt': low})
+    # ap, the ranges overlap
+    return Q(**{low_field + '__lte': high, high_field + '__gte': low})
+
+
+def number_q(prefix, value, field='value'):
+    match = NUMBER_RE.match(value)
+    if match is None:
+        raise ValueError(value)
+
+    number = float(value)
+    # Equality is within the precision of the parameter value
+    precision = 0.5 * 10 ** -len(match.group(1) or '')
+    low, high = number - precision, number + precision
+
+    if prefix == 'eq':
+        return Q(**{field + '__gte': low, field + '__lt': high})
+    if prefix == 'ne':
+        return Q(**{field + '__lt': low}) | Q(**{field + '__gte': high})
+    if prefix in ('gt', 'sa'):
+        return Q(**{field + '__gt': number})
+    if prefix in ('lt', 'eb'):
+        return Q(**{field + '__lt': number})
+    if prefix == 'ge':
+        return Q(**{field + '__gte': number})
+    if prefix == 'le':
+        return Q(**{field + '__lte': number})
+    # ap, within 10% of the value
+    margin = abs(number) * 0.1
+    return Q(
+        **{field + '__gte': number - margin, field + '__lte': number + margin}
+    )
+
+
+def string_q(value, modifier):
+    if modifier == 'exact':
+        return Q(exact=value[:MAX_VALUE_LENGTH])
+    if modifier == 'contains':
+        return Q(value__contains=normalize_string(value))
+    if modifier is None:
+        return Q(value__startswith=normalize_string(value))
+    raise ValueError(modifier)
+
+
+def token_q(value, modifier):
+    if modifier not in (None, 'not'):
+        raise ValueError(modifier)
+
+    parts = split_token(value)
+    if len(parts) == 1:
+        return Q(code=parts[0][:MAX_VALUE_LENGTH])
+
+    system, code = parts
+    q = Q()
+    if system:
+        q &= Q(system=system[:MAX_VALUE_LENGTH])
+    else:
+        q &= Q(system__isnull=True)
+    if code:
+        q &= Q(code=code[:MAX_VALUE_LENGTH])
+    return q
+
+
+def date_value_q(value, modifier):
+    if modifier is not None:
+        raise ValueError(modifier)
+
+    prefix, value = split_prefix(value)
+    date_range = parse_date_range(value)
+    if date_range is None:
+        raise ValueError(value)
+    return date_q(prefix, *date_range)
+
+
+def reference_q(value, modifier):
+    if modifier is not None and not modifier[:1].isupper():
+        raise ValueError(modifier)
+
+    segments = value.split('?')[0].rstrip('/').split('/')
+    if '_history' in segments:
+        segments = segments[: segments.index('_history')]
+
+    q = Q(target_id=segments[-1][:64])
+    if len(segments) >= 2:
+        q &= Q(target_type=segments[-2])
+    elif modifier is not None:
+        q &= Q(target_type=modifier)
+    return q
+
+
+def quantity_q(value, modifier):
+    if modifier is not None:
+        raise ValueError(modifier)
+
+    prefix, value = split_prefix(value)
+    number, *parts = value.split('|', 2)
+    q = number_q(prefix, number)
+    if len(parts) == 2:
+        system, code = parts
+        if system:
+            q &= Q(system=system)
+            if code:
+                q &= Q(code=code)
+        elif code:
+            q &= Q(code=code) | Q(unit=code)
+    return q
+
+
+def uri_q(value, modifier):
+    if modifier == 'below':
+        return Q(uri__startswith=value[:MAX_VALUE_LENGTH])
+    if modifier is None:
+        return Q(uri=value[:MAX_VALUE_LENGTH])
+    raise ValueError(modifier)
+
+
+VALUE_Q = {
+    'string': string_q,
+    'token': token_q,
+    'date': date_value_q,
+    'reference': reference_q,
+    'quantity': quantity_q,
+    'uri': uri_q,
+}
+
+
+# Rough selectivity of a parameter by type, lower is more selective. The
+# most selective parameter of a search drives it, see search_queryset
+SELECTIVITY = {
+    'reference': 1,
+    'uri': 2,
+    'token': 3,
+    'string': 4,
+    'quantity': 5,
+    'date': 6,
+}
+
+Condition = namedtuple(
+    'Condition', ['rank', 'param_type', 'name', 'q', 'negate']
+)
+
+
+def search_queryset(queryset, resource_type, params, strict=False):
+    """
+    Filter `queryset` (of resources of `resource_type`) by the search
+    parameters of a query string, using the index tables.
+
+    The most selective parameter becomes `id IN (SELECT resource_id ...)`,
+    matched by the `(resource_type, name, value)` index of its table. The
+    other ones become `EXISTS` subqueries correlated on `resource_id`, so
+    they only probe the index rows of the resources already selected
+    instead of materializing every match.
+
+    Repeated parameters are combined with AND, comma separated values with
+    OR. Unknown parameters are ignored, unless `strict`.
+    https://www.hl7.org/fhir/search.html
+    """
+    conditions = []
+    for key in params:
+        code, _sep, modifier = key.partition(':')
+        modifier = modifier or None
+
+        if code in RESULT_PARAMETERS:
+            continue
+
+        for value in params.getlist(key):
+            try:
+                conditions.append(
+                    get_condition(resource_type, code, modifier, value)
+                )
+            except LookupError:
+                if strict:
+                    raise ParseError(_("Unknown search parameter '%s'.") % code)
+                break
+            except ValueError:
+                raise ParseError(
+                    _("Invalid value or modifier for search parameter '%s'.")
+                    % key
+                )
+
+    conditions.sort(key=attrgetter('rank'))
+    driver = next(
+        (c for c in conditions if c.param_type and not c.negate), None
+    )
+
+    for condition in conditions:
+        if condition.param_type is None:
+            queryset = queryset.filter(condition.q)
+            continue
+
+        model, _fields = INDEX_MODELS[condition.param_type]
+        if condition is driver:
+            index = model.objects.filter(
+                condition.q, resource_type=resource_type, name=condition.name
+            )
+            queryset = queryset.filter(id__in=index.values('resource_id'))
+        else:
+            # Without the resource type, only the resource_id index applies
+            exists = Exists(
+                model.objects.filter(
+                    condition.q, resource_id=OuterRef('id'), name=condition.name
+                )
+            )
+            queryset = queryset.filter(~exists if condition.negate else exists)
+
+    return queryset
+
+
+def get_condition(resource_type, code, modifier, value) -> Condition:
+    if code == '_id':
+        ids = []
+        for item in split_values(value):
+            try:
+                ids.append(uuid.UUID(item))
+            except ValueError:
+                continue
+        return Condition(0, None, code, Q(id__in=ids), False)
+
+    if code == '_lastUpdated':
+        q = Q()
+        for item in split_values(value):
+            prefix, item = split_prefix(item)
+            date_range = parse_date_range(item)
+            if date_range is None:
+                raise ValueError(item)
+            q |= date_q(prefix, *date_range, 'updated_at', 'updated_at')
+        return Condition(SELECTIVITY['date'], None, code, q, False)
+
+    param = search_parameters.get(resource_type, code)
+    if param is None:
+        raise LookupError(code)
+
+    if modifier == 'missing':
+        if value not in ('true', 'false'):
+            raise ValueError(value)
+        return Condition(
+            len(SELECTIVITY) + 1, param.type, code, Q(), value == 'true'
+        )
+
+    q = Q()
+    for item in split_values(value):
+        q |= VALUE_Q[param.type](item, modifier)
+
+    return Condition(
+        SELECTIVITY[param.type], param.type, code, q, modifier == 'not'
+    )
+
+
+class SearchParameterFilter(BaseFilterBackend):
+    """
+    Filter backend that applies the FHIR search parameters of the request
+    to the queryset of resources of the view's type.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        prefer = request.META.get('HTTP_PREFER', '')
+        return search_queryset(
+            queryset,
+            view.kwargs['type'],
+            request.query_params,
+            strict='handling=strict' in prefer,
+        )
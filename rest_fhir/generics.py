@@ -1,16 +1,108 @@
-from typing import Union
+import asyncio
+import functools
+from contextlib import ExitStack
+from typing import Optional, Union
 
-from rest_framework.generics import GenericAPIView
+from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import BrowsableAPIRenderer
 
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+from . import parsers, renderers
+from .compat import sync_to_async
 from .exceptions import Gone
+from .indexer import get_response_token, wait_for_index
+from .mixins.conditional_read import parse_version_etag
 from .models import Resource, ResourceVersion
+from .negotiation import FHIRContentNegotiation
+from .projection import Projection, get_projection
+from .routers import (
+    CONSISTENCY_TOKEN_HEADER,
+    is_replica,
+    mark_written,
+    requires_primary,
+    use_primary,
+)
+from .settings import fhir_settings
+from .sharding import is_sharded, shard_for, use_shard
 
 FhirResource = Union[Resource, ResourceVersion]
 
 
 class FhirGenericAPIView(GenericAPIView):
-    def get_object(self) -> FhirResource:
-        object = super().get_object()
+    renderer_classes = [
+        renderers.FHIRJSONRenderer,
+        renderers.JSONRenderer,
+        BrowsableAPIRenderer,
+    ]
+    parser_classes = [
+        parsers.FHIRJSONParser,
+        parsers.JSONParser,
+        FormParser,
+        MultiPartParser,
+    ]
+    content_negotiation_class = FHIRContentNegotiation
+
+    def dispatch(self, request, *args, **kwargs):
+        with self.route_databases(request, kwargs):
+            return super().dispatch(request, *args, **kwargs)
+
+    def route_databases(self, request, kwargs) -> ExitStack:
+        """
+        Database routing of the request: writes, and the requests of
+        clients that wrote recently, read from the primary database (see
+        rest_fhir.routers), requests on a resource id go to its shard (see
+        rest_fhir.sharding).
+        """
+        stack = ExitStack()
+        if requires_primary(request):
+            stack.enter_context(use_primary())
+        if is_sharded() and 'id' in kwargs:
+            stack.enter_context(use_shard(shard_for(kwargs['id'])))
+        return stack
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Write-behind search indexing, see rest_fhir.indexer
+        token = request.headers.get(CONSISTENCY_TOKEN_HEADER)
+        if token is not None and fhir_settings.ASYNC_INDEXING:
+            wait_for_index(token)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            mark_written(response)
+            if fhir_settings.ASYNC_INDEXING:
+                token = get_response_token(response, self.kwargs)
+                if token is not None:
+                    response[CONSISTENCY_TOKEN_HEADER] = token
+        return response
+
+    def get_object(self, queryset=None) -> FhirResource:
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        queryset = self.filter_queryset(queryset)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            object = get_object_or_404(queryset, **filter_kwargs)
+        except Http404:
+            if not is_replica(queryset.db):
+                raise
+            object = None
+
+        if self.is_stale(queryset, object):
+            object = get_object_or_404(
+                queryset.using(fhir_settings.PRIMARY_DATABASE),
+                **filter_kwargs,
+            )
+
+        self.check_object_permissions(self.request, object)
 
         # A GET for a deleted resource returns a 410 status code
         # https://www.hl7.org/fhir/http.html#read
@@ -18,3 +110,154 @@ class FhirGenericAPIView(GenericAPIView):
             raise Gone()
 
         return object
+
+    def is_stale(self, queryset, object: Optional[FhirResource]) -> bool:
+        """
+        Whether `object`, read from `queryset`, may be behind the primary
+        database: it was read from a replica, and is missing or older than
+        the version of the client's If-None-Match or If-Match header.
+        """
+        if not is_replica(queryset.db):
+            return False
+        if object is None:
+            return True
+
+        seen_version_ids = [
+            parse_version_etag(self.request.headers.get(header))
+            for header in ('If-None-Match', 'If-Match')
+        ]
+        return any(
+            version_id is not None and version_id > object.version_id
+            for version_id in seen_version_ids
+        )
+
+    def get_metadata_queryset(self):
+        """
+        Queryset used to evaluate preconditions. Defaults to the regular
+        queryset; views should override it to defer the resource content.
+        """
+        return self.get_queryset()
+
+    def get_metadata_object(self) -> FhirResource:
+        return self.get_object(queryset=self.get_metadata_queryset())
+
+    def get_projection(self) -> Optional[Projection]:
+        """
+        Projection of the resources read by a GET of a resource type, on
+        its `_summary` and `_elements` parameters. None when whole
+        resources are returned.
+        """
+        if not hasattr(self, '_projection'):
+            self._projection = None
+            if self.request.method == 'GET' and 'type' in self.kwargs:
+                self._projection = get_projection(
+                    self.kwargs['type'], self.request.query_params
+                )
+        return self._projection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, 'request', None) is not None:
+            context['projection'] = self.get_projection()
+        return context
+
+
+class AsyncFhirGenericAPIView(FhirGenericAPIView):
+    """
+    FhirGenericAPIView served by an async view function, so that ASGI
+    servers run it on their event loop instead of a worker thread.
+
+    Handlers (`get`, `post`, ...) may be coroutine functions, using the
+    async variants of the mixins; sync ones run in a thread, as they would
+    for a sync view. Authentication, permissions and throttling may query
+    the database so they run in a thread as well.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # Keep the attributes set by DRF (`cls`, `csrf_exempt`, ...)
+        return functools.update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        with self.route_databases(request, kwargs):
+            return await self.adispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(
+                    request, *args, **kwargs
+                )
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def aget_object(self, queryset=None) -> FhirResource:
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        queryset = self.filter_queryset(queryset)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            object = await self.aget_object_or_404(queryset, **filter_kwargs)
+        except Http404:
+            if not is_replica(queryset.db):
+                raise
+            object = None
+
+        if self.is_stale(queryset, object):
+            object = await self.aget_object_or_404(
+                queryset.using(fhir_settings.PRIMARY_DATABASE),
+                **filter_kwargs,
+            )
+
+        self.check_object_permissions(self.request, object)
+
+        if self.request.method == 'GET' and object.deleted_at is not None:
+            raise Gone()
+
+        return object
+
+    async def aget_object_or_404(self, queryset, **filter_kwargs):
+        # Same lookup errors as get_object_or_404
+        try:
+            return await queryset.aget(**filter_kwargs)
+        except (
+            queryset.model.DoesNotExist,
+            TypeError,
+            ValueError,
+            ValidationError,
+        ):
+            raise Http404
+
+    async def aget_metadata_object(self) -> FhirResource:
+        return await self.aget_object(queryset=self.get_metadata_queryset())
@@ -0,0 +1,302 @@
+import csv
+import io
+import uuid
+from collections import defaultdict, namedtuple
+from typing import List, Tuple
+
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DataError,
+    IntegrityError,
+    connections,
+    transaction,
+)
+from django.utils import timezone
+
+from .encoders import dumps, loads
+from .models import (
+    Resource,
+    ResourceVersion,
+    normalize_resource_content,
+    write_index,
+)
+from .settings import fhir_settings
+from .sharding import atomic_shards, is_sharded, shard_for
+
+ImportChunk = namedtuple(
+    'ImportChunk', ['start', 'end', 'lines', 'created', 'updated', 'errors']
+)
+ImportIssue = namedtuple('ImportIssue', ['offset', 'message'])
+
+
+class NDJSONImporter:
+    """
+    Stream resources from an NDJSON file into `fhir_resource` and
+    `fhir_resource_ver`, `batch_size` lines at a time, so memory use does
+    not depend on the size of the file.
+
+    Each chunk is written in its own transaction with bulk inserts, or with
+    `COPY` on PostgreSQL. `run` yields an ImportChunk once each chunk is
+    committed; its `end` offset is where a later run can resume from.
+
+    Resources keep the `id` of their line when it is a UUID, so that the
+    references between them still resolve, and get a new one otherwise.
+    Lines of resources that already exist write their next version, like
+    updates, so importing a file again doesn't duplicate its resources.
+
+    When a chunk is rejected by the database (IntegrityError, DataError),
+    its lines are written again one at a time and only the failing ones
+    are reported. Other database errors are raised: the chunk isn't
+    committed, and the import can resume from its `start` offset.
+
+    With SHARD_DATABASES, resources are written to their shard instead of
+    the `using` database.
+    """
+
+    def __init__(self, batch_size=1000, using=DEFAULT_DB_ALIAS, use_copy=None):
+        self.batch_size = batch_size
+        self.using = using
+        if use_copy is None:
+            use_copy = connections[using].vendor == 'postgresql'
+        self.use_copy = use_copy
+
+    def run(self, stream, offset=0):
+        position = self.seek(stream, offset)
+
+        while True:
+            start = position
+            entries = []
+            errors = []
+            lines = 0
+
+            while lines < self.batch_size:
+                line = stream.readline()
+                if not line:
+                    break
+
+                line_offset = position
+                position += len(line)
+                if not line.strip():
+                    continue
+
+                lines += 1
+                try:
+                    entries.append((line_offset, self.parse_line(line)))
+                except ValueError as exc:
+                    errors.append(ImportIssue(line_offset, str(exc)))
+
+            if not lines:
+                return
+
+            created = updated = 0
+            if entries:
+                try:
+                    created, updated, issues = self.write(entries)
+                except (DataError, IntegrityError):
+                    created, updated, issues = self.write_each(entries)
+                errors = sorted(errors + issues)
+
+            yield ImportChunk(start, position, lines, created, updated, errors)
+
+    def seek(self, stream, offset) -> int:
+        if not offset:
+            return 0
+
+        if getattr(stream, 'seekable', lambda: False)():
+            stream.seek(offset)
+        else:
+            remaining = offset
+            while remaining:
+                skipped = len(stream.read(min(remaining, 64 * 1024)))
+                if not skipped:
+                    break
+                remaining -= skipped
+        return offset
+
+    def parse_line(self, line) -> dict:
+        resource_content = loads(line)
+        if not isinstance(resource_content, dict) or not isinstance(
+            resource_content.get('resourceType'), str
+        ):
+            raise ValueError('Line is not a FHIR resource')
+        return resource_content
+
+    def get_id(self, resource_content) -> uuid.UUID:
+        resource_id = resource_content.get('id')
+        if isinstance(resource_id, str):
+            try:
+                return uuid.UUID(resource_id)
+            except ValueError:
+                pass
+        return uuid.uuid4()
+
+    def write(self, entries) -> Tuple[int, int, List[ImportIssue]]:
+        """
+        Write the `(offset, resource content)` entries of a chunk. Returns
+        the number of resources created and updated, and the issues of the
+        lines that weren't written.
+        """
+        ids = [
+            self.get_id(resource_content)
+            for _offset, resource_content in entries
+        ]
+        if not is_sharded():
+            return self.write_to(self.using, entries, ids)
+
+        # Resources go to the shard of their id (see rest_fhir.sharding),
+        # the chunk is committed on all shards or rolled back on all
+        chunks = defaultdict(lambda: ([], []))
+        for entry, resource_id in zip(entries, ids):
+            shard_entries, shard_ids = chunks[shard_for(resource_id)]
+            shard_entries.append(entry)
+            shard_ids.append(resource_id)
+
+        created = updated = 0
+        errors = []
+        with atomic_shards():
+            for alias, (shard_entries, shard_ids) in chunks.items():
+                shard_created, shard_updated, shard_errors = self.write_to(
+                    alias, shard_entries, shard_ids
+                )
+                created += shard_created
+                updated += shard_updated
+                errors.extend(shard_errors)
+        return created, updated, errors
+
+    def write_each(self, entries) -> Tuple[int, int, List[ImportIssue]]:
+        """
+        `write` the entries of a rejected chunk one at a time, reporting
+        the lines rejected by the database.
+        """
+        created = updated = 0
+        errors = []
+        for entry in entries:
+            try:
+                entry_created, entry_updated, entry_errors = self.write([entry])
+            except (DataError, IntegrityError) as exc:
+                errors.append(ImportIssue(entry[0], str(exc)))
+            else:
+                created += entry_created
+                updated += entry_updated
+                errors.extend(entry_errors)
+        return created, updated, errors
+
+    def write_to(
+        self, using, entries, ids
+    ) -> Tuple[int, int, List[ImportIssue]]:
+        with transaction.atomic(using=using):
+            resource_types = dict(
+                Resource.objects.using(using)
+                .filter(id__in=ids)
+                .values_list('id', 'resource_type')
+            )
+            created = []
+            updated = []
+            errors = []
+
+            for (offset, resource_content), resource_id in zip(entries, ids):
+                resource_type = resource_content['resourceType']
+                if resource_id not in resource_types:
+                    resource_types[resource_id] = resource_type
+                    created.append((resource_id, resource_content))
+                elif resource_types[resource_id] == resource_type:
+                    updated.append((resource_id, resource_content))
+                else:
+                    errors.append(
+                        ImportIssue(
+                            offset,
+                            'Resource %s already exists as a %s'
+                            % (resource_id, resource_types[resource_id]),
+                        )
+                    )
+
+            if created:
+                created_ids, resource_contents = zip(*created)
+                if self.use_copy:
+                    self.copy(resource_contents, using, created_ids)
+                else:
+                    Resource.objects.using(using).bulk_create_resources(
+                        resource_contents, ids=created_ids
+                    )
+            if updated:
+                self.update(updated, using)
+
+        return len(created), len(updated), errors
+
+    def update(self, updated, using):
+        """
+        Write the next version of the resources of the `(id, resource
+        content)` pairs, one at a time like updates.
+        """
+        resources = (
+            Resource.objects.using(using)
+            .with_current_content()
+            .in_bulk({resource_id for resource_id, _content in updated})
+        )
+        for resource_id, resource_content in updated:
+            resources[resource_id].save(
+                resource_content=resource_content, using=using
+            )
+
+    def copy(self, resource_contents, using=None, ids=None) -> int:
+        """
+        Write the chunk with PostgreSQL `COPY ... FROM STDIN`. The search
+        index is written with bulk inserts in the same transaction.
+        """
+        using = using or self.using
+        if ids is None:
+            ids = [uuid.uuid4() for _ in resource_contents]
+
+        now = timezone.now().isoformat()
+        denormalized = fhir_settings.DENORMALIZED_CONTENT
+        indexed = []
+        resources = io.StringIO()
+        versions = io.StringIO()
+        resources_writer = csv.writer(resources)
+        versions_writer = csv.writer(versions)
+
+        for resource_id, resource_content in zip(ids, resource_contents):
+            resource_content = normalize_resource_content(
+                resource_id, resource_content
+            )
+            raw = dumps(resource_content).decode('utf-8')
+            row = [resource_id, resource_content['resourceType'], 1, now, now]
+            if denormalized:
+                row.append(raw)
+            resources_writer.writerow(row)
+            versions_writer.writerow(
+                [resource_id, resource_content['resourceType'], 1, raw, now]
+            )
+            indexed.append(
+                (
+                    resource_id,
+                    resource_content['resourceType'],
+                    resource_content,
+                    {},
+                )
+            )
+
+        resources.seek(0)
+        versions.seek(0)
+
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.copy_expert(
+                    'COPY %s (id, resource_type, vid, published_at, '
+                    'updated_at%s) FROM STDIN WITH (FORMAT csv)'
+                    % (
+                        Resource._meta.db_table,
+                        ', current_content' if denormalized else '',
+                    ),
+                    resources,
+                )
+                cursor.copy_expert(
+                    'COPY %s (resource_id, resource_type, vid, '
+                    'resource_content, published_at) '
+                    'FROM STDIN WITH (FORMAT csv)'
+                    % ResourceVersion._meta.db_table,
+                    versions,
+                )
+            write_index(indexed, [1] * len(indexed), using=using)
+
+        return len(resource_contents)
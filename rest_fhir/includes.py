@@ -0,0 +1,221 @@
+"""
+`_include` and `_revinclude` https://www.hl7.org/fhir/search.html#include
+
+References are resolved through the `fhir_idx_reference` rows written
+with the search index, never by reading the referencing resources. Each
+hop from a set of resources costs at most three queries, whatever their
+number: one on the index rows of these resources for `_include`, one on
+the index rows pointing to them for `_revinclude`, and one
+`id IN (...)` on the resources found. `:iterate` parameters are applied
+to the resources included by the previous hop, up to
+MAX_INCLUDE_ITERATIONS hops.
+
+Only references indexed by a search parameter of type reference can be
+followed, and only to resources of this server. A page includes at most
+SEARCH_MAX_INCLUDES resources.
+"""
+import re
+import uuid
+from collections import namedtuple
+from functools import reduce
+from operator import or_
+from typing import List, Optional
+
+from rest_framework.exceptions import ParseError
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from .indexing import search_parameters
+from .models import ReferenceIndex, Resource
+from .settings import fhir_settings
+from .sharding import sharded
+
+# Hops of the `:iterate` parameters, after the one from the matches
+MAX_INCLUDE_ITERATIONS = 3
+
+INCLUDE_RE = re.compile(
+    r'^(?P<source>[A-Z][A-Za-z]+):(?P<code>[a-z][a-z0-9\-]*)'
+    r'(?::(?P<target>[A-Z][A-Za-z]+))?$'
+)
+
+# `_include=*` follows every reference, it has no source nor code
+Include = namedtuple(
+    'Include', ['source_type', 'code', 'target_type', 'iterate']
+)
+
+
+def parse_includes(params, name, strict=False) -> List[Include]:
+    """
+    Includes of the `name` (`_include` or `_revinclude`) parameters of a
+    query string, with their `:iterate` (or `:recurse`) modifier. Unknown
+    search parameters are ignored, unless `strict`.
+    """
+    includes = []
+    for key in params:
+        param_name, _sep, modifier = key.partition(':')
+        if param_name != name:
+            continue
+        if modifier not in ('', 'iterate', 'recurse'):
+            raise ParseError(
+                _("Invalid modifier for search parameter '%s'.") % key
+            )
+
+        for value in params.getlist(key):
+            include = parse_include(name, value, bool(modifier), strict)
+            if include is not None:
+                includes.append(include)
+    return includes
+
+
+def parse_include(name, value, iterate, strict) -> Optional[Include]:
+    if value == '*' and name == '_include':
+        return Include(None, None, None, iterate)
+
+    match = INCLUDE_RE.match(value)
+    if match is None:
+        raise ParseError(_("Invalid value for search parameter '%s'.") % name)
+
+    param = search_parameters.get(match.group('source'), match.group('code'))
+    if param is None or param.type != 'reference':
+        if strict:
+            raise ParseError(
+                _("Unknown reference search parameter '%s'.") % value
+            )
+        return None
+    return Include(
+        match.group('source'),
+        match.group('code'),
+        match.group('target'),
+        iterate,
+    )
+
+
+def get_references(resources, includes) -> set:
+    """
+    `(type, id)` of the resources referenced by `resources` through the
+    search parameters of `includes`.
+    """
+    queryset = ReferenceIndex.objects.filter(
+        resource_id__in=[resource.id for resource in resources]
+    )
+    if not any(include.source_type is None for include in includes):
+        source_types = {resource.resource_type for resource in resources}
+        conditions = [
+            Q(resource_type=include.source_type, name=include.code)
+            & (
+                Q(target_type=include.target_type)
+                if include.target_type is not None
+                else Q()
+            )
+            for include in includes
+            if include.source_type in source_types
+        ]
+        if not conditions:
+            return set()
+        queryset = queryset.filter(reduce(or_, conditions))
+
+    rows = sharded(queryset.values_list('target_type', 'target_id'))
+    references = set()
+    for target_type, target_id in rows:
+        try:
+            references.add((target_type, uuid.UUID(target_id)))
+        except ValueError:
+            # Logical ids on this server are always UUIDs
+            continue
+    return references
+
+
+def get_referrers(resources, includes) -> set:
+    """
+    `(type, id)` of the resources referencing `resources` through the
+    search parameters of `includes`.
+    """
+    ids_by_type = {}
+    for resource in resources:
+        ids_by_type.setdefault(resource.resource_type, []).append(
+            str(resource.id)
+        )
+
+    conditions = [
+        Q(
+            resource_type=include.source_type,
+            name=include.code,
+            target_type=target_type,
+            target_id__in=ids,
+        )
+        for include in includes
+        for target_type, ids in ids_by_type.items()
+        if include.target_type in (None, target_type)
+    ]
+    if not conditions:
+        return set()
+
+    return set(
+        sharded(
+            ReferenceIndex.objects.filter(reduce(or_, conditions)).values_list(
+                'resource_type', 'resource_id'
+            )
+        )
+    )
+
+
+def get_resources(keys, projection=None, limit=None) -> list:
+    """
+    Current versions of the resources of `(type, id)` keys that exist and
+    aren't deleted, in a single query (per shard).
+    """
+    queryset = (
+        Resource.objects.with_current_content()
+        .filter(
+            id__in=sorted({resource_id for _type, resource_id in keys}),
+            resource_type__in=sorted(
+                {resource_type for resource_type, _id in keys}
+            ),
+            deleted_at__isnull=True,
+        )
+        .order_by('id')
+    )
+    if projection is not None:
+        queryset = queryset.with_raw_content(projection)
+
+    return [
+        resource
+        for resource in sharded(queryset)[:limit]
+        if (resource.resource_type, resource.id) in keys
+    ]
+
+
+def resolve_includes(resources, includes, revincludes, projection=None) -> list:
+    """
+    Resources included by `includes` and `revincludes` for the `resources`
+    of a searchset page, in the order of the hops that found them. Matches
+    are never included again.
+    """
+    seen = {(resource.resource_type, resource.id) for resource in resources}
+    limit = fhir_settings.SEARCH_MAX_INCLUDES
+    included = []
+
+    for hop in range(MAX_INCLUDE_ITERATIONS + 1):
+        if hop:
+            includes = [include for include in includes if include.iterate]
+            revincludes = [
+                include for include in revincludes if include.iterate
+            ]
+        if not resources or not (includes or revincludes):
+            break
+
+        keys = (
+            get_references(resources, includes)
+            | get_referrers(resources, revincludes)
+        ) - seen
+        if not keys:
+            break
+
+        resources = get_resources(keys, projection, limit - len(included))
+        seen |= keys
+        included.extend(resources)
+        if len(included) >= limit:
+            break
+
+    return included
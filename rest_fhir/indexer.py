@@ -0,0 +1,186 @@
+"""
+Write-behind search indexing. With ASYNC_INDEXING, writes don't extract
+the search index of their version: they insert an IndexingTask in the
+`fhir_index_outbox` table, in their transaction, and the
+`fhir_index_worker` command writes the index of the resources of the
+tasks in batches.
+
+Searches see a write once it is indexed. Clients that need it sooner pass
+the versioned references of their writes (`Patient/<id>/_history/<vid>`,
+the `X-Consistency-Token` header of write responses) in a
+`X-Consistency-Token` header: the request waits until these versions are
+indexed, for up to INDEXING_WAIT_TIMEOUT seconds, and answers 503
+otherwise. Deletes need none: searches exclude deleted resources before
+their index is cleared.
+
+Tasks are claimed with `SELECT ... FOR UPDATE SKIP LOCKED` where it is
+supported, so workers of several processes or hosts share the outbox.
+A task reindexes the current version of its resource, whichever it is
+when processed, so processing a task twice or out of order is harmless.
+Tasks of the same resource may still be claimed by two workers: the
+resources of a batch are locked before their content is read, so these
+workers take turns, and the second one replaces the index rows written
+by the first instead of adding to them.
+"""
+import re
+import time
+from typing import List, Optional, Tuple
+
+from rest_framework.exceptions import ParseError
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .exceptions import IndexNotReady
+from .mixins.conditional_read import parse_version_etag
+from .models import IndexingTask, Resource, index_resources
+from .routers import CONSISTENCY_TOKEN_HEADER
+from .settings import fhir_settings
+from .sharding import sharded
+
+# Polling interval of the requests waiting for a consistency token
+WAIT_INTERVAL = 0.02
+
+CONSISTENCY_TOKEN_RE = re.compile(
+    r'(?:^|/)([A-Za-z]+)/([0-9a-fA-F-]{36})/_history/([0-9]+)$'
+)
+
+
+def get_consistency_token(resource_type, resource_id, version_id) -> str:
+    return '%s/%s/_history/%d' % (resource_type, resource_id, version_id)
+
+
+def parse_consistency_tokens(value) -> List[Tuple[str, str, int]]:
+    """
+    `(resource type, id, version id)` of the comma separated versioned
+    references of a consistency token header. Absolute and relative urls
+    are accepted.
+    """
+    tokens = []
+    for token in value.split(','):
+        match = CONSISTENCY_TOKEN_RE.search(token.strip())
+        if match is None:
+            raise ParseError(
+                'Invalid %s header: %r.' % (CONSISTENCY_TOKEN_HEADER, token)
+            )
+        tokens.append((match.group(1), match.group(2), int(match.group(3))))
+    return tokens
+
+
+def is_indexed(resource_id, version_id) -> bool:
+    """
+    Whether the index of the resource reflects version `version_id` (or a
+    later one).
+    """
+    return not (
+        sharded(IndexingTask.objects.all(), resource_id)
+        .filter(resource_id=resource_id, version_id__lte=version_id)
+        .exists()
+    )
+
+
+def wait_for_index(value, timeout=None):
+    """
+    Wait until the versions of the consistency token header `value` are
+    indexed. Raises IndexNotReady after `timeout` seconds (defaults to
+    INDEXING_WAIT_TIMEOUT).
+    """
+    tokens = parse_consistency_tokens(value)
+    if timeout is None:
+        timeout = fhir_settings.INDEXING_WAIT_TIMEOUT
+    deadline = time.monotonic() + timeout
+
+    while True:
+        tokens = [
+            (resource_type, resource_id, version_id)
+            for resource_type, resource_id, version_id in tokens
+            if not is_indexed(resource_id, version_id)
+        ]
+        if not tokens:
+            return
+        if time.monotonic() >= deadline:
+            raise IndexNotReady()
+        time.sleep(WAIT_INTERVAL)
+
+
+def get_response_token(response, kwargs) -> Optional[str]:
+    """
+    Consistency token of the response to a write: the version of its
+    Location header, or of its ETag for the resource of the url `kwargs`.
+    """
+    match = CONSISTENCY_TOKEN_RE.search(response.get('Location', ''))
+    if match is not None:
+        resource_type, resource_id, version_id = match.groups()
+        return get_consistency_token(
+            resource_type, resource_id, int(version_id)
+        )
+
+    version_id = parse_version_etag(response.get('ETag'))
+    if version_id is not None and 'type' in kwargs and 'id' in kwargs:
+        return get_consistency_token(kwargs['type'], kwargs['id'], version_id)
+    return None
+
+
+def process_batch(using=DEFAULT_DB_ALIAS, batch_size=None) -> int:
+    """
+    Claim up to `batch_size` tasks of the outbox of `using`, write the
+    search index of the current version of their resources, and delete
+    them, in one transaction. Returns the number of tasks processed.
+    """
+    batch_size = batch_size or fhir_settings.INDEXING_BATCH_SIZE
+    skip_locked = connections[using].features.has_select_for_update_skip_locked
+
+    with transaction.atomic(using=using):
+        tasks = IndexingTask.objects.using(using).order_by('id')
+        if skip_locked:
+            tasks = tasks.select_for_update(skip_locked=True)
+        claimed = list(tasks.values_list('id', 'resource_id')[:batch_size])
+        if not claimed:
+            return 0
+        task_ids = [task_id for task_id, _resource_id in claimed]
+        resource_ids = {resource_id for _task_id, resource_id in claimed}
+
+        # Locked in the order of their ids, so that workers can't deadlock
+        resources = Resource.objects.using(using).filter(id__in=resource_ids)
+        list(
+            resources.select_for_update()
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+        # Deleted resources have no content, their index is cleared
+        index_resources(
+            [
+                (
+                    resource.id,
+                    resource.resource_type,
+                    resource.resource_content,
+                    None,
+                )
+                for resource in resources.with_current_content()
+            ],
+            using=using,
+        )
+        IndexingTask.objects.using(using).filter(id__in=task_ids).delete()
+
+    return len(task_ids)
+
+
+def run_worker(
+    using=DEFAULT_DB_ALIAS, batch_size=None, poll_interval=1.0, once=False
+) -> int:
+    """
+    Process the outbox of `using` batch after batch. When it is empty,
+    return if `once`, or poll it again after `poll_interval` seconds.
+    Returns the number of tasks processed.
+    """
+    processed = 0
+    while True:
+        count = process_batch(using, batch_size)
+        processed += count
+        if count:
+            continue
+        if once:
+            return processed
+        # Like at the end of a request, honouring CONN_MAX_AGE
+        connections[using].close_if_unusable_or_obsolete()
+        time.sleep(poll_interval)
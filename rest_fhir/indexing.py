@@ -0,0 +1,462 @@
+"""
+Search parameters and the extraction of their values from resources.
+
+Search parameters are compiled once, when the app is ready, from the
+DEFAULT_SEARCH_PARAMETERS below and the `SEARCH_PARAMETERS` setting. Each
+write extracts the values of the parameters of its resource type, which
+are stored in one index table per parameter type (see `models`).
+
+Expressions support the subset of FHIRPath used by most SearchParameter
+definitions: a union (`|`) of dotted paths, each starting with the resource
+type, e.g. `Observation.effectiveDateTime | Observation.effectivePeriod`.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+from django.core.signals import setting_changed
+
+from .settings import fhir_settings
+
+SEARCH_PARAMETER_TYPES = (
+    'string',
+    'token',
+    'date',
+    'reference',
+    'quantity',
+    'uri',
+)
+
+# (code, type, expression[, target types])
+DEFAULT_SEARCH_PARAMETERS = [
+    # Shared
+    (
+        'identifier',
+        'token',
+        'Patient.identifier | Practitioner.identifier | '
+        'Organization.identifier | Location.identifier | '
+        'Observation.identifier | Encounter.identifier | '
+        'Condition.identifier | Procedure.identifier | '
+        'MedicationRequest.identifier',
+    ),
+    (
+        'name',
+        'string',
+        'Patient.name | Practitioner.name | Organization.name | '
+        'Location.name | ValueSet.name | CodeSystem.name',
+    ),
+    (
+        'active',
+        'token',
+        'Patient.active | Practitioner.active | Organization.active',
+    ),
+    ('family', 'string', 'Patient.name.family | Practitioner.name.family'),
+    ('given', 'string', 'Patient.name.given | Practitioner.name.given'),
+    (
+        'address',
+        'string',
+        'Patient.address | Practitioner.address | Organization.address | '
+        'Location.address',
+    ),
+    ('telecom', 'token', 'Patient.telecom | Practitioner.telecom'),
+    (
+        'status',
+        'token',
+        'Observation.status | Encounter.status | Procedure.status | '
+        'MedicationRequest.status | ValueSet.status | CodeSystem.status',
+    ),
+    (
+        'code',
+        'token',
+        'Observation.code | Condition.code | Procedure.code',
+    ),
+    (
+        'subject',
+        'reference',
+        'Observation.subject | Encounter.subject | Condition.subject | '
+        'Procedure.subject | MedicationRequest.subject',
+    ),
+    (
+        'patient',
+        'reference',
+        'Observation.subject | Encounter.subject | Condition.subject | '
+        'Procedure.subject | MedicationRequest.subject',
+        ['Patient'],
+    ),
+    (
+        'encounter',
+        'reference',
+        'Observation.encounter | Condition.encounter | '
+        'Procedure.encounter | MedicationRequest.encounter',
+    ),
+    (
+        'date',
+        'date',
+        'Observation.effectiveDateTime | Observation.effectivePeriod | '
+        'Observation.effectiveInstant | Encounter.period | '
+        'Procedure.performedDateTime | Procedure.performedPeriod',
+    ),
+    ('url', 'uri', 'ValueSet.url | CodeSystem.url'),
+    # Patient
+    ('gender', 'token', 'Patient.gender'),
+    ('birthdate', 'date', 'Patient.birthDate'),
+    ('general-practitioner', 'reference', 'Patient.generalPractitioner'),
+    ('organization', 'reference', 'Patient.managingOrganization'),
+    # Organization
+    ('type', 'token', 'Organization.type | Encounter.type'),
+    # Observation
+    ('category', 'token', 'Observation.category | Condition.category'),
+    ('value-quantity', 'quantity', 'Observation.valueQuantity'),
+    ('performer', 'reference', 'Observation.performer'),
+    # Encounter
+    ('class', 'token', 'Encounter.class'),
+    # Condition
+    ('clinical-status', 'token', 'Condition.clinicalStatus'),
+    (
+        'onset-date',
+        'date',
+        'Condition.onsetDateTime | Condition.onsetPeriod',
+    ),
+    # MedicationRequest
+    ('intent', 'token', 'MedicationRequest.intent'),
+    ('authoredon', 'date', 'MedicationRequest.authoredOn'),
+    # Terminology
+    ('version', 'token', 'ValueSet.version | CodeSystem.version'),
+]
+
+SearchParameter = namedtuple(
+    'SearchParameter', ['code', 'type', 'paths', 'target']
+)
+
+# Bounds of open ended periods
+MIN_DATETIME = datetime(1, 1, 1, tzinfo=timezone.utc)
+MAX_DATETIME = datetime(9999, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc)
+
+DATE_RE = re.compile(
+    r'^(?P<year>\d{4})(?:-(?P<month>\d{2})(?:-(?P<day>\d{2})'
+    r'(?:T(?P<hour>\d{2}):(?P<minute>\d{2})(?::(?P<second>\d{2})'
+    r'(?P<fraction>\.\d+)?)?(?P<tz>Z|[+-]\d{2}:\d{2})?)?)?)?$'
+)
+
+# Index columns are limited to this length
+MAX_VALUE_LENGTH = 255
+
+
+def parse_search_parameter(definition) -> Dict[str, SearchParameter]:
+    """
+    Compile a search parameter definition, either a tuple of the
+    DEFAULT_SEARCH_PARAMETERS or a SearchParameter resource, to one
+    SearchParameter per resource type of its expression.
+    """
+    if isinstance(definition, dict):
+        code = definition['code']
+        param_type = definition['type']
+        expression = definition['expression']
+        target = definition.get('target')
+    else:
+        code, param_type, expression, *target = definition
+        target = target[0] if target else None
+
+    if param_type not in SEARCH_PARAMETER_TYPES:
+        raise ValueError(
+            "Search parameter '%s' has an unsupported type '%s'"
+            % (code, param_type)
+        )
+
+    paths = dict()
+    for part in expression.split('|'):
+        resource_type, *path = part.strip().split('.')
+        if not path:
+            raise ValueError(
+                "Search parameter '%s' has an unsupported expression '%s'"
+                % (code, expression)
+            )
+        paths.setdefault(resource_type, []).append(tuple(path))
+
+    return {
+        resource_type: SearchParameter(
+            code, param_type, tuple(type_paths), target and tuple(target)
+        )
+        for resource_type, type_paths in paths.items()
+    }
+
+
+class SearchParameterRegistry:
+    """
+    Compiled search parameters by resource type and code.
+    """
+
+    def __init__(self):
+        self._parameters = None
+
+    def load(self):
+        parameters = dict()
+        for definition in [
+            *DEFAULT_SEARCH_PARAMETERS,
+            *fhir_settings.SEARCH_PARAMETERS,
+        ]:
+            for resource_type, param in parse_search_parameter(
+                definition
+            ).items():
+                parameters.setdefault(resource_type, {})[param.code] = param
+        self._parameters = parameters
+
+    def reset(self):
+        self._parameters = None
+
+    @property
+    def parameters(self) -> Dict[str, Dict[str, SearchParameter]]:
+        if self._parameters is None:
+            self.load()
+        return self._parameters
+
+    def get(self, resource_type, code) -> Optional[SearchParameter]:
+        return self.parameters.get(resource_type, {}).get(code)
+
+    def for_type(self, resource_type) -> Dict[str, SearchParameter]:
+        return self.parameters.get(resource_type, {})
+
+    def index_types(self, resource_type) -> set:
+        """
+        Index tables that may hold values of resources of this type.
+        """
+        return {param.type for param in self.for_type(resource_type).values()}
+
+
+search_parameters = SearchParameterRegistry()
+
+
+def reload_search_parameters(*args, **kwargs):
+    if kwargs['setting'] == 'REST_FHIR':
+        search_parameters.reset()
+
+
+setting_changed.connect(reload_search_parameters)
+
+
+def normalize_string(value: str) -> str:
+    """
+    Case and accent insensitive form of a string, used for string search.
+    """
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return value.casefold()[:MAX_VALUE_LENGTH]
+
+
+def parse_date_range(value: str) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Range of instants covered by a FHIR date, dateTime or instant, given
+    its precision: `2020` covers the whole year. Dates without a timezone
+    are taken as UTC.
+    """
+    match = DATE_RE.match(value) if isinstance(value, str) else None
+    if match is None:
+        return None
+
+    parts = match.groupdict()
+    try:
+        low = datetime(
+            int(parts['year']),
+            int(parts['month'] or 1),
+            int(parts['day'] or 1),
+            int(parts['hour'] or 0),
+            int(parts['minute'] or 0),
+            int(parts['second'] or 0),
+            int(Decimal(parts['fraction'] or 0) * 1000000),
+        )
+    except (ValueError, InvalidOperation):
+        return None
+
+    tz = parts['tz']
+    if tz in (None, 'Z'):
+        tzinfo = timezone.utc
+    else:
+        sign = -1 if tz[0] == '-' else 1
+        tzinfo = timezone(
+            sign * timedelta(hours=int(tz[1:3]), minutes=int(tz[4:6]))
+        )
+    low = low.replace(tzinfo=tzinfo)
+
+    if parts['fraction'] is not None:
+        return low, low
+    if parts['second'] is not None:
+        step = relativedelta(seconds=1)
+    elif parts['minute'] is not None:
+        step = relativedelta(minutes=1)
+    elif parts['day'] is not None:
+        step = relativedelta(days=1)
+    elif parts['month'] is not None:
+        step = relativedelta(months=1)
+    else:
+        step = relativedelta(years=1)
+
+    try:
+        high = low + step - timedelta(microseconds=1)
+    except OverflowError:
+        high = MAX_DATETIME
+    return low, high
+
+
+def iter_path(value, path):
+    """
+    Values of the elements at `path`, flattening repeating elements.
+    """
+    if isinstance(value, list):
+        for item in value:
+            yield from iter_path(item, path)
+        return
+
+    if not path:
+        if value is not None:
+            yield value
+        return
+
+    if isinstance(value, dict):
+        yield from iter_path(value.get(path[0]), path[1:])
+
+
+def extract_string(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        # HumanName, Address
+        for key in (
+            'text',
+            'family',
+            'given',
+            'prefix',
+            'suffix',
+            'line',
+            'city',
+            'district',
+            'state',
+            'postalCode',
+            'country',
+        ):
+            item = value.get(key)
+            for text in item if isinstance(item, list) else [item]:
+                if isinstance(text, str):
+                    yield text
+
+
+def extract_token(value):
+    if isinstance(value, bool):
+        yield None, 'true' if value else 'false'
+    elif isinstance(value, str):
+        yield None, value
+    elif isinstance(value, dict):
+        if isinstance(value.get('coding'), list):
+            # CodeableConcept
+            for coding in value['coding']:
+                yield from extract_token(coding)
+        elif 'code' in value:
+            # Coding
+            if isinstance(value['code'], str):
+                yield value.get('system'), value['code']
+        elif isinstance(value.get('value'), str):
+            # Identifier, ContactPoint
+            yield value.get('system'), value['value']
+
+
+def extract_date(value):
+    if isinstance(value, str):
+        date_range = parse_date_range(value)
+        if date_range is not None:
+            yield date_range
+    elif isinstance(value, dict):
+        # Period
+        start = parse_date_range(value.get('start'))
+        end = parse_date_range(value.get('end'))
+        if start or end:
+            yield (
+                start[0] if start else MIN_DATETIME,
+                end[1] if end else MAX_DATETIME,
+            )
+
+
+def extract_reference(value):
+    reference = value.get('reference') if isinstance(value, dict) else None
+    if not isinstance(reference, str) or reference.startswith('#'):
+        return
+
+    segments = reference.split('?')[0].rstrip('/').split('/')
+    if '_history' in segments:
+        segments = segments[: segments.index('_history')]
+    if len(segments) >= 2:
+        yield segments[-2], segments[-1]
+
+
+def extract_quantity(value):
+    if isinstance(value, dict) and isinstance(
+        value.get('value'), (int, float, Decimal)
+    ):
+        yield (
+            float(value['value']),
+            value.get('system'),
+            value.get('code'),
+            value.get('unit'),
+        )
+
+
+def extract_uri(value):
+    if isinstance(value, str):
+        yield value
+
+
+def truncate(value):
+    if isinstance(value, str):
+        return value[:MAX_VALUE_LENGTH]
+    return value
+
+
+def extract_index_values(resource_type, resource_content) -> Dict[str, set]:
+    """
+    Values of the search parameters of a resource, by parameter type. Each
+    value is a tuple that starts with the parameter code and is followed by
+    the columns of its index table.
+    """
+    values = {}
+    if not resource_content:
+        return values
+
+    for param in search_parameters.for_type(resource_type).values():
+        rows = values.setdefault(param.type, set())
+        for path in param.paths:
+            for element in iter_path(resource_content, path):
+                if param.type == 'string':
+                    for text in extract_string(element):
+                        rows.add(
+                            (param.code, normalize_string(text), truncate(text))
+                        )
+                elif param.type == 'token':
+                    for system, code in extract_token(element):
+                        rows.add((param.code, truncate(system), truncate(code)))
+                elif param.type == 'date':
+                    for low, high in extract_date(element):
+                        rows.add((param.code, low, high))
+                elif param.type == 'reference':
+                    for target_type, target_id in extract_reference(element):
+                        if param.target and target_type not in param.target:
+                            continue
+                        rows.add((param.code, target_type[:45], target_id[:64]))
+                elif param.type == 'quantity':
+                    for value, system, code, unit in extract_quantity(element):
+                        rows.add(
+                            (
+                                param.code,
+                                value,
+                                truncate(system),
+                                truncate(code),
+                                truncate(unit),
+                            )
+                        )
+                elif param.type == 'uri':
+                    for uri in extract_uri(element):
+                        rows.add((param.code, truncate(uri)))
+
+    return {param_type: rows for param_type, rows in values.items() if rows}
@@ -0,0 +1,97 @@
+"""
+Timings of the phases of a request, collected for InstrumentationMiddleware
+(see rest_fhir.middleware): database queries, serialization of resources,
+evaluation of preconditions and rendering.
+
+Phases are timed by the code that runs them, with `timing` or `timed`,
+into the RequestTimings of the current context. Outside of an
+instrumented request they cost a context variable lookup.
+"""
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.db import connections
+
+PHASES = ('db', 'serialize', 'precondition', 'render')
+
+
+class RequestTimings:
+    """
+    Seconds spent in each phase of a request, and its number of queries.
+    Phases may overlap: the contents loaded while serializing count in
+    `db` and in `serialize`.
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.queries = 0
+        # Depth of the timing of each phase, nested calls count once
+        self.depth = defaultdict(int)
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    'rest_fhir_timings', default=None
+)
+
+
+@contextmanager
+def timing(phase):
+    timings = current_timings.get()
+    if timings is None or timings.depth[phase]:
+        yield
+        return
+
+    timings.depth[phase] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+        timings.depth[phase] -= 1
+
+
+def timed(phase):
+    """
+    Decorator timing the calls of a function as `phase`.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_timings.get() is None:
+                return func(*args, **kwargs)
+            with timing(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    timings.queries += 1
+    with timing('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_recorder(connection=None, **kwargs):
+    """
+    Time the queries of `connection`, or of the connections of the current
+    thread. Connected to `connection_created` by the middleware, for the
+    connections of other threads (e.g. the one running the database
+    queries of async views).
+    """
+    for connection in [connection] if connection else connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
@@ -0,0 +1,145 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from rest_fhir.models import Resource, ResourceVersion
+from rest_fhir.patch import JSONPatch, diff
+from rest_fhir.settings import fhir_settings
+
+
+def encode_history(rows, interval):
+    """
+    Contents or deltas of the versions of a resource, from its versions
+    in decreasing version order, encoded with a snapshot every `interval`
+    versions (all contents when None).
+    """
+    encoded = []
+    content = next_content = None
+    for index, version in enumerate(rows):
+        version_id = version.version_id
+        if version.resource_delta is None:
+            content = version.resource_content
+        elif version.resource_delta:
+            content = JSONPatch(version.resource_delta).apply(content)
+
+        if (
+            index == 0
+            or not interval
+            or version_id % interval == 0
+            or content is None
+            or next_content is None
+        ):
+            encoded.append((version_id, content, None))
+        else:
+            encoded.append((version_id, None, diff(next_content, content)))
+        next_content = content
+    return encoded
+
+
+class Command(BaseCommand):
+    help = (
+        'Encode the version history of resources following the '
+        'HISTORY_SNAPSHOT_INTERVAL setting: past versions are stored as JSON '
+        'Patches from the next one, or with their full content when the '
+        'setting is None.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='resource_types',
+            help='Resource type to compact, can be repeated. Defaults to all.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of resources compacted per transaction.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to compact. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+        interval = fhir_settings.HISTORY_SNAPSHOT_INTERVAL
+
+        queryset = (
+            Resource.objects.using(using)
+            .filter(version_id__gt=1)
+            .order_by('id')
+        )
+        if options['resource_types']:
+            queryset = queryset.filter(
+                resource_type__in=options['resource_types']
+            )
+
+        compacted = rewritten = 0
+        last_id = None
+        started = time.monotonic()
+
+        while True:
+            batch = queryset
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic(using=using):
+                # Writers of these resources wait for the end of the batch
+                list(
+                    Resource.objects.using(using)
+                    .select_for_update()
+                    .filter(id__in=ids)
+                    .values_list('id', flat=True)
+                )
+                for resource_id in ids:
+                    rewritten += self.compact(resource_id, interval, using)
+
+            compacted += len(ids)
+            last_id = ids[-1]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                '%d compacted, %.0f/s'
+                % (compacted, compacted / elapsed if elapsed else 0)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Compacted %d resources, %d versions rewritten.'
+                % (compacted, rewritten)
+            )
+        )
+
+    def compact(self, resource_id, interval, using) -> int:
+        versions = ResourceVersion.objects.using(using).filter(
+            resource_id=resource_id
+        )
+        rows = list(
+            versions.order_by('-version_id').only(
+                'version_id',
+                'resource_content',
+                'resource_content_compressed',
+                'resource_delta',
+            )
+        )
+        content_field = ResourceVersion._meta.get_field('resource_content')
+
+        rewritten = 0
+        for (version_id, content, delta), stored in zip(
+            encode_history(rows, interval), rows
+        ):
+            if (delta is None) == (stored.resource_delta is None):
+                continue
+            versions.filter(version_id=version_id).update(
+                resource_delta=delta,
+                **content_field.get_column_values(content),
+            )
+            rewritten += 1
+        return rewritten
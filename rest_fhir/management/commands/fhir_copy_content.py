@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import OuterRef, Subquery
+
+from rest_fhir.models import Resource, ResourceVersion
+from rest_fhir.settings import fhir_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the content of the current version to the rows of the '
+        'resources that have no copy, after enabling the '
+        'DENORMALIZED_CONTENT setting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='resource_types',
+            help='Resource type to copy, can be repeated. Defaults to all.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of resources copied per query.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to update. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        if not fhir_settings.DENORMALIZED_CONTENT:
+            raise CommandError('The DENORMALIZED_CONTENT setting is off.')
+
+        using = options['database']
+        batch_size = options['batch_size']
+
+        queryset = (
+            Resource.objects.using(using)
+            .filter(
+                deleted_at__isnull=True,
+                current_content__isnull=True,
+                current_content_compressed__isnull=True,
+            )
+            .order_by('id')
+        )
+        if options['resource_types']:
+            queryset = queryset.filter(
+                resource_type__in=options['resource_types']
+            )
+        versions = ResourceVersion.objects.filter(
+            resource_id=OuterRef('id'), version_id=OuterRef('version_id')
+        )
+
+        copied = 0
+        last_id = None
+        started = time.monotonic()
+
+        while True:
+            batch = queryset
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            # The conditions are checked again on update: a copy written
+            # meanwhile by a new version is kept
+            copied += queryset.filter(id__in=ids).update(
+                current_content=Subquery(versions.values('resource_content')),
+                current_content_compressed=Subquery(
+                    versions.values('resource_content_compressed')
+                ),
+            )
+            last_id = ids[-1]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                '%d copied, %.0f/s'
+                % (copied, copied / elapsed if elapsed else 0)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS('Copied the content of %d resources.' % copied)
+        )
@@ -0,0 +1,129 @@
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from rest_fhir.partitioning import (
+    VERSION_TABLE,
+    add_months,
+    create_range_partition_sql,
+    get_partitions,
+    has_current_versions,
+    is_partitioned,
+    month_bounds,
+    parse_range_partition_name,
+    quote_name,
+    range_bound,
+    range_partition_name,
+    split_default_partition_sql,
+)
+
+
+def iso_date(value) -> date:
+    # date.fromisoformat is new in Python 3.7
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the monthly partitions of fhir_resource_ver for the coming '
+        'months, and detach the partitions of old months, after '
+        '`fhir_partition --versions range`. Meant to run periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='Number of monthly partitions kept ahead of the current one.',
+        )
+        parser.add_argument(
+            '--detach-before',
+            type=iso_date,
+            help=(
+                'Detach the partitions of the months ending before this date '
+                '(YYYY-MM-DD), for archiving. Partitions holding the current '
+                'version of a resource are kept.'
+            ),
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to maintain. Defaults to "default".',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the SQL statements instead of running them.',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires a PostgreSQL database.')
+
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor, VERSION_TABLE):
+                raise CommandError(
+                    '%s is not partitioned, run fhir_partition first.'
+                    % VERSION_TABLE
+                )
+            partitions = set(get_partitions(cursor, VERSION_TABLE))
+
+            statements = []
+            today = timezone.now().date()
+            for start, end in month_bounds(
+                today, add_months(today, options['months_ahead'])
+            ):
+                if range_partition_name(start) in partitions:
+                    continue
+                if self.has_default_rows(cursor, start, end):
+                    statements += split_default_partition_sql(start, end)
+                else:
+                    statements.append(create_range_partition_sql(start, end))
+
+            detached = []
+            if options['detach_before']:
+                for partition in sorted(partitions):
+                    bounds = parse_range_partition_name(partition)
+                    if bounds is None or bounds[1] > options['detach_before']:
+                        continue
+                    if has_current_versions(cursor, partition):
+                        self.stdout.write(
+                            self.style.WARNING(
+                                '%s holds current versions, kept.' % partition
+                            )
+                        )
+                        continue
+                    statements.append(
+                        'ALTER TABLE %s DETACH PARTITION %s'
+                        % (quote_name(VERSION_TABLE), quote_name(partition))
+                    )
+                    detached.append(partition)
+
+            if options['dry_run']:
+                for statement in statements:
+                    self.stdout.write('%s;' % statement)
+                return
+
+            with transaction.atomic(using=using):
+                for statement in statements:
+                    cursor.execute(statement)
+
+        for partition in detached:
+            self.stdout.write('Detached %s.' % partition)
+        self.stdout.write(
+            self.style.SUCCESS('Ran %d statements.' % len(statements))
+        )
+
+    def has_default_rows(self, cursor, start, end) -> bool:
+        default = '%s_default' % VERSION_TABLE
+        cursor.execute(
+            'SELECT 1 FROM %s WHERE published_at >= %s AND published_at < %s '
+            'LIMIT 1'
+            % (quote_name(default), range_bound(start), range_bound(end))
+        )
+        return cursor.fetchone() is not None
@@ -0,0 +1,126 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from rest_fhir.importer import NDJSONImporter
+
+
+class Command(BaseCommand):
+    help = 'Import resources from an NDJSON file, one resource per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the NDJSON file.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of lines written per transaction.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to import into. Defaults to "default".',
+        )
+        parser.add_argument(
+            '--offset',
+            type=int,
+            default=None,
+            help='Byte offset of the file to start reading from.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'File that keeps the offset of the last imported chunk. '
+                'The import resumes from it when it exists.'
+            ),
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_false',
+            dest='use_copy',
+            default=None,
+            help='Use bulk inserts instead of COPY on PostgreSQL.',
+        )
+
+    def handle(self, *args, **options):
+        offset = options['offset']
+        checkpoint = options['checkpoint']
+
+        if offset is None:
+            offset = self.read_checkpoint(checkpoint) if checkpoint else 0
+
+        importer = NDJSONImporter(
+            batch_size=options['batch_size'],
+            using=options['database'],
+            use_copy=options['use_copy'],
+        )
+
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        total_size = os.fstat(stream.fileno()).st_size
+        created = updated = errors = 0
+        started = time.monotonic()
+
+        with stream:
+            try:
+                for chunk in importer.run(stream, offset=offset):
+                    created += chunk.created
+                    updated += chunk.updated
+                    errors += len(chunk.errors)
+
+                    for issue in chunk.errors:
+                        self.stderr.write(
+                            'Offset %d: %s' % (issue.offset, issue.message)
+                        )
+
+                    if checkpoint:
+                        self.write_checkpoint(checkpoint, chunk.end)
+                    offset = chunk.end
+
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        'Offset %d/%d (%.1f%%): %d created, %d updated, '
+                        '%d errors, %.0f/s'
+                        % (
+                            chunk.end,
+                            total_size,
+                            100 * chunk.end / (total_size or 1),
+                            created,
+                            updated,
+                            errors,
+                            (created + updated) / elapsed if elapsed else 0,
+                        )
+                    )
+            except DatabaseError as exc:
+                # The chunk that failed is neither committed nor checkpointed
+                raise CommandError(
+                    'Import stopped at offset %d: %s' % (offset, exc)
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Imported %d resources (%d updated, %d errors).'
+                % (created + updated, updated, errors)
+            )
+        )
+
+    def read_checkpoint(self, path) -> int:
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError('Invalid checkpoint file %s' % path)
+
+    def write_checkpoint(self, path, offset):
+        # Replace the file atomically, so a crash never leaves it truncated
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path)
@@ -0,0 +1,86 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rest_fhir.indexer import run_worker
+from rest_fhir.settings import fhir_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the search index of the resources written with the '
+        'ASYNC_INDEXING setting, from the outbox of indexing tasks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Number of worker processes.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help=(
+                'Number of tasks processed per transaction. Defaults to the '
+                'INDEXING_BATCH_SIZE setting.'
+            ),
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls of an empty outbox.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the outbox is empty.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database of the outbox. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        if not fhir_settings.ASYNC_INDEXING:
+            self.stderr.write(
+                self.style.WARNING('The ASYNC_INDEXING setting is off.')
+            )
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1.')
+
+        kwargs = {
+            'using': options['database'],
+            'batch_size': options['batch_size'],
+            'poll_interval': options['poll_interval'],
+            'once': options['once'],
+        }
+
+        if options['processes'] == 1:
+            processed = run_worker(**kwargs)
+        else:
+            # Forked processes must not share the connections of this one
+            connections.close_all()
+            with multiprocessing.Pool(options['processes']) as pool:
+                processed = sum(
+                    pool.starmap(
+                        run_worker_process,
+                        [(kwargs,)] * options['processes'],
+                    )
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS('Indexed %d resource versions.' % processed)
+        )
+
+
+def run_worker_process(kwargs):
+    try:
+        return run_worker(**kwargs)
+    finally:
+        connections.close_all()
@@ -0,0 +1,158 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from rest_fhir.models import ResourceVersion
+from rest_fhir.partitioning import (
+    RESOURCE_TABLE,
+    VERSION_SCHEMES,
+    VERSION_TABLE,
+    add_months,
+    is_partitioned,
+    month_bounds,
+    partition_resources_sql,
+    partition_versions_sql,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the resource tables of a PostgreSQL database to partitioned '
+        'tables: fhir_resource by resource type, fhir_resource_ver by month '
+        'of publication or by hash of the resource id. Rows are copied in a '
+        'single transaction, the tables are locked meanwhile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='resource_types',
+            default=[],
+            help=(
+                'Resource type with its own partition of fhir_resource, can '
+                'be repeated. Other types share a default partition.'
+            ),
+        )
+        parser.add_argument(
+            '--versions',
+            choices=VERSION_SCHEMES,
+            default='range',
+            help=(
+                'Partition versions by month of publication ("range", old '
+                'partitions can be detached), or by hash of the resource id '
+                '("hash", the versions of a resource share a partition).'
+            ),
+        )
+        parser.add_argument(
+            '--hash-partitions',
+            type=int,
+            default=16,
+            help='Number of partitions of fhir_resource_ver with "hash".',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='Number of monthly partitions created ahead with "range".',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to partition. Defaults to "default".',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the SQL statements instead of running them.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires a PostgreSQL database.')
+
+        with connection.cursor() as cursor:
+            statements = []
+            if is_partitioned(cursor, RESOURCE_TABLE):
+                self.stdout.write('%s is already partitioned.' % RESOURCE_TABLE)
+            else:
+                try:
+                    statements += partition_resources_sql(
+                        options['resource_types'],
+                        self.get_foreign_keys(connection, cursor),
+                    )
+                except ValueError as exc:
+                    raise CommandError(exc)
+
+            if is_partitioned(cursor, VERSION_TABLE):
+                self.stdout.write('%s is already partitioned.' % VERSION_TABLE)
+            else:
+                statements += self.partition_versions(
+                    connection, cursor, options
+                )
+
+            if options['dry_run']:
+                for statement in statements:
+                    self.stdout.write('%s;' % statement)
+                return
+
+            with transaction.atomic(using=options['database']):
+                for statement in statements:
+                    cursor.execute(statement)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Partitioned %s in %d statements.'
+                % (connection.alias, len(statements))
+            )
+        )
+
+    def get_foreign_keys(self, connection, cursor):
+        """
+        Foreign keys referencing fhir_resource, as (table, constraint).
+        """
+        foreign_keys = []
+        for table in connection.introspection.table_names(cursor):
+            constraints = connection.introspection.get_constraints(
+                cursor, table
+            )
+            foreign_keys += [
+                (table, name)
+                for name, constraint in constraints.items()
+                if constraint['foreign_key']
+                and constraint['foreign_key'][0] == RESOURCE_TABLE
+            ]
+        return foreign_keys
+
+    def partition_versions(self, connection, cursor, options):
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'pid')", [VERSION_TABLE]
+        )
+        [sequence] = cursor.fetchone()
+
+        with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+            indexes = [
+                str(index.create_sql(ResourceVersion, editor))
+                for index in ResourceVersion._meta.indexes
+            ]
+
+        months = []
+        if options['versions'] == 'range':
+            cursor.execute(
+                'SELECT MIN(published_at) FROM %s'
+                % connection.ops.quote_name(VERSION_TABLE)
+            )
+            [first] = cursor.fetchone()
+            now = timezone.now()
+            months = month_bounds(
+                first or now, add_months(now.date(), options['months_ahead'])
+            )
+
+        return partition_versions_sql(
+            options['versions'],
+            sequence,
+            indexes=indexes,
+            months=months,
+            hash_partitions=options['hash_partitions'],
+        )
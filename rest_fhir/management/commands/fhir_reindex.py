@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from rest_fhir.models import INDEX_MODELS, Resource, index_resources
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the search index of the current version of resources, e.g. '
+        'after a change of the SEARCH_PARAMETERS setting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='resource_types',
+            help='Resource type to reindex, can be repeated. Defaults to all.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of resources reindexed per transaction.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to reindex. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+
+        queryset = (
+            Resource.objects.using(using)
+            .select_related('version')
+            .filter(deleted_at__isnull=True)
+            .order_by('id')
+        )
+        if options['resource_types']:
+            queryset = queryset.filter(
+                resource_type__in=options['resource_types']
+            )
+
+        reindexed = 0
+        last_id = None
+        started = time.monotonic()
+
+        while True:
+            batch = queryset
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            resources = list(batch[:batch_size])
+            if not resources:
+                break
+
+            ids = [resource.id for resource in resources]
+            with transaction.atomic(using=using):
+                for model, _fields in INDEX_MODELS.values():
+                    model.objects.using(using).filter(
+                        resource_id__in=ids
+                    ).delete()
+                index_resources(
+                    [
+                        (
+                            resource.id,
+                            resource.resource_type,
+                            resource.resource_content,
+                            {},
+                        )
+                        for resource in resources
+                    ],
+                    using=using,
+                )
+
+            reindexed += len(resources)
+            last_id = ids[-1]
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                '%d reindexed, %.0f/s'
+                % (reindexed, reindexed / elapsed if elapsed else 0)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS('Reindexed %d resources.' % reindexed)
+        )
@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_fhir.compression import (
+    compress,
+    dictionaries,
+    encode_content,
+    train_dictionary,
+)
+from rest_fhir.models import CompressionDictionary, Resource
+from rest_fhir.settings import fhir_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Train the dictionary of the compression of large resource contents '
+        'on the current version of stored resources. Contents written after '
+        'a restart are compressed with it, the ones already compressed keep '
+        'the dictionary they were compressed with.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='resource_types',
+            help='Resource type to sample, can be repeated. Defaults to all.',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=500,
+            help='Number of resources sampled per resource type.',
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=None,
+            help='Size of the dictionary in bytes. Defaults to the codec one.',
+        )
+        parser.add_argument(
+            '--codec',
+            default=None,
+            help='Compression codec. Defaults to COMPRESSION_CODEC.',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to sample. Defaults to "default".',
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        codec = options['codec'] or fhir_settings.COMPRESSION_CODEC
+
+        queryset = (
+            Resource.objects.using(using)
+            .select_related('version')
+            .filter(deleted_at__isnull=True)
+        )
+        resource_types = options['resource_types'] or sorted(
+            queryset.order_by()
+            .values_list('resource_type', flat=True)
+            .distinct()
+        )
+
+        samples = []
+        for resource_type in resource_types:
+            samples += [
+                encode_content(resource.resource_content)
+                for resource in queryset.filter(
+                    resource_type=resource_type
+                ).order_by('-updated_at')[: options['samples']]
+            ]
+        if not samples:
+            self.stdout.write(self.style.WARNING('No resources to sample.'))
+            return
+
+        data = train_dictionary(samples, codec=codec, size=options['size'])
+        dictionary = CompressionDictionary.objects.using(using).create(
+            codec=codec, data=data
+        )
+        dictionaries.reset()
+
+        plain = sum(len(sample) for sample in samples)
+        without = sum(
+            len(compress(sample, codec, (0, None))) for sample in samples
+        )
+        trained = sum(
+            len(compress(sample, codec, (dictionary.pk, data)))
+            for sample in samples
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Trained dictionary %d (%s, %d bytes) on %d resources: '
+                '%.1f%% of their size compressed with it, %.1f%% without.'
+                % (
+                    dictionary.pk,
+                    codec,
+                    len(data),
+                    len(samples),
+                    100 * trained / plain,
+                    100 * without / plain,
+                )
+            )
+        )
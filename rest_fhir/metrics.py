@@ -0,0 +1,155 @@
+"""
+Prometheus metrics of the FHIR interactions, recorded by
+InstrumentationMiddleware when the `prometheus_client` package is
+installed, and exposed by the `metrics` view:
+
+    from rest_fhir.metrics import metrics
+
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+        path('metrics', metrics),
+    ]
+
+The view isn't authenticated, route it where only the Prometheus server
+reaches it. Multiprocess servers (e.g. gunicorn) need the multiprocess
+mode of prometheus_client: the view aggregates the metrics of every
+process when the PROMETHEUS_MULTIPROC_DIR environment variable is set.
+"""
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+from .settings import fhir_settings
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+# Latencies from a cached read to a large transaction Bundle
+DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100)
+
+# Label of the resource types beyond METRICS_MAX_RESOURCE_TYPES, and of
+# the interactions that aren't on a resource type
+OTHER_RESOURCE_TYPE = 'other'
+NO_RESOURCE_TYPE = ''
+
+
+class InteractionMetrics:
+    """
+    Histograms of the duration of the interactions, of their phases (see
+    rest_fhir.instrumentation) and of their number of queries, labelled by
+    interaction and resource type.
+
+    Resource types come from request urls: the number of distinct labels
+    is capped by METRICS_MAX_RESOURCE_TYPES, the types seen after that are
+    labelled `other`.
+    """
+
+    def __init__(self, registry=None):
+        if prometheus_client is None:
+            raise ImproperlyConfigured(
+                'Prometheus metrics require the prometheus_client package.'
+            )
+
+        registry = registry or prometheus_client.REGISTRY
+        labels = ['interaction', 'resource_type']
+        self.duration = prometheus_client.Histogram(
+            'fhir_interaction_duration_seconds',
+            'Duration of the FHIR interactions.',
+            labels,
+            buckets=DURATION_BUCKETS,
+            registry=registry,
+        )
+        self.phase_duration = prometheus_client.Histogram(
+            'fhir_interaction_phase_duration_seconds',
+            'Time spent in the database, serializing resources, '
+            'evaluating preconditions and rendering, by interaction.',
+            [*labels, 'phase'],
+            buckets=DURATION_BUCKETS,
+            registry=registry,
+        )
+        self.queries = prometheus_client.Histogram(
+            'fhir_interaction_queries',
+            'Number of database queries of the FHIR interactions.',
+            labels,
+            buckets=QUERY_BUCKETS,
+            registry=registry,
+        )
+        self._lock = threading.Lock()
+        self._resource_types = set()
+
+    def get_resource_type_label(self, resource_type) -> str:
+        if resource_type is None:
+            return NO_RESOURCE_TYPE
+        if resource_type in self._resource_types:
+            return resource_type
+        with self._lock:
+            if len(self._resource_types) >= (
+                fhir_settings.METRICS_MAX_RESOURCE_TYPES
+            ):
+                return OTHER_RESOURCE_TYPE
+            self._resource_types.add(resource_type)
+        return resource_type
+
+    def observe(self, interaction, resource_type, duration, timings):
+        labels = (interaction, self.get_resource_type_label(resource_type))
+        self.duration.labels(*labels).observe(duration)
+        self.queries.labels(*labels).observe(timings.queries)
+        for phase, seconds in timings.phases.items():
+            self.phase_duration.labels(*labels, phase).observe(seconds)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> InteractionMetrics:
+    """
+    Metrics of the default registry, created on first use.
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = InteractionMetrics()
+    return _metrics
+
+
+def metrics(request):
+    """
+    Metrics of the default registry, in the Prometheus text format.
+    """
+    if prometheus_client is None:
+        raise ImproperlyConfigured(
+            'The metrics view requires the prometheus_client package.'
+        )
+
+    registry = prometheus_client.REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return HttpResponse(
+        prometheus_client.generate_latest(registry),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+from django.db.backends.signals import connection_created
+
+from . import metrics
+from .generics import FhirGenericAPIView
+from .instrumentation import (
+    PHASES,
+    RequestTimings,
+    current_timings,
+    install_query_recorder,
+)
+from .settings import fhir_settings
+
+# FHIR interaction codes https://www.hl7.org/fhir/http.html, by url name
+# and method. Other requests are named by their url name (operations).
+INTERACTIONS = {
+    'read-update-delete': {
+        'GET': 'read',
+        'HEAD': 'read',
+        'PUT': 'update',
+        'PATCH': 'patch',
+        'DELETE': 'delete',
+    },
+    'vread': {'GET': 'vread', 'HEAD': 'vread'},
+    'instance-history': {'GET': 'history-instance'},
+    'type-history': {'GET': 'history-type'},
+    'system-history': {'GET': 'history-system'},
+    'search-create': {
+        'GET': 'search-type',
+        'POST': 'create',
+        'PUT': 'update',
+        'DELETE': 'delete',
+    },
+    'batch-transaction': {'POST': 'batch'},
+}
+
+
+class InstrumentationMiddleware:
+    """
+    Break FHIR interactions down into database time and queries, resource
+    serialization, precondition evaluation and rendering. Timings go out
+    in a `Server-Timing` header (unless the SERVER_TIMING setting is
+    False), and to the Prometheus histograms of rest_fhir.metrics when
+    prometheus_client is installed.
+
+    Opt-in, with `rest_fhir.middleware.InstrumentationMiddleware` in the
+    MIDDLEWARE setting. Requests to other views are left alone.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the middleware as a coroutine function, like Django's
+            # MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+        connection_created.connect(install_query_recorder)
+        install_query_recorder()
+        self.metrics = (
+            metrics.get_metrics()
+            if metrics.prometheus_client is not None
+            else None
+        )
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        install_query_recorder()
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.process_timings(
+            request, response, timings, time.perf_counter() - start
+        )
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.process_timings(
+            request, response, timings, time.perf_counter() - start
+        )
+
+    def process_timings(self, request, response, timings, duration):
+        match = request.resolver_match
+        view_class = getattr(match.func, 'cls', None) if match else None
+        if view_class is None or not issubclass(view_class, FhirGenericAPIView):
+            return response
+
+        if fhir_settings.SERVER_TIMING:
+            response['Server-Timing'] = self.get_server_timing(
+                timings, duration
+            )
+
+        if self.metrics is not None:
+            self.metrics.observe(
+                self.get_interaction(request),
+                match.kwargs.get('type'),
+                duration,
+                timings,
+            )
+        return response
+
+    def get_interaction(self, request) -> str:
+        url_name = request.resolver_match.url_name
+        return INTERACTIONS.get(url_name, {}).get(request.method, url_name)
+
+    def get_server_timing(self, timings, duration) -> str:
+        entries = []
+        for phase in PHASES:
+            if phase not in timings.phases:
+                continue
+            entry = '%s;dur=%.3f' % (phase, timings.phases[phase] * 1000)
+            if phase == 'db':
+                entry += ';desc="%d queries"' % timings.queries
+            entries.append(entry)
+        entries.append('total;dur=%.3f' % (duration * 1000))
+        return ', '.join(entries)
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# Elements of `meta` managed by the server, added on every read
+SERVER_META_ELEMENTS = ('versionId', 'lastUpdated')
+
+
+def normalize_content(resource_id, resource_content):
+    """
+    Frozen copy of rest_fhir.models.normalize_resource_content: the
+    Logical Id first, and only the client supplied elements of `meta`.
+    """
+    content = {'id': str(resource_id)}
+    meta = resource_content.get('meta')
+    if isinstance(meta, dict):
+        meta = {
+            key: value
+            for key, value in meta.items()
+            if key not in SERVER_META_ELEMENTS
+        }
+        if meta:
+            content['meta'] = meta
+    content.update(
+        (key, value)
+        for key, value in resource_content.items()
+        if key not in ('id', 'meta')
+    )
+    return content
+
+
+def normalize_resource_content(apps, schema_editor):
+    """
+    Drop the server managed elements of `meta` from stored content, they
+    are rebuilt on every read, and move the Logical Id to the first
+    element. The elements supplied by clients (`profile`, `security`,
+    `tag`, ...) are kept, so that nothing is lost: reversing it is a no-op.
+    """
+    ResourceVersion = apps.get_model('rest_fhir', 'ResourceVersion')
+    versions = ResourceVersion.objects.using(
+        schema_editor.connection.alias
+    ).filter(resource_content__has_key='meta')
+
+    for version in versions.iterator():
+        version.resource_content = normalize_content(
+            version.resource_id, version.resource_content
+        )
+        version.save(update_fields=['resource_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0001_create_resource_models'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            normalize_resource_content, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0002_normalize_resource_content'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='published_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Date that the first version of the resource was created'),
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Date that the most recent version of the resource was created'),
+        ),
+        migrations.AlterField(
+            model_name='resourceversion',
+            name='published_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Date that version was created version of the resource was created'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:52
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0003_resource_timestamps_defaults'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('level', models.CharField(choices=[('system', 'System'), ('type', 'Type'), ('patient', 'Patient')], help_text='Level of the $export operation', max_length=10)),
+                ('resource_types', models.JSONField(blank=True, help_text='Resource types to export, all of them when empty', null=True)),
+                ('since', models.DateTimeField(help_text='Only resources updated since this date are exported', null=True)),
+                ('request', models.TextField(help_text='Full url of the original kick-off request')),
+                ('status', models.CharField(choices=[('accepted', 'Accepted'), ('in-progress', 'In progress'), ('completed', 'Completed'), ('failed', 'Failed')], default='accepted', max_length=12)),
+                ('output', models.JSONField(blank=True, default=list, help_text='Exported files, with their resource type and count')),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Transaction time of the export')),
+                ('completed_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'export job',
+                'verbose_name_plural': 'export jobs',
+                'db_table': 'fhir_export_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0004_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UriIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('uri', models.CharField(max_length=255)),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_uri',
+            },
+        ),
+        migrations.CreateModel(
+            name='TokenIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('system', models.CharField(max_length=255, null=True)),
+                ('code', models.CharField(max_length=255)),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_token',
+            },
+        ),
+        migrations.CreateModel(
+            name='StringIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('value', models.CharField(help_text='Value without case and accents, for prefix matches', max_length=255)),
+                ('exact', models.CharField(max_length=255)),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_string',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferenceIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('target_type', models.CharField(max_length=45)),
+                ('target_id', models.CharField(max_length=64)),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_reference',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuantityIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('value', models.FloatField()),
+                ('system', models.CharField(max_length=255, null=True)),
+                ('code', models.CharField(max_length=255, null=True)),
+                ('unit', models.CharField(max_length=255, null=True)),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_quantity',
+            },
+        ),
+        migrations.CreateModel(
+            name='DateIndex',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_type', models.CharField(max_length=45)),
+                ('name', models.CharField(help_text='Code of the search parameter', max_length=64)),
+                ('low', models.DateTimeField()),
+                ('high', models.DateTimeField()),
+                ('resource', models.ForeignKey(db_column='resource_id', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rest_fhir.resource')),
+            ],
+            options={
+                'db_table': 'fhir_idx_date',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uriindex',
+            index=models.Index(fields=['resource_type', 'name', 'uri'], name='fhir_idx_uri_value', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tokenindex',
+            index=models.Index(fields=['resource_type', 'name', 'code', 'system'], name='fhir_idx_token_code'),
+        ),
+        migrations.AddIndex(
+            model_name='stringindex',
+            index=models.Index(fields=['resource_type', 'name', 'value'], name='fhir_idx_string_value', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='stringindex',
+            index=models.Index(fields=['resource_type', 'name', 'exact'], name='fhir_idx_string_exact'),
+        ),
+        migrations.AddIndex(
+            model_name='referenceindex',
+            index=models.Index(fields=['resource_type', 'name', 'target_id', 'target_type'], name='fhir_idx_reference_target'),
+        ),
+        migrations.AddIndex(
+            model_name='quantityindex',
+            index=models.Index(fields=['resource_type', 'name', 'value'], name='fhir_idx_quantity_value'),
+        ),
+        migrations.AddIndex(
+            model_name='dateindex',
+            index=models.Index(fields=['resource_type', 'name', 'low', 'high'], name='fhir_idx_date_low'),
+        ),
+        migrations.AddIndex(
+            model_name='dateindex',
+            index=models.Index(fields=['resource_type', 'name', 'high'], name='fhir_idx_date_high'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourceversion',
+            name='resource_type',
+            field=models.CharField(
+                default='',
+                help_text='Type of the resource, repeated here for type level history',
+                max_length=45,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE fhir_resource_ver SET resource_type = ('
+                'SELECT resource_type FROM fhir_resource '
+                'WHERE fhir_resource.id = fhir_resource_ver.resource_id)'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='resourceversion',
+            index=models.Index(
+                fields=['published_at', 'id'],
+                name='fhir_resource_ver_history',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='resourceversion',
+            index=models.Index(
+                fields=['resource_type', 'published_at', 'id'],
+                name='fhir_resource_ver_type_history',
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0006_resource_version_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CriteriaLock',
+            fields=[
+                ('key', models.CharField(help_text='SHA-256 of the resource type and search criteria', max_length=64, primary_key=True, serialize=False)),
+                ('locked_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'criteria lock',
+                'verbose_name_plural': 'criteria locks',
+                'db_table': 'fhir_criteria_lock',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0007_criteria_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourceversion',
+            name='resource_delta',
+            field=models.JSONField(blank=True, help_text='JSON Patch from the content of the next version to the content of this one, stored instead of the content in delta encoded history', null=True),
+        ),
+    ]
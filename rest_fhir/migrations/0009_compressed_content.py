@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.utils.timezone
+import rest_fhir.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0008_delta_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'compression dictionary',
+                'verbose_name_plural': 'compression dictionaries',
+                'db_table': 'fhir_compression_dict',
+            },
+        ),
+        migrations.AddField(
+            model_name='resourceversion',
+            name='resource_content_compressed',
+            field=models.BinaryField(help_text='The text of the resource compressed, stored instead of the content for large resources', null=True),
+        ),
+        migrations.AlterField(
+            model_name='resourceversion',
+            name='resource_content',
+            field=rest_fhir.fields.CompressedJSONField(blank=True, compressed_field='resource_content_compressed', help_text='The actual full text of the resource being stored', null=True),
+        ),
+    ]
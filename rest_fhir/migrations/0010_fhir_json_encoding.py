@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:50
+
+from django.db import migrations, models
+import rest_fhir.encoders
+import rest_fhir.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0009_compressed_content'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resourceversion',
+            name='resource_content',
+            field=rest_fhir.fields.CompressedJSONField(blank=True, compressed_field='resource_content_compressed', decoder=rest_fhir.encoders.FHIRJSONDecoder, encoder=rest_fhir.encoders.FHIRJSONEncoder, help_text='The actual full text of the resource being stored', null=True),
+        ),
+        migrations.AlterField(
+            model_name='resourceversion',
+            name='resource_delta',
+            field=models.JSONField(blank=True, decoder=rest_fhir.encoders.FHIRJSONDecoder, encoder=rest_fhir.encoders.FHIRJSONEncoder, help_text='JSON Patch from the content of the next version to the content of this one, stored instead of the content in delta encoded history', null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:32
+
+from django.db import migrations, models
+import rest_fhir.encoders
+import rest_fhir.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0010_fhir_json_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='current_content',
+            field=rest_fhir.fields.CompressedJSONField(blank=True, compressed_field='current_content_compressed', decoder=rest_fhir.encoders.FHIRJSONDecoder, encoder=rest_fhir.encoders.FHIRJSONEncoder, help_text='Copy of the content of the current version, see the DENORMALIZED_CONTENT setting. NULL when there is no copy', null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='current_content_compressed',
+            field=models.BinaryField(help_text='Copy of the content of the current version compressed', null=True),
+        ),
+    ]
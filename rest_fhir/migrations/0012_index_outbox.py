@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_fhir', '0011_resource_current_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexingTask',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource_id', models.UUIDField(help_text='Logical Id of the resource')),
+                ('resource_type', models.CharField(max_length=45)),
+                ('version_id', models.PositiveIntegerField(db_column='vid', help_text='Version written')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'indexing task',
+                'verbose_name_plural': 'indexing tasks',
+                'db_table': 'fhir_index_outbox',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='indexingtask',
+            index=models.Index(fields=['resource_id', 'version_id'], name='fhir_index_outbox_resource'),
+        ),
+    ]
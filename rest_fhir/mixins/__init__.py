@@ -1,11 +1,29 @@
-from .create import CreateResourceMixin
-from .delete import DeleteResourceMixin
-from .read import ReadResourceMixin
-from .vread import VReadResourceMixin
+from .batch import BatchTransactionMixin
+from .bulk_import import ImportResourcesMixin
+from .create import AsyncCreateResourceMixin, CreateResourceMixin
+from .delete import AsyncDeleteResourceMixin, DeleteResourceMixin
+from .export import BulkExportMixin
+from .history import HistoryResourceMixin
+from .patch import PatchResourceMixin
+from .read import AsyncReadResourceMixin, ReadResourceMixin
+from .search import SearchResourceMixin
+from .update import UpdateResourceMixin
+from .vread import AsyncVReadResourceMixin, VReadResourceMixin
 
 __all__ = [
     'ReadResourceMixin',
+    'UpdateResourceMixin',
+    'PatchResourceMixin',
     'DeleteResourceMixin',
     'VReadResourceMixin',
     'CreateResourceMixin',
+    'BatchTransactionMixin',
+    'ImportResourcesMixin',
+    'BulkExportMixin',
+    'SearchResourceMixin',
+    'HistoryResourceMixin',
+    'AsyncReadResourceMixin',
+    'AsyncVReadResourceMixin',
+    'AsyncCreateResourceMixin',
+    'AsyncDeleteResourceMixin',
 ]
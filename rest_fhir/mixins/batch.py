@@ -0,0 +1,533 @@
+import uuid
+
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    MethodNotAllowed,
+    NotFound,
+    ParseError,
+)
+from rest_framework.response import Response
+
+from django.db import IntegrityError, transaction
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
+from ..bundles import (
+    TRANSACTION_ORDER,
+    error_entry,
+    parse_entry_request,
+    resolve_references,
+    response_entry,
+    search_entry,
+    searchset_bundle,
+)
+from ..conditional import lock_criteria, parse_criteria, resolve_criteria
+from ..exceptions import Conflict, Gone, PreconditionFailed
+from ..filters import search_queryset
+from ..includes import parse_includes, resolve_includes
+from ..models import (
+    Resource,
+    ResourceVersion,
+    VersionConflict,
+    materialize_versions,
+)
+from ..pagination import get_page_size
+from ..sharding import atomic_shards, sharded
+from .update import (
+    get_conditional_update_target,
+    get_expected_version_id,
+    validate_update_content,
+    version_conflict_error,
+)
+
+
+class BatchTransactionMixin:
+    """
+    Process `batch` and `transaction` Bundles posted to the base url.
+    https://www.hl7.org/fhir/http.html#transaction
+
+    Entries are grouped by interaction: creates run as a single bulk insert
+    and reads as a single `id IN (...)` query, instead of one round trip of
+    the regular interaction per entry.
+    """
+
+    bundle_types = ('batch', 'transaction')
+
+    def batch_transaction(self, request, *args, **kwargs):
+        bundle = request.data
+        if (
+            not isinstance(bundle, dict)
+            or bundle.get('resourceType') != 'Bundle'
+        ):
+            raise ParseError(_('Expected a Bundle resource.'))
+
+        bundle_type = bundle.get('type')
+        if bundle_type not in self.bundle_types:
+            raise ParseError(
+                _('Bundle type must be one of: %s.')
+                % ', '.join(self.bundle_types)
+            )
+
+        entries = bundle.get('entry') or []
+        if not isinstance(entries, list):
+            raise ParseError(_('Bundle entry must be a list.'))
+
+        if bundle_type == 'transaction':
+            # Over every shard, the entries write to any of them
+            with atomic_shards():
+                response_entries = self.process_entries(entries, atomic=True)
+        else:
+            response_entries = self.process_entries(entries, atomic=False)
+
+        return Response(
+            data={
+                'resourceType': 'Bundle',
+                'id': str(uuid.uuid4()),
+                'type': '%s-response' % bundle_type,
+                'entry': response_entries,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def process_entries(self, entries, atomic=False):
+        results = [None] * len(entries)
+        groups = {method: [] for method in TRANSACTION_ORDER}
+
+        for index, entry in enumerate(entries):
+            entry_request = parse_entry_request(entry)
+            if entry_request is None or entry_request.id is False:
+                self.set_entry_error(
+                    results,
+                    index,
+                    ParseError(_('Invalid entry request.')),
+                    atomic,
+                )
+            else:
+                groups[entry_request.method].append(
+                    [index, entry, entry_request]
+                )
+
+        for method in TRANSACTION_ORDER:
+            if method == 'POST' and atomic:
+                # Conditional creates see the deletes of the transaction
+                self.resolve_entry_references(
+                    groups, self.resolve_conditional_creates(groups, results)
+                )
+
+            handler = getattr(self, 'process_%s_entries' % method.lower())
+            if groups[method]:
+                handler(groups[method], results, atomic)
+
+        return results
+
+    def set_entry_error(self, results, index, exc, atomic):
+        # Any failure rolls back a whole transaction, while batch entries
+        # fail on their own
+        if atomic:
+            raise exc
+        results[index] = error_entry(exc)
+
+    def get_entry_representation(self, instance):
+        return self.get_serializer(instance).data
+
+    def wants_representation(self):
+        prefer = self.request.META.get('HTTP_PREFER', '')
+        return 'return=minimal' not in prefer
+
+    def resolve_entry_criteria(self, resource_type, query):
+        """
+        Resource matching the search criteria of a conditional entry. The
+        criteria stay locked until the end of the current transaction.
+        """
+        params = parse_criteria(query)
+        lock_criteria(resource_type, params)
+        return resolve_criteria(resource_type, params)
+
+    def instance_entry(self, status_code, instance):
+        return response_entry(
+            status_code,
+            resource_type=instance.resource_type,
+            instance=instance,
+            resource=(
+                self.get_entry_representation(instance)
+                if self.wants_representation()
+                else None
+            ),
+        )
+
+    def resolve_conditional_creates(self, groups, results):
+        """
+        Answer the POST entries of a transaction whose `ifNoneExist`
+        matches a resource with that resource, instead of creating it.
+        Returns the references to their full urls, to be pointed to it.
+        """
+        references = dict()
+        remaining = []
+        for item in groups['POST']:
+            index, entry, entry_request = item
+            if_none_exist = entry['request'].get('ifNoneExist')
+            instance = None
+            if if_none_exist is not None:
+                instance = self.resolve_entry_criteria(
+                    entry_request.type, if_none_exist
+                )
+
+            if instance is None:
+                remaining.append(item)
+                continue
+
+            results[index] = self.instance_entry(status.HTTP_200_OK, instance)
+            full_url = entry.get('fullUrl')
+            if isinstance(full_url, str) and full_url.startswith('urn:'):
+                references[full_url] = '%s/%s' % (
+                    instance.resource_type,
+                    instance.id,
+                )
+
+        groups['POST'] = remaining
+        return references
+
+    def resolve_entry_references(self, groups, references=None):
+        """
+        Assign the Logical Ids of the resources created by the transaction,
+        and replace references to their `urn:uuid` full urls.
+        """
+        references = dict(references or {})
+        for item in groups['POST']:
+            index, entry, entry_request = item
+            resource_id = uuid.uuid4()
+            item[2] = entry_request._replace(id=resource_id)
+
+            full_url = entry.get('fullUrl')
+            if isinstance(full_url, str) and full_url.startswith('urn:'):
+                references[full_url] = '%s/%s' % (
+                    entry_request.type,
+                    resource_id,
+                )
+
+        if not references:
+            return
+
+        for method in TRANSACTION_ORDER:
+            for _index, entry, _entry_request in groups[method]:
+                if 'resource' in entry:
+                    entry['resource'] = resolve_references(
+                        entry['resource'], references
+                    )
+
+    def process_post_entries(self, items, results, atomic):
+        valid = []
+        for index, entry, entry_request in items:
+            resource = entry.get('resource')
+            if (
+                not isinstance(resource, dict)
+                or resource.get('resourceType') != entry_request.type
+                or entry_request.query is not None
+            ):
+                self.set_entry_error(
+                    results,
+                    index,
+                    ParseError(
+                        _('Entry resource must be a %s.') % entry_request.type
+                    ),
+                    atomic,
+                )
+            elif not atomic and 'ifNoneExist' in entry['request']:
+                self.process_conditional_post_entry(
+                    index, entry, entry_request, results
+                )
+            else:
+                valid.append((index, resource, entry_request))
+
+        if not valid:
+            return
+
+        resources = Resource.objects.bulk_create_resources(
+            [resource for _index, resource, _entry_request in valid],
+            ids=[
+                entry_request.id or uuid.uuid4()
+                for _index, _resource, entry_request in valid
+            ],
+        )
+
+        representation = self.wants_representation()
+        for (index, _resource, _entry_request), instance in zip(
+            valid, resources
+        ):
+            results[index] = response_entry(
+                status.HTTP_201_CREATED,
+                resource_type=instance.resource_type,
+                instance=instance,
+                resource=(
+                    self.get_entry_representation(instance)
+                    if representation
+                    else None
+                ),
+            )
+
+    def process_conditional_post_entry(
+        self, index, entry, entry_request, results
+    ):
+        """
+        Create the resource of a batch entry unless one matches its
+        `ifNoneExist`, in a transaction of its own.
+        """
+        try:
+            with transaction.atomic():
+                instance = self.resolve_entry_criteria(
+                    entry_request.type, entry['request']['ifNoneExist']
+                )
+                if instance is None:
+                    [instance] = Resource.objects.bulk_create_resources(
+                        [entry['resource']]
+                    )
+                    status_code = status.HTTP_201_CREATED
+                else:
+                    status_code = status.HTTP_200_OK
+        except APIException as exc:
+            results[index] = error_entry(exc)
+            return
+
+        results[index] = self.instance_entry(status_code, instance)
+
+    def process_delete_entries(self, items, results, atomic):
+        instances = self.get_entry_resources(items)
+
+        for index, _entry, entry_request in items:
+            if entry_request.id is None and entry_request.query:
+                self.process_conditional_delete_entry(
+                    index, entry_request, results, atomic
+                )
+                continue
+
+            instance = instances.get((entry_request.type, entry_request.id))
+            if entry_request.id is None or instance is None:
+                self.set_entry_error(results, index, NotFound(), atomic)
+                continue
+
+            instance.delete()
+            results[index] = response_entry(status.HTTP_204_NO_CONTENT)
+
+    def process_conditional_delete_entry(
+        self, index, entry_request, results, atomic
+    ):
+        try:
+            with transaction.atomic():
+                instance = self.resolve_entry_criteria(
+                    entry_request.type, entry_request.query
+                )
+                if instance is not None:
+                    instance.delete()
+        except APIException as exc:
+            self.set_entry_error(results, index, exc, atomic)
+            return
+
+        results[index] = response_entry(status.HTTP_204_NO_CONTENT)
+
+    def process_put_entries(self, items, results, atomic):
+        instances = self.get_entry_resources(items)
+        representation = self.wants_representation()
+
+        for index, entry, entry_request in items:
+            try:
+                instance, created = self.put_entry_resource(
+                    entry, entry_request, instances
+                )
+            except APIException as exc:
+                self.set_entry_error(results, index, exc, atomic)
+                continue
+
+            results[index] = response_entry(
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+                resource_type=instance.resource_type,
+                instance=instance,
+                resource=(
+                    self.get_entry_representation(instance)
+                    if representation
+                    else None
+                ),
+            )
+
+    def put_entry_resource(self, entry, entry_request, instances):
+        """
+        Update the resource of a PUT entry, honoring its `ifMatch`, or
+        create it with the id of the entry url. A conditional update
+        resolves the resource from the search criteria of the url.
+        """
+        resource = entry.get('resource')
+
+        if entry_request.id is not None and entry_request.query is None:
+            instance = instances.get((entry_request.type, entry_request.id))
+            return self.write_entry_resource(
+                entry, entry_request.type, entry_request.id, instance, resource
+            )
+
+        if entry_request.id is None and entry_request.query:
+            with transaction.atomic():
+                instance = self.resolve_entry_criteria(
+                    entry_request.type, entry_request.query
+                )
+                resource_id, resource = get_conditional_update_target(
+                    instance, resource
+                )
+                return self.write_entry_resource(
+                    entry, entry_request.type, resource_id, instance, resource
+                )
+
+        raise MethodNotAllowed('PUT')
+
+    def write_entry_resource(
+        self, entry, resource_type, resource_id, instance, resource
+    ):
+        expected_version_id = get_expected_version_id(
+            entry['request'].get('ifMatch')
+        )
+        validate_update_content(resource, resource_type, resource_id)
+
+        created = instance is None
+        if created:
+            if expected_version_id is not None:
+                raise PreconditionFailed()
+            instance = Resource(id=resource_id)
+
+        try:
+            instance.save(
+                resource_content=resource,
+                expected_version_id=expected_version_id,
+            )
+        except VersionConflict:
+            raise version_conflict_error(expected_version_id)
+        except IntegrityError:
+            raise Conflict()
+
+        return instance, created
+
+    def process_patch_entries(self, items, results, atomic):
+        for index, _entry, entry_request in items:
+            self.set_entry_error(
+                results, index, MethodNotAllowed('PATCH'), atomic
+            )
+
+    def process_get_entries(self, items, results, atomic):
+        instances = self.get_entry_resources(
+            [item for item in items if item[2].vid is None]
+        )
+
+        for index, _entry, entry_request in items:
+            if entry_request.id is None:
+                self.process_search_entry(index, entry_request, results, atomic)
+                continue
+
+            try:
+                instance = self.get_entry_instance(entry_request, instances)
+            except APIException as exc:
+                self.set_entry_error(results, index, exc, atomic)
+                continue
+
+            results[index] = response_entry(
+                status.HTTP_200_OK,
+                resource_type=entry_request.type,
+                instance=instance,
+                resource=(
+                    self.get_entry_representation(instance)
+                    if entry_request.method == 'GET'
+                    else None
+                ),
+            )
+
+    process_head_entries = process_get_entries
+
+    def process_search_entry(self, index, entry_request, results, atomic):
+        """
+        Answer a type level GET entry with the first page of the search
+        as a searchset Bundle.
+        """
+        params = QueryDict(entry_request.query or '')
+        queryset = sharded(
+            Resource.objects.with_current_content().filter(
+                resource_type=entry_request.type, deleted_at__isnull=True
+            )
+        )
+
+        try:
+            queryset = search_queryset(queryset, entry_request.type, params)
+            includes = parse_includes(params, '_include')
+            revincludes = parse_includes(params, '_revinclude')
+        except APIException as exc:
+            self.set_entry_error(results, index, exc, atomic)
+            return
+
+        page = list(queryset.order_by('id')[: get_page_size(params)])
+        entries = [
+            search_entry(
+                self.request.build_absolute_uri(
+                    reverse(
+                        'read-update-delete',
+                        kwargs={
+                            'type': instance.resource_type,
+                            'id': instance.id,
+                        },
+                    )
+                ),
+                self.get_entry_representation(instance),
+                mode,
+            )
+            for instances, mode in (
+                (page, 'match'),
+                (resolve_includes(page, includes, revincludes), 'include'),
+            )
+            for instance in instances
+        ]
+
+        results[index] = response_entry(
+            status.HTTP_200_OK,
+            resource=(
+                searchset_bundle(entries)
+                if entry_request.method == 'GET'
+                else None
+            ),
+        )
+
+    def get_entry_instance(self, entry_request, instances):
+        if entry_request.vid is None:
+            instance = instances.get((entry_request.type, entry_request.id))
+        else:
+            instance = sharded(
+                ResourceVersion.objects.filter(
+                    resource__resource_type=entry_request.type,
+                    resource_id=entry_request.id,
+                    version_id=entry_request.vid,
+                ).select_related('resource'),
+                entry_request.id,
+            ).first()
+
+        if instance is None:
+            raise NotFound()
+
+        if instance.deleted_at is not None:
+            raise Gone()
+
+        if entry_request.vid is not None:
+            materialize_versions([instance])
+        return instance
+
+    def get_entry_resources(self, items):
+        """
+        Fetch the resources targeted by the entries with a single query.
+        """
+        ids = {
+            entry_request.id
+            for _index, _entry, entry_request in items
+            if entry_request.id is not None
+        }
+        if not ids:
+            return {}
+
+        return {
+            (instance.resource_type, instance.id): instance
+            for instance in sharded(
+                Resource.objects.with_current_content().filter(id__in=ids)
+            )
+        }
@@ -0,0 +1,59 @@
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from django.utils.translation import gettext_lazy as _
+
+from ..bundles import operation_outcome
+from ..importer import NDJSONImporter
+
+
+class ImportResourcesMixin:
+    """
+    `$import` operation: stream the NDJSON request body into the database,
+    see NDJSONImporter.
+    """
+
+    import_batch_size = 1000
+    max_reported_errors = 100
+
+    def import_resources(self, request, *args, **kwargs):
+        stream = request.data
+        if stream is None or isinstance(stream, dict):
+            raise ParseError(_('Expected an NDJSON request body.'))
+
+        try:
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            raise ParseError(_('Offset must be an integer.'))
+
+        importer = NDJSONImporter(batch_size=self.import_batch_size)
+        created = updated = errors = 0
+        end = offset
+        issues = []
+
+        for chunk in importer.run(stream, offset=offset):
+            created += chunk.created
+            updated += chunk.updated
+            errors += len(chunk.errors)
+            end = chunk.end
+
+            for issue in chunk.errors[: self.max_reported_errors - len(issues)]:
+                issues.append(
+                    {
+                        'severity': 'error',
+                        'code': 'processing',
+                        'diagnostics': 'Offset %d: %s'
+                        % (issue.offset, issue.message),
+                    }
+                )
+
+        outcome = operation_outcome(
+            'Imported %d resources (%d updated, %d errors), read up to '
+            'offset %d.' % (created + updated, updated, errors, end),
+            code='informational',
+            severity='information',
+        )
+        outcome['issue'].extend(issues)
+
+        return Response(data=outcome, status=status.HTTP_200_OK)
@@ -1,57 +1,96 @@
 import calendar
-from typing import Union
+import re
+from typing import Optional, Union
 
-import dateutil.parser
 from rest_framework import status
 from rest_framework.response import Response
 
 from django.utils.cache import get_conditional_response
 from django.utils.http import http_date
 
+from ..compat import sync_to_async
+from ..instrumentation import timed
 from ..models import Resource, ResourceVersion
 
 FhirResource = Union[Resource, ResourceVersion]
 
+PRECONDITION_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+# Version ETag, as built by etag_func
+VERSION_ETAG_RE = re.compile(r'^\s*(?:W/)?"([0-9]+)"\s*$')
+
+
+def parse_version_etag(etag) -> Optional[int]:
+    """
+    Version id of an ETag such as `W/"3"`, None if it isn't one.
+    """
+    match = VERSION_ETAG_RE.match(etag or '')
+    if match is None:
+        return None
+    return int(match.group(1))
+
 
 class ConditionalReadMixin:
     def conditional_read(self, request, *args, **kwargs):
-        instance = self.get_object()
+        if self.has_preconditions(request):
+            # Test If-Modified-Since and If-None-Match preconditions against
+            # the version metadata only, the resource content is loaded on
+            # demand by the serializer when the answer is a 200
+            # https://www.hl7.org/fhir/http.html#cread
+            instance = self.get_metadata_object()
+            response = self.evaluate_preconditions(request, instance)
+            if response is not None:
+                return response
+        else:
+            instance = self.get_object()
+
+        return self.get_read_response(
+            instance, self.get_representation(instance)
+        )
+
+    def get_representation(self, instance: FhirResource):
+        # Pass the stored JSON through when possible, instead of decoding
+        # and encoding it again
         serializer = self.get_serializer(instance)
-        res_data = serializer.data
+        data = serializer.to_raw_representation(instance)
+        if data is None:
+            data = serializer.data
+        return data
 
-        # Test If-Modified-Since and If-None-Match preconditions
-        # https://www.hl7.org/fhir/http.html#cread
-        etag, last_modified = self.get_conditional_args(res_data)
-        response = get_conditional_response(request, etag, last_modified)
-        if response is not None:
-            return response
+    @timed('precondition')
+    def evaluate_preconditions(self, request, instance: FhirResource):
+        etag, last_modified = self.get_conditional_args(instance)
+        return get_conditional_response(request, etag, last_modified)
 
+    def get_read_response(self, instance: FhirResource, data) -> Response:
         # Set revelant header on the response if request method is safe
-        headers = self.get_conditional_headers(res_data)
+        headers = self.get_conditional_headers(instance)
 
         return Response(
-            data=res_data,
+            data=data,
             status=status.HTTP_200_OK,
             headers=headers,
         )
 
-    def etag_func(self, data) -> str:
-        return 'W/"%s"' % data['meta']['versionId']
+    def has_preconditions(self, request) -> bool:
+        return any(header in request.META for header in PRECONDITION_HEADERS)
+
+    def etag_func(self, instance: FhirResource) -> str:
+        return 'W/"%s"' % instance.version_id
 
-    def last_modified_func(self, data) -> str:
-        dt = dateutil.parser.parse(data['meta']['lastUpdated'])
-        return calendar.timegm(dt.utctimetuple())
+    def last_modified_func(self, instance: FhirResource) -> int:
+        return calendar.timegm(instance.last_updated.utctimetuple())
 
-    def get_conditional_args(self, data: dict):
-        etag = self.etag_func(data)
-        last_modified = self.last_modified_func(data)
+    def get_conditional_args(self, instance: FhirResource):
+        etag = self.etag_func(instance)
+        last_modified = self.last_modified_func(instance)
         return (
             etag,
             last_modified,
         )
 
-    def get_conditional_headers(self, data):
-        etag, last_modified = self.get_conditional_args(data)
+    def get_conditional_headers(self, instance: FhirResource):
+        etag, last_modified = self.get_conditional_args(instance)
 
         headers = dict()
         if etag:
@@ -61,3 +100,26 @@ class ConditionalReadMixin:
             headers['Last-Modified'] = http_date(last_modified)
 
         return headers
+
+
+class AsyncConditionalReadMixin(ConditionalReadMixin):
+    """
+    ConditionalReadMixin for AsyncFhirGenericAPIView.
+    """
+
+    async def aconditional_read(self, request, *args, **kwargs):
+        if self.has_preconditions(request):
+            instance = await self.aget_metadata_object()
+            response = self.evaluate_preconditions(request, instance)
+            if response is not None:
+                return response
+        else:
+            instance = await self.aget_object()
+
+        return self.get_read_response(
+            instance, await self.aget_representation(instance)
+        )
+
+    async def aget_representation(self, instance: FhirResource):
+        # Deferred or delta encoded contents are loaded from the database
+        return await sync_to_async(self.get_representation)(instance)
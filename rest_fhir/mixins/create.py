@@ -1,23 +1,91 @@
+from rest_framework import status
 from rest_framework.mixins import CreateModelMixin
+from rest_framework.response import Response
 
+from django.db import transaction
 from django.urls import reverse
 
-from .conditional_read import ConditionalReadMixin
+from ..compat import sync_to_async
+from ..conditional import lock_criteria, parse_criteria, resolve_criteria
+from .conditional_read import AsyncConditionalReadMixin, ConditionalReadMixin
 
 
 class CreateResourceMixin(CreateModelMixin, ConditionalReadMixin):
-    def get_success_headers(self, data):
-        try:
-            ret = dict()
-            ret['Location'] = reverse(
-                'vread',
-                kwargs={
-                    'type': data['resourceType'],
-                    'id': data['id'],
-                    'vid': data['meta']['versionId'],
-                },
+    def create(self, request, *args, **kwargs):
+        if_none_exist = request.META.get('HTTP_IF_NONE_EXIST')
+        if if_none_exist is not None:
+            return self.conditional_create(request, if_none_exist)
+        return self.create_resource(request)
+
+    def create_resource(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.instance)
+        return Response(
+            self.get_representation(serializer.instance),
+            status=status.HTTP_201_CREATED,
+            headers=headers,
+        )
+
+    def conditional_create(self, request, if_none_exist):
+        """
+        Create the resource unless one matches the criteria of the
+        If-None-Exist header, in which case that one is returned.
+        https://www.hl7.org/fhir/http.html#ccreate
+        """
+        resource_type = self.kwargs['type']
+        params = parse_criteria(if_none_exist)
+
+        with transaction.atomic():
+            lock_criteria(resource_type, params)
+            instance = resolve_criteria(resource_type, params)
+            if instance is None:
+                return self.create_resource(request)
+
+        return Response(
+            self.get_representation(instance),
+            status=status.HTTP_200_OK,
+            headers=self.get_success_headers(instance),
+        )
+
+    def get_success_headers(self, instance):
+        ret = dict()
+        ret['Location'] = reverse(
+            'vread',
+            kwargs={
+                'type': instance.resource_type,
+                'id': instance.id,
+                'vid': instance.version_id,
+            },
+        )
+        ret.update(self.get_conditional_headers(instance))
+        return ret
+
+
+class AsyncCreateResourceMixin(AsyncConditionalReadMixin, CreateResourceMixin):
+    async def acreate(self, request, *args, **kwargs):
+        if_none_exist = request.META.get('HTTP_IF_NONE_EXIST')
+        if if_none_exist is not None:
+            # The criteria lock is held by a transaction, which can't span
+            # several async queries
+            return await sync_to_async(self.conditional_create)(
+                request, if_none_exist
             )
-            ret.update(self.get_conditional_headers(data))
-            return ret
-        except (TypeError, KeyError):
-            return {}
+        return await self.acreate_resource(request)
+
+    async def acreate_resource(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await self.aperform_create(serializer)
+        headers = self.get_success_headers(serializer.instance)
+        return Response(
+            await self.aget_representation(serializer.instance),
+            status=status.HTTP_201_CREATED,
+            headers=headers,
+        )
+
+    async def aperform_create(self, serializer):
+        serializer.instance = await serializer.acreate(
+            serializer.validated_data
+        )
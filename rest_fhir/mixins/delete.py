@@ -1,5 +1,44 @@
+from rest_framework import status
 from rest_framework.mixins import DestroyModelMixin
+from rest_framework.response import Response
+
+from django.db import transaction
+
+from ..compat import sync_to_async
+from ..conditional import lock_criteria, parse_criteria, resolve_criteria
 
 
 class DeleteResourceMixin(DestroyModelMixin):
-    pass
+    def conditional_destroy(self, request, *args, **kwargs):
+        """
+        Delete the resource matching the search criteria of the query
+        string, if any. Criteria matching several resources answer 412.
+        https://www.hl7.org/fhir/http.html#delete
+        """
+        resource_type = self.kwargs['type']
+        params = parse_criteria(request.query_params)
+
+        with transaction.atomic():
+            lock_criteria(resource_type, params)
+            instance = resolve_criteria(resource_type, params)
+            if instance is not None:
+                self.check_object_permissions(request, instance)
+                self.perform_destroy(instance)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncDeleteResourceMixin(DeleteResourceMixin):
+    async def adestroy(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        await self.aperform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    async def aperform_destroy(self, instance):
+        await instance.adelete()
+
+    async def aconditional_destroy(self, request, *args, **kwargs):
+        # Like conditional create, in a single transaction
+        return await sync_to_async(self.conditional_destroy)(
+            request, *args, **kwargs
+        )
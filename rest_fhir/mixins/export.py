@@ -0,0 +1,141 @@
+import os
+
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from ..bundles import operation_outcome
+from ..exporter import cancel_export, get_export_dir, start_export
+from ..models import ExportJob
+
+NDJSON_FORMATS = (
+    'application/fhir+ndjson',
+    'application/ndjson',
+    'ndjson',
+)
+
+
+class BulkExportMixin:
+    """
+    FHIR Bulk Data `$export` operation: kick-off, status polling and file
+    download. https://hl7.org/fhir/uv/bulkdata/export.html
+    """
+
+    def kick_off_export(self, request, *args, **kwargs):
+        params = request.query_params
+
+        output_format = params.get('_outputFormat')
+        if output_format is not None and output_format not in NDJSON_FORMATS:
+            raise ParseError(_('Only NDJSON output is supported.'))
+
+        since = params.get('_since')
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                raise ParseError(_('_since must be a FHIR instant.'))
+
+        resource_types = [
+            resource_type
+            for resource_type in params.get('_type', '').split(',')
+            if resource_type
+        ]
+
+        level = self.get_export_level()
+        if level == ExportJob.TYPE:
+            resource_types = [self.kwargs['type']]
+
+        job = ExportJob.objects.create(
+            level=level,
+            resource_types=resource_types or None,
+            since=since,
+            request=request.build_absolute_uri(),
+        )
+        start_export(job)
+
+        return Response(
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                'Content-Location': request.build_absolute_uri(
+                    reverse('export-status', kwargs={'job_id': job.pk})
+                )
+            },
+        )
+
+    def get_export_level(self):
+        resource_type = self.kwargs.get('type')
+        if resource_type is None:
+            return ExportJob.SYSTEM
+        if resource_type == 'Patient':
+            return ExportJob.PATIENT
+        return ExportJob.TYPE
+
+    def get_export_job(self) -> ExportJob:
+        return get_object_or_404(ExportJob, pk=self.kwargs['job_id'])
+
+    def export_status(self, request, *args, **kwargs):
+        job = self.get_export_job()
+
+        if job.status in (ExportJob.ACCEPTED, ExportJob.IN_PROGRESS):
+            return Response(
+                status=status.HTTP_202_ACCEPTED,
+                headers={'X-Progress': job.status, 'Retry-After': '2'},
+            )
+
+        if job.status == ExportJob.FAILED:
+            return Response(
+                data=operation_outcome(job.error, code='exception'),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return Response(
+            data={
+                'transactionTime': job.created_at.isoformat(),
+                'request': job.request,
+                'requiresAccessToken': False,
+                'output': [
+                    {
+                        'type': output['type'],
+                        'url': request.build_absolute_uri(
+                            reverse(
+                                'export-file',
+                                kwargs={
+                                    'job_id': job.pk,
+                                    'name': output['name'],
+                                },
+                            )
+                        ),
+                        'count': output['count'],
+                    }
+                    for output in job.output
+                ],
+                'error': [],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def cancel_export(self, request, *args, **kwargs):
+        cancel_export(self.get_export_job())
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    def export_file(self, request, *args, **kwargs):
+        job = self.get_export_job()
+        name = self.kwargs['name']
+
+        if job.status != ExportJob.COMPLETED or name not in {
+            output['name'] for output in job.output
+        }:
+            raise NotFound()
+
+        path = os.path.join(get_export_dir(job.pk), name)
+        try:
+            stream = open(path, 'rb')
+        except FileNotFoundError:
+            raise NotFound()
+
+        return FileResponse(stream, content_type='application/fhir+ndjson')
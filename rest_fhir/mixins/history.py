@@ -0,0 +1,80 @@
+from rest_framework.exceptions import ParseError
+
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
+from ..bundles import history_entry
+from ..indexing import parse_date_range
+from ..models import ResourceVersion, materialize_versions
+
+
+class HistoryResourceMixin:
+    """
+    History of a resource, of a resource type or of the whole system.
+    https://www.hl7.org/fhir/http.html#history
+    """
+
+    def history(self, request, *args, **kwargs):
+        queryset = self.filter_history(self.get_queryset(), request)
+
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_history_entries(page))
+
+    def filter_history(self, queryset, request):
+        params = request.query_params
+
+        if '_since' in params:
+            since = self.parse_instant('_since', params['_since'])
+            queryset = queryset.filter(published_at__gte=since[0])
+
+        if '_at' in params:
+            low, high = self.parse_instant('_at', params['_at'])
+            # Versions that were current at some point of the period: they
+            # are published before its end, and not replaced before it starts
+            replaced = ResourceVersion.objects.filter(
+                resource_id=OuterRef('resource_id'),
+                version_id__gt=OuterRef('version_id'),
+                published_at__lte=low,
+            )
+            queryset = queryset.filter(published_at__lte=high).exclude(
+                Exists(replaced)
+            )
+
+        return queryset
+
+    def parse_instant(self, param, value):
+        date_range = parse_date_range(value)
+        if date_range is None:
+            raise ParseError(_('%s must be a FHIR date or instant.') % param)
+        return date_range
+
+    def get_history_entries(self, versions):
+        materialize_versions(versions)
+
+        # Deleted versions have no content
+        serializer = self.get_serializer(
+            [version for version in versions if version.deleted_at is None],
+            many=True,
+        )
+        resources = iter(serializer.data)
+
+        return [
+            history_entry(
+                self.get_full_url(version),
+                version,
+                next(resources) if version.deleted_at is None else None,
+            )
+            for version in versions
+        ]
+
+    def get_full_url(self, version):
+        return self.request.build_absolute_uri(
+            reverse(
+                'read-update-delete',
+                kwargs={
+                    'type': version.resource_type,
+                    'id': version.resource_id,
+                },
+            )
+        )
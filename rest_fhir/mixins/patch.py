@@ -0,0 +1,76 @@
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.response import Response
+
+from django.db import connections, router
+from django.http import Http404
+
+from ..exceptions import Gone, UnprocessableEntity
+from ..models import Resource, VersionConflict
+from ..parsers import JSONPatchParser
+from ..patch import JSONPatch, PatchError
+from .conditional_read import ConditionalReadMixin
+from .update import get_expected_version_id, version_conflict_error
+
+
+class PatchResourceMixin(ConditionalReadMixin):
+    """
+    Patch a resource with a JSON Patch document.
+    https://www.hl7.org/fhir/http.html#patch
+
+    Only the patch travels: on PostgreSQL the new content is derived from
+    the stored one in the database (see Resource.patch_in_database). The
+    next version is allocated like an update, so an If-Match header makes
+    the patch answer 412 unless it applies on top of the named version.
+    """
+
+    def patch_resource(self, request, *args, **kwargs):
+        if request.content_type.split(';')[0].strip() != (
+            JSONPatchParser.media_type
+        ):
+            raise UnsupportedMediaType(request.content_type)
+
+        try:
+            patch = JSONPatch(request.data)
+        except PatchError as exc:
+            raise ParseError(str(exc))
+
+        expected_version_id = get_expected_version_id(
+            request.META.get('HTTP_IF_MATCH')
+        )
+        instance = self.get_patch_object(patch)
+
+        try:
+            instance.patch(patch, expected_version_id=expected_version_id)
+        except PatchError as exc:
+            raise UnprocessableEntity(str(exc))
+        except VersionConflict:
+            raise version_conflict_error(expected_version_id)
+
+        return Response(
+            self.get_representation(instance),
+            headers=self.get_conditional_headers(instance),
+        )
+
+    def get_patch_queryset(self, patch):
+        """
+        Queryset of the resource to patch. The content is only loaded when
+        the patch is applied in Python.
+        """
+        queryset = Resource.objects.filter(resource_type=self.kwargs['type'])
+        using = router.db_for_write(Resource)
+        if patch.can_apply_in_database(connections[using]):
+            return queryset.only(
+                'id', 'resource_type', 'version_id', 'updated_at', 'deleted_at'
+            )
+        return queryset.with_current_content()
+
+    def get_patch_object(self, patch):
+        instance = (
+            self.get_patch_queryset(patch).filter(id=self.kwargs['id']).first()
+        )
+        if instance is None:
+            raise Http404
+        if instance.deleted_at is not None:
+            raise Gone()
+        self.check_object_permissions(self.request, instance)
+        return instance
@@ -1,6 +1,90 @@
-from .conditional_read import ConditionalReadMixin
+from ..cache import get_resource_cache
+from ..exceptions import Gone
+from ..serializers import RawResource
+from .conditional_read import AsyncConditionalReadMixin, ConditionalReadMixin
 
 
 class ReadResourceMixin(ConditionalReadMixin):
     def read(self, request, *args, **kwargs):
-        return self.conditional_read(request, *args, **kwargs)
+        # The cache holds whole resources
+        resource_cache = get_resource_cache(self.kwargs['type'])
+        if resource_cache is None or self.get_projection() is not None:
+            return self.conditional_read(request, *args, **kwargs)
+
+        return self.cached_read(resource_cache, request, *args, **kwargs)
+
+    def cached_read(self, resource_cache, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        resource_id = self.kwargs[lookup_url_kwarg]
+
+        pointer = resource_cache.get_pointer(resource_id)
+        if pointer is not None:
+            if pointer.deleted:
+                raise Gone()
+
+            response = self.evaluate_preconditions(request, pointer)
+            if response is not None:
+                return response
+
+            data = resource_cache.get_content(resource_id, pointer.version_id)
+            if isinstance(data, bytes):
+                data = RawResource(data)
+            if data is not None:
+                return self.get_read_response(pointer, data)
+
+        # Cache miss or evicted content, read through the database
+        instance = self.get_object()
+        response = self.evaluate_preconditions(request, instance)
+        if response is not None:
+            resource_cache.add_pointer(instance)
+            return response
+
+        data = self.get_representation(instance)
+        resource_cache.set_content(
+            instance, data.raw if isinstance(data, RawResource) else data
+        )
+
+        return self.get_read_response(instance, data)
+
+
+class AsyncReadResourceMixin(AsyncConditionalReadMixin, ReadResourceMixin):
+    async def aread(self, request, *args, **kwargs):
+        resource_cache = get_resource_cache(self.kwargs['type'])
+        if resource_cache is None or self.get_projection() is not None:
+            return await self.aconditional_read(request, *args, **kwargs)
+
+        return await self.acached_read(resource_cache, request, *args, **kwargs)
+
+    async def acached_read(self, resource_cache, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        resource_id = self.kwargs[lookup_url_kwarg]
+
+        pointer = await resource_cache.aget_pointer(resource_id)
+        if pointer is not None:
+            if pointer.deleted:
+                raise Gone()
+
+            response = self.evaluate_preconditions(request, pointer)
+            if response is not None:
+                return response
+
+            data = await resource_cache.aget_content(
+                resource_id, pointer.version_id
+            )
+            if isinstance(data, bytes):
+                data = RawResource(data)
+            if data is not None:
+                return self.get_read_response(pointer, data)
+
+        instance = await self.aget_object()
+        response = self.evaluate_preconditions(request, instance)
+        if response is not None:
+            await resource_cache.aadd_pointer(instance)
+            return response
+
+        data = await self.aget_representation(instance)
+        await resource_cache.aset_content(
+            instance, data.raw if isinstance(data, RawResource) else data
+        )
+
+        return self.get_read_response(instance, data)
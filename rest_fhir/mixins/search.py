@@ -0,0 +1,64 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+from django.urls import reverse
+
+from ..bundles import search_entry, searchset_bundle
+from ..includes import parse_includes, resolve_includes
+
+
+class SearchResourceMixin:
+    """
+    Search the resources of a type, filtered by the view's filter backends
+    and paginated as a searchset Bundle.
+    https://www.hl7.org/fhir/http.html#search
+    """
+
+    def search(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        strict = 'handling=strict' in request.META.get('HTTP_PREFER', '')
+        includes = parse_includes(request.query_params, '_include', strict)
+        revincludes = parse_includes(
+            request.query_params, '_revinclude', strict
+        )
+
+        # https://www.hl7.org/fhir/search.html#summary
+        if request.query_params.get('_summary') == 'count':
+            return Response(
+                searchset_bundle([], total=queryset.count()),
+                status=status.HTTP_200_OK,
+            )
+
+        projection = self.get_projection()
+        if projection is not None:
+            queryset = queryset.with_raw_content(projection)
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+        entries = self.get_search_entries(page)
+        if includes or revincludes:
+            # https://www.hl7.org/fhir/search.html#include
+            entries += self.get_search_entries(
+                resolve_includes(page, includes, revincludes, projection),
+                mode='include',
+            )
+
+        if self.paginator is not None:
+            return self.get_paginated_response(entries)
+        return Response(searchset_bundle(entries), status=status.HTTP_200_OK)
+
+    def get_search_entries(self, instances, mode='match'):
+        serializer = self.get_serializer(instances, many=True)
+        return [
+            search_entry(self.get_full_url(instance), data, mode)
+            for instance, data in zip(instances, serializer.data)
+        ]
+
+    def get_full_url(self, instance):
+        return self.request.build_absolute_uri(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': instance.resource_type, 'id': instance.id},
+            )
+        )
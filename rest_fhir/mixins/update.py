@@ -0,0 +1,181 @@
+import uuid
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.mixins import UpdateModelMixin
+from rest_framework.response import Response
+
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
+from ..conditional import lock_criteria, parse_criteria, resolve_criteria
+from ..exceptions import Conflict, PreconditionFailed
+from ..models import Resource, VersionConflict
+from .conditional_read import ConditionalReadMixin, parse_version_etag
+
+
+def get_expected_version_id(if_match):
+    """
+    Version id an update must apply to, from the value of an If-Match
+    header (None when there is no header). Only version ETags can match.
+    """
+    if if_match is None:
+        return None
+
+    version_id = parse_version_etag(if_match)
+    if version_id is None:
+        raise PreconditionFailed()
+    return version_id
+
+
+def validate_update_content(resource_content, resource_type, resource_id):
+    """
+    The resource of an update must have the type and the id of its url
+    https://www.hl7.org/fhir/http.html#update
+    """
+    if (
+        not isinstance(resource_content, dict)
+        or resource_content.get('resourceType') != resource_type
+    ):
+        raise ParseError(_('Resource must be a %s.') % resource_type)
+
+    if resource_content.get('id') != str(resource_id):
+        raise ParseError(_('Resource id must match the id of the url.'))
+
+
+def get_conditional_update_target(instance, resource_content):
+    """
+    Logical id written by a conditional update, with the resource content
+    completed with it: the id of the matching `instance`, the id of the
+    resource if there is no match and it has a valid one, a new one
+    otherwise. https://www.hl7.org/fhir/http.html#cond-update
+    """
+    if instance is not None:
+        resource_id = instance.id
+    else:
+        try:
+            resource_id = uuid.UUID(str(resource_content['id']))
+        except (KeyError, TypeError, ValueError):
+            resource_id = uuid.uuid4()
+
+    # The id may be left out of the resource of a conditional update
+    if isinstance(resource_content, dict):
+        resource_content = {'id': str(resource_id), **resource_content}
+    return resource_id, resource_content
+
+
+def version_conflict_error(expected_version_id):
+    if expected_version_id is not None:
+        return PreconditionFailed()
+    return Conflict()
+
+
+class UpdateResourceMixin(UpdateModelMixin, ConditionalReadMixin):
+    """
+    Update a resource with PUT, or create it with the id of the url. The
+    conditional update resolves the resource from search criteria instead.
+
+    Nothing is locked between reading the resource and writing its next
+    version: the version id is swapped in a conditional UPDATE (see
+    Resource.set_resource_version). With an If-Match header, the update
+    answers 412 unless it applies on top of the version named by the
+    header.
+    """
+
+    def update(self, request, *args, **kwargs):
+        return self.update_resource(
+            request, self.get_update_object(), self.kwargs['id'], request.data
+        )
+
+    def conditional_update(self, request, *args, **kwargs):
+        """
+        Update the resource matching the search criteria of the query
+        string, or create it if none does.
+        https://www.hl7.org/fhir/http.html#cond-update
+        """
+        resource_type = self.kwargs['type']
+        params = parse_criteria(request.query_params)
+        resource_content = request.data
+
+        with transaction.atomic():
+            lock_criteria(resource_type, params)
+            instance = resolve_criteria(
+                resource_type, params, queryset=self.get_update_queryset()
+            )
+
+            resource_id, resource_content = get_conditional_update_target(
+                instance, resource_content
+            )
+            return self.update_resource(
+                request, instance, resource_id, resource_content
+            )
+
+    def update_resource(self, request, instance, resource_id, resource_content):
+        expected_version_id = get_expected_version_id(
+            request.META.get('HTTP_IF_MATCH')
+        )
+        validate_update_content(
+            resource_content, self.kwargs['type'], resource_id
+        )
+
+        created = instance is None
+        if created:
+            if expected_version_id is not None:
+                raise PreconditionFailed()
+            instance = Resource(id=resource_id)
+
+        serializer = self.get_serializer(
+            instance,
+            data=resource_content,
+            context={
+                **self.get_serializer_context(),
+                'expected_version_id': expected_version_id,
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            self.perform_update(serializer)
+        except VersionConflict:
+            raise version_conflict_error(expected_version_id)
+        except IntegrityError:
+            # Created by a concurrent request
+            raise Conflict()
+
+        return Response(
+            self.get_representation(serializer.instance),
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+            headers=self.get_success_headers(serializer.instance),
+        )
+
+    def get_update_queryset(self):
+        """
+        Queryset of the resource to update. The content of the current
+        version is loaded, so that only the index tables of the search
+        parameters that changed are rewritten.
+        """
+        return Resource.objects.with_current_content().filter(
+            resource_type=self.kwargs['type']
+        )
+
+    def get_update_object(self):
+        instance = (
+            self.get_update_queryset().filter(id=self.kwargs['id']).first()
+        )
+        if instance is not None:
+            self.check_object_permissions(self.request, instance)
+        return instance
+
+    def get_success_headers(self, instance):
+        ret = dict()
+        ret['Location'] = reverse(
+            'vread',
+            kwargs={
+                'type': instance.resource_type,
+                'id': instance.id,
+                'vid': instance.version_id,
+            },
+        )
+        ret.update(self.get_conditional_headers(instance))
+        return ret
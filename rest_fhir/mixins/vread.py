@@ -1,6 +1,17 @@
-from .conditional_read import ConditionalReadMixin
+from ..models import materialize_versions
+from .conditional_read import AsyncConditionalReadMixin, ConditionalReadMixin
 
 
 class VReadResourceMixin(ConditionalReadMixin):
     def vread(self, request, *args, **kwargs):
         return self.conditional_read(request, *args, **kwargs)
+
+    def get_representation(self, instance):
+        # Versions of delta encoded history are rebuilt first
+        materialize_versions([instance])
+        return super().get_representation(instance)
+
+
+class AsyncVReadResourceMixin(AsyncConditionalReadMixin, VReadResourceMixin):
+    async def avread(self, request, *args, **kwargs):
+        return await self.aconditional_read(request, *args, **kwargs)
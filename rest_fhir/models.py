@@ -1,10 +1,222 @@
 import uuid
-from typing import Dict, Tuple
+from collections import defaultdict
+from functools import partial
+from typing import Dict, Optional, Tuple
 
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .cache import get_resource_cache, invalidate_resource
+from .compat import sync_to_async
+from .encoders import FHIRJSONDecoder, FHIRJSONEncoder
+from .fields import CompressedJSONField
+from .indexing import extract_index_values, search_parameters
+from .patch import JSONPatch, PatchApplies, PatchedContent, PatchError, diff
+from .projection import ProjectedContent, Projection
+from .settings import fhir_settings
+from .sharding import atomic_shards, is_sharded, shard_for
+
+# Number of times an update without an expected version is written again
+# on top of the versions written concurrently, see set_resource_version
+MAX_VERSION_ATTEMPTS = 10
+
+
+class VersionConflict(Exception):
+    """
+    The current version of a resource is not the one an update is based on.
+    """
+
+
+# Elements of `meta` managed by the server, added on every read
+SERVER_META_ELEMENTS = ('versionId', 'lastUpdated')
+
+
+def normalize_resource_content(resource_id, resource_content) -> dict:
+    """
+    Content is stored with the Logical Id as its first element, and with
+    the elements of `meta` supplied by the client only (`profile`,
+    `security`, `tag`, ...). Keeping `id` first lets reads splice `meta`
+    in without decoding the documents that have none.
+    """
+    content = {'id': str(resource_id)}
+    meta = resource_content.get('meta')
+    if isinstance(meta, dict):
+        meta = {
+            key: value
+            for key, value in meta.items()
+            if key not in SERVER_META_ELEMENTS
+        }
+        if meta:
+            content['meta'] = meta
+    content.update(
+        (key, value)
+        for key, value in resource_content.items()
+        if key not in ('id', 'meta')
+    )
+    return content
+
+
+class AsyncQuerySetMixin:
+    """
+    Async methods of the querysets, for the async views. Django 3.2 has no
+    async ORM: like the `a` prefixed methods of later versions, they run
+    their sync counterpart in the thread of the request's sync code.
+    """
+
+    async def aget(self, *args, **kwargs):
+        return await sync_to_async(self.get)(*args, **kwargs)
+
+    async def afirst(self):
+        return await sync_to_async(self.first)()
+
+    async def aexists(self) -> bool:
+        return await sync_to_async(self.exists)()
+
+
+def annotate_raw_content(
+    queryset, content, projection: Optional[Projection] = None
+):
+    """
+    Defer the `content` field of `queryset` and fetch it as JSON text in
+    the `raw_content` attribute instead, projected by the database when
+    `projection` is given (`raw_projected` is then True). Contents that the
+    database can't project are fetched decoded, to project them after.
+    """
+    if projection is not None:
+        if not projection.is_supported(connections[queryset.db]):
+            return queryset
+        return queryset.defer(content).annotate(
+            raw_content=Cast(
+                ProjectedContent(F(content), projection), models.TextField()
+            ),
+            raw_projected=Value(True, output_field=models.BooleanField()),
+        )
+    return queryset.defer(content).annotate(
+        raw_content=Cast(content, models.TextField())
+    )
+
+
+class ResourceQuerySet(AsyncQuerySetMixin, models.QuerySet):
+    def with_current_content(self):
+        """
+        Load the content of the current version along with the resources:
+        from the copy on their rows with DENORMALIZED_CONTENT, with a join
+        to `fhir_resource_ver` otherwise.
+        """
+        if fhir_settings.DENORMALIZED_CONTENT:
+            return self
+        return self.select_related('version')
+
+    def with_raw_content(self, projection: Optional[Projection] = None):
+        """
+        Fetch the content of the current version as JSON text in the
+        `raw_content` attribute, instead of decoding it.
+        """
+        if fhir_settings.DENORMALIZED_CONTENT:
+            return annotate_raw_content(self, 'current_content', projection)
+        return annotate_raw_content(
+            self, 'version__resource_content', projection
+        )
+
+    def bulk_create_resources(
+        self, resource_contents, ids=None, batch_size=None
+    ):
+        """
+        Create the first version of many resources with one `bulk_create`
+        over `fhir_resource` and one over `fhir_resource_ver`, in a single
+        transaction. Logical Ids may be given in `ids`, they are generated
+        otherwise.
+        """
+        if ids is None:
+            ids = [uuid.uuid4() for _ in resource_contents]
+
+        if self._db is None and is_sharded():
+            return self.bulk_create_sharded_resources(
+                resource_contents, ids, batch_size
+            )
+
+        # Resolve `self.db` as the database written to, like get_or_create
+        self._for_write = True
+        now = timezone.now()
+        resources = []
+        versions = []
+
+        for resource_id, resource_content in zip(ids, resource_contents):
+            resource_content = normalize_resource_content(
+                resource_id, resource_content
+            )
+            resource = self.model(
+                id=resource_id,
+                resource_type=resource_content['resourceType'],
+                version_id=1,
+                published_at=now,
+                updated_at=now,
+                current_content=resource_content
+                if fhir_settings.DENORMALIZED_CONTENT
+                else None,
+            )
+            version = ResourceVersion(
+                resource=resource,
+                resource_type=resource.resource_type,
+                version_id=1,
+                resource_content=resource_content,
+                published_at=now,
+            )
+            resource.version = version
+            resources.append(resource)
+            versions.append(version)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            self.bulk_create(resources, batch_size=batch_size)
+            ResourceVersion.objects.using(self.db).bulk_create(
+                versions, batch_size=batch_size
+            )
+            write_index(
+                [
+                    (
+                        resource.id,
+                        resource.resource_type,
+                        version.resource_content,
+                        {},
+                    )
+                    for resource, version in zip(resources, versions)
+                ],
+                [version.version_id for version in versions],
+                using=self.db,
+                batch_size=batch_size,
+            )
+
+        return resources
+
+    def bulk_create_sharded_resources(self, resource_contents, ids, batch_size):
+        """
+        `bulk_create_resources` on the shard of each resource, see
+        rest_fhir.sharding.
+        """
+        positions_by_shard = defaultdict(list)
+        for position, resource_id in enumerate(ids):
+            positions_by_shard[shard_for(resource_id)].append(position)
+
+        resources = [None] * len(ids)
+        with atomic_shards():
+            for alias, positions in positions_by_shard.items():
+                created = self.using(alias).bulk_create_resources(
+                    [resource_contents[position] for position in positions],
+                    ids=[ids[position] for position in positions],
+                    batch_size=batch_size,
+                )
+                for position, resource in zip(positions, created):
+                    resources[position] = resource
+        return resources
+
+
+class ResourceVersionQuerySet(AsyncQuerySetMixin, models.QuerySet):
+    def with_raw_content(self, projection: Optional[Projection] = None):
+        return annotate_raw_content(self, 'resource_content', projection)
+
 
 class Resource(models.Model):
     id = models.UUIDField(
@@ -30,11 +242,11 @@ class Resource(models.Model):
         related_name='+',
     )
     published_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text=_('Date that the first version of the resource was created'),
     )
     updated_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text=_(
             'Date that the most recent version of the resource was created'
         ),
@@ -47,6 +259,24 @@ class Resource(models.Model):
             'Otherwise, contains NULL'
         ),
     )
+    current_content = CompressedJSONField(
+        null=True,
+        blank=True,
+        compressed_field='current_content_compressed',
+        encoder=FHIRJSONEncoder,
+        decoder=FHIRJSONDecoder,
+        help_text=_(
+            'Copy of the content of the current version, see the '
+            'DENORMALIZED_CONTENT setting. NULL when there is no copy'
+        ),
+    )
+    current_content_compressed = models.BinaryField(
+        null=True,
+        editable=False,
+        help_text=_('Copy of the content of the current version compressed'),
+    )
+
+    objects = ResourceQuerySet.as_manager()
 
     class Meta:
         db_table = 'fhir_resource'
@@ -61,68 +291,438 @@ class Resource(models.Model):
     @property
     def resource_content(self):
         if self.deleted_at is None:
+            if self.has_current_content():
+                return self.current_content
             return self.version.resource_content
 
+    def has_current_content(self) -> bool:
+        """
+        Whether the copy of the content of the current version on the row
+        (see DENORMALIZED_CONTENT) is loaded. Rows written while the
+        setting was off have no copy, their version is read instead.
+        """
+        loaded = self.__dict__
+        if 'current_content_compressed' not in loaded:
+            return False
+        if loaded['current_content_compressed'] is not None:
+            return True
+        if 'current_content' in loaded:
+            return loaded['current_content'] is not None
+        # Deferred for `raw_content`, see ResourceQuerySet.with_raw_content
+        return getattr(self, 'raw_content', None) is not None
+
+    def get_current_content_values(self, version) -> dict:
+        """
+        Values of the columns of the copy of the content of `version` on
+        the row: the content with DENORMALIZED_CONTENT, NULL otherwise so
+        that a copy is never stale.
+        """
+        content = version.resource_content
+        if not fhir_settings.DENORMALIZED_CONTENT:
+            content = None
+        return Resource._meta.get_field('current_content').get_column_values(
+            content
+        )
+
     @property
     def last_updated(self):
         return self.updated_at
 
-    def save(self, resource_content=None, **kwargs):
-        first = self._state.adding
+    def save(self, resource_content=None, expected_version_id=None, **kwargs):
+        if not resource_content:
+            return super().save(**kwargs)
 
         # Retrieve type from content and force Logical Id
-        if resource_content:
-            resource_content = {'id': str(self.id), **resource_content}
-            self.resource_type = resource_content['resourceType']
-
-        super().save(**kwargs)
+        resource_content = normalize_resource_content(self.id, resource_content)
+        self.resource_type = resource_content['resourceType']
 
         # Create a history entry from content
-        if resource_content:
-            self.set_resource_version(
-                resource_content=resource_content, first=first
-            )
+        self.set_resource_version(
+            resource_content=resource_content,
+            first=self._state.adding,
+            expected_version_id=expected_version_id,
+            **kwargs,
+        )
 
     def delete(
-        self, using=None, keep_parents=False
+        self, using=None, keep_parents=False, expected_version_id=None
     ) -> Tuple[int, Dict[str, int]]:
-        self.set_resource_version(delete=True)
+        self.set_resource_version(
+            delete=True, expected_version_id=expected_version_id, using=using
+        )
 
         per_obj_deleted = {}
         per_obj_deleted['rest_fhir.Resource'] = 1
         per_obj_deleted['rest_fhir.ResourceVersion'] = 1
         return (2, per_obj_deleted)
 
+    async def asave(self, *args, **kwargs):
+        # The version is written in a single transaction, see
+        # AsyncQuerySetMixin
+        return await sync_to_async(self.save)(*args, **kwargs)
+
+    async def adelete(self, *args, **kwargs):
+        return await sync_to_async(self.delete)(*args, **kwargs)
+
+    def get_index_values(self):
+        """
+        Search index values of the current version, when its content is
+        already loaded. Returns None otherwise.
+        """
+        if (
+            Resource.version.is_cached(self)
+            and self.version is not None
+            and self.version.deleted_at is not None
+        ):
+            return {}
+        content = self.get_loaded_content()
+        if content is None:
+            return None
+        return extract_index_values(self.resource_type, content)
+
+    def get_loaded_content(self):
+        """
+        Content of the current version, when it is already loaded. Returns
+        None otherwise.
+        """
+        if self.has_current_content():
+            if 'current_content' in self.get_deferred_fields():
+                return None
+            return self.current_content
+        if not Resource.version.is_cached(self) or self.version is None:
+            return None
+        if 'resource_content' in self.version.get_deferred_fields():
+            return None
+        return self.version.resource_content
+
     def set_resource_version(
-        self, resource_content=None, first=False, delete=False, **kwargs
+        self,
+        resource_content=None,
+        first=False,
+        delete=False,
+        expected_version_id=None,
+        **kwargs,
     ):
-        version_id = self.version_id + 1
-        deleted_at = timezone.now() if delete else None
-        version = self.history.create(
-            version_id=version_id,
-            resource_content=resource_content,
-            deleted_at=deleted_at,
+        """
+        Write a new version of the resource, with one INSERT into
+        `fhir_resource_ver` and one INSERT (first version) or UPDATE (next
+        versions) of `fhir_resource`, in a single transaction.
+
+        Next versions are allocated by `allocate_version_id`, a
+        compare-and-swap on the current version id, so no lock is held
+        between reading a resource and writing it. If the current version
+        is not `expected_version_id` (e.g. the version of an If-Match
+        header), VersionConflict is raised. Without an expected version,
+        the write is based on the loaded version and, when other versions
+        were written since, retried on top of the latest one.
+
+        The search index is rewritten in the same transaction, or its
+        rewrite enqueued with ASYNC_INDEXING, see `write_index`.
+        """
+        using = kwargs.pop('using', None) or router.db_for_write(
+            Resource, instance=self
         )
 
+        if first:
+            base_version_id = 0
+            previous_index_values = {}
+        elif expected_version_id is None:
+            base_version_id = self.version_id
+            previous_index_values = self.get_index_values()
+        else:
+            base_version_id = expected_version_id
+            previous_index_values = (
+                self.get_index_values()
+                if expected_version_id == self.version_id
+                else None
+            )
+        previous_content = (
+            self.get_loaded_content()
+            if not first and base_version_id == self.version_id
+            else None
+        )
+
+        for _attempt in range(MAX_VERSION_ATTEMPTS):
+            now = timezone.now()
+            version = ResourceVersion(
+                resource=self,
+                resource_type=self.resource_type,
+                version_id=base_version_id + 1,
+                resource_content=resource_content,
+                published_at=now,
+                deleted_at=now if delete else None,
+            )
+
+            with transaction.atomic(using=using, savepoint=False):
+                if first:
+                    self.version_id = version.version_id
+                    self.published_at = self.updated_at = now
+                    self.deleted_at = version.deleted_at
+                    self.current_content = (
+                        resource_content
+                        if fhir_settings.DENORMALIZED_CONTENT
+                        else None
+                    )
+                    super().save(force_insert=True, using=using, **kwargs)
+                elif not self.allocate_version_id(version, using):
+                    # Leave the transaction untouched for the retry
+                    version = None
+
+                if version is not None:
+                    version.save(force_insert=True, using=using)
+                    write_index(
+                        [
+                            (
+                                self.id,
+                                self.resource_type,
+                                resource_content,
+                                previous_index_values,
+                            )
+                        ],
+                        [version.version_id],
+                        using=using,
+                    )
+                    if previous_content is not None:
+                        self.encode_previous_version(
+                            version, previous_content, using
+                        )
+
+            if version is not None:
+                break
+
+            if expected_version_id is not None:
+                raise VersionConflict(self.id)
+
+            # Another writer got there first, the loaded index values are
+            # stale as well
+            base_version_id = (
+                Resource.objects.using(using)
+                .filter(pk=self.pk)
+                .values_list('version_id', flat=True)
+                .get()
+            )
+            previous_index_values = previous_content = None
+        else:
+            raise VersionConflict(self.id)
+
         self.version = version
-        self.updated_at = version.published_at
 
-        if first:
-            self.published_at = version.published_at
-
-        if delete:
-            self.deleted_at = version.deleted_at
-
-        super().save(
-            update_fields=[
-                'version_id',
-                'updated_at',
-                'published_at',
-                'deleted_at',
-            ],
-            **kwargs,
+        # Point cached reads to the new version once it is visible
+        transaction.on_commit(partial(invalidate_resource, self), using=using)
+
+    def encode_previous_version(self, version, previous_content, using):
+        """
+        In delta encoded history (see HISTORY_SNAPSHOT_INTERVAL), replace
+        the content of the version `version` follows by a JSON Patch from
+        the content of `version`. Every N-th version keeps its content, so
+        that rebuilding a version applies less than N patches.
+        """
+        interval = fhir_settings.HISTORY_SNAPSHOT_INTERVAL
+        previous_version_id = version.version_id - 1
+        if (
+            not interval
+            or previous_version_id % interval == 0
+            or version.resource_content is None
+        ):
+            return
+
+        ResourceVersion.objects.using(using).filter(
+            resource_id=self.pk, version_id=previous_version_id
+        ).update(
+            resource_content=None,
+            resource_content_compressed=None,
+            resource_delta=diff(version.resource_content, previous_content),
         )
 
+    def patch(self, patch, expected_version_id=None, using=None):
+        """
+        Write the next version of the resource by applying a JSON Patch
+        (see rest_fhir.patch) to its current version.
+
+        When the database supports it, the content is derived from the
+        stored one by `patch_in_database`, so it is never loaded by the
+        application. Otherwise the loaded content is patched and written
+        like an update. Without an expected version, a patch that lost a
+        race is applied again to the latest version.
+
+        Raises PatchError if the patch does not apply to the content and
+        VersionConflict if the current version is not the expected one.
+        """
+        using = using or router.db_for_write(Resource, instance=self)
+        can_patch_in_database = patch.can_apply_in_database(connections[using])
+
+        for _attempt in range(MAX_VERSION_ATTEMPTS):
+            if (
+                expected_version_id is not None
+                and expected_version_id != self.version_id
+            ):
+                raise VersionConflict(self.id)
+            if self.deleted_at is not None:
+                raise PatchError('Deleted resources can not be patched.')
+
+            try:
+                if can_patch_in_database and self.patch_in_database(
+                    patch, using
+                ):
+                    return
+                self.save(
+                    resource_content=patch.apply(self.resource_content),
+                    expected_version_id=self.version_id,
+                    using=using,
+                )
+                return
+            except VersionConflict:
+                if expected_version_id is not None:
+                    raise
+
+            current = (
+                Resource.objects.using(using)
+                .select_related('version')
+                .get(pk=self.pk)
+            )
+            self.version_id = current.version_id
+            self.updated_at = current.updated_at
+            self.deleted_at = current.deleted_at
+            self.current_content = current.current_content
+            self.current_content_compressed = current.current_content_compressed
+            self.version = current.version
+
+        raise VersionConflict(self.id)
+
+    def patch_in_database(self, patch, using) -> bool:
+        """
+        Write the next version with its content patched by the database:
+        the compare-and-swap of the version id only applies if all the
+        operations apply to the content of the current version, and the
+        new version is inserted with its content computed from that one.
+
+        Only the index tables of the search parameters whose elements are
+        changed by the patch are rewritten.
+
+        Returns False, without writing anything, if the patch does not
+        apply to the current version. Raises VersionConflict if the
+        current version is not the loaded one.
+        """
+        base_version_id = self.version_id
+        base_versions = ResourceVersion.objects.using(using).filter(
+            resource_id=self.pk, version_id=base_version_id
+        )
+        now = timezone.now()
+        version = ResourceVersion(
+            resource=self,
+            resource_type=self.resource_type,
+            version_id=base_version_id + 1,
+            resource_content=PatchedContent(
+                Subquery(base_versions.values('resource_content')), patch
+            ),
+            published_at=now,
+        )
+
+        with transaction.atomic(using=using, savepoint=False):
+            applies = Exists(
+                ResourceVersion.objects.filter(
+                    resource_id=OuterRef('pk'),
+                    version_id=base_version_id,
+                ).filter(PatchApplies(F('resource_content'), patch))
+            )
+            if self.allocate_version_id(version, using, condition=applies):
+                version.save(force_insert=True, using=using)
+                version.refresh_from_db(fields=['resource_content'])
+                if fhir_settings.DENORMALIZED_CONTENT:
+                    self.current_content = version.resource_content
+
+                if fhir_settings.ASYNC_INDEXING:
+                    write_index(
+                        [(self.id, self.resource_type, None, None)],
+                        [version.version_id],
+                        using=using,
+                    )
+                else:
+                    values = extract_index_values(
+                        self.resource_type, version.resource_content
+                    )
+                    changed = {
+                        param.type
+                        for param in search_parameters.for_type(
+                            self.resource_type
+                        ).values()
+                        if any(
+                            path[0] in patch.elements for path in param.paths
+                        )
+                    }
+                    previous_index_values = {
+                        param_type: None
+                        if param_type in changed
+                        else values.get(param_type)
+                        for param_type in search_parameters.index_types(
+                            self.resource_type
+                        )
+                    }
+                    index_resources(
+                        [
+                            (
+                                self.id,
+                                self.resource_type,
+                                version.resource_content,
+                                previous_index_values,
+                            )
+                        ],
+                        using=using,
+                    )
+            else:
+                version = None
+
+        if version is None:
+            if (
+                Resource.objects.using(using)
+                .filter(pk=self.pk, version_id=base_version_id)
+                .exists()
+            ):
+                return False
+            raise VersionConflict(self.id)
+
+        self.version = version
+        transaction.on_commit(partial(invalidate_resource, self), using=using)
+        return True
+
+    def allocate_version_id(self, version, using, condition=None) -> bool:
+        """
+        Move the current version id to the one of `version` with
+        `UPDATE ... SET vid = vid + 1 WHERE id = %s AND vid = %s`. Returns
+        False, and leaves the instance unchanged, if the current version
+        is not the one `version` follows (or `condition` is false).
+        """
+        # The resource type is the partition key of fhir_resource when it
+        # is partitioned (see rest_fhir.partitioning)
+        queryset = Resource.objects.using(using).filter(
+            pk=self.pk,
+            resource_type=version.resource_type,
+            version_id=version.version_id - 1,
+        )
+        if condition is not None:
+            queryset = queryset.filter(condition)
+
+        current_content_values = self.get_current_content_values(version)
+        updated = queryset.update(
+            version_id=F('version_id') + 1,
+            updated_at=version.published_at,
+            deleted_at=version.deleted_at,
+            **current_content_values,
+        )
+        if not updated:
+            return False
+
+        self.version_id = version.version_id
+        self.updated_at = version.published_at
+        self.deleted_at = version.deleted_at
+        # The content of a patch is computed by the database, it is set by
+        # patch_in_database once read back
+        for attname, value in current_content_values.items():
+            if hasattr(value, 'resolve_expression'):
+                value = None
+            setattr(self, attname, value)
+        return True
+
 
 class ResourceVersion(models.Model):
     id = models.AutoField(
@@ -143,13 +743,33 @@ class ResourceVersion(models.Model):
         related_name='history',
         db_column='resource_id',
     )
-    resource_content = models.JSONField(
+    resource_type = models.CharField(
+        max_length=45,
+        help_text=_(
+            'Type of the resource, repeated here for type level history'
+        ),
+    )
+    resource_content = CompressedJSONField(
         null=True,
         blank=True,
+        compressed_field='resource_content_compressed',
+        encoder=FHIRJSONEncoder,
+        decoder=FHIRJSONDecoder,
         help_text=_('The actual full text of the resource being stored'),
     )
+    resource_delta = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=FHIRJSONEncoder,
+        decoder=FHIRJSONDecoder,
+        help_text=_(
+            'JSON Patch from the content of the next version to the content '
+            'of this one, stored instead of the content in delta encoded '
+            'history'
+        ),
+    )
     published_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text=_(
             'Date that version was created version of the resource was created'
         ),
@@ -161,14 +781,482 @@ class ResourceVersion(models.Model):
             'Deleted versions of a resource have no content'
         ),
     )
+    resource_content_compressed = models.BinaryField(
+        null=True,
+        editable=False,
+        help_text=_(
+            'The text of the resource compressed, stored instead of the '
+            'content for large resources'
+        ),
+    )
+
+    objects = ResourceVersionQuerySet.as_manager()
 
     class Meta:
         db_table = 'fhir_resource_ver'
         unique_together = ['resource', 'version_id']
         ordering = ['resource', 'version_id']
+        indexes = [
+            # Keyset pagination of system and type level history
+            models.Index(
+                fields=['published_at', 'id'],
+                name='fhir_resource_ver_history',
+            ),
+            models.Index(
+                fields=['resource_type', 'published_at', 'id'],
+                name='fhir_resource_ver_type_history',
+            ),
+        ]
         verbose_name = 'resource'
         verbose_name_plural = 'resource versions'
 
     @property
     def last_updated(self):
         return self.published_at
+
+
+class SearchIndex(models.Model):
+    """
+    Values of a search parameter in the current version of a resource.
+    The resource type is repeated here so searches only read the index.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    resource = models.ForeignKey(
+        'Resource',
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_column='resource_id',
+    )
+    resource_type = models.CharField(max_length=45)
+    name = models.CharField(
+        max_length=64, help_text=_('Code of the search parameter')
+    )
+
+    class Meta:
+        abstract = True
+
+
+class StringIndex(SearchIndex):
+    value = models.CharField(
+        max_length=255,
+        help_text=_('Value without case and accents, for prefix matches'),
+    )
+    exact = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'fhir_idx_string'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'value'],
+                name='fhir_idx_string_value',
+                opclasses=['varchar_pattern_ops'] * 3,
+            ),
+            models.Index(
+                fields=['resource_type', 'name', 'exact'],
+                name='fhir_idx_string_exact',
+            ),
+        ]
+
+
+class TokenIndex(SearchIndex):
+    system = models.CharField(max_length=255, null=True)
+    code = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'fhir_idx_token'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'code', 'system'],
+                name='fhir_idx_token_code',
+            ),
+        ]
+
+
+class DateIndex(SearchIndex):
+    low = models.DateTimeField()
+    high = models.DateTimeField()
+
+    class Meta:
+        db_table = 'fhir_idx_date'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'low', 'high'],
+                name='fhir_idx_date_low',
+            ),
+            models.Index(
+                fields=['resource_type', 'name', 'high'],
+                name='fhir_idx_date_high',
+            ),
+        ]
+
+
+class ReferenceIndex(SearchIndex):
+    target_type = models.CharField(max_length=45)
+    target_id = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = 'fhir_idx_reference'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'target_id', 'target_type'],
+                name='fhir_idx_reference_target',
+            ),
+        ]
+
+
+class QuantityIndex(SearchIndex):
+    value = models.FloatField()
+    system = models.CharField(max_length=255, null=True)
+    code = models.CharField(max_length=255, null=True)
+    unit = models.CharField(max_length=255, null=True)
+
+    class Meta:
+        db_table = 'fhir_idx_quantity'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'value'],
+                name='fhir_idx_quantity_value',
+            ),
+        ]
+
+
+class UriIndex(SearchIndex):
+    uri = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'fhir_idx_uri'
+        indexes = [
+            models.Index(
+                fields=['resource_type', 'name', 'uri'],
+                name='fhir_idx_uri_value',
+                opclasses=['varchar_pattern_ops'] * 3,
+            ),
+        ]
+
+
+INDEX_MODELS = {
+    'string': (StringIndex, ['name', 'value', 'exact']),
+    'token': (TokenIndex, ['name', 'system', 'code']),
+    'date': (DateIndex, ['name', 'low', 'high']),
+    'reference': (ReferenceIndex, ['name', 'target_type', 'target_id']),
+    'quantity': (QuantityIndex, ['name', 'value', 'system', 'code', 'unit']),
+    'uri': (UriIndex, ['name', 'uri']),
+}
+
+
+def get_raw_content(instance) -> Optional[str]:
+    """
+    JSON text of the content of a resource or of a version, when it is
+    available without encoding the content: fetched by `with_raw_content`,
+    or decompressed. None otherwise.
+    """
+    raw = getattr(instance, 'raw_content', None)
+    if raw is None:
+        if isinstance(instance, Resource) and instance.has_current_content():
+            return Resource._meta.get_field('current_content').get_raw_value(
+                instance
+            )
+        version = (
+            instance.version if isinstance(instance, Resource) else instance
+        )
+        if version is not None:
+            raw = ResourceVersion._meta.get_field(
+                'resource_content'
+            ).get_raw_value(version)
+    return raw
+
+
+def rebuild_versions(resource_id, version_ids, using=None) -> dict:
+    """
+    Contents of delta encoded versions of a resource, by version id. The
+    versions from the lowest one to the closest version above the highest
+    one that has its content are fetched, then their patches are applied
+    from the top.
+    """
+    queryset = ResourceVersion.objects.using(using).filter(
+        resource_id=resource_id
+    )
+    snapshot = (
+        queryset.filter(
+            version_id__gte=max(version_ids), resource_delta__isnull=True
+        )
+        .order_by('version_id')
+        .values('version_id')[:1]
+    )
+    rows = (
+        queryset.filter(
+            version_id__gte=min(version_ids),
+            version_id__lte=Subquery(snapshot),
+        )
+        .order_by('-version_id')
+        .only(
+            'version_id',
+            'resource_content',
+            'resource_content_compressed',
+            'resource_delta',
+        )
+    )
+
+    contents = {}
+    content = None
+    for row in rows:
+        if row.resource_delta is None:
+            content = row.resource_content
+        elif row.resource_delta:
+            content = JSONPatch(row.resource_delta).apply(content)
+        if row.version_id in version_ids:
+            contents[row.version_id] = content
+    return contents
+
+
+def materialize_versions(versions, using=None):
+    """
+    Set the content of the delta encoded `versions` (see
+    Resource.encode_previous_version), rebuilt by `rebuild_versions` or
+    taken from the resource cache.
+    """
+    pending = {}
+    for version in versions:
+        if version.resource_delta is not None:
+            pending.setdefault(
+                (version.resource_type, version.resource_id), []
+            ).append(version)
+
+    for (resource_type, resource_id), resource_versions in pending.items():
+        version_ids = {version.version_id for version in resource_versions}
+        resource_cache = get_resource_cache(resource_type)
+
+        contents = {}
+        if resource_cache is not None:
+            contents = resource_cache.get_version_contents(
+                resource_id, version_ids
+            )
+
+        missing = version_ids.difference(contents)
+        if missing:
+            # From the database of the versions, e.g. their shard
+            rebuilt = rebuild_versions(
+                resource_id,
+                missing,
+                using=using or resource_versions[0]._state.db,
+            )
+            contents.update(rebuilt)
+            if resource_cache is not None:
+                resource_cache.set_version_contents(resource_id, rebuilt)
+
+        for version in resource_versions:
+            version.resource_content = contents[version.version_id]
+
+
+def index_resources(resources, using, batch_size=None):
+    """
+    Write the search index of `(id, resource type, content, previous
+    values)` tuples. Previous values are the index values of the version
+    being replaced: `{}` for new resources, None when unknown. Values of
+    None for a parameter type mark a table to rewrite.
+
+    Only index tables whose values changed are written, with one DELETE
+    (when the resource may have rows there) and one INSERT per table. A
+    content of None (a delete) only clears the index.
+    """
+    rows = {param_type: [] for param_type in INDEX_MODELS}
+    clear_ids = {param_type: [] for param_type in INDEX_MODELS}
+
+    for resource_id, resource_type, resource_content, previous in resources:
+        values = extract_index_values(resource_type, resource_content)
+
+        if previous is None:
+            param_types = search_parameters.index_types(resource_type)
+            for param_type in param_types:
+                clear_ids[param_type].append(resource_id)
+        else:
+            param_types = set(values) | set(previous)
+            for param_type, previous_values in previous.items():
+                if previous_values is None or previous_values != values.get(
+                    param_type
+                ):
+                    clear_ids[param_type].append(resource_id)
+
+        for param_type in param_types:
+            if (
+                previous
+                and previous.get(param_type) is not None
+                and previous[param_type] == values.get(param_type)
+            ):
+                continue
+
+            model, fields = INDEX_MODELS[param_type]
+            rows[param_type].extend(
+                model(
+                    resource_id=resource_id,
+                    resource_type=resource_type,
+                    **dict(zip(fields, value)),
+                )
+                for value in values.get(param_type, ())
+            )
+
+    for param_type, (model, _fields) in INDEX_MODELS.items():
+        if clear_ids[param_type]:
+            model._base_manager.using(using).filter(
+                resource_id__in=clear_ids[param_type]
+            ).delete()
+        if rows[param_type]:
+            model._base_manager.using(using).bulk_create(
+                rows[param_type], batch_size=batch_size
+            )
+
+
+def write_index(resources, version_ids, using, batch_size=None):
+    """
+    Write the search index of `resources` (see `index_resources`), or with
+    ASYNC_INDEXING, enqueue an IndexingTask for each of them at its new
+    version id, written by rest_fhir.indexer.
+    """
+    if not fhir_settings.ASYNC_INDEXING:
+        index_resources(resources, using=using, batch_size=batch_size)
+        return
+
+    IndexingTask.objects.using(using).bulk_create(
+        [
+            IndexingTask(
+                resource_id=resource_id,
+                resource_type=resource_type,
+                version_id=version_id,
+            )
+            for (
+                resource_id,
+                resource_type,
+                _content,
+                _previous,
+            ), version_id in zip(resources, version_ids)
+        ],
+        batch_size=batch_size,
+    )
+
+
+class IndexingTask(models.Model):
+    """
+    Outbox of the search index writes with ASYNC_INDEXING: a row per
+    version written, in its transaction. It is deleted once the index of
+    the resource is written, see rest_fhir.indexer.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    resource_id = models.UUIDField(help_text=_('Logical Id of the resource'))
+    resource_type = models.CharField(max_length=45)
+    version_id = models.PositiveIntegerField(
+        db_column='vid', help_text=_('Version written')
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'fhir_index_outbox'
+        indexes = [
+            # Consistency tokens, see rest_fhir.indexer.is_indexed
+            models.Index(
+                fields=['resource_id', 'version_id'],
+                name='fhir_index_outbox_resource',
+            ),
+        ]
+        verbose_name = 'indexing task'
+        verbose_name_plural = 'indexing tasks'
+
+
+class ExportJob(models.Model):
+    ACCEPTED = 'accepted'
+    IN_PROGRESS = 'in-progress'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (ACCEPTED, _('Accepted')),
+        (IN_PROGRESS, _('In progress')),
+        (COMPLETED, _('Completed')),
+        (FAILED, _('Failed')),
+    ]
+
+    SYSTEM = 'system'
+    TYPE = 'type'
+    PATIENT = 'patient'
+    LEVEL_CHOICES = [
+        (SYSTEM, _('System')),
+        (TYPE, _('Type')),
+        (PATIENT, _('Patient')),
+    ]
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True)
+    level = models.CharField(
+        max_length=10,
+        choices=LEVEL_CHOICES,
+        help_text=_('Level of the $export operation'),
+    )
+    resource_types = models.JSONField(
+        null=True,
+        blank=True,
+        help_text=_('Resource types to export, all of them when empty'),
+    )
+    since = models.DateTimeField(
+        null=True,
+        help_text=_('Only resources updated since this date are exported'),
+    )
+    request = models.TextField(
+        help_text=_('Full url of the original kick-off request')
+    )
+    status = models.CharField(
+        max_length=12, choices=STATUS_CHOICES, default=ACCEPTED
+    )
+    output = models.JSONField(
+        default=list,
+        blank=True,
+        help_text=_('Exported files, with their resource type and count'),
+    )
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        help_text=_('Transaction time of the export'),
+    )
+    completed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'fhir_export_job'
+        ordering = ['-created_at']
+        verbose_name = 'export job'
+        verbose_name_plural = 'export jobs'
+
+
+class CriteriaLock(models.Model):
+    """
+    One row per search criteria of the conditional interactions, locked to
+    serialize them on databases without advisory locks, see
+    `rest_fhir.conditional.lock_criteria`.
+    """
+
+    key = models.CharField(
+        max_length=64,
+        primary_key=True,
+        help_text=_('SHA-256 of the resource type and search criteria'),
+    )
+    locked_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'fhir_criteria_lock'
+        verbose_name = 'criteria lock'
+        verbose_name_plural = 'criteria locks'
+
+
+class CompressionDictionary(models.Model):
+    """
+    Dictionary shared by the compressed resource contents, trained on the
+    stored resources by the `fhir_train_compression` command, see
+    `rest_fhir.compression`.
+    """
+
+    id = models.AutoField(primary_key=True)
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'fhir_compression_dict'
+        verbose_name = 'compression dictionary'
+        verbose_name_plural = 'compression dictionaries'
@@ -0,0 +1,29 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+# Short `_format` values of the FHIR specification that aren't the format
+# of a renderer
+FORMAT_ALIASES = {'html': 'text/html'}
+
+
+class FHIRContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation honouring the `_format` parameter, which overrides
+    the Accept header with a format (e.g. `json`) or a media type (e.g.
+    `application/fhir+json`).
+    https://www.hl7.org/fhir/http.html#mime-type
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        value = request.query_params.get('_format')
+        if value is None or format_suffix:
+            return super().select_renderer(request, renderers, format_suffix)
+
+        # An unescaped `+` of a media type is decoded as a space
+        value = value.strip().replace(' ', '+')
+        value = FORMAT_ALIASES.get(value, value)
+        for renderer in renderers:
+            if value in (renderer.format, renderer.media_type):
+                return renderer, renderer.media_type
+
+        raise NotAcceptable(available_renderers=renderers)
@@ -0,0 +1,146 @@
+import base64
+import binascii
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from .bundles import make_bundle, searchset_bundle
+from .settings import fhir_settings
+
+
+def get_page_size(params) -> int:
+    """
+    Page size requested by the `_count` parameter, within the settings.
+    """
+    try:
+        page_size = int(params['_count'])
+    except (KeyError, ValueError):
+        return fhir_settings.SEARCH_PAGE_SIZE
+
+    if page_size <= 0:
+        return fhir_settings.SEARCH_PAGE_SIZE
+    return min(page_size, fhir_settings.SEARCH_MAX_PAGE_SIZE)
+
+
+class SearchsetPagination(CursorPagination):
+    """
+    Paginate search results as searchset Bundles, with `next` and
+    `previous` links. Pages are keyed by the Logical Id of their last
+    resource, so fetching a page does not scan the previous ones.
+    """
+
+    ordering = 'id'
+    cursor_query_param = '_cursor'
+    page_size_query_param = '_count'
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Only set by CursorPagination from DRF 3.14
+        self.request = request
+        self.total = None
+        if request.query_params.get('_total') == 'accurate':
+            self.total = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_page_size(self, request):
+        return get_page_size(request.query_params)
+
+    def get_paginated_response(self, data):
+        return Response(
+            searchset_bundle(
+                data,
+                links=[
+                    ('self', self.request.build_absolute_uri()),
+                    ('next', self.get_next_link()),
+                    ('previous', self.get_previous_link()),
+                ],
+                total=self.total,
+            )
+        )
+
+
+class HistoryPagination(BasePagination):
+    """
+    Paginate resource versions as history Bundles, newest first. Pages are
+    keyed by the `(published_at, pid)` of their last version instead of an
+    OFFSET, so a deep page costs the same as the first one given an index
+    on those columns.
+    """
+
+    cursor_query_param = '_cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = get_page_size(request.query_params)
+
+        queryset = queryset.order_by('-published_at', '-id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            published_at, pk = position
+            # The first condition bounds the index range scan, the second
+            # one breaks ties between versions published at the same time
+            queryset = queryset.filter(published_at__lte=published_at).filter(
+                Q(published_at__lt=published_at) | Q(id__lt=pk)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            published_at, pk = (
+                base64.urlsafe_b64decode(encoded.encode('ascii'))
+                .decode('ascii')
+                .rsplit(' ', 1)
+            )
+            published_at = parse_datetime(published_at)
+            pk = int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if published_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return published_at, pk
+
+    @staticmethod
+    def encode_position(published_at, pk) -> str:
+        position = '%s %d' % (published_at.isoformat(), pk)
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode()
+
+    def encode_cursor(self, instance):
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_position(instance.published_at, instance.pk),
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response(
+            make_bundle(
+                'history',
+                data,
+                links=[
+                    ('self', self.request.build_absolute_uri()),
+                    ('next', self.get_next_link()),
+                ],
+            )
+        )
@@ -0,0 +1,46 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import renderers
+from .encoders import loads
+
+
+class FHIRJSONParser(BaseParser):
+    """
+    JSON resources, decoded with rest_fhir.encoders so that decimals keep
+    their precision.
+    """
+
+    media_type = 'application/fhir+json'
+    renderer_class = renderers.FHIRJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class JSONParser(FHIRJSONParser):
+    media_type = 'application/json'
+    renderer_class = renderers.JSONRenderer
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline delimited JSON. The request stream is returned unread, so that
+    very large bodies can be consumed one line at a time.
+    """
+
+    media_type = 'application/fhir+ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
+
+
+class JSONPatchParser(JSONParser):
+    """
+    JSON Patch documents of the PATCH interaction.
+    """
+
+    media_type = 'application/json-patch+json'
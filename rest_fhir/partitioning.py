@@ -0,0 +1,277 @@
+"""
+Declarative partitioning of `fhir_resource` and `fhir_resource_ver` on
+PostgreSQL, see the `fhir_partition` and `fhir_create_partitions`
+commands.
+
+- `fhir_resource` is partitioned by LIST of `resource_type`: a partition
+  per hot resource type, the other types share a default partition. Type
+  level reads (`resource_type = %s`) only scan their partition.
+- `fhir_resource_ver` is partitioned either by RANGE of `published_at`,
+  a partition per month, so old history can be detached and archived; or
+  by HASH of `resource_id`, so the versions of a resource (the join of
+  Resource.version, vread, instance history) live in one partition.
+
+Primary keys and unique constraints of partitioned tables include the
+partition key: the logical id is only unique per resource type, and the
+`(resource_id, vid)` uniqueness of versions is dropped with RANGE
+partitioning (version ids are still allocated by a compare-and-swap on
+`fhir_resource`). Foreign keys to `fhir_resource` are dropped, Django
+cascades deletions itself.
+
+The functions below build the SQL from facts read from the database by
+the commands (constraint names, sequence, bounds).
+"""
+import re
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.utils import timezone
+
+from .models import Resource, ResourceVersion
+
+RESOURCE_TABLE = Resource._meta.db_table
+VERSION_TABLE = ResourceVersion._meta.db_table
+
+VERSION_SCHEMES = ('range', 'hash')
+
+RESOURCE_TYPE_RE = re.compile(r'^[A-Z][A-Za-z]{0,44}$')
+RANGE_PARTITION_RE = re.compile(
+    r'^%s_p(\d{4})_(\d{2})$' % re.escape(VERSION_TABLE)
+)
+
+
+def quote_name(name) -> str:
+    return '"%s"' % name.replace('"', '""')
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def month_start(value) -> date:
+    if isinstance(value, datetime):
+        value = timezone.localtime(value, timezone.utc).date()
+    return value.replace(day=1)
+
+
+def month_bounds(start, end) -> List[Tuple[date, date]]:
+    """
+    Bounds of the months from the one of `start` to the one of `end`.
+    """
+    month, last = month_start(start), month_start(end)
+    bounds = []
+    while month <= last:
+        bounds.append((month, add_months(month, 1)))
+        month = add_months(month, 1)
+    return bounds
+
+
+def resource_partition_name(resource_type=None) -> str:
+    if resource_type is None:
+        return '%s_default' % RESOURCE_TABLE
+    return '%s_%s' % (RESOURCE_TABLE, resource_type.lower())
+
+
+def range_partition_name(start: date) -> str:
+    return '%s_p%04d_%02d' % (VERSION_TABLE, start.year, start.month)
+
+
+def parse_range_partition_name(name) -> Optional[Tuple[date, date]]:
+    """
+    Bounds of a monthly partition of `fhir_resource_ver` from its name.
+    """
+    match = RANGE_PARTITION_RE.match(name)
+    if match is None:
+        return None
+    start = date(int(match.group(1)), int(match.group(2)), 1)
+    return start, add_months(start, 1)
+
+
+def range_bound(value: date) -> str:
+    return "'%s 00:00:00+00'" % value.isoformat()
+
+
+def validate_resource_types(resource_types):
+    for resource_type in resource_types:
+        if not RESOURCE_TYPE_RE.match(resource_type):
+            raise ValueError('Invalid resource type %r.' % resource_type)
+
+
+def replace_table_sql(table, partition_by) -> List[str]:
+    old = quote_name('%s_unpartitioned' % table)
+    return [
+        'ALTER TABLE %s RENAME TO %s' % (quote_name(table), old),
+        'CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING STORAGE) '
+        'PARTITION BY %s' % (quote_name(table), old, partition_by),
+    ]
+
+
+def copy_rows_sql(table) -> List[str]:
+    old = quote_name('%s_unpartitioned' % table)
+    return [
+        'INSERT INTO %s SELECT * FROM %s' % (quote_name(table), old),
+        'DROP TABLE %s' % old,
+    ]
+
+
+def partition_resources_sql(
+    resource_types: Iterable[str], foreign_keys: Iterable[Tuple[str, str]]
+) -> List[str]:
+    """
+    Statements replacing `fhir_resource` by a table partitioned by
+    resource type, with a partition for each of `resource_types` and a
+    default one. `foreign_keys` are the `(table, constraint)` of the
+    foreign keys to `fhir_resource`, dropped first.
+    """
+    resource_types = list(resource_types)
+    validate_resource_types(resource_types)
+
+    statements = [
+        'ALTER TABLE %s DROP CONSTRAINT %s'
+        % (quote_name(table), quote_name(constraint))
+        for table, constraint in foreign_keys
+    ]
+    statements += replace_table_sql(RESOURCE_TABLE, 'LIST (resource_type)')
+    statements += [
+        "CREATE TABLE %s PARTITION OF %s FOR VALUES IN ('%s')"
+        % (
+            quote_name(resource_partition_name(resource_type)),
+            quote_name(RESOURCE_TABLE),
+            resource_type,
+        )
+        for resource_type in resource_types
+    ]
+    statements.append(
+        'CREATE TABLE %s PARTITION OF %s DEFAULT'
+        % (quote_name(resource_partition_name()), quote_name(RESOURCE_TABLE))
+    )
+    statements += copy_rows_sql(RESOURCE_TABLE)
+    statements.append(
+        'ALTER TABLE %s ADD PRIMARY KEY (id, resource_type)'
+        % quote_name(RESOURCE_TABLE)
+    )
+    return statements
+
+
+def create_range_partition_sql(start: date, end: date) -> str:
+    return 'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%s) TO (%s)' % (
+        quote_name(range_partition_name(start)),
+        quote_name(VERSION_TABLE),
+        range_bound(start),
+        range_bound(end),
+    )
+
+
+def split_default_partition_sql(start: date, end: date) -> List[str]:
+    """
+    Statements creating the monthly partition `[start, end)` when the
+    default partition already has versions of that month: they are moved
+    to the new partition.
+    """
+    table = quote_name(VERSION_TABLE)
+    default = quote_name('%s_default' % VERSION_TABLE)
+    partition = quote_name(range_partition_name(start))
+    condition = 'published_at >= %s AND published_at < %s' % (
+        range_bound(start),
+        range_bound(end),
+    )
+    return [
+        'ALTER TABLE %s DETACH PARTITION %s' % (table, default),
+        create_range_partition_sql(start, end),
+        'INSERT INTO %s SELECT * FROM %s WHERE %s'
+        % (partition, default, condition),
+        'DELETE FROM %s WHERE %s' % (default, condition),
+        'ALTER TABLE %s ATTACH PARTITION %s DEFAULT' % (table, default),
+    ]
+
+
+def partition_versions_sql(
+    scheme,
+    sequence,
+    indexes: Iterable[str] = (),
+    months: Iterable[Tuple[date, date]] = (),
+    hash_partitions=16,
+) -> List[str]:
+    """
+    Statements replacing `fhir_resource_ver` by a table partitioned by
+    month of `published_at` (`months` are the bounds of the partitions,
+    others go to a default partition), or by hash of `resource_id`.
+    `sequence` is the sequence of the `pid` column, kept across the swap,
+    `indexes` the SQL of the indexes to recreate.
+    """
+    if scheme not in VERSION_SCHEMES:
+        raise ValueError('Unknown partitioning scheme %r.' % scheme)
+
+    table = quote_name(VERSION_TABLE)
+    statements = ['ALTER SEQUENCE %s OWNED BY NONE' % sequence]
+
+    if scheme == 'range':
+        statements += replace_table_sql(VERSION_TABLE, 'RANGE (published_at)')
+        statements += [
+            create_range_partition_sql(start, end) for start, end in months
+        ]
+        statements.append(
+            'CREATE TABLE %s PARTITION OF %s DEFAULT'
+            % (quote_name('%s_default' % VERSION_TABLE), table)
+        )
+        statements += copy_rows_sql(VERSION_TABLE)
+        statements += [
+            'ALTER TABLE %s ADD PRIMARY KEY (pid, published_at)' % table,
+            'CREATE INDEX %s ON %s (resource_id, vid)'
+            % (quote_name('%s_resource_vid' % VERSION_TABLE), table),
+        ]
+    else:
+        statements += replace_table_sql(VERSION_TABLE, 'HASH (resource_id)')
+        statements += [
+            'CREATE TABLE %s PARTITION OF %s '
+            'FOR VALUES WITH (MODULUS %d, REMAINDER %d)'
+            % (
+                quote_name('%s_h%02d' % (VERSION_TABLE, remainder)),
+                table,
+                hash_partitions,
+                remainder,
+            )
+            for remainder in range(hash_partitions)
+        ]
+        statements += copy_rows_sql(VERSION_TABLE)
+        statements += [
+            'ALTER TABLE %s ADD PRIMARY KEY (pid, resource_id)' % table,
+            'ALTER TABLE %s ADD CONSTRAINT %s UNIQUE (resource_id, vid)'
+            % (table, quote_name('%s_resource_vid_uniq' % VERSION_TABLE)),
+        ]
+
+    statements += list(indexes)
+    statements.append('ALTER SEQUENCE %s OWNED BY %s.pid' % (sequence, table))
+    return statements
+
+
+def is_partitioned(cursor, table) -> bool:
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def get_partitions(cursor, table) -> List[str]:
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+        [table],
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def has_current_versions(cursor, partition) -> bool:
+    """
+    Whether a partition of `fhir_resource_ver` holds the current version of
+    some resource. Detaching it would lose their content.
+    """
+    cursor.execute(
+        'SELECT 1 FROM %s v JOIN %s r ON r.id = v.resource_id '
+        'AND r.vid = v.vid LIMIT 1'
+        % (quote_name(partition), quote_name(RESOURCE_TABLE))
+    )
+    return cursor.fetchone() is not None
@@ -0,0 +1,356 @@
+"""
+JSON Patch (RFC 6902) of resource contents.
+https://www.hl7.org/fhir/http.html#patch
+
+A patch is applied in Python to a loaded content, or by PostgreSQL to the
+stored content of the previous version with `jsonb_set`, `jsonb_insert`
+and `#-`, so that the document doesn't travel to the application and back.
+"""
+import copy
+from collections import namedtuple
+from typing import Optional
+
+from django.db import NotSupportedError
+from django.db.models import BooleanField, Expression, JSONField
+
+from .encoders import dumps
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+# Operations PostgreSQL applies, and the number of them above which the
+# nested expressions get too large
+SQL_OPERATIONS = ('add', 'remove', 'replace', 'test')
+MAX_SQL_OPERATIONS = 8
+
+# Elements managed by the server
+PROTECTED_ELEMENTS = ('id', 'meta', 'resourceType')
+
+Operation = namedtuple('Operation', ['op', 'path', 'value', 'from_path'])
+
+
+class PatchError(ValueError):
+    """
+    Invalid patch, or a patch that does not apply to the content.
+    """
+
+
+def parse_pointer(pointer) -> tuple:
+    """
+    Reference tokens of a JSON Pointer (RFC 6901), e.g. `/name/0/family`.
+    """
+    if not isinstance(pointer, str) or (pointer and pointer[0] != '/'):
+        raise PatchError('Invalid JSON pointer %r.' % (pointer,))
+    if not pointer:
+        return ()
+    return tuple(
+        token.replace('~1', '/').replace('~0', '~')
+        for token in pointer[1:].split('/')
+    )
+
+
+def array_index(token) -> Optional[int]:
+    if token.isdigit() and (token == '0' or token[0] != '0'):
+        return int(token)
+    return None
+
+
+def make_pointer(path) -> str:
+    return ''.join(
+        '/' + str(token).replace('~', '~0').replace('/', '~1') for token in path
+    )
+
+
+def json_equal(a, b) -> bool:
+    # Unlike Python, JSON tells booleans from numbers
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(
+            json_equal(a[key], b[key]) for key in a
+        )
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(json_equal, a, b))
+    return a == b
+
+
+def get_value(document, path):
+    value = document
+    for token in path:
+        if isinstance(value, dict) and token in value:
+            value = value[token]
+            continue
+        if isinstance(value, list):
+            index = array_index(token)
+            if index is not None and index < len(value):
+                value = value[index]
+                continue
+        raise PatchError('Path /%s not found.' % '/'.join(path))
+    return value
+
+
+def add_value(document, path, value):
+    parent, token = get_value(document, path[:-1]), path[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+        return
+    if isinstance(parent, list):
+        index = len(parent) if token == '-' else array_index(token)
+        if index is not None and index <= len(parent):
+            parent.insert(index, value)
+            return
+    raise PatchError('Path /%s not found.' % '/'.join(path))
+
+
+def remove_value(document, path):
+    parent, token = get_value(document, path[:-1]), path[-1]
+    if isinstance(parent, dict) and token in parent:
+        return parent.pop(token)
+    if isinstance(parent, list):
+        index = array_index(token)
+        if index is not None and index < len(parent):
+            return parent.pop(index)
+    raise PatchError('Path /%s not found.' % '/'.join(path))
+
+
+def diff(source, target, path=()) -> list:
+    """
+    JSON Patch operations that turn `source` into `target`. Objects are
+    compared member by member and arrays item by item, once their common
+    leading and trailing items are left out. Other values are replaced.
+    """
+    if isinstance(source, dict) and isinstance(target, dict):
+        operations = [
+            {'op': 'remove', 'path': make_pointer(path + (key,))}
+            for key in source
+            if key not in target
+        ]
+        for key, value in target.items():
+            if key in source:
+                operations += diff(source[key], value, path + (key,))
+            else:
+                operations.append(
+                    {
+                        'op': 'add',
+                        'path': make_pointer(path + (key,)),
+                        'value': value,
+                    }
+                )
+        return operations
+
+    if isinstance(source, list) and isinstance(target, list):
+        start = 0
+        while start < min(len(source), len(target)) and json_equal(
+            source[start], target[start]
+        ):
+            start += 1
+        end = 0
+        while end < min(len(source), len(target)) - start and json_equal(
+            source[-end - 1], target[-end - 1]
+        ):
+            end += 1
+        removed = source[start : len(source) - end]
+        added = target[start : len(target) - end]
+
+        if len(removed) == len(added):
+            operations = []
+            for index, (item, value) in enumerate(zip(removed, added), start):
+                operations += diff(item, value, path + (index,))
+            return operations
+
+        return [
+            {'op': 'remove', 'path': make_pointer(path + (index,))}
+            for index in reversed(range(start, start + len(removed)))
+        ] + [
+            {'op': 'add', 'path': make_pointer(path + (index,)), 'value': value}
+            for index, value in enumerate(added, start)
+        ]
+
+    if json_equal(source, target):
+        return []
+    return [{'op': 'replace', 'path': make_pointer(path), 'value': target}]
+
+
+class JSONPatch:
+    def __init__(self, operations):
+        if not isinstance(operations, list) or not operations:
+            raise PatchError('A JSON Patch is a non empty array of operations.')
+        self.operations = [self.parse_operation(o) for o in operations]
+
+    @staticmethod
+    def parse_operation(operation) -> Operation:
+        if not isinstance(operation, dict) or operation.get('op') not in (
+            OPERATIONS
+        ):
+            raise PatchError('Invalid operation %r.' % (operation,))
+
+        op = operation['op']
+        path = parse_pointer(operation.get('path'))
+        from_path = None
+        if op in ('move', 'copy'):
+            from_path = parse_pointer(operation.get('from'))
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError('Operation %s requires a value.' % op)
+
+        changed = [path] if op != 'test' else []
+        if op == 'move':
+            changed.append(from_path)
+        for changed_path in changed:
+            if not changed_path or changed_path[0] in PROTECTED_ELEMENTS:
+                raise PatchError(
+                    'Path /%s can not be changed.' % '/'.join(changed_path)
+                )
+
+        return Operation(op, path, operation.get('value'), from_path)
+
+    @property
+    def elements(self) -> set:
+        """
+        Top level elements read or changed by the patch.
+        """
+        return {
+            path[0]
+            for operation in self.operations
+            for path in (operation.path, operation.from_path)
+            if path
+        }
+
+    def apply(self, document) -> dict:
+        """
+        Return a patched copy of `document`. Raises PatchError if an
+        operation does not apply.
+        """
+        document = copy.deepcopy(document)
+        for op, path, value, from_path in self.operations:
+            if op == 'add':
+                add_value(document, path, copy.deepcopy(value))
+            elif op == 'remove':
+                remove_value(document, path)
+            elif op == 'replace':
+                remove_value(document, path)
+                add_value(document, path, copy.deepcopy(value))
+            elif op == 'move':
+                if path[: len(from_path)] == from_path and path != from_path:
+                    raise PatchError('Can not move a value into itself.')
+                add_value(document, path, remove_value(document, from_path))
+            elif op == 'copy':
+                add_value(
+                    document,
+                    path,
+                    copy.deepcopy(get_value(document, from_path)),
+                )
+            elif not json_equal(get_value(document, path), value):
+                raise PatchError('Test of /%s failed.' % '/'.join(path))
+        return document
+
+    def can_apply_in_database(self, connection) -> bool:
+        return (
+            connection.vendor == 'postgresql'
+            and len(self.operations) <= MAX_SQL_OPERATIONS
+            and all(o.op in SQL_OPERATIONS for o in self.operations)
+        )
+
+    def as_postgresql(self, sql, params):
+        """
+        Return the SQL of the content `sql` patched by PostgreSQL, and the
+        SQL of a condition that is true when all the operations apply to
+        it. Each operation is checked against the content patched by the
+        previous ones.
+        """
+        params = list(params)
+        conditions = []
+        condition_params = []
+
+        for op, path, value, _from_path in self.operations:
+            if op == 'test':
+                conditions.append('(%s #> %%s::text[]) = %%s::jsonb' % sql)
+                condition_params += params + [list(path), dumps(value).decode()]
+                continue
+
+            if op in ('remove', 'replace'):
+                conditions.append('(%s #> %%s::text[]) IS NOT NULL' % sql)
+                condition_params += params + [list(path)]
+            elif path[-1] == '-' or array_index(path[-1]) is not None:
+                conditions.append(
+                    "jsonb_typeof(%s #> %%s::text[]) = 'array' AND "
+                    'jsonb_array_length(%s #> %%s::text[]) >= %%s' % (sql, sql)
+                )
+                condition_params += (
+                    params
+                    + [list(path[:-1])]
+                    + params
+                    + [list(path[:-1]), array_index(path[-1]) or 0]
+                )
+            else:
+                conditions.append(
+                    "jsonb_typeof(%s #> %%s::text[]) = 'object'" % sql
+                )
+                condition_params += params + [list(path[:-1])]
+
+            if op == 'remove':
+                sql = '(%s #- %%s::text[])' % sql
+                params = params + [list(path)]
+            elif op == 'replace':
+                sql = 'jsonb_set(%s, %%s::text[], %%s::jsonb, false)' % sql
+                params = params + [list(path), dumps(value).decode()]
+            elif path[-1] == '-':
+                # After the last element
+                sql = 'jsonb_insert(%s, %%s::text[], %%s::jsonb, true)' % sql
+                params = params + [
+                    list(path[:-1]) + ['-1'],
+                    dumps(value).decode(),
+                ]
+            elif array_index(path[-1]) is not None:
+                sql = 'jsonb_insert(%s, %%s::text[], %%s::jsonb)' % sql
+                params = params + [list(path), dumps(value).decode()]
+            else:
+                sql = 'jsonb_set(%s, %%s::text[], %%s::jsonb, true)' % sql
+                params = params + [list(path), dumps(value).decode()]
+
+        condition = ' AND '.join('(%s)' % c for c in conditions) or 'TRUE'
+        return sql, params, condition, condition_params
+
+
+class PatchedContent(Expression):
+    """
+    Content expression patched by the database. PostgreSQL only, see
+    JSONPatch.can_apply_in_database.
+    """
+
+    def __init__(self, content, patch: JSONPatch, output_field=None):
+        super().__init__(output_field=output_field or JSONField())
+        self.content = content
+        self.patch = patch
+
+    def get_source_expressions(self):
+        return [self.content]
+
+    def set_source_expressions(self, exprs):
+        [self.content] = exprs
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            'JSON Patch is applied in the database on PostgreSQL only.'
+        )
+
+    def as_postgresql(self, compiler, connection):
+        sql, params = compiler.compile(self.content)
+        sql, params, _condition, _condition_params = self.patch.as_postgresql(
+            sql, params
+        )
+        return sql, params
+
+
+class PatchApplies(PatchedContent):
+    """
+    Condition that all the operations of the patch apply to the content.
+    """
+
+    def __init__(self, content, patch: JSONPatch):
+        super().__init__(content, patch, output_field=BooleanField())
+
+    def as_postgresql(self, compiler, connection):
+        sql, params = compiler.compile(self.content)
+        _sql, _params, condition, condition_params = self.patch.as_postgresql(
+            sql, params
+        )
+        return condition, condition_params
@@ -0,0 +1,341 @@
+"""
+Subsets of resources returned for the `_summary` and `_elements` result
+parameters https://www.hl7.org/fhir/search.html#summary, on search, read
+and vread.
+
+Projections keep or drop top level elements only, so that the database
+computes them from the stored content (PostgreSQL, and SQLite 3.38 or
+later): reads fetch the requested elements, not the whole document. Other
+databases, and compressed contents, are projected after decoding.
+"""
+import re
+from typing import FrozenSet, Optional
+
+from rest_framework.exceptions import ParseError
+
+from django.db import NotSupportedError
+from django.db.models import Expression, JSONField
+from django.utils.translation import gettext_lazy as _
+
+from .settings import fhir_settings
+
+SUMMARY_MODES = ('true', 'text', 'data', 'count', 'false')
+
+# Tag of the resources returned with some of their elements only
+# https://www.hl7.org/fhir/search.html#summary
+SUBSETTED_TAG = {
+    'system': 'http://terminology.hl7.org/CodeSystem/v3-ObservationValue',
+    'code': 'SUBSETTED',
+}
+
+# Elements of the stored content that are always kept (the server
+# managed elements of `meta` are added to every representation)
+MANDATORY_ELEMENTS = frozenset(['resourceType', 'id', 'meta'])
+
+# Top level elements marked as summary in the R4 definitions of resource
+# types, in addition to those of Resource (`id`, `meta`, `implicitRules`).
+# Choice elements are named with their `[x]` suffix. Types missing here
+# are summarized by dropping the DomainResource elements that aren't
+# summary ones, see SUMMARY_EXCLUDED_ELEMENTS; the SUMMARY_ELEMENTS
+# setting adds or overrides types.
+SUMMARY_ELEMENTS = {
+    'Condition': (
+        'identifier',
+        'clinicalStatus',
+        'verificationStatus',
+        'severity',
+        'code',
+        'bodySite',
+        'subject',
+        'encounter',
+        'onset[x]',
+        'abatement[x]',
+        'recordedDate',
+        'recorder',
+        'asserter',
+    ),
+    'Encounter': (
+        'identifier',
+        'status',
+        'class',
+        'type',
+        'serviceType',
+        'subject',
+        'episodeOfCare',
+        'participant',
+        'appointment',
+        'reasonCode',
+        'reasonReference',
+        'diagnosis',
+    ),
+    'Observation': (
+        'identifier',
+        'basedOn',
+        'partOf',
+        'status',
+        'code',
+        'subject',
+        'focus',
+        'encounter',
+        'effective[x]',
+        'issued',
+        'performer',
+        'value[x]',
+        'hasMember',
+        'derivedFrom',
+        'component',
+    ),
+    'Organization': ('identifier', 'active', 'type', 'name', 'partOf'),
+    'Patient': (
+        'identifier',
+        'active',
+        'name',
+        'telecom',
+        'gender',
+        'birthDate',
+        'deceased[x]',
+        'address',
+        'managingOrganization',
+        'link',
+    ),
+    'Practitioner': (
+        'identifier',
+        'active',
+        'name',
+        'telecom',
+        'address',
+        'gender',
+        'birthDate',
+    ),
+}
+SUMMARY_EXCLUDED_ELEMENTS = ('text', 'contained', 'extension', 'language')
+
+# Top level elements with a minimum cardinality of 1, returned by
+# `_summary=text` and `_elements` whether they are requested or not
+REQUIRED_ELEMENTS = {
+    'Condition': ('subject',),
+    'Encounter': ('status', 'class'),
+    'Observation': ('status', 'code'),
+}
+
+ELEMENT_RE = re.compile(r'^([A-Za-z][A-Za-z0-9_]*)(\[x\])?$')
+
+
+class Projection:
+    """
+    Top level elements kept from resource contents: those in `keep` and
+    the choice elements named by `choices` (`value` for `value[x]`), or
+    when `keep` is None all but those in `drop`.
+    """
+
+    def __init__(
+        self,
+        keep: Optional[FrozenSet[str]] = None,
+        choices: FrozenSet[str] = frozenset(),
+        drop: FrozenSet[str] = frozenset(),
+    ):
+        self.keep = None if keep is None else keep | MANDATORY_ELEMENTS
+        self.choices = choices
+        self.drop = drop - MANDATORY_ELEMENTS
+
+    def __eq__(self, other):
+        return isinstance(other, Projection) and (
+            (self.keep, self.choices, self.drop)
+            == (other.keep, other.choices, other.drop)
+        )
+
+    def __repr__(self):
+        if self.keep is None:
+            return '<Projection drop=%s>' % sorted(self.drop)
+        return '<Projection keep=%s choices=%s>' % (
+            sorted(self.keep),
+            sorted(self.choices),
+        )
+
+    @classmethod
+    def from_elements(cls, elements):
+        """
+        Projection on `elements` names such as `name` or `value[x]`.
+        """
+        keep, choices = set(), set()
+        for element in elements:
+            name, choice = ELEMENT_RE.match(element).groups()
+            (choices if choice else keep).add(name)
+        return cls(keep=frozenset(keep), choices=frozenset(choices))
+
+    def includes(self, key: str) -> bool:
+        if key in MANDATORY_ELEMENTS:
+            return True
+        if self.keep is None:
+            return key not in self.drop
+        if key in self.keep:
+            return True
+        return any(
+            key.startswith(choice)
+            and key[len(choice) : len(choice) + 1].isupper()
+            for choice in self.choices
+        )
+
+    def apply(self, content: dict) -> dict:
+        return {
+            key: value for key, value in content.items() if self.includes(key)
+        }
+
+    def is_supported(self, connection) -> bool:
+        """
+        Whether the database of `connection` computes the projection, see
+        ProjectedContent.
+        """
+        if connection.vendor == 'postgresql':
+            return True
+        if connection.vendor == 'sqlite':
+            # The -> operator returns elements as written
+            return connection.Database.sqlite_version_info >= (3, 38, 0)
+        return False
+
+
+def get_summary_elements(resource_type):
+    summary_elements = {**SUMMARY_ELEMENTS, **fhir_settings.SUMMARY_ELEMENTS}
+    return summary_elements.get(resource_type)
+
+
+def get_projection(resource_type, query_params) -> Optional[Projection]:
+    """
+    Projection of the resources of `resource_type` requested by the
+    `_summary` or `_elements` parameter of `query_params`, None if whole
+    resources are requested. `_summary=count` applies to searches only
+    and isn't a projection.
+    """
+    summary = query_params.get('_summary', 'false')
+    if summary not in SUMMARY_MODES:
+        raise ParseError(_('Invalid _summary parameter: %s') % summary)
+
+    elements = query_params.get('_elements')
+    if elements is not None:
+        if summary != 'false':
+            raise ParseError(
+                _('The _summary and _elements parameters are exclusive.')
+            )
+        return Projection.from_elements(
+            [
+                *parse_elements(resource_type, elements),
+                *REQUIRED_ELEMENTS.get(resource_type, ()),
+            ]
+        )
+
+    if summary == 'true':
+        summary_elements = get_summary_elements(resource_type)
+        if summary_elements is None:
+            return Projection(drop=frozenset(SUMMARY_EXCLUDED_ELEMENTS))
+        return Projection.from_elements(['implicitRules', *summary_elements])
+    if summary == 'text':
+        return Projection.from_elements(
+            ['text', *REQUIRED_ELEMENTS.get(resource_type, ())]
+        )
+    if summary == 'data':
+        return Projection(drop=frozenset(['text']))
+    return None
+
+
+def parse_elements(resource_type, value):
+    """
+    Element names of an `_elements` parameter, optionally prefixed by the
+    resource type as in `Patient.name`.
+    """
+    elements = []
+    for element in value.split(','):
+        element = element.strip()
+        if element.startswith(resource_type + '.'):
+            element = element[len(resource_type) + 1 :]
+        if ELEMENT_RE.match(element) is None:
+            raise ParseError(_('Invalid _elements parameter: %s') % value)
+        elements.append(element)
+    return elements
+
+
+class ProjectedContent(Expression):
+    """
+    Content expression projected by the database, on PostgreSQL and
+    SQLite only, see Projection.is_supported. NULL for NULL contents.
+    """
+
+    def __init__(self, content, projection: Projection):
+        super().__init__(output_field=JSONField())
+        self.content = content
+        self.projection = projection
+
+    def get_source_expressions(self):
+        return [self.content]
+
+    def set_source_expressions(self, exprs):
+        [self.content] = exprs
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            'Projections are computed in the database on PostgreSQL and '
+            'SQLite only.'
+        )
+
+    def as_postgresql(self, compiler, connection):
+        sql, params = compiler.compile(self.content)
+        projection = self.projection
+        if projection.keep is None:
+            return '(%s - %%s::text[])' % sql, [
+                *params,
+                sorted(projection.drop),
+            ]
+
+        condition, condition_params = 'e.key = ANY(%s)', [
+            sorted(projection.keep)
+        ]
+        if projection.choices:
+            condition += ' OR e.key ~ %s'
+            condition_params.append(
+                '^(?:%s)[A-Z]' % '|'.join(sorted(projection.choices))
+            )
+        return (
+            '(SELECT jsonb_object_agg(e.key, e.value) FROM jsonb_each(%s) '
+            'AS e WHERE %s)' % (sql, condition),
+            [*params, *condition_params],
+        )
+
+    def as_sqlite(self, compiler, connection):
+        sql, params = compiler.compile(self.content)
+        projection = self.projection
+        if projection.keep is None:
+            paths = ['$."%s"' % key for key in sorted(projection.drop)]
+            return 'json_remove(%s, %s)' % (
+                sql,
+                ', '.join(['%s'] * len(paths)),
+            ), [*params, *paths]
+
+        # `->` returns elements as written: numbers keep their precision
+        # and booleans their type, unlike the values of json_each
+        if not projection.choices:
+            # Elements missing from the content are NULL members, which
+            # json_patch removes. Faster than the json_each scan below.
+            keys = ['id', *sorted(projection.keep - {'id'})]
+            members, members_params = [], []
+            for key in keys:
+                members.append('%%s, json(%s -> %%s)' % sql)
+                members_params += [key, *params, '$."%s"' % key]
+            return (
+                "CASE WHEN %s IS NULL THEN NULL ELSE json_patch('{}', "
+                'json_object(%s)) END' % (sql, ', '.join(members)),
+                [*params, *members_params],
+            )
+
+        keys = sorted(projection.keep)
+        conditions = ['e.key IN (%s)' % ', '.join(['%s'] * len(keys))]
+        conditions += ['e.key GLOB %s'] * len(projection.choices)
+        condition_params = [
+            *keys,
+            *('%s[A-Z]*' % choice for choice in sorted(projection.choices)),
+        ]
+        return (
+            'CASE WHEN %(c)s IS NULL THEN NULL ELSE ('
+            'SELECT json_group_object(e.key, json(%(c)s -> e.fullkey)) '
+            'FROM json_each(%(c)s) AS e WHERE %(w)s) END'
+            % {'c': sql, 'w': ' OR '.join(conditions)},
+            [*params, *params, *params, *condition_params],
+        )
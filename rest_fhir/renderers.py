@@ -0,0 +1,40 @@
+from rest_framework import renderers
+
+from .encoders import dumps, escape_line_separators
+from .instrumentation import timed
+from .serializers import RawResource
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    JSON renderer that writes already encoded resources unchanged, and
+    encodes the rest with rest_fhir.encoders. Indented when requested with
+    `_pretty=true`.
+    """
+
+    def get_indent(self, accepted_media_type, renderer_context):
+        request = renderer_context.get('request')
+        if (
+            request is not None
+            and request.query_params.get('_pretty') == 'true'
+        ):
+            return 2
+        return super().get_indent(accepted_media_type, renderer_context)
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if isinstance(data, RawResource):
+            if indent is None:
+                return data.raw
+            data = data.data
+
+        return escape_line_separators(dumps(data, indent))
+
+
+class FHIRJSONRenderer(JSONRenderer):
+    media_type = 'application/fhir+json'
@@ -0,0 +1,122 @@
+"""
+Read replicas. `ReplicaRouter` sends the queries of FHIR resources, their
+versions and search indexes to the REPLICA_DATABASES, and their writes to
+the PRIMARY_DATABASE:
+
+    DATABASE_ROUTERS = ['rest_fhir.routers.ReplicaRouter']
+    REST_FHIR = {'REPLICA_DATABASES': ['replica-1', 'replica-2']}
+
+Other models (export jobs, criteria locks, compression dictionaries) stay
+on the primary database.
+
+Replicas lag behind the primary, the FHIR views read their own writes
+nonetheless:
+- writes, and the reads following them in the same request, run on the
+  primary database (`use_primary`);
+- a client that wrote in the last REPLICA_MAX_LAG seconds carries a
+  cookie, its requests read from the primary database;
+- a resource, or version, missing from a replica or older than the
+  version the client presents (If-None-Match, If-Match), is looked up
+  again on the primary database (`FhirGenericAPIView.lookup_object`);
+- requests with a consistency token (see rest_fhir.indexer) read from
+  the primary database.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from rest_framework.permissions import SAFE_METHODS
+
+from .settings import fhir_settings
+
+CONSISTENCY_TOKEN_HEADER = 'X-Consistency-Token'
+
+_use_primary: ContextVar[bool] = ContextVar(
+    'rest_fhir_use_primary', default=False
+)
+
+
+@contextmanager
+def use_primary():
+    """
+    Route the reads of the current context to the primary database.
+    """
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def is_replica(alias) -> bool:
+    return alias in fhir_settings.REPLICA_DATABASES
+
+
+def is_resource_model(model) -> bool:
+    from .models import IndexingTask, Resource, ResourceVersion, SearchIndex
+
+    return issubclass(
+        model, (Resource, ResourceVersion, SearchIndex, IndexingTask)
+    )
+
+
+def requires_primary(request) -> bool:
+    """
+    Whether `request` must read from the primary database: it writes, or
+    its client wrote recently (see `mark_written`).
+    """
+    if not fhir_settings.REPLICA_DATABASES:
+        return False
+    if request.method not in SAFE_METHODS:
+        return True
+    if CONSISTENCY_TOKEN_HEADER in request.headers:
+        return True
+
+    try:
+        written_at = float(request.COOKIES[fhir_settings.REPLICA_COOKIE_NAME])
+    except (KeyError, ValueError):
+        return False
+    return time.time() - written_at < fhir_settings.REPLICA_MAX_LAG
+
+
+def mark_written(response):
+    """
+    Pin the next requests of the client to the primary database until the
+    replicas caught up with its write.
+    """
+    if not fhir_settings.REPLICA_DATABASES:
+        return
+    response.set_cookie(
+        fhir_settings.REPLICA_COOKIE_NAME,
+        '%.3f' % time.time(),
+        max_age=fhir_settings.REPLICA_MAX_LAG,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not is_resource_model(model):
+            return None
+        # Related objects come from the database of their instance, e.g.
+        # the version of a resource read again from the primary database
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        replicas = fhir_settings.REPLICA_DATABASES
+        if not replicas or _use_primary.get():
+            return fhir_settings.PRIMARY_DATABASE
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not is_resource_model(model):
+            return None
+        return fhir_settings.PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary database
+        if is_resource_model(type(obj1)) and is_resource_model(type(obj2)):
+            return True
+        return None
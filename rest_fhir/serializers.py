@@ -1,8 +1,77 @@
+import json
+import re
+from collections.abc import Mapping
+from typing import Optional
+
 from rest_framework import serializers
 
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from .models import Resource
+from .encoders import dumps, loads
+from .instrumentation import timed
+from .models import Resource, get_raw_content
+from .projection import SUBSETTED_TAG, Projection
+
+# Leading `id` element of the stored content, see normalize_resource_content
+LEADING_ID_RE = re.compile(r'\{\s*"id"\s*:\s*"([^"\\]*)"\s*([,}])')
+
+
+class RawResource(Mapping):
+    """
+    A resource representation already encoded as JSON. Renderers write the
+    bytes unchanged, the mapping interface decodes them on first use only.
+    """
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+
+    @cached_property
+    def data(self) -> dict:
+        return loads(self.raw)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '<RawResource %r>' % self.raw[:64]
+
+
+def splice_resource(raw: str, resource_id: str, meta: dict) -> Optional[str]:
+    """
+    Replace the leading `id` element of a stored document by the `id` and
+    `meta` elements of the representation, without decoding the rest of it.
+    Returns None if the document is not laid out as expected, or may have
+    a `meta` element of its own to merge.
+    """
+    if '"meta"' in raw:
+        return None
+    match = LEADING_ID_RE.match(raw)
+    if match is None or match.group(1) != resource_id:
+        return None
+
+    head = json.dumps(
+        {'id': resource_id, 'meta': meta},
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    if match.group(2) == '}':
+        return head
+    return head[:-1] + raw[match.end() - 1 :]
+
+
+def is_projected(instance) -> bool:
+    # NULL for the contents that are compressed or delta encoded
+    return (
+        getattr(instance, 'raw_projected', False)
+        and instance.raw_content is not None
+    )
 
 
 class MetaElementSerializer(serializers.Serializer):
@@ -25,12 +94,83 @@ class ResourceSerializer(serializers.Serializer):
     def run_validation(self, data):
         return data
 
+    @property
+    def projection(self) -> Optional[Projection]:
+        """
+        Projection of the `_summary` and `_elements` parameters, see
+        FhirGenericAPIView.get_projection.
+        """
+        return self.context.get('projection')
+
+    def get_content(self, instance) -> Optional[dict]:
+        """
+        Content of `instance`, projected by the database when it fetched
+        it so (see `with_raw_content`), after decoding otherwise.
+        """
+        if is_projected(instance):
+            return loads(instance.raw_content)
+
+        content = instance.resource_content
+        if content is not None and self.projection is not None:
+            content = self.projection.apply(content)
+        return content
+
+    def get_elements(self, instance, meta=None) -> dict:
+        """
+        The `id` and `meta` elements of the representation of `instance`,
+        `meta` adding the server managed elements to the stored ones.
+        """
+        elements = super().to_representation(instance)
+        if isinstance(meta, dict):
+            elements['meta'] = {**meta, **elements['meta']}
+        if self.projection is not None:
+            elements['meta']['tag'] = [
+                *elements['meta'].get('tag', []),
+                SUBSETTED_TAG,
+            ]
+        return elements
+
+    @timed('serialize')
     def to_representation(self, instance):
-        ret = instance.resource_content or dict()
-        ret.update(super().to_representation(instance))
+        ret = dict(self.get_content(instance) or {})
+        ret.update(self.get_elements(instance, ret.get('meta')))
         return ret
 
+    @timed('serialize')
+    def to_raw_representation(self, instance) -> Optional[RawResource]:
+        """
+        Representation of `instance` built from the JSON text of its content
+        (see get_raw_content, encoded when it isn't available). Returns None
+        if the content can't be spliced, or has to be projected.
+        """
+        if self.projection is not None and not is_projected(instance):
+            return None
+
+        raw = get_raw_content(instance)
+        if raw is None:
+            if instance.resource_content is None:
+                return None
+            raw = dumps(instance.resource_content).decode('utf-8')
+
+        elements = self.get_elements(instance)
+        raw = splice_resource(raw, elements['id'], elements['meta'])
+        if raw is None:
+            return None
+        return RawResource(raw.encode('utf-8'))
+
     def create(self, validated_data):
         resource = Resource()
         resource.save(resource_content=validated_data)
         return resource
+
+    async def acreate(self, validated_data):
+        resource = Resource()
+        await resource.asave(resource_content=validated_data)
+        return resource
+
+    def update(self, instance, validated_data):
+        instance.save(
+            resource_content=validated_data,
+            expected_version_id=self.context.get('expected_version_id'),
+        )
+        return instance
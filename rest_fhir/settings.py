@@ -0,0 +1,145 @@
+"""
+Settings for REST FHIR are all namespaced in the REST_FHIR setting.
+For example your project's `settings.py` file might look like this:
+
+REST_FHIR = {
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 600,
+}
+
+This module provides the `fhir_settings` object, that is used to access
+REST FHIR settings, checking for user settings first, then falling
+back to the defaults.
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+
+DEFAULTS = {
+    # Read-through cache of current resource versions. Disabled when the
+    # cache alias is None.
+    'CACHE_ALIAS': None,
+    'CACHE_TIMEOUT': 300,
+    'CACHE_KEY_PREFIX': 'fhir',
+    # Per resource type overrides of the cache settings above, e.g.
+    # {'Patient': {'ALIAS': 'fhir-patient', 'TIMEOUT': 60}}. REST FHIR
+    # doesn't count the entries of a type: its memory is bounded by giving
+    # it a cache alias of its own in CACHES, with the limits of that
+    # backend (OPTIONS MAX_ENTRIES of the local memory and database
+    # backends, maxmemory of a Redis instance, ...). A type mapped to an
+    # alias of None is never cached.
+    'CACHE_RESOURCE_TYPES': {},
+    # Bulk Data $export. Files are written under EXPORT_DIR (a directory
+    # of the system temporary directory when None). Jobs run on a thread
+    # pool of the web process unless EXPORT_ASYNC is False, and export up
+    # to EXPORT_MAX_WORKERS resource types in parallel.
+    'EXPORT_DIR': None,
+    'EXPORT_ASYNC': True,
+    'EXPORT_MAX_WORKERS': 4,
+    'EXPORT_CHUNK_SIZE': 2000,
+    # Search parameters indexed in addition to the built-in ones, as
+    # SearchParameter resources (only `code`, `type`, `expression` and
+    # `target` are used). Run the `fhir_reindex` command after a change.
+    'SEARCH_PARAMETERS': [],
+    # Delta encoded history. When set to N, a version is stored as a JSON
+    # Patch from the next one once it is replaced, except every N-th
+    # version which keeps its full content. The current version is always
+    # stored in full. Run the `fhir_compact_history` command after a
+    # change. Disabled when None.
+    'HISTORY_SNAPSHOT_INTERVAL': None,
+    # Compression of large contents. Versions whose JSON encoding is at
+    # least COMPRESSION_THRESHOLD bytes are stored compressed, with the
+    # COMPRESSION_CODEC ('zlib', or 'zstd' with the zstandard package) and
+    # the latest dictionary trained by the `fhir_train_compression`
+    # command. Smaller ones stay plain JSON. Compressed contents are read
+    # and patched by the application, never in the database. Disabled
+    # when None; 16384 keeps the bulk of the rows plain.
+    'COMPRESSION_THRESHOLD': None,
+    'COMPRESSION_CODEC': 'zlib',
+    # Keep a copy of the content of the current version on the resource
+    # rows, so that reads and searches don't join the version table, at
+    # the cost of writing each content twice. Resources last written while
+    # it was off are read with the join until the `fhir_copy_content`
+    # command copies theirs.
+    'DENORMALIZED_CONTENT': False,
+    # Write-behind search indexing, see rest_fhir.indexer. Writes enqueue
+    # the indexing of their version, written by the `fhir_index_worker`
+    # command in batches of INDEXING_BATCH_SIZE resources. Requests with a
+    # consistency token wait up to INDEXING_WAIT_TIMEOUT seconds for it.
+    'ASYNC_INDEXING': False,
+    'INDEXING_BATCH_SIZE': 500,
+    'INDEXING_WAIT_TIMEOUT': 10,
+    # Default and maximum `_count` of searchset Bundles, and maximum number
+    # of resources added to a page by `_include` and `_revinclude`
+    'SEARCH_PAGE_SIZE': 20,
+    'SEARCH_MAX_PAGE_SIZE': 1000,
+    'SEARCH_MAX_INCLUDES': 1000,
+    # Top level elements returned by `_summary=true`, by resource type, in
+    # addition to or instead of rest_fhir.projection.SUMMARY_ELEMENTS, e.g.
+    # {'Medication': ['identifier', 'code', 'status']}
+    'SUMMARY_ELEMENTS': {},
+    # rest_fhir.middleware.InstrumentationMiddleware: whether to add the
+    # Server-Timing header to responses, and the number of resource types
+    # labelled in the Prometheus metrics (the rest are labelled `other`)
+    'SERVER_TIMING': True,
+    'METRICS_MAX_RESOURCE_TYPES': 200,
+    # rest_fhir.routers.ReplicaRouter: database aliases of the primary and
+    # of its read replicas. Clients read from the primary for
+    # REPLICA_MAX_LAG seconds after a write, on a REPLICA_COOKIE_NAME
+    # cookie, so set it above the replication lag.
+    'PRIMARY_DATABASE': 'default',
+    'REPLICA_DATABASES': [],
+    'REPLICA_MAX_LAG': 10,
+    'REPLICA_COOKIE_NAME': 'fhir_written_at',
+    # rest_fhir.sharding.ShardRouter: database aliases of the shards, and
+    # the number of threads querying them for type and system level
+    # interactions. Changing the list changes the shard of most
+    # resources, they aren't moved.
+    'SHARD_DATABASES': [],
+    'SHARD_MAX_WORKERS': 8,
+}
+
+
+class FhirSettings:
+    def __init__(self, defaults=None):
+        self.defaults = defaults or DEFAULTS
+        self._cached_attrs = set()
+
+    @property
+    def user_settings(self):
+        if not hasattr(self, '_user_settings'):
+            self._user_settings = getattr(settings, 'REST_FHIR', {})
+        return self._user_settings
+
+    def __getattr__(self, attr):
+        if attr not in self.defaults:
+            raise AttributeError("Invalid REST FHIR setting: '%s'" % attr)
+
+        try:
+            # Check if present in user settings
+            val = self.user_settings[attr]
+        except KeyError:
+            # Fall back to defaults
+            val = self.defaults[attr]
+
+        # Cache the result
+        self._cached_attrs.add(attr)
+        setattr(self, attr, val)
+        return val
+
+    def reload(self):
+        for attr in self._cached_attrs:
+            delattr(self, attr)
+        self._cached_attrs.clear()
+        if hasattr(self, '_user_settings'):
+            delattr(self, '_user_settings')
+
+
+fhir_settings = FhirSettings(DEFAULTS)
+
+
+def reload_fhir_settings(*args, **kwargs):
+    if kwargs['setting'] == 'REST_FHIR':
+        fhir_settings.reload()
+
+
+setting_changed.connect(reload_fhir_settings)
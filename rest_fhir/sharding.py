@@ -0,0 +1,319 @@
+"""
+Hash sharding. Each resource, with its versions and search index rows,
+lives on one of the SHARD_DATABASES, chosen by a hash of its logical id:
+
+    DATABASE_ROUTERS = ['rest_fhir.sharding.ShardRouter']
+    REST_FHIR = {'SHARD_DATABASES': ['shard-0', 'shard-1', 'shard-2']}
+
+Requests with an id in their url (read, vread, update, patch, delete,
+instance history) are routed to the shard of that id (`use_shard`), and
+resources are written to their own shard. Type and system level requests
+(search, history, conditional interactions, batches) query every shard
+with a ShardedQuerySet: each shard is queried in a thread of a shared
+pool, and the results are merged on the ordering of the query.
+
+The shard of a resource depends on the number of shards: adding one means
+moving resources. Other models (export jobs, criteria locks, compression
+dictionaries) stay on the default database. Read replicas of shards are
+not supported.
+"""
+import heapq
+import threading
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar, copy_context
+from itertools import chain, islice
+from operator import attrgetter
+from typing import Any, Callable, Dict, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .routers import is_resource_model
+from .settings import fhir_settings
+
+_current_shard: ContextVar[Optional[str]] = ContextVar(
+    'rest_fhir_shard', default=None
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_sharded() -> bool:
+    return bool(fhir_settings.SHARD_DATABASES)
+
+
+def shard_for(resource_id) -> str:
+    """
+    Database alias of the shard of a logical id.
+    """
+    if not isinstance(resource_id, uuid.UUID):
+        resource_id = uuid.UUID(str(resource_id))
+    shards = fhir_settings.SHARD_DATABASES
+    return shards[zlib.crc32(resource_id.bytes) % len(shards)]
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Route the queries of the current context to the shard `alias`.
+    """
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def sharded(queryset, resource_id=None):
+    """
+    `queryset` on the shard of `resource_id`, or on every shard (as a
+    ShardedQuerySet) without one. Unchanged when there are no shards, or
+    when the current context is already routed to a shard.
+    """
+    if not is_sharded():
+        return queryset
+    if resource_id is not None:
+        return queryset.using(shard_for(resource_id))
+    if _current_shard.get() is not None:
+        return queryset
+    return ShardedQuerySet(
+        {
+            alias: queryset.using(alias)
+            for alias in fhir_settings.SHARD_DATABASES
+        }
+    )
+
+
+@contextmanager
+def atomic_shards():
+    """
+    Transaction over the default database and every shard. A failure rolls
+    back all of them, but there is no two-phase commit: a shard failing to
+    commit after another one did leaves the latter committed.
+    """
+    aliases = dict.fromkeys([DEFAULT_DB_ALIAS, *fhir_settings.SHARD_DATABASES])
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=fhir_settings.SHARD_MAX_WORKERS,
+                thread_name_prefix='fhir-shard',
+            )
+        return _executor
+
+
+def run_on_shard(func, alias):
+    try:
+        with use_shard(alias):
+            return func(alias)
+    finally:
+        # Like at the end of a request, honouring CONN_MAX_AGE
+        connections[alias].close_if_unusable_or_obsolete()
+
+
+def scatter(func: Callable[[str], Any], aliases=None) -> Dict[str, Any]:
+    """
+    Results of `func(alias)` for each shard, called in parallel threads
+    routed to their shard. Inside a transaction the calls run one after
+    the other in the current thread instead: other threads have their own
+    connections, which don't see the uncommitted writes.
+    """
+    aliases = list(aliases or fhir_settings.SHARD_DATABASES)
+    if len(aliases) == 1 or any(
+        connections[alias].in_atomic_block for alias in aliases
+    ):
+        results = {}
+        for alias in aliases:
+            with use_shard(alias):
+                results[alias] = func(alias)
+        return results
+
+    # Each call gets a copy of the current context (e.g. the timings of
+    # rest_fhir.instrumentation)
+    futures = {
+        alias: get_executor().submit(
+            copy_context().run, run_on_shard, func, alias
+        )
+        for alias in aliases
+    }
+    return {alias: future.result() for alias, future in futures.items()}
+
+
+class ShardedQuerySet:
+    """
+    The same queryset on each shard. Chained methods (`filter`,
+    `order_by`, ...) apply to every shard; evaluating it queries the shards
+    in parallel (see `scatter`) and merges their rows on the ordering of
+    the queryset. A slice `[start:stop]` fetches up to `stop` rows from
+    each shard.
+
+    Covers what views, pagination and search filters use of querysets.
+    """
+
+    CHAINED_METHODS = (
+        'all',
+        'annotate',
+        'defer',
+        'distinct',
+        'exclude',
+        'filter',
+        'only',
+        'order_by',
+        'prefetch_related',
+        'select_related',
+        'values',
+        'values_list',
+        'with_raw_content',
+    )
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+        self._result_cache = None
+
+    @property
+    def model(self):
+        return next(iter(self.querysets.values())).model
+
+    def __getattr__(self, name):
+        if name not in self.CHAINED_METHODS:
+            raise AttributeError(name)
+
+        def chained(*args, **kwargs):
+            return ShardedQuerySet(
+                {
+                    alias: getattr(queryset, name)(*args, **kwargs)
+                    for alias, queryset in self.querysets.items()
+                }
+            )
+
+        return chained
+
+    def __repr__(self):
+        return '<ShardedQuerySet %r>' % self.querysets
+
+    def get_merge_key(self):
+        """
+        Sort key and direction of the rows of the shards, from the
+        `order_by` of the queryset. None when rows aren't ordered.
+        """
+        queryset = next(iter(self.querysets.values()))
+        ordering = queryset.query.order_by
+        if not ordering or queryset.query.values_select:
+            return None
+
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) > 1:
+            raise ValueError(
+                'Sharded querysets are ordered in a single direction.'
+            )
+        return (
+            attrgetter(*[field.lstrip('-') for field in ordering]),
+            descending.pop(),
+        )
+
+    def merge(self, rows_by_shard):
+        merge_key = self.get_merge_key()
+        if merge_key is None:
+            return chain.from_iterable(rows_by_shard)
+        key, reverse = merge_key
+        return heapq.merge(*rows_by_shard, key=key, reverse=reverse)
+
+    def fetch(self, stop=None) -> list:
+        results = scatter(
+            lambda alias: list(self.querysets[alias][:stop])
+            if stop is not None
+            else list(self.querysets[alias]),
+            self.querysets,
+        )
+        return list(islice(self.merge(results.values()), stop))
+
+    def __getitem__(self, k):
+        if isinstance(k, int):
+            return self.fetch(k + 1)[k]
+        if k.step is not None:
+            raise ValueError('Sharded querysets are sliced without step.')
+        start = k.start or 0
+        if self._result_cache is not None:
+            return self._result_cache[start : k.stop]
+        return self.fetch(k.stop)[start:]
+
+    def __iter__(self):
+        if self._result_cache is None:
+            self._result_cache = self.fetch()
+        return iter(self._result_cache)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __bool__(self):
+        return bool(len(self))
+
+    def iterator(self, chunk_size=2000):
+        """
+        Stream the rows of the shards, one (server side) cursor per shard.
+        """
+        return self.merge(
+            [
+                queryset.iterator(chunk_size=chunk_size)
+                for queryset in self.querysets.values()
+            ]
+        )
+
+    def count(self) -> int:
+        return sum(
+            scatter(
+                lambda alias: self.querysets[alias].count(), self.querysets
+            ).values()
+        )
+
+    def exists(self) -> bool:
+        return any(
+            scatter(
+                lambda alias: self.querysets[alias].exists(), self.querysets
+            ).values()
+        )
+
+    def first(self):
+        rows = self[:1]
+        return rows[0] if rows else None
+
+
+def get_resource_id(instance):
+    """
+    Logical id of the resource of a model instance, without querying: it
+    is unset while a version or an index row is being built.
+    """
+    from .models import Resource
+
+    if isinstance(instance, Resource):
+        return instance.pk
+    return instance.__dict__.get('resource_id')
+
+
+class ShardRouter:
+    def db_for_read(self, model, **hints):
+        if not is_resource_model(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _current_shard.get()
+
+    def db_for_write(self, model, **hints):
+        if not is_resource_model(model) or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        resource_id = get_resource_id(instance) if instance else None
+        if resource_id is not None:
+            return shard_for(resource_id)
+        return _current_shard.get()
@@ -1,6 +1,16 @@
 from django.urls import path
 
-from .views import ReadUpdateDeleteAPIView, SearchCreateAPIView, VReadAPIView
+from .views import (
+    BatchTransactionAPIView,
+    ExportAPIView,
+    ExportFileAPIView,
+    ExportStatusAPIView,
+    HistoryAPIView,
+    ImportAPIView,
+    ReadUpdateDeleteAPIView,
+    SearchCreateAPIView,
+    VReadAPIView,
+)
 
 urlpatterns = [
     # Instance Level Interactions
@@ -14,6 +24,32 @@ urlpatterns = [
         VReadAPIView.as_view(),
         name='vread',
     ),
+    path(
+        '<str:type>/<uuid:id>/_history',
+        HistoryAPIView.as_view(),
+        name='instance-history',
+    ),
     # Type Level Interactions
     path('<str:type>/', SearchCreateAPIView.as_view(), name='search-create'),
+    path('<str:type>/_history', HistoryAPIView.as_view(), name='type-history'),
+    path('<str:type>/$export', ExportAPIView.as_view(), name='type-export'),
+    # Whole System Interactions
+    path('_history', HistoryAPIView.as_view(), name='system-history'),
+    path('$import', ImportAPIView.as_view(), name='import'),
+    path('$export', ExportAPIView.as_view(), name='export'),
+    path(
+        '$export-status/<uuid:job_id>',
+        ExportStatusAPIView.as_view(),
+        name='export-status',
+    ),
+    path(
+        '$export-file/<uuid:job_id>/<str:name>',
+        ExportFileAPIView.as_view(),
+        name='export-file',
+    ),
+    path(
+        '',
+        BatchTransactionAPIView.as_view(),
+        name='batch-transaction',
+    ),
 ]
@@ -1,23 +1,45 @@
-from . import generics, mixins, serializers
+from . import filters, generics, mixins, pagination, parsers, serializers
 from .models import Resource, ResourceVersion
+from .sharding import sharded
 
 
 class ReadUpdateDeleteAPIView(
     mixins.ReadResourceMixin,
+    mixins.UpdateResourceMixin,
+    mixins.PatchResourceMixin,
     mixins.DeleteResourceMixin,
     generics.FhirGenericAPIView,
 ):
     serializer_class = serializers.ResourceSerializer
+    parser_classes = [
+        *generics.FhirGenericAPIView.parser_classes,
+        parsers.JSONPatchParser,
+    ]
     lookup_field = 'id'
 
     def get_queryset(self):
-        return Resource.objects.select_related('version').filter(
-            resource_type=self.kwargs['type']
+        return (
+            Resource.objects.with_current_content()
+            .with_raw_content(self.get_projection())
+            .filter(resource_type=self.kwargs['type'])
         )
 
+    def get_metadata_queryset(self):
+        # No join to the version table, only the columns needed to build
+        # the ETag and Last-Modified validators
+        return Resource.objects.only(
+            'id', 'resource_type', 'version_id', 'updated_at', 'deleted_at'
+        ).filter(resource_type=self.kwargs['type'])
+
     def get(self, request, *args, **kwargs):
         return self.read(request, *args, **kwargs)
 
+    def put(self, request, *args, **kwargs):
+        return self.update(request, *args, **kwargs)
+
+    def patch(self, request, *args, **kwargs):
+        return self.patch_resource(request, *args, **kwargs)
+
     def delete(self, request, *args, **kwargs):
         return self.destroy(request, *args, **kwargs)
 
@@ -30,6 +52,19 @@ class VReadAPIView(mixins.VReadResourceMixin, generics.FhirGenericAPIView):
     def get_queryset(self):
         return (
             ResourceVersion.objects.select_related('resource')
+            .with_raw_content(self.get_projection())
+            .order_by('version_id')
+            .filter(
+                resource__resource_type=self.kwargs['type'],
+                resource_id=self.kwargs['id'],
+            )
+        )
+
+    def get_metadata_queryset(self):
+        return (
+            ResourceVersion.objects.defer(
+                'resource_content', 'resource_content_compressed'
+            )
             .order_by('version_id')
             .filter(
                 resource__resource_type=self.kwargs['type'],
@@ -41,10 +76,137 @@ class VReadAPIView(mixins.VReadResourceMixin, generics.FhirGenericAPIView):
         return self.vread(request, *args, **kwargs)
 
 
+class HistoryAPIView(mixins.HistoryResourceMixin, generics.FhirGenericAPIView):
+    """
+    History at instance (type and id in the url), type (type only) or
+    system level.
+    """
+
+    serializer_class = serializers.ResourceSerializer
+    pagination_class = pagination.HistoryPagination
+
+    def get_queryset(self):
+        queryset = ResourceVersion.objects.all()
+        if 'type' in self.kwargs:
+            queryset = queryset.filter(resource_type=self.kwargs['type'])
+        if 'id' in self.kwargs:
+            queryset = queryset.filter(resource_id=self.kwargs['id'])
+        return sharded(queryset)
+
+    def get(self, request, *args, **kwargs):
+        return self.history(request, *args, **kwargs)
+
+
 class SearchCreateAPIView(
-    mixins.CreateResourceMixin, generics.FhirGenericAPIView
+    mixins.SearchResourceMixin,
+    mixins.CreateResourceMixin,
+    mixins.UpdateResourceMixin,
+    mixins.DeleteResourceMixin,
+    generics.FhirGenericAPIView,
 ):
+    """
+    Type level interactions: search, create, and the conditional update
+    and delete of the resource matching the search criteria.
+    """
+
     serializer_class = serializers.ResourceSerializer
+    filter_backends = [filters.SearchParameterFilter]
+    pagination_class = pagination.SearchsetPagination
+
+    def get_queryset(self):
+        return sharded(
+            Resource.objects.with_current_content().filter(
+                resource_type=self.kwargs['type'], deleted_at__isnull=True
+            )
+        )
+
+    def get(self, request, *args, **kwargs):
+        return self.search(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
+
+    def put(self, request, *args, **kwargs):
+        return self.conditional_update(request, *args, **kwargs)
+
+    def delete(self, request, *args, **kwargs):
+        return self.conditional_destroy(request, *args, **kwargs)
+
+
+class BatchTransactionAPIView(
+    mixins.BatchTransactionMixin, generics.FhirGenericAPIView
+):
+    serializer_class = serializers.ResourceSerializer
+
+    def post(self, request, *args, **kwargs):
+        return self.batch_transaction(request, *args, **kwargs)
+
+
+class ImportAPIView(mixins.ImportResourcesMixin, generics.FhirGenericAPIView):
+    parser_classes = [parsers.NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        return self.import_resources(request, *args, **kwargs)
+
+
+class ExportAPIView(mixins.BulkExportMixin, generics.FhirGenericAPIView):
+    def get(self, request, *args, **kwargs):
+        return self.kick_off_export(request, *args, **kwargs)
+
+
+class ExportStatusAPIView(mixins.BulkExportMixin, generics.FhirGenericAPIView):
+    def get(self, request, *args, **kwargs):
+        return self.export_status(request, *args, **kwargs)
+
+    def delete(self, request, *args, **kwargs):
+        return self.cancel_export(request, *args, **kwargs)
+
+
+class ExportFileAPIView(mixins.BulkExportMixin, generics.FhirGenericAPIView):
+    def get(self, request, *args, **kwargs):
+        return self.export_file(request, *args, **kwargs)
+
+
+class AsyncReadUpdateDeleteAPIView(
+    mixins.AsyncReadResourceMixin,
+    mixins.AsyncDeleteResourceMixin,
+    ReadUpdateDeleteAPIView,
+    generics.AsyncFhirGenericAPIView,
+):
+    """
+    ReadUpdateDeleteAPIView for ASGI deployments, see rest_fhir.async_urls.
+    Updates and patches run in a thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aread(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await self.adestroy(request, *args, **kwargs)
+
+
+class AsyncVReadAPIView(
+    mixins.AsyncVReadResourceMixin,
+    VReadAPIView,
+    generics.AsyncFhirGenericAPIView,
+):
+    async def get(self, request, *args, **kwargs):
+        return await self.avread(request, *args, **kwargs)
+
+
+class AsyncSearchCreateAPIView(
+    mixins.AsyncCreateResourceMixin,
+    mixins.AsyncDeleteResourceMixin,
+    SearchCreateAPIView,
+    generics.AsyncFhirGenericAPIView,
+):
+    """
+    SearchCreateAPIView for ASGI deployments. Searches and conditional
+    updates run in a thread.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        return await self.acreate(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await self.aconditional_destroy(request, *args, **kwargs)
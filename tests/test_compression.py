@@ -0,0 +1,163 @@
+import io
+
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+
+from rest_fhir.compression import (
+    compress,
+    decompress,
+    dictionaries,
+    encode_content,
+    train_dictionary,
+)
+from rest_fhir.models import (
+    CompressionDictionary,
+    Resource,
+    ResourceVersion,
+    materialize_versions,
+)
+
+
+def make_observation(components):
+    return {
+        'resourceType': 'Observation',
+        'status': 'final',
+        'code': {'coding': [{'system': 'http://loinc.org', 'code': '1-8'}]},
+        'component': [
+            {
+                'code': {'text': 'component %d' % i},
+                'valueQuantity': {'value': i, 'unit': 'mg'},
+            }
+            for i in range(components)
+        ],
+    }
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        dictionaries.reset()
+        self.addCleanup(dictionaries.reset)
+
+    def test_documents_shall_decompress_with_their_dictionary(self):
+        samples = [
+            encode_content(make_observation(number)) for number in range(50)
+        ]
+        data = train_dictionary(samples)
+        self.assertIn(b'"system":"http://loinc.org"', data)
+
+        document = encode_content(make_observation(3))
+        compressed = compress(document)
+        dictionary = CompressionDictionary.objects.create(
+            codec='zlib', data=data
+        )
+        dictionaries.reset()
+        trained = compress(document)
+
+        self.assertLess(len(trained), len(compressed))
+        self.assertEqual(decompress(compressed), document)
+        self.assertEqual(decompress(trained), document)
+        self.assertEqual(trained[1:5], dictionary.pk.to_bytes(4, 'big'))
+
+    def test_train_command_shall_store_a_dictionary(self):
+        for number in range(10):
+            Resource().save(resource_content=make_observation(number))
+
+        out = io.StringIO()
+        call_command('fhir_train_compression', stdout=out)
+
+        dictionary = CompressionDictionary.objects.get()
+        self.assertEqual(dictionary.codec, 'zlib')
+        self.assertIn('Trained dictionary %d' % dictionary.pk, out.getvalue())
+        self.assertEqual(dictionaries.latest('zlib')[0], dictionary.pk)
+
+    def test_contents_shall_not_be_compressed_by_default(self):
+        resource = Resource()
+        resource.save(resource_content=make_observation(1000))
+
+        version = ResourceVersion.objects.get(resource_id=resource.id)
+        self.assertIsNone(version.resource_content_compressed)
+        self.assertEqual(len(version.resource_content['component']), 1000)
+
+
+@override_settings(REST_FHIR={'COMPRESSION_THRESHOLD': 1024})
+class CompressedContentTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_large_contents_shall_be_stored_compressed(self):
+        small = Resource()
+        small.save(resource_content=make_observation(2))
+        large = Resource()
+        large.save(resource_content=make_observation(100))
+
+        rows = dict(
+            ResourceVersion.objects.values_list(
+                'resource_id', 'resource_content'
+            )
+        )
+        self.assertEqual(
+            rows[small.id]['component'][1]['code']['text'], 'component 1'
+        )
+        self.assertIsNone(rows[large.id])
+        self.assertIsNotNone(large.version.resource_content_compressed)
+
+        resource = Resource.objects.select_related('version').get(id=large.id)
+        self.assertEqual(
+            resource.resource_content,
+            {'id': str(large.id), **make_observation(100)},
+        )
+
+    def test_compressed_resources_shall_be_read_and_updated(self):
+        resource = Resource()
+        resource.save(resource_content=make_observation(100))
+        url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Observation', 'id': str(resource.id)},
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['component']), 100)
+        self.assertEqual(response.data['meta']['versionId'], '1')
+
+        response = self.client.patch(
+            url,
+            '[{"op": "remove", "path": "/component/0"}]',
+            content_type='application/json-patch+json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            reverse(
+                'vread',
+                kwargs={
+                    'type': 'Observation',
+                    'id': str(resource.id),
+                    'vid': 1,
+                },
+            )
+        )
+        self.assertEqual(len(response.data['component']), 100)
+
+    @override_settings(
+        REST_FHIR={
+            'COMPRESSION_THRESHOLD': 1024,
+            'HISTORY_SNAPSHOT_INTERVAL': 2,
+        }
+    )
+    def test_delta_encoded_versions_shall_rebuild_from_compressed_ones(self):
+        resource = Resource()
+        for components in (100, 101, 102):
+            resource.save(resource_content=make_observation(components))
+
+        versions = list(resource.history.order_by('version_id'))
+        self.assertIsNotNone(versions[0].resource_delta)
+        self.assertIsNone(versions[0].resource_content_compressed)
+        self.assertIsNotNone(versions[1].resource_content_compressed)
+
+        materialize_versions(versions)
+        self.assertEqual(len(versions[0].resource_content['component']), 100)
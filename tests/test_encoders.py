@@ -0,0 +1,34 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from rest_fhir import encoders
+from rest_fhir.encoders import dumps, loads
+
+
+class EncodersTestCase(SimpleTestCase):
+    def test_decimals_shall_keep_their_precision(self):
+        data = b'{"value":1.50,"low":1.5,"high":3.141592653589793238,"n":7}'
+
+        for orjson in (encoders.orjson, None):
+            with mock.patch.object(encoders, 'orjson', orjson):
+                value = loads(data)
+                self.assertEqual(value['value'], Decimal('1.50'))
+                self.assertIs(type(value['low']), float)
+                self.assertIs(type(value['n']), int)
+                self.assertEqual(dumps(value), data)
+
+    def test_documents_shall_be_indented(self):
+        value = {'value': Decimal('1.50'), 'code': ['mg']}
+        expected = b'{\n  "value": 1.50,\n  "code": [\n    "mg"\n  ]\n}'
+
+        self.assertEqual(dumps(value, indent=2), expected)
+        self.assertEqual(
+            loads(dumps({'code': ['mg']}, indent=2)), {'code': ['mg']}
+        )
+
+    def test_invalid_documents_shall_raise_value_error(self):
+        for data in (b'{"value":', b'{"value":NaN}', b'[1.0'):
+            with self.assertRaises(ValueError):
+                loads(data)
@@ -0,0 +1,245 @@
+import io
+import json
+import os
+import tempfile
+import uuid
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase
+
+from rest_fhir.importer import ImportIssue, NDJSONImporter
+from rest_fhir.models import (
+    ReferenceIndex,
+    Resource,
+    ResourceVersion,
+    TokenIndex,
+)
+
+
+def ndjson(*resources):
+    return ''.join(
+        (json.dumps(resource) if isinstance(resource, dict) else resource)
+        + '\n'
+        for resource in resources
+    ).encode()
+
+
+class NDJSONImporterTestCase(TestCase):
+    def test_importer_shall_write_chunks_of_batch_size(self):
+        stream = io.BytesIO(
+            ndjson(
+                *[{'resourceType': 'Patient', 'id': str(i)} for i in range(5)]
+            )
+        )
+
+        chunks = list(NDJSONImporter(batch_size=2).run(stream))
+
+        self.assertEqual([chunk.created for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[-1].end, len(stream.getvalue()))
+        self.assertEqual(Resource.objects.count(), 5)
+        self.assertEqual(ResourceVersion.objects.count(), 5)
+
+        resource = Resource.objects.first()
+        self.assertEqual(resource.version_id, 1)
+        self.assertEqual(resource.resource_content['id'], str(resource.id))
+
+    def test_importer_shall_report_invalid_lines(self):
+        data = ndjson(
+            {'resourceType': 'Patient'},
+            '{"resourceType": ',
+            '[1, 2]',
+            {'resourceType': 'Observation'},
+        )
+
+        [chunk] = NDJSONImporter().run(io.BytesIO(data))
+
+        self.assertEqual(chunk.lines, 4)
+        self.assertEqual(chunk.created, 2)
+        self.assertEqual(
+            [issue.offset for issue in chunk.errors],
+            [data.index(b'{"resourceType": \n'), data.index(b'[1, 2]')],
+        )
+
+    def test_importer_shall_resume_from_offset(self):
+        data = ndjson({'resourceType': 'Patient'}, {'resourceType': 'Group'})
+        offset = data.index(b'\n') + 1
+
+        list(NDJSONImporter().run(io.BytesIO(data), offset=offset))
+
+        self.assertEqual(
+            list(Resource.objects.values_list('resource_type', flat=True)),
+            ['Group'],
+        )
+
+    def test_importer_shall_keep_the_uuid_ids_of_the_lines(self):
+        patient_id = str(uuid.uuid4())
+        data = ndjson(
+            {'resourceType': 'Patient', 'id': patient_id},
+            {
+                'resourceType': 'Observation',
+                'id': 'example',
+                'subject': {'reference': 'Patient/%s' % patient_id},
+            },
+        )
+
+        list(NDJSONImporter().run(io.BytesIO(data)))
+
+        patient = Resource.objects.get(resource_type='Patient')
+        self.assertEqual(str(patient.id), patient_id)
+        observation = Resource.objects.get(resource_type='Observation')
+        self.assertNotEqual(observation.resource_content['id'], 'example')
+        self.assertEqual(
+            ReferenceIndex.objects.get(
+                resource_id=observation.id, name='subject'
+            ).target_id,
+            patient_id,
+        )
+
+    def test_importing_a_file_again_shall_update_its_resources(self):
+        patient_id = str(uuid.uuid4())
+        data = ndjson(
+            {'resourceType': 'Patient', 'id': patient_id, 'gender': 'male'},
+            {'resourceType': 'Patient', 'id': patient_id, 'gender': 'female'},
+        )
+
+        [chunk] = NDJSONImporter().run(io.BytesIO(data))
+        self.assertEqual((chunk.created, chunk.updated), (1, 1))
+        [chunk] = NDJSONImporter().run(io.BytesIO(data))
+        self.assertEqual((chunk.created, chunk.updated), (0, 2))
+
+        resource = Resource.objects.get()
+        self.assertEqual(resource.version_id, 4)
+        self.assertEqual(resource.resource_content['gender'], 'female')
+        self.assertEqual(
+            TokenIndex.objects.get(resource_id=patient_id, name='gender').code,
+            'female',
+        )
+
+    def test_importer_shall_report_ids_of_another_resource_type(self):
+        patient_id = str(uuid.uuid4())
+        data = ndjson(
+            {'resourceType': 'Patient', 'id': patient_id},
+            {'resourceType': 'Group', 'id': patient_id},
+        )
+
+        [chunk] = NDJSONImporter().run(io.BytesIO(data))
+
+        self.assertEqual(chunk.created, 1)
+        [issue] = chunk.errors
+        self.assertEqual(issue.offset, data.index(b'{"resourceType": "Group"'))
+        self.assertEqual(Resource.objects.get().resource_type, 'Patient')
+
+    def test_importer_shall_report_the_lines_rejected_by_the_database(self):
+        data = ndjson(
+            {'resourceType': 'Patient'},
+            {'resourceType': 'Patient', 'gender': 'rejected'},
+            {'resourceType': 'Group'},
+        )
+        write_to = NDJSONImporter.write_to
+
+        def reject(importer, using, entries, ids):
+            if any(content.get('gender') for _offset, content in entries):
+                raise IntegrityError('rejected')
+            return write_to(importer, using, entries, ids)
+
+        with mock.patch.object(NDJSONImporter, 'write_to', reject):
+            [chunk] = NDJSONImporter().run(io.BytesIO(data))
+
+        self.assertEqual(chunk.created, 2)
+        self.assertEqual(
+            chunk.errors,
+            [
+                ImportIssue(
+                    data.index(b'{"resourceType": "Patient", "gender"'),
+                    'rejected',
+                )
+            ],
+        )
+        self.assertEqual(
+            sorted(Resource.objects.values_list('resource_type', flat=True)),
+            ['Group', 'Patient'],
+        )
+
+
+class ImportCommandTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'Patient.ndjson')
+        self.checkpoint = os.path.join(self.tmpdir.name, 'checkpoint')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_command_shall_checkpoint_and_resume(self):
+        data = ndjson(*[{'resourceType': 'Patient'} for _ in range(3)])
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+        call_command(
+            'fhir_import',
+            self.path,
+            batch_size=2,
+            checkpoint=self.checkpoint,
+            stdout=io.StringIO(),
+        )
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(int(f.read()), len(data))
+        self.assertEqual(Resource.objects.count(), 3)
+
+        # Lines appended to the file are the only ones imported on resume
+        with open(self.path, 'ab') as f:
+            f.write(ndjson({'resourceType': 'Group'}))
+
+        call_command(
+            'fhir_import',
+            self.path,
+            checkpoint=self.checkpoint,
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(Resource.objects.count(), 4)
+        self.assertEqual(
+            Resource.objects.filter(resource_type='Group').count(), 1
+        )
+
+    def test_command_shall_stop_before_a_chunk_it_failed_to_write(self):
+        data = ndjson(*[{'resourceType': 'Patient'} for _ in range(3)])
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        # End of the first chunk, of two lines
+        end = data.index(b'\n', data.index(b'\n') + 1) + 1
+        write_to = NDJSONImporter.write_to
+        calls = []
+
+        def fail_second_chunk(importer, using, entries, ids):
+            calls.append(entries)
+            if len(calls) == 2:
+                raise OperationalError('server closed the connection')
+            return write_to(importer, using, entries, ids)
+
+        with mock.patch.object(NDJSONImporter, 'write_to', fail_second_chunk):
+            with self.assertRaisesMessage(
+                CommandError, 'Import stopped at offset %d' % end
+            ):
+                call_command(
+                    'fhir_import',
+                    self.path,
+                    batch_size=2,
+                    checkpoint=self.checkpoint,
+                    stdout=io.StringIO(),
+                )
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(int(f.read()), end)
+        self.assertEqual(Resource.objects.count(), 2)
+
+        call_command(
+            'fhir_import',
+            self.path,
+            checkpoint=self.checkpoint,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Resource.objects.count(), 3)
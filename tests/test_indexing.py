@@ -0,0 +1,158 @@
+import io
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from rest_fhir.indexing import (
+    MAX_DATETIME,
+    extract_index_values,
+    parse_date_range,
+    search_parameters,
+)
+from rest_fhir.models import Resource, StringIndex, TokenIndex
+
+UTC = timezone.utc
+
+
+class ParseDateRangeTestCase(TestCase):
+    def test_range_shall_cover_the_precision_of_the_value(self):
+        self.assertEqual(
+            parse_date_range('2020'),
+            (
+                datetime(2020, 1, 1, tzinfo=UTC),
+                datetime(2020, 12, 31, 23, 59, 59, 999999, tzinfo=UTC),
+            ),
+        )
+        self.assertEqual(
+            parse_date_range('2020-02'),
+            (
+                datetime(2020, 2, 1, tzinfo=UTC),
+                datetime(2020, 2, 29, 23, 59, 59, 999999, tzinfo=UTC),
+            ),
+        )
+        low, high = parse_date_range('2020-02-03T10:00:00+02:00')
+        self.assertEqual(low, datetime(2020, 2, 3, 8, tzinfo=UTC))
+        self.assertEqual(
+            high, datetime(2020, 2, 3, 8, 0, 0, 999999, tzinfo=UTC)
+        )
+
+    def test_invalid_values_shall_not_be_parsed(self):
+        self.assertIsNone(parse_date_range('yesterday'))
+        self.assertIsNone(parse_date_range('2020-13'))
+        self.assertIsNone(parse_date_range(None))
+
+
+class ExtractIndexValuesTestCase(TestCase):
+    def test_values_shall_be_extracted_by_parameter_type(self):
+        values = extract_index_values(
+            'Observation',
+            {
+                'resourceType': 'Observation',
+                'status': 'final',
+                'code': {
+                    'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]
+                },
+                'subject': {'reference': 'Patient/123'},
+                'effectivePeriod': {'start': '2021-01-01'},
+                'valueQuantity': {
+                    'value': 72,
+                    'unit': 'beats/minute',
+                    'system': 'http://unitsofmeasure.org',
+                    'code': '/min',
+                },
+            },
+        )
+
+        self.assertEqual(
+            values['token'],
+            {('status', None, 'final'), ('code', 'http://loinc.org', '8867-4')},
+        )
+        self.assertEqual(
+            values['reference'],
+            {('subject', 'Patient', '123'), ('patient', 'Patient', '123')},
+        )
+        [(name, low, high)] = values['date']
+        self.assertEqual(low, datetime(2021, 1, 1, tzinfo=UTC))
+        self.assertEqual(high, MAX_DATETIME)
+        self.assertEqual(
+            values['quantity'],
+            {
+                (
+                    'value-quantity',
+                    72.0,
+                    'http://unitsofmeasure.org',
+                    '/min',
+                    'beats/minute',
+                )
+            },
+        )
+
+    def test_string_values_shall_be_normalized(self):
+        values = extract_index_values(
+            'Patient',
+            {
+                'resourceType': 'Patient',
+                'name': [{'family': 'Müller', 'given': ['Ana']}],
+            },
+        )
+
+        self.assertIn(('family', 'muller', 'Müller'), values['string'])
+        self.assertIn(('name', 'ana', 'Ana'), values['string'])
+
+    def test_reference_target_shall_restrict_values(self):
+        values = extract_index_values(
+            'Observation',
+            {
+                'resourceType': 'Observation',
+                'subject': {'reference': 'Group/1'},
+            },
+        )
+
+        self.assertEqual(values['reference'], {('subject', 'Group', '1')})
+
+
+class SearchParametersSettingTestCase(TestCase):
+    def test_custom_parameters_shall_be_indexed(self):
+        with override_settings(
+            REST_FHIR={
+                'SEARCH_PARAMETERS': [
+                    {
+                        'resourceType': 'SearchParameter',
+                        'code': 'breed',
+                        'type': 'token',
+                        'expression': 'Basic.extension.valueString',
+                    }
+                ]
+            }
+        ):
+            self.assertIsNotNone(search_parameters.get('Basic', 'breed'))
+            resource = Resource()
+            resource.save(
+                resource_content={
+                    'resourceType': 'Basic',
+                    'extension': [{'valueString': 'beagle'}],
+                }
+            )
+
+        self.assertIsNone(search_parameters.get('Basic', 'breed'))
+        self.assertTrue(
+            TokenIndex.objects.filter(name='breed', code='beagle').exists()
+        )
+
+    def test_reindex_command_shall_rebuild_index(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Patient',
+                'name': [{'text': 'A'}],
+            }
+        )
+        StringIndex.objects.all().delete()
+
+        call_command('fhir_reindex', stdout=io.StringIO())
+
+        self.assertEqual(
+            set(StringIndex.objects.values_list('resource_id', 'name')),
+            {(resource.id, 'name')},
+        )
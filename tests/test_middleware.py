@@ -0,0 +1,116 @@
+import re
+from unittest import skipIf
+
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import include, path
+
+from rest_fhir import metrics
+from rest_fhir.instrumentation import RequestTimings
+from rest_fhir.models import Resource
+
+MIDDLEWARE = ['rest_fhir.middleware.InstrumentationMiddleware']
+
+SERVER_TIMING_RE = re.compile(r'([a-z]+);dur=([0-9.]+)(?:;desc="([^"]*)")?')
+
+
+def parse_server_timing(value) -> dict:
+    return {
+        name: (float(duration), desc)
+        for name, duration, desc in SERVER_TIMING_RE.findall(value)
+    }
+
+
+@override_settings(MIDDLEWARE=MIDDLEWARE)
+class InstrumentationMiddlewareTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+        path('fhir-async/', include('rest_fhir.async_urls')),
+        path('health', lambda request: HttpResponse('ok')),
+    ]
+
+    def setUp(self):
+        self.resource = Resource()
+        self.resource.save(
+            resource_content={'resourceType': 'Patient', 'gender': 'male'}
+        )
+        self.url = '/fhir/Patient/%s/' % self.resource.id
+
+    def test_server_timing_shall_break_read_down(self):
+        response = self.client.get(self.url)
+
+        timings = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(list(timings), ['db', 'serialize', 'render', 'total'])
+        self.assertEqual(timings['db'][1], '1 queries')
+        self.assertGreaterEqual(
+            timings['total'][0],
+            timings['db'][0] + timings['render'][0],
+        )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='W/"1"')
+
+        self.assertEqual(response.status_code, 304)
+        timings = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(list(timings), ['db', 'precondition', 'total'])
+
+    def test_server_timing_shall_count_queries_of_async_views(self):
+        response = self.client.get('/fhir-async/Patient/%s/' % self.resource.id)
+
+        timings = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(timings['db'][1], '1 queries')
+
+    def test_other_views_and_disabled_header_shall_be_left_alone(self):
+        self.assertFalse(self.client.get('/health').has_header('Server-Timing'))
+
+        with override_settings(
+            MIDDLEWARE=MIDDLEWARE, REST_FHIR={'SERVER_TIMING': False}
+        ):
+            response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@skipIf(metrics.prometheus_client is None, 'prometheus_client is required')
+class InteractionMetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.prometheus_client.CollectorRegistry()
+        self.metrics = metrics.InteractionMetrics(registry=self.registry)
+
+    def sample(self, name, **labels):
+        return self.registry.get_sample_value(name, labels)
+
+    @override_settings(REST_FHIR={'METRICS_MAX_RESOURCE_TYPES': 1})
+    def test_observe(self):
+        timings = RequestTimings()
+        timings.queries = 2
+        timings.add('db', 0.002)
+
+        self.metrics.observe('read', 'Patient', 0.004, timings)
+        self.metrics.observe('read', 'Observation', 0.004, timings)
+
+        labels = {'interaction': 'read', 'resource_type': 'Patient'}
+        self.assertEqual(
+            self.sample('fhir_interaction_duration_seconds_count', **labels),
+            1,
+        )
+        self.assertEqual(
+            self.sample('fhir_interaction_queries_sum', **labels), 2
+        )
+        self.assertEqual(
+            self.sample(
+                'fhir_interaction_phase_duration_seconds_sum',
+                phase='db',
+                **labels,
+            ),
+            0.002,
+        )
+        # Beyond METRICS_MAX_RESOURCE_TYPES
+        self.assertEqual(
+            self.sample(
+                'fhir_interaction_duration_seconds_count',
+                interaction='read',
+                resource_type='other',
+            ),
+            1,
+        )
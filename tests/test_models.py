@@ -1,6 +1,17 @@
-from django.test import TestCase
+import io
+import uuid
+from importlib import import_module
 
-from rest_fhir.models import Resource
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from rest_fhir.models import (
+    DateIndex,
+    Resource,
+    ResourceVersion,
+    TokenIndex,
+    materialize_versions,
+)
 
 
 class ResourceTestCase(TestCase):
@@ -108,3 +119,220 @@ class ResourceTestCase(TestCase):
         self.assertIsNotNone(deleted_version.deleted_at)
         self.assertIsNone(deleted_version.resource_content)
         self.assertIsNotNone(resource.deleted_at, deleted_version.deleted_at)
+
+    def test_normalization_shall_keep_client_meta_elements(self):
+        migration = import_module(
+            'rest_fhir.migrations.0002_normalize_resource_content'
+        )
+        resource_id = uuid.uuid4()
+        content = {
+            'resourceType': 'Patient',
+            'id': 'client-id',
+            'meta': {
+                'versionId': '3',
+                'lastUpdated': '2021-01-01T00:00:00Z',
+                'security': [{'code': 'R'}],
+            },
+        }
+
+        self.assertEqual(
+            migration.normalize_content(resource_id, content),
+            {
+                'id': str(resource_id),
+                'meta': {'security': [{'code': 'R'}]},
+                'resourceType': 'Patient',
+            },
+        )
+        del content['meta']['security']
+        self.assertEqual(
+            list(migration.normalize_content(resource_id, content)),
+            ['id', 'resourceType'],
+        )
+
+    def test_create_resource_shall_write_two_statements(self):
+        resource = Resource()
+
+        with self.assertNumQueries(2) as ctx:
+            resource.save(resource_content={'resourceType': 'Patient'})
+
+        [insert_resource, insert_version] = ctx.captured_queries
+        self.assertTrue(
+            insert_resource['sql'].startswith('INSERT INTO "fhir_resource"')
+        )
+        self.assertTrue(
+            insert_version['sql'].startswith('INSERT INTO "fhir_resource_ver"')
+        )
+        self.assertEqual(resource.published_at, resource.updated_at)
+        self.assertEqual(resource.updated_at, resource.version.published_at)
+
+    def test_update_and_delete_resource_shall_write_two_statements(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        with self.assertNumQueries(2):
+            resource.save(
+                resource_content={'resourceType': 'Patient', 'text': {}}
+            )
+
+        with self.assertNumQueries(2):
+            resource.delete()
+
+        resource.refresh_from_db()
+        self.assertEqual(resource.version_id, 3)
+        self.assertEqual(resource.updated_at, resource.deleted_at)
+
+    def test_write_shall_only_rewrite_changed_search_index_tables(self):
+        resource = Resource()
+        resource.save(
+            resource_content={'resourceType': 'Patient', 'gender': 'male'}
+        )
+
+        # Token values are unchanged, only the date index is written
+        with self.assertNumQueries(3) as ctx:
+            resource.save(
+                resource_content={
+                    'resourceType': 'Patient',
+                    'gender': 'male',
+                    'birthDate': '1970',
+                }
+            )
+
+        self.assertTrue(
+            ctx.captured_queries[2]['sql'].startswith(
+                'INSERT INTO "fhir_idx_date"'
+            )
+        )
+        self.assertEqual(
+            list(TokenIndex.objects.values_list('name', 'code')),
+            [('gender', 'male')],
+        )
+
+        with self.assertNumQueries(4):
+            resource.delete()
+
+        self.assertFalse(TokenIndex.objects.exists())
+        self.assertFalse(DateIndex.objects.exists())
+
+    def test_write_shall_clear_search_index_of_loaded_resource(self):
+        resource = Resource()
+        resource.save(
+            resource_content={'resourceType': 'Patient', 'gender': 'male'}
+        )
+        resource = (
+            Resource.objects.defer('version__resource_content')
+            .select_related('version')
+            .get(pk=resource.pk)
+        )
+
+        resource.save(
+            resource_content={'resourceType': 'Patient', 'gender': 'female'}
+        )
+
+        self.assertEqual(
+            list(TokenIndex.objects.values_list('name', 'code')),
+            [('gender', 'female')],
+        )
+
+
+def write_versions(resource, count):
+    contents = [
+        {
+            'resourceType': 'Observation',
+            'status': 'final',
+            'component': [{'valueInteger': i} for i in range(number)],
+        }
+        for number in range(1, count + 1)
+    ]
+    for content in contents:
+        resource.save(resource_content=content)
+    return [
+        {'id': str(resource.id), **content, 'resourceType': 'Observation'}
+        for content in contents
+    ]
+
+
+@override_settings(REST_FHIR={'HISTORY_SNAPSHOT_INTERVAL': 3})
+class DeltaHistoryTestCase(TestCase):
+    def get_versions(self, resource):
+        return list(
+            ResourceVersion.objects.filter(resource=resource).order_by(
+                'version_id'
+            )
+        )
+
+    def test_past_versions_shall_be_stored_as_deltas(self):
+        resource = Resource()
+        contents = write_versions(resource, 7)
+
+        versions = self.get_versions(resource)
+        # Every third version and the current one keep their content
+        self.assertEqual(
+            [version.resource_content is None for version in versions],
+            [True, True, False, True, True, False, False],
+        )
+        self.assertEqual(
+            versions[4].resource_delta,
+            [{'op': 'remove', 'path': '/component/5'}],
+        )
+
+        # One query for the versions of the resource
+        with self.assertNumQueries(1):
+            materialize_versions(versions)
+        self.assertEqual(
+            [version.resource_content for version in versions], contents
+        )
+
+    def test_unchanged_version_shall_be_stored_as_empty_delta(self):
+        resource = Resource()
+        [content] = write_versions(resource, 1)
+        write_versions(resource, 1)
+
+        [version, _current] = self.get_versions(resource)
+        self.assertEqual(version.resource_delta, [])
+        materialize_versions([version])
+        self.assertEqual(version.resource_content, content)
+
+    def test_version_before_a_delete_shall_keep_its_content(self):
+        resource = Resource()
+        write_versions(resource, 2)
+        resource.delete()
+        write_versions(resource, 1)
+
+        versions = self.get_versions(resource)
+        self.assertEqual(
+            [version.resource_delta is None for version in versions],
+            [False, True, True, True],
+        )
+
+    def test_compact_history_shall_encode_existing_versions(self):
+        resource = Resource()
+        with override_settings(REST_FHIR={}):
+            contents = write_versions(resource, 5)
+        self.assertFalse(
+            ResourceVersion.objects.filter(
+                resource_delta__isnull=False
+            ).exists()
+        )
+
+        call_command('fhir_compact_history', stdout=io.StringIO())
+
+        versions = self.get_versions(resource)
+        self.assertEqual(
+            [version.resource_delta is None for version in versions],
+            [False, False, True, False, True],
+        )
+        materialize_versions(versions)
+        self.assertEqual(
+            [version.resource_content for version in versions], contents
+        )
+
+        # And decode it when delta encoding is disabled
+        with override_settings(REST_FHIR={}):
+            call_command('fhir_compact_history', stdout=io.StringIO())
+        self.assertEqual(
+            [
+                version.resource_content
+                for version in self.get_versions(resource)
+            ],
+            contents,
+        )
@@ -0,0 +1,138 @@
+from datetime import date, datetime, timezone
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from rest_fhir.partitioning import (
+    month_bounds,
+    parse_range_partition_name,
+    partition_resources_sql,
+    partition_versions_sql,
+    range_partition_name,
+    split_default_partition_sql,
+)
+
+
+class PartitioningSQLTestCase(SimpleTestCase):
+    def test_month_bounds_shall_cover_both_ends(self):
+        bounds = month_bounds(
+            datetime(2025, 11, 17, 23, tzinfo=timezone.utc), date(2026, 2, 1)
+        )
+        self.assertEqual(
+            bounds,
+            [
+                (date(2025, 11, 1), date(2025, 12, 1)),
+                (date(2025, 12, 1), date(2026, 1, 1)),
+                (date(2026, 1, 1), date(2026, 2, 1)),
+                (date(2026, 2, 1), date(2026, 3, 1)),
+            ],
+        )
+        name = range_partition_name(date(2025, 12, 1))
+        self.assertEqual(name, 'fhir_resource_ver_p2025_12')
+        self.assertEqual(
+            parse_range_partition_name(name),
+            (date(2025, 12, 1), date(2026, 1, 1)),
+        )
+        self.assertIsNone(parse_range_partition_name('fhir_resource_ver_h01'))
+
+    def test_resources_shall_be_listed_by_type(self):
+        statements = partition_resources_sql(
+            ['Patient', 'Observation'],
+            [('fhir_resource_ver', 'fhir_resource_ver_resource_id_fk')],
+        )
+
+        self.assertEqual(
+            statements[0],
+            'ALTER TABLE "fhir_resource_ver" '
+            'DROP CONSTRAINT "fhir_resource_ver_resource_id_fk"',
+        )
+        self.assertIn(
+            'CREATE TABLE "fhir_resource" (LIKE "fhir_resource_unpartitioned" '
+            'INCLUDING DEFAULTS INCLUDING STORAGE) '
+            'PARTITION BY LIST (resource_type)',
+            statements,
+        )
+        self.assertIn(
+            'CREATE TABLE "fhir_resource_patient" PARTITION OF '
+            '"fhir_resource" FOR VALUES IN (\'Patient\')',
+            statements,
+        )
+        self.assertIn(
+            'CREATE TABLE "fhir_resource_default" PARTITION OF '
+            '"fhir_resource" DEFAULT',
+            statements,
+        )
+        self.assertEqual(
+            statements[-1],
+            'ALTER TABLE "fhir_resource" ADD PRIMARY KEY (id, resource_type)',
+        )
+
+        with self.assertRaises(ValueError):
+            partition_resources_sql(["Patient') OR ('1"], [])
+
+    def test_versions_shall_be_partitioned_by_month_or_hash(self):
+        statements = partition_versions_sql(
+            'range',
+            'fhir_resource_ver_pid_seq',
+            indexes=['CREATE INDEX "fhir_resource_ver_history" ...'],
+            months=month_bounds(date(2026, 1, 1), date(2026, 2, 1)),
+        )
+        self.assertEqual(
+            statements[0],
+            'ALTER SEQUENCE fhir_resource_ver_pid_seq OWNED BY NONE',
+        )
+        self.assertIn(
+            'CREATE TABLE "fhir_resource_ver_p2026_02" PARTITION OF '
+            '"fhir_resource_ver" FOR VALUES FROM '
+            "('2026-02-01 00:00:00+00') TO ('2026-03-01 00:00:00+00')",
+            statements,
+        )
+        self.assertIn(
+            'ALTER TABLE "fhir_resource_ver" ADD PRIMARY KEY (pid, published_at)',
+            statements,
+        )
+        self.assertIn(
+            'CREATE INDEX "fhir_resource_ver_history" ...', statements
+        )
+        self.assertEqual(
+            statements[-1],
+            'ALTER SEQUENCE fhir_resource_ver_pid_seq '
+            'OWNED BY "fhir_resource_ver".pid',
+        )
+
+        statements = partition_versions_sql(
+            'hash', 'fhir_resource_ver_pid_seq', hash_partitions=4
+        )
+        self.assertIn(
+            'CREATE TABLE "fhir_resource_ver_h03" PARTITION OF '
+            '"fhir_resource_ver" FOR VALUES WITH (MODULUS 4, REMAINDER 3)',
+            statements,
+        )
+        self.assertIn(
+            'ALTER TABLE "fhir_resource_ver" ADD CONSTRAINT '
+            '"fhir_resource_ver_resource_vid_uniq" UNIQUE (resource_id, vid)',
+            statements,
+        )
+
+    def test_new_month_shall_move_rows_out_of_the_default_partition(self):
+        statements = split_default_partition_sql(
+            date(2026, 3, 1), date(2026, 4, 1)
+        )
+        self.assertEqual(
+            [statement.split(' ', 2)[:2] for statement in statements],
+            [
+                ['ALTER', 'TABLE'],
+                ['CREATE', 'TABLE'],
+                ['INSERT', 'INTO'],
+                ['DELETE', 'FROM'],
+                ['ALTER', 'TABLE'],
+            ],
+        )
+        self.assertTrue(statements[-1].endswith('DEFAULT'))
+
+
+class PartitioningCommandTestCase(TestCase):
+    def test_commands_shall_require_postgresql(self):
+        for command in ('fhir_partition', 'fhir_create_partitions'):
+            with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+                call_command(command)
@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase
+
+from rest_fhir.patch import JSONPatch, PatchError, parse_pointer
+
+PATIENT = {
+    'resourceType': 'Patient',
+    'id': 'example',
+    'active': True,
+    'name': [{'family': 'Chalmers', 'given': ['Peter', 'James']}],
+}
+
+
+class JSONPatchTestCase(SimpleTestCase):
+    def test_pointer_shall_unescape_reference_tokens(self):
+        self.assertEqual(parse_pointer(''), ())
+        self.assertEqual(parse_pointer('/a~1b/m~0n/0'), ('a/b', 'm~n', '0'))
+        with self.assertRaises(PatchError):
+            parse_pointer('name')
+
+    def test_patch_shall_apply_operations_in_order(self):
+        patch = JSONPatch(
+            [
+                {'op': 'test', 'path': '/active', 'value': True},
+                {'op': 'replace', 'path': '/active', 'value': False},
+                {'op': 'add', 'path': '/name/0/given/-', 'value': 'Jim'},
+                {'op': 'add', 'path': '/name/0/given/0', 'value': 'Pete'},
+                {'op': 'remove', 'path': '/name/0/given/1'},
+                {'op': 'copy', 'from': '/name/0', 'path': '/name/-'},
+                {'op': 'move', 'from': '/active', 'path': '/deceased'},
+            ]
+        )
+
+        self.assertEqual(
+            patch.apply(PATIENT),
+            {
+                'resourceType': 'Patient',
+                'id': 'example',
+                'deceased': False,
+                'name': [
+                    {'family': 'Chalmers', 'given': ['Pete', 'James', 'Jim']},
+                    {'family': 'Chalmers', 'given': ['Pete', 'James', 'Jim']},
+                ],
+            },
+        )
+        # The document is left untouched
+        self.assertEqual(PATIENT['name'][0]['given'], ['Peter', 'James'])
+        self.assertEqual(patch.elements, {'active', 'name', 'deceased'})
+
+    def test_patch_shall_fail_when_an_operation_does_not_apply(self):
+        for operation in (
+            {'op': 'test', 'path': '/active', 'value': 1},
+            {'op': 'replace', 'path': '/gender', 'value': 'male'},
+            {'op': 'remove', 'path': '/name/1'},
+            {'op': 'add', 'path': '/name/2', 'value': {}},
+            {'op': 'add', 'path': '/contact/0/name', 'value': {}},
+            {'op': 'move', 'from': '/name', 'path': '/name/0/text'},
+        ):
+            with self.assertRaises(PatchError, msg=operation):
+                JSONPatch([operation]).apply(PATIENT)
+
+    def test_patch_shall_reject_invalid_operations(self):
+        for operations in (
+            {},
+            [],
+            [{'op': 'merge', 'path': '/active'}],
+            [{'op': 'add', 'path': '/active'}],
+            [{'op': 'copy', 'path': '/active'}],
+            [{'op': 'replace', 'path': '', 'value': {}}],
+            [{'op': 'replace', 'path': '/id', 'value': 'other'}],
+            [{'op': 'remove', 'path': '/meta/versionId'}],
+            [{'op': 'move', 'from': '/resourceType', 'path': '/type'}],
+        ):
+            with self.assertRaises(PatchError, msg=operations):
+                JSONPatch(operations)
+
+    def test_postgresql_shall_apply_add_remove_replace_and_test(self):
+        patch = JSONPatch(
+            [
+                {'op': 'test', 'path': '/active', 'value': True},
+                {'op': 'replace', 'path': '/active', 'value': False},
+                {'op': 'add', 'path': '/name/-', 'value': {'text': 'Jim'}},
+            ]
+        )
+
+        sql, params, condition, condition_params = patch.as_postgresql(
+            'content', []
+        )
+
+        self.assertEqual(
+            sql,
+            'jsonb_insert(jsonb_set(content, %s::text[], %s::jsonb, false), '
+            '%s::text[], %s::jsonb, true)',
+        )
+        self.assertEqual(
+            params, [['active'], 'false', ['name', '-1'], '{"text":"Jim"}']
+        )
+        # Each condition applies to the content patched by the previous
+        # operations
+        self.assertEqual(condition.count('jsonb_set'), 2)
+        self.assertEqual(condition.count('%s'), len(condition_params))
+
+    def test_postgresql_shall_not_apply_move_and_copy(self):
+        class Connection:
+            vendor = 'postgresql'
+
+        patch = JSONPatch([{'op': 'remove', 'path': '/active'}])
+        self.assertTrue(patch.can_apply_in_database(Connection()))
+
+        patch = JSONPatch([{'op': 'move', 'from': '/a', 'path': '/b'}])
+        self.assertFalse(patch.can_apply_in_database(Connection()))
@@ -0,0 +1,50 @@
+from rest_framework.exceptions import ParseError
+
+from django.test import SimpleTestCase, override_settings
+
+from rest_fhir.projection import Projection, get_projection
+
+
+class ProjectionTestCase(SimpleTestCase):
+    def test_get_projection(self):
+        self.assertIsNone(get_projection('Patient', {}))
+        self.assertIsNone(get_projection('Patient', {'_summary': 'count'}))
+        self.assertEqual(
+            get_projection('Observation', {'_elements': 'Observation.note'}),
+            Projection(keep=frozenset(['note', 'status', 'code'])),
+        )
+        self.assertEqual(
+            get_projection('Basic', {'_summary': 'true'}),
+            Projection(
+                drop=frozenset(['text', 'contained', 'extension', 'language'])
+            ),
+        )
+        with override_settings(REST_FHIR={'SUMMARY_ELEMENTS': {'Basic': []}}):
+            self.assertEqual(
+                get_projection('Basic', {'_summary': 'true'}),
+                Projection(keep=frozenset(['implicitRules'])),
+            )
+
+        with self.assertRaises(ParseError):
+            get_projection('Patient', {'_elements': 'name,'})
+
+    def test_apply(self):
+        content = {
+            'id': '1',
+            'resourceType': 'Observation',
+            'text': {'status': 'empty'},
+            'valueQuantity': {'value': 72},
+            'valueset': 'not a choice',
+        }
+        self.assertEqual(
+            Projection.from_elements(['value[x]']).apply(content),
+            {
+                'id': '1',
+                'resourceType': 'Observation',
+                'valueQuantity': {'value': 72},
+            },
+        )
+        self.assertEqual(
+            Projection(drop=frozenset(['text', 'id'])).apply(content),
+            {key: value for key, value in content.items() if key != 'text'},
+        )
@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase
+
+from rest_fhir.serializers import RawResource, splice_resource
+
+
+class SpliceResourceTestCase(SimpleTestCase):
+    meta = {'versionId': '2', 'lastUpdated': '2021-05-11T12:29:00Z'}
+
+    def test_splice_shall_replace_leading_id_with_id_and_meta(self):
+        raw = '{"id": "abc", "resourceType": "Patient", "active": true}'
+
+        spliced = splice_resource(raw, 'abc', self.meta)
+
+        self.assertEqual(
+            spliced,
+            '{"id":"abc","meta":{"versionId":"2",'
+            '"lastUpdated":"2021-05-11T12:29:00Z"}, '
+            '"resourceType": "Patient", "active": true}',
+        )
+        self.assertEqual(
+            RawResource(spliced.encode()),
+            {
+                'id': 'abc',
+                'meta': self.meta,
+                'resourceType': 'Patient',
+                'active': True,
+            },
+        )
+
+    def test_splice_shall_handle_document_with_id_only(self):
+        spliced = splice_resource('{"id":"abc"}', 'abc', self.meta)
+
+        self.assertEqual(
+            RawResource(spliced.encode()), {'id': 'abc', 'meta': self.meta}
+        )
+
+    def test_splice_shall_refuse_unexpected_layouts(self):
+        self.assertIsNone(
+            splice_resource('{"resourceType": "Patient"}', 'abc', self.meta)
+        )
+        self.assertIsNone(
+            splice_resource('{"id": "xyz", "active": true}', 'abc', self.meta)
+        )
+        # A stored `meta` is merged after decoding
+        self.assertIsNone(
+            splice_resource('{"id": "abc", "meta": {"tag": []}}', 'abc', {})
+        )
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.test import AsyncClient, override_settings
+from django.urls import include, path, resolve, reverse
+
+from rest_fhir.compat import sync_to_async
+from rest_fhir.models import Resource
+
+VARIABLE = ContextVar('variable')
+
+
+class AsyncViewsTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.async_urls')),
+    ]
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def url(self, name, **kwargs):
+        return reverse(
+            name, kwargs={key: str(value) for key, value in kwargs.items()}
+        )
+
+    def test_views_shall_be_coroutine_functions(self):
+        for url in (
+            self.url('read-update-delete', type='Patient', id=Resource().id),
+            self.url('vread', type='Patient', id=Resource().id, vid=1),
+            self.url('search-create', type='Patient'),
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+
+    def test_sync_code_shall_run_in_the_context_variables_of_the_view(self):
+        # Where the database routing of the request is kept
+        async def view():
+            VARIABLE.set('view')
+            return await sync_to_async(VARIABLE.get)()
+
+        self.assertEqual(async_to_sync(view)(), 'view')
+
+    def test_server_should_read_resource(self):
+        resource = self.create({'resourceType': 'Patient', 'active': True})
+        url = self.url('read-update-delete', type='Patient', id=resource.id)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['active'], True)
+        self.assertEqual(response['ETag'], 'W/"1"')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='W/"1"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            self.url('read-update-delete', type='Patient', id=Resource().id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(REST_FHIR={'CACHE_ALIAS': 'default'})
+    def test_server_should_read_resource_through_the_cache(self):
+        resource = self.create({'resourceType': 'Patient', 'active': True})
+        url = self.url('read-update-delete', type='Patient', id=resource.id)
+
+        self.assertEqual(self.client.get(url).data['active'], True)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['active'], True)
+
+    def test_server_should_create_update_and_delete_resource(self):
+        response = self.client.post(
+            self.url('search-create', type='Patient'),
+            {'resourceType': 'Patient', 'active': True},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource_id = response.data['id']
+        self.assertEqual(
+            response['Location'],
+            self.url('vread', type='Patient', id=resource_id, vid=1),
+        )
+
+        # Sync handlers of the async views run in a thread
+        url = self.url('read-update-delete', type='Patient', id=resource_id)
+        response = self.client.put(
+            url,
+            {'resourceType': 'Patient', 'id': resource_id, 'active': False},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(
+            self.url('vread', type='Patient', id=resource_id, vid=1)
+        )
+        self.assertEqual(response.data['active'], True)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_410_GONE)
+
+    def test_server_should_create_resource_conditionally(self):
+        resource = self.create(
+            {
+                'resourceType': 'Patient',
+                'identifier': [{'system': 'urn:mrn', 'value': '42'}],
+            }
+        )
+
+        response = self.client.post(
+            self.url('search-create', type='Patient'),
+            {'resourceType': 'Patient'},
+            format='json',
+            HTTP_IF_NONE_EXIST='identifier=urn:mrn|42',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], str(resource.id))
+
+    async def test_views_shall_serve_async_requests(self):
+        # Requests of the async client are handled by the ASGI handler,
+        # where database queries outside of a thread raise
+        # SynchronousOnlyOperation
+        client = AsyncClient()
+
+        response = await client.post(
+            self.url('search-create', type='Patient'),
+            {'resourceType': 'Patient', 'active': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource_id = json.loads(response.content)['id']
+
+        # Not concurrently: with asgiref 3.4, the last for Python 3.6,
+        # concurrent requests query out of the test transaction's thread
+        url = self.url('read-update-delete', type='Patient', id=resource_id)
+        response = await client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = await client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = await client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
@@ -0,0 +1,221 @@
+import io
+import threading
+import time
+from unittest import mock, skipIf
+
+from rest_framework import status
+from rest_framework.test import (
+    APITestCase,
+    APITransactionTestCase,
+    URLPatternsTestCase,
+)
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import include, path, reverse
+
+from rest_fhir import indexer
+from rest_fhir.indexer import process_batch
+from rest_fhir.models import IndexingTask, TokenIndex
+from rest_fhir.routers import CONSISTENCY_TOKEN_HEADER
+
+
+@override_settings(
+    REST_FHIR={'ASYNC_INDEXING': True, 'INDEXING_WAIT_TIMEOUT': 0}
+)
+class AsyncIndexingTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def create(self, gender='male'):
+        response = self.client.post(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'resourceType': 'Patient', 'gender': gender},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def search(self, token=None, **params):
+        headers = {}
+        if token is not None:
+            headers['HTTP_X_CONSISTENCY_TOKEN'] = token
+        return self.client.get(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            params,
+            **headers,
+        )
+
+    def assertSearch(self, expected, **params):
+        response = self.search(**params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entry['resource']['id'] for entry in response.data['entry']],
+            expected,
+        )
+
+    def test_create_shall_enqueue_indexing(self):
+        response = self.create()
+        resource_id = response.data['id']
+
+        [task] = IndexingTask.objects.all()
+        self.assertEqual(str(task.resource_id), resource_id)
+        self.assertEqual(task.resource_type, 'Patient')
+        self.assertEqual(task.version_id, 1)
+        self.assertFalse(TokenIndex.objects.exists())
+        self.assertSearch([], gender='male')
+
+        self.assertEqual(process_batch(), 1)
+        self.assertFalse(IndexingTask.objects.exists())
+        self.assertSearch([resource_id], gender='male')
+        self.assertEqual(process_batch(), 0)
+
+    def test_write_shall_return_consistency_token(self):
+        response = self.create()
+        resource_id = response.data['id']
+        self.assertEqual(
+            response[CONSISTENCY_TOKEN_HEADER],
+            'Patient/%s/_history/1' % resource_id,
+        )
+
+        url = reverse(
+            'read-update-delete', kwargs={'type': 'Patient', 'id': resource_id}
+        )
+        response = self.client.put(
+            url,
+            {'resourceType': 'Patient', 'id': resource_id, 'gender': 'female'},
+            format='json',
+        )
+        self.assertEqual(
+            response[CONSISTENCY_TOKEN_HEADER],
+            'Patient/%s/_history/2' % resource_id,
+        )
+
+        response = self.client.get(url)
+        self.assertNotIn(CONSISTENCY_TOKEN_HEADER, response)
+
+    def test_search_with_token_shall_wait_for_indexing(self):
+        response = self.create()
+        resource_id = response.data['id']
+        token = response[CONSISTENCY_TOKEN_HEADER]
+        response = self.search(token=token, gender='male')
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+        process_batch()
+        self.assertSearch([resource_id], token=token, gender='male')
+
+        response = self.search(token='Patient/1/_history/x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_and_delete_shall_be_indexed_by_the_worker(self):
+        resource_id = self.create().data['id']
+        url = reverse(
+            'read-update-delete', kwargs={'type': 'Patient', 'id': resource_id}
+        )
+        self.client.put(
+            url,
+            {'resourceType': 'Patient', 'id': resource_id, 'gender': 'female'},
+            format='json',
+        )
+        self.assertEqual(IndexingTask.objects.count(), 2)
+
+        stdout = io.StringIO()
+        call_command('fhir_index_worker', '--once', stdout=stdout)
+        self.assertIn('Indexed 2 resource versions.', stdout.getvalue())
+        self.assertSearch([], gender='male')
+        self.assertSearch([resource_id], gender='female')
+
+        # Deleted resources are excluded before their index is cleared
+        response = self.client.delete(url)
+        self.assertNotIn(CONSISTENCY_TOKEN_HEADER, response)
+        self.assertSearch([], gender='female')
+        call_command('fhir_index_worker', '--once', stdout=stdout)
+        self.assertFalse(TokenIndex.objects.filter(resource_id=resource_id))
+
+    def test_tasks_of_a_resource_shall_leave_the_index_of_its_last_version(
+        self,
+    ):
+        resource_id = self.create().data['id']
+        self.client.put(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': 'Patient', 'id': resource_id},
+            ),
+            {'resourceType': 'Patient', 'id': resource_id, 'gender': 'female'},
+            format='json',
+        )
+
+        self.assertEqual(process_batch(batch_size=1), 1)
+        self.assertEqual(process_batch(batch_size=1), 1)
+        self.assertEqual(
+            list(
+                TokenIndex.objects.filter(
+                    resource_id=resource_id, name='gender'
+                ).values_list('code', flat=True)
+            ),
+            ['female'],
+        )
+
+
+@skipIf(
+    connection.vendor == 'sqlite',
+    'SQLite test databases are shared by threads with table level locks, '
+    'see benchmarks/bench_conditional_contention.py',
+)
+@override_settings(REST_FHIR={'ASYNC_INDEXING': True})
+class ConcurrentIndexingTestCase(APITransactionTestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_workers_shall_take_turns_on_the_tasks_of_a_resource(self):
+        response = self.client.post(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'resourceType': 'Patient', 'gender': 'male'},
+            format='json',
+        )
+        resource_id = response.data['id']
+        self.client.put(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': 'Patient', 'id': resource_id},
+            ),
+            {'resourceType': 'Patient', 'id': resource_id, 'gender': 'female'},
+            format='json',
+        )
+        self.assertEqual(IndexingTask.objects.count(), 2)
+
+        def index_resources(*args, **kwargs):
+            result = original_index_resources(*args, **kwargs)
+            # Keep the transaction open while the other worker runs
+            time.sleep(0.2)
+            return result
+
+        def work():
+            try:
+                processed.append(process_batch(batch_size=1))
+            finally:
+                connection.close()
+
+        original_index_resources = indexer.index_resources
+        processed = []
+        with mock.patch.object(indexer, 'index_resources', index_resources):
+            threads = [threading.Thread(target=work) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(processed, [1, 1])
+        self.assertEqual(
+            list(
+                TokenIndex.objects.filter(
+                    resource_id=resource_id, name='gender'
+                ).values_list('code', flat=True)
+            ),
+            ['female'],
+        )
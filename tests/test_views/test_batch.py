@@ -0,0 +1,241 @@
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource, ResourceVersion
+
+
+class BatchTransactionAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def post_bundle(self, bundle_type, entries, **kwargs):
+        return self.client.post(
+            reverse('batch-transaction'),
+            data={
+                'resourceType': 'Bundle',
+                'type': bundle_type,
+                'entry': entries,
+            },
+            format='json',
+            **kwargs,
+        )
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def test_transaction_shall_create_entries_with_bulk_inserts(self):
+        entries = [
+            {
+                'fullUrl': 'urn:uuid:%d' % i,
+                'resource': {'resourceType': 'Patient', 'birthDate': '1970'},
+                'request': {'method': 'POST', 'url': 'Patient'},
+            }
+            for i in range(50)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_bundle(
+                'transaction', entries, HTTP_PREFER='return=minimal'
+            )
+
+        statements = [
+            query['sql']
+            for query in ctx.captured_queries
+            if 'SAVEPOINT' not in query['sql']
+        ]
+        # One bulk insert per table, the search index included
+        self.assertEqual(len(statements), 3)
+        self.assertTrue(statements[2].startswith('INSERT INTO "fhir_idx_date"'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['type'], 'transaction-response')
+        self.assertEqual(len(response.data['entry']), 50)
+        self.assertEqual(Resource.objects.count(), 50)
+        self.assertEqual(ResourceVersion.objects.count(), 50)
+
+        entry = response.data['entry'][0]
+        resource = Resource.objects.get(
+            id=entry['response']['location'].split('/')[1]
+        )
+        self.assertEqual(entry['response']['status'], '201 Created')
+        self.assertEqual(entry['response']['etag'], 'W/"1"')
+        self.assertEqual(resource.version_id, 1)
+        self.assertEqual(resource.published_at, resource.version.published_at)
+
+    def test_transaction_shall_resolve_urn_uuid_references(self):
+        response = self.post_bundle(
+            'transaction',
+            [
+                {
+                    'fullUrl': 'urn:uuid:61ebe359-bfdc-4613-8bf2-c5e300945f0a',
+                    'resource': {'resourceType': 'Patient', 'active': True},
+                    'request': {'method': 'POST', 'url': 'Patient'},
+                },
+                {
+                    'fullUrl': 'urn:uuid:88f151c0-a954-468a-88bd-5ae15c08e059',
+                    'resource': {
+                        'resourceType': 'Observation',
+                        'status': 'final',
+                        'subject': {
+                            'reference': 'urn:uuid:61ebe359-bfdc-4613-8bf2-c5e300945f0a'
+                        },
+                    },
+                    'request': {'method': 'POST', 'url': 'Observation'},
+                },
+            ],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [patient_entry, observation_entry] = response.data['entry']
+        self.assertEqual(
+            observation_entry['resource']['subject']['reference'],
+            'Patient/%s' % patient_entry['resource']['id'],
+        )
+
+        observation = Resource.objects.get(
+            id=observation_entry['resource']['id']
+        )
+        self.assertEqual(
+            observation.resource_content['subject']['reference'],
+            'Patient/%s' % patient_entry['resource']['id'],
+        )
+
+    def test_transaction_shall_roll_back_on_failed_entry(self):
+        response = self.post_bundle(
+            'transaction',
+            [
+                {
+                    'resource': {'resourceType': 'Patient'},
+                    'request': {'method': 'POST', 'url': 'Patient'},
+                },
+                {
+                    'request': {
+                        'method': 'DELETE',
+                        'url': 'Patient/0c6d8ba3-7f31-4a35-a1c8-ec4eef5a0c4a',
+                    },
+                },
+            ],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Resource.objects.count(), 0)
+
+    def test_batch_shall_process_entries_independently(self):
+        patient = self.create({'resourceType': 'Patient', 'active': True})
+        organization = self.create({'resourceType': 'Organization'})
+
+        response = self.post_bundle(
+            'batch',
+            [
+                {
+                    'request': {
+                        'method': 'GET',
+                        'url': 'Patient/%s' % patient.id,
+                    },
+                },
+                {
+                    'request': {
+                        'method': 'GET',
+                        'url': 'Patient/7d6cbe33-5b4e-4a44-8c7e-5a1fb0ba6c5b',
+                    },
+                },
+                {
+                    'resource': {'resourceType': 'Patient'},
+                    'request': {'method': 'POST', 'url': 'Organization'},
+                },
+                {
+                    'request': {
+                        'method': 'DELETE',
+                        'url': 'Organization/%s' % organization.id,
+                    },
+                },
+            ],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['type'], 'batch-response')
+        [read, missing, invalid, delete] = response.data['entry']
+
+        self.assertEqual(read['response']['status'], '200 OK')
+        self.assertEqual(read['resource']['id'], str(patient.id))
+        self.assertEqual(read['resource']['active'], True)
+        self.assertEqual(missing['response']['status'], '404 Not Found')
+        self.assertEqual(
+            missing['response']['outcome']['resourceType'], 'OperationOutcome'
+        )
+        self.assertEqual(invalid['response']['status'], '400 Bad Request')
+        self.assertEqual(delete['response']['status'], '204 No Content')
+
+        organization.refresh_from_db()
+        self.assertIsNotNone(organization.deleted_at)
+
+    def test_batch_shall_update_entries_honoring_if_match(self):
+        patient = self.create({'resourceType': 'Patient', 'active': True})
+        stale = self.create({'resourceType': 'Patient'})
+        stale.save(resource_content={'resourceType': 'Patient'})
+
+        def put_entry(resource_id, if_match):
+            return {
+                'resource': {
+                    'resourceType': 'Patient',
+                    'id': str(resource_id),
+                    'active': False,
+                },
+                'request': {
+                    'method': 'PUT',
+                    'url': 'Patient/%s' % resource_id,
+                    'ifMatch': if_match,
+                },
+            }
+
+        response = self.post_bundle(
+            'batch',
+            [put_entry(patient.id, 'W/"1"'), put_entry(stale.id, 'W/"1"')],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [updated, conflict] = response.data['entry']
+        self.assertEqual(updated['response']['status'], '200 OK')
+        self.assertEqual(updated['response']['etag'], 'W/"2"')
+        self.assertEqual(updated['resource']['active'], False)
+        self.assertEqual(
+            conflict['response']['status'], '412 Precondition Failed'
+        )
+        self.assertEqual(Resource.objects.get(id=stale.id).version_id, 2)
+
+    def test_batch_shall_read_entries_with_a_single_query(self):
+        patients = [
+            self.create({'resourceType': 'Patient', 'gender': 'female'})
+            for _ in range(10)
+        ]
+
+        with self.assertNumQueries(1):
+            response = self.post_bundle(
+                'batch',
+                [
+                    {'request': {'method': 'GET', 'url': 'Patient/%s' % p.id}}
+                    for p in patients
+                ],
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entry['resource']['id'] for entry in response.data['entry']],
+            [str(p.id) for p in patients],
+        )
+
+    def test_server_should_returns_400_for_non_bundle(self):
+        response = self.client.post(
+            reverse('batch-transaction'),
+            data={'resourceType': 'Patient'},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
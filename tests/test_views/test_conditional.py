@@ -0,0 +1,308 @@
+import threading
+from unittest import skipIf
+
+from rest_framework import status
+from rest_framework.test import (
+    APIClient,
+    APITestCase,
+    APITransactionTestCase,
+    URLPatternsTestCase,
+)
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource
+
+IDENTIFIER = {'system': 'urn:oid:1.2.36.146.595.217.0.1', 'value': '12345'}
+CRITERIA = 'identifier=urn:oid:1.2.36.146.595.217.0.1|12345'
+
+
+class ConditionalAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def type_url(self, resource_type, query=None):
+        url = reverse('search-create', kwargs={'type': resource_type})
+        return url if query is None else '%s?%s' % (url, query)
+
+    def conditional_create(self, data, criteria=CRITERIA):
+        return self.client.post(
+            self.type_url(data['resourceType']),
+            data=data,
+            format='json',
+            HTTP_IF_NONE_EXIST=criteria,
+        )
+
+    def test_conditional_create_shall_create_resource_without_match(self):
+        self.create({'resourceType': 'Patient', 'identifier': [{'value': '1'}]})
+
+        response = self.conditional_create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Resource.objects.count(), 2)
+
+    def test_conditional_create_shall_return_the_matching_resource(self):
+        resource = self.create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.conditional_create(
+                {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], str(resource.id))
+        self.assertEqual(response['ETag'], 'W/"1"')
+        self.assertEqual(Resource.objects.count(), 1)
+
+        # The criteria are resolved with the identifier token index
+        [lookup] = [
+            query['sql']
+            for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+        self.assertIn('"fhir_idx_token"', lookup)
+
+    def test_conditional_create_shall_412_for_multiple_matches(self):
+        for _ in range(2):
+            self.create({'resourceType': 'Patient', 'identifier': [IDENTIFIER]})
+
+        response = self.conditional_create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.assertEqual(Resource.objects.count(), 2)
+
+    def test_conditional_create_shall_400_for_invalid_criteria(self):
+        for criteria in ('', '_count=1', 'unknown=1'):
+            response = self.conditional_create(
+                {'resourceType': 'Patient'}, criteria=criteria
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(Resource.objects.count(), 0)
+
+    def test_conditional_update_shall_update_the_matching_resource(self):
+        resource = self.create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        response = self.client.put(
+            self.type_url('Patient', CRITERIA),
+            data={
+                'resourceType': 'Patient',
+                'identifier': [IDENTIFIER],
+                'active': True,
+            },
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], str(resource.id))
+        self.assertEqual(response.data['meta']['versionId'], '2')
+        self.assertEqual(Resource.objects.count(), 1)
+
+    def test_conditional_update_shall_create_resource_without_match(self):
+        response = self.client.put(
+            self.type_url('Patient', CRITERIA),
+            data={'resourceType': 'Patient', 'identifier': [IDENTIFIER]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Resource.objects.get().resource_content['identifier'], [IDENTIFIER]
+        )
+
+    def test_conditional_update_shall_400_for_id_of_another_resource(self):
+        resource = self.create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+        other = self.create({'resourceType': 'Patient'})
+
+        response = self.client.put(
+            self.type_url('Patient', CRITERIA),
+            data={'resourceType': 'Patient', 'id': str(other.id)},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Resource.objects.get(id=resource.id).version_id, 1)
+
+    def test_conditional_delete_shall_delete_the_matching_resource(self):
+        resource = self.create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        response = self.client.delete(self.type_url('Patient', CRITERIA))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNotNone(Resource.objects.get(id=resource.id).deleted_at)
+
+        # Nothing matches anymore
+        response = self.client.delete(self.type_url('Patient', CRITERIA))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_conditional_delete_shall_412_for_multiple_matches(self):
+        for _ in range(2):
+            self.create({'resourceType': 'Patient', 'identifier': [IDENTIFIER]})
+
+        response = self.client.delete(self.type_url('Patient', CRITERIA))
+
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.assertFalse(
+            Resource.objects.filter(deleted_at__isnull=False).exists()
+        )
+
+    def test_transaction_shall_reference_the_resource_matching_if_none_exist(
+        self,
+    ):
+        patient = self.create(
+            {'resourceType': 'Patient', 'identifier': [IDENTIFIER]}
+        )
+
+        response = self.client.post(
+            reverse('batch-transaction'),
+            data={
+                'resourceType': 'Bundle',
+                'type': 'transaction',
+                'entry': [
+                    {
+                        'fullUrl': 'urn:uuid:patient',
+                        'resource': {
+                            'resourceType': 'Patient',
+                            'identifier': [IDENTIFIER],
+                        },
+                        'request': {
+                            'method': 'POST',
+                            'url': 'Patient',
+                            'ifNoneExist': CRITERIA,
+                        },
+                    },
+                    {
+                        'resource': {
+                            'resourceType': 'Observation',
+                            'subject': {'reference': 'urn:uuid:patient'},
+                        },
+                        'request': {'method': 'POST', 'url': 'Observation'},
+                    },
+                ],
+            },
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [matched, created] = response.data['entry']
+        self.assertEqual(matched['response']['status'], '200 OK')
+        self.assertEqual(matched['resource']['id'], str(patient.id))
+        self.assertEqual(created['response']['status'], '201 Created')
+        self.assertEqual(
+            created['resource']['subject']['reference'],
+            'Patient/%s' % patient.id,
+        )
+        self.assertEqual(Resource.objects.count(), 2)
+
+    def test_batch_shall_process_conditional_entries(self):
+        self.create({'resourceType': 'Patient', 'identifier': [IDENTIFIER]})
+        other = {'system': 'urn:oid:1.2.36.146.595.217.0.1', 'value': '6789'}
+
+        response = self.client.post(
+            reverse('batch-transaction'),
+            data={
+                'resourceType': 'Bundle',
+                'type': 'batch',
+                'entry': [
+                    {
+                        'resource': {
+                            'resourceType': 'Patient',
+                            'identifier': [other],
+                        },
+                        'request': {
+                            'method': 'POST',
+                            'url': 'Patient',
+                            'ifNoneExist': 'identifier=%s|%s'
+                            % (other['system'], other['value']),
+                        },
+                    },
+                    {
+                        'resource': {
+                            'resourceType': 'Patient',
+                            'identifier': [IDENTIFIER],
+                            'active': False,
+                        },
+                        'request': {
+                            'method': 'PUT',
+                            'url': 'Patient?%s' % CRITERIA,
+                        },
+                    },
+                    {
+                        'request': {
+                            'method': 'DELETE',
+                            'url': 'Patient?identifier=unknown',
+                        },
+                    },
+                ],
+            },
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [created, updated, deleted] = response.data['entry']
+        self.assertEqual(created['response']['status'], '201 Created')
+        self.assertEqual(updated['response']['status'], '200 OK')
+        self.assertEqual(updated['response']['etag'], 'W/"2"')
+        self.assertEqual(deleted['response']['status'], '204 No Content')
+        self.assertEqual(Resource.objects.count(), 2)
+
+
+@skipIf(
+    connection.vendor == 'sqlite',
+    'SQLite test databases are shared by threads with table level locks, '
+    'see benchmarks/bench_conditional_contention.py',
+)
+class ConcurrentConditionalCreateTestCase(
+    APITransactionTestCase, URLPatternsTestCase
+):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_concurrent_conditional_creates_shall_create_one_resource(self):
+        url = reverse('search-create', kwargs={'type': 'Patient'})
+        statuses = []
+
+        def upsert():
+            try:
+                response = APIClient().post(
+                    url,
+                    {'resourceType': 'Patient', 'identifier': [IDENTIFIER]},
+                    format='json',
+                    HTTP_IF_NONE_EXIST=CRITERIA,
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upsert) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [200] * 15 + [201])
+        self.assertEqual(Resource.objects.count(), 1)
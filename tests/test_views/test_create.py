@@ -1,3 +1,5 @@
+import json
+
 from rest_framework import status
 from rest_framework.test import APITestCase, URLPatternsTestCase
 
@@ -48,6 +50,12 @@ class CreateAPIViewTestCase(APITestCase, URLPatternsTestCase):
             {'id': str(resource.id), **request_body},
         )
 
+    def test_server_should_create_resource_with_two_statements(self):
+        with self.assertNumQueries(2):
+            response = self.create({'resourceType': 'Patient'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_created_resource_shall_ignore_id_from_request_body(self):
         request_body = {
             'resourceType': 'Patient',
@@ -92,6 +100,25 @@ class CreateAPIViewTestCase(APITestCase, URLPatternsTestCase):
             request_body['meta']['lastUpdated'],
         )
 
+    def test_created_resource_shall_be_stored_without_id_and_meta(self):
+        request_body = {
+            'resourceType': 'Patient',
+            'id': 'pat1',
+            'meta': {'versionId': 'pat1.1'},
+            'active': True,
+        }
+
+        response = self.create(request_body)
+        resource = Resource.objects.get(id=response.data['id'])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            resource.resource_content,
+            {'id': str(resource.id), 'resourceType': 'Patient', 'active': True},
+        )
+        self.assertEqual(json.loads(response.content), dict(response.data))
+        self.assertEqual(response.data['meta']['versionId'], '1')
+
     def test_server_should_returns_location_which_contains_id_and_vid(self):
         request_body = {
             'resourceType': 'Organization',
@@ -0,0 +1,179 @@
+import json
+import shutil
+import tempfile
+
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.test import override_settings
+from django.urls import include, path, reverse
+
+from rest_fhir.models import ExportJob, Resource
+
+
+class ExportAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir, ignore_errors=True)
+        settings = override_settings(
+            REST_FHIR={
+                'EXPORT_DIR': self.export_dir,
+                'EXPORT_ASYNC': False,
+                'EXPORT_MAX_WORKERS': 1,
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.patient = Resource()
+        self.patient.save(resource_content={'resourceType': 'Patient'})
+        self.observation = Resource()
+        self.observation.save(
+            resource_content={
+                'resourceType': 'Observation',
+                'subject': {'reference': 'Patient/%s' % self.patient.pk},
+            }
+        )
+        deleted = Resource()
+        deleted.save(resource_content={'resourceType': 'Observation'})
+        deleted.delete()
+
+    def kick_off(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return response['Content-Location']
+
+    def test_server_should_export_current_resources_by_type(self):
+        status_url = self.kick_off(reverse('export'))
+
+        response = self.client.get(status_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['requiresAccessToken'])
+        self.assertEqual(
+            [(o['type'], o['count']) for o in response.data['output']],
+            [('Observation', 1), ('Patient', 1)],
+        )
+
+        response = self.client.get(response.data['output'][0]['url'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/fhir+ndjson')
+        [line] = b''.join(response.streaming_content).splitlines()
+        resource = json.loads(line)
+        self.assertEqual(resource['id'], str(self.observation.pk))
+        self.assertEqual(resource['meta']['versionId'], '1')
+
+    def test_server_should_filter_export_by_type_param(self):
+        status_url = self.kick_off(reverse('export'), _type='Patient')
+
+        response = self.client.get(status_url)
+
+        self.assertEqual(
+            [o['type'] for o in response.data['output']], ['Patient']
+        )
+
+    def test_server_should_export_a_single_type(self):
+        status_url = self.kick_off(
+            reverse('type-export', kwargs={'type': 'Observation'})
+        )
+
+        response = self.client.get(status_url)
+
+        self.assertEqual(
+            [o['type'] for o in response.data['output']], ['Observation']
+        )
+
+    def test_server_should_export_the_patient_compartment(self):
+        for resource_content in (
+            {
+                'resourceType': 'Observation',
+                'text': {
+                    'status': 'generated',
+                    'div': '<div>See Patient/%s</div>' % self.patient.pk,
+                },
+            },
+            {
+                'resourceType': 'Practitioner',
+                'extension': [
+                    {
+                        'url': 'http://example.org/Patient/x',
+                        'valueString': 'Patient/%s' % self.patient.pk,
+                    }
+                ],
+            },
+        ):
+            Resource().save(resource_content=resource_content)
+
+        status_url = self.kick_off(
+            reverse('type-export', kwargs={'type': 'Patient'})
+        )
+        response = self.client.get(status_url)
+
+        self.assertEqual(
+            [(o['type'], o['count']) for o in response.data['output']],
+            [('Observation', 1), ('Patient', 1)],
+        )
+        response = self.client.get(response.data['output'][0]['url'])
+        [line] = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(json.loads(line)['id'], str(self.observation.pk))
+
+    def test_server_should_export_only_changes_since(self):
+        status_url = self.kick_off(
+            reverse('export'), _since='2999-01-01T00:00:00Z'
+        )
+
+        response = self.client.get(status_url)
+
+        self.assertEqual(response.data['output'], [])
+
+    def test_server_should_reject_invalid_since(self):
+        response = self.client.get(reverse('export'), {'_since': 'yesterday'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_should_reject_unsupported_output_format(self):
+        response = self.client.get(
+            reverse('export'), {'_outputFormat': 'text/csv'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_should_report_running_job(self):
+        job = ExportJob.objects.create(level=ExportJob.SYSTEM)
+
+        response = self.client.get(
+            reverse('export-status', kwargs={'job_id': job.pk})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['X-Progress'], ExportJob.ACCEPTED)
+        self.assertIn('Retry-After', response)
+
+    def test_server_should_report_failed_job(self):
+        job = ExportJob.objects.create(
+            level=ExportJob.SYSTEM, status=ExportJob.FAILED, error='boom'
+        )
+
+        response = self.client.get(
+            reverse('export-status', kwargs={'job_id': job.pk})
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+        self.assertEqual(response.data['resourceType'], 'OperationOutcome')
+
+    def test_server_should_cancel_job(self):
+        status_url = self.kick_off(reverse('export'))
+
+        response = self.client.delete(status_url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(ExportJob.objects.exists())
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource, ResourceVersion
+
+
+class HistoryAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def setUp(self):
+        self.patient = Resource()
+        self.patient.save(resource_content={'resourceType': 'Patient'})
+        self.patient.save(
+            resource_content={'resourceType': 'Patient', 'active': True}
+        )
+        self.patient.delete()
+
+        self.observation = Resource()
+        self.observation.save(resource_content={'resourceType': 'Observation'})
+
+    def get_history(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['type'], 'history')
+        return response
+
+    def test_instance_history_shall_list_versions_newest_first(self):
+        response = self.get_history(
+            reverse(
+                'instance-history',
+                kwargs={'type': 'Patient', 'id': self.patient.id},
+            )
+        )
+
+        [deleted, updated, created] = response.data['entry']
+        self.assertEqual(
+            deleted['request'],
+            {'method': 'DELETE', 'url': 'Patient/%s' % self.patient.id},
+        )
+        self.assertNotIn('resource', deleted)
+        self.assertEqual(deleted['response']['status'], '204 No Content')
+        self.assertEqual(updated['request']['method'], 'PUT')
+        self.assertEqual(updated['resource']['active'], True)
+        self.assertEqual(updated['response']['etag'], 'W/"2"')
+        self.assertEqual(
+            created['request'], {'method': 'POST', 'url': 'Patient'}
+        )
+        self.assertEqual(created['resource']['meta']['versionId'], '1')
+        self.assertTrue(
+            created['fullUrl'].endswith('/fhir/Patient/%s/' % self.patient.id)
+        )
+
+    def test_type_and_system_history(self):
+        response = self.get_history(
+            reverse('type-history', kwargs={'type': 'Observation'})
+        )
+        self.assertEqual(len(response.data['entry']), 1)
+
+        response = self.get_history(reverse('system-history'))
+        self.assertEqual(len(response.data['entry']), 4)
+
+    def test_history_shall_paginate_with_keyset_cursor(self):
+        url = reverse('system-history')
+        response = self.get_history(url, _count=3)
+        first_page = [e['fullUrl'] for e in response.data['entry']]
+        links = {
+            link['relation']: link['url'] for link in response.data['link']
+        }
+
+        self.assertEqual(len(first_page), 3)
+        with self.assertNumQueries(1) as ctx:
+            response = self.client.get(links['next'])
+
+        self.assertEqual(len(response.data['entry']), 1)
+        self.assertNotIn(
+            'next', [link['relation'] for link in response.data['link']]
+        )
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+        self.assertEqual(response.data['entry'][0]['response']['etag'], 'W/"1"')
+
+    def test_history_shall_break_ties_on_same_published_at(self):
+        ResourceVersion.objects.update(published_at=self.patient.updated_at)
+        url = reverse('system-history')
+
+        seen = []
+        response = self.get_history(url, _count=1)
+        while True:
+            seen.extend(
+                e['response']['location'] for e in response.data['entry']
+            )
+            links = {
+                link['relation']: link['url'] for link in response.data['link']
+            }
+            if 'next' not in links:
+                break
+            response = self.client.get(links['next'])
+
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_history_since(self):
+        last = ResourceVersion.objects.order_by('-published_at').first()
+
+        response = self.get_history(
+            reverse('system-history'),
+            _since=last.published_at.isoformat().replace('+00:00', 'Z'),
+        )
+
+        self.assertEqual(len(response.data['entry']), 1)
+
+    def test_history_at(self):
+        [first, second, deleted] = ResourceVersion.objects.filter(
+            resource=self.patient
+        ).order_by('version_id')
+        for days, version in enumerate([second, deleted], start=1):
+            ResourceVersion.objects.filter(pk=version.pk).update(
+                published_at=first.published_at + timedelta(days=days)
+            )
+        at = first.published_at + timedelta(hours=1)
+
+        response = self.get_history(
+            reverse(
+                'instance-history',
+                kwargs={'type': 'Patient', 'id': self.patient.id},
+            ),
+            _at=at.isoformat().replace('+00:00', 'Z'),
+        )
+
+        [entry] = response.data['entry']
+        self.assertEqual(entry['response']['etag'], 'W/"1"')
+
+    def test_history_shall_reject_invalid_params(self):
+        url = reverse('system-history')
+
+        response = self.client.get(url, {'_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'_cursor': 'nonsense'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,51 @@
+import json
+
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource
+
+
+class ImportAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_server_should_import_ndjson_body(self):
+        body = '\n'.join(
+            [
+                json.dumps({'resourceType': 'Patient', 'gender': 'male'}),
+                json.dumps({'resourceType': 'Patient', 'gender': 'female'}),
+                'not json',
+            ]
+        )
+
+        response = self.client.post(
+            reverse('import'),
+            data=body,
+            content_type='application/fhir+ndjson',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['resourceType'], 'OperationOutcome')
+        [summary, error] = response.data['issue']
+        self.assertEqual(summary['severity'], 'information')
+        self.assertIn(
+            'Imported 2 resources (0 updated, 1 errors)',
+            summary['diagnostics'],
+        )
+        self.assertEqual(error['severity'], 'error')
+        self.assertEqual(Resource.objects.count(), 2)
+
+    def test_server_should_returns_415_for_json_body(self):
+        response = self.client.post(
+            reverse('import'),
+            data={'resourceType': 'Patient'},
+            format='json',
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
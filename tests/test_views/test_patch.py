@@ -0,0 +1,158 @@
+import json
+
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource, StringIndex, VersionConflict
+from rest_fhir.patch import JSONPatch
+
+
+class PatchAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def patch(self, resource, operations, **kwargs):
+        return self.client.patch(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': resource.resource_type, 'id': resource.id},
+            ),
+            data=json.dumps(operations),
+            content_type=kwargs.pop(
+                'content_type', 'application/json-patch+json'
+            ),
+            **kwargs,
+        )
+
+    def test_server_should_write_the_patched_version(self):
+        resource = self.create(
+            {
+                'resourceType': 'Patient',
+                'active': True,
+                'name': [{'family': 'Chalmers'}],
+            }
+        )
+
+        response = self.patch(
+            resource,
+            [
+                {'op': 'replace', 'path': '/active', 'value': False},
+                {'op': 'add', 'path': '/name/0/given', 'value': ['Peter']},
+            ],
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], 'W/"2"')
+        self.assertEqual(response.data['active'], False)
+        self.assertEqual(response.data['meta']['versionId'], '2')
+
+        resource = Resource.objects.get(id=resource.id)
+        self.assertEqual(
+            resource.resource_content['name'],
+            [{'family': 'Chalmers', 'given': ['Peter']}],
+        )
+        self.assertEqual(resource.history.count(), 2)
+
+        # The search index follows the patched content
+        self.assertEqual(
+            set(
+                StringIndex.objects.filter(resource_id=resource.id).values_list(
+                    'value', flat=True
+                )
+            ),
+            {'chalmers', 'peter'},
+        )
+
+    def test_server_should_apply_patch_matching_if_match(self):
+        resource = self.create({'resourceType': 'Patient'})
+        resource.save(resource_content={'resourceType': 'Patient'})
+        operations = [{'op': 'add', 'path': '/active', 'value': True}]
+
+        response = self.patch(resource, operations, HTTP_IF_MATCH='W/"1"')
+        self.assertEqual(
+            response.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+
+        response = self.patch(resource, operations, HTTP_IF_MATCH='W/"2"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], 'W/"3"')
+
+    def test_stale_patch_shall_apply_to_the_latest_version(self):
+        resource = self.create({'resourceType': 'Patient', 'name': [{}]})
+        stale = Resource.objects.select_related('version').get(id=resource.id)
+        resource.save(
+            resource_content={'resourceType': 'Patient', 'active': True}
+        )
+        patch = JSONPatch([{'op': 'add', 'path': '/gender', 'value': 'male'}])
+
+        with self.assertRaises(VersionConflict):
+            stale.patch(patch, expected_version_id=1)
+        stale.patch(patch)
+
+        self.assertEqual(stale.version_id, 3)
+        self.assertEqual(
+            Resource.objects.get(id=resource.id).resource_content,
+            {
+                'id': str(resource.id),
+                'resourceType': 'Patient',
+                'active': True,
+                'gender': 'male',
+            },
+        )
+
+    def test_server_should_422_for_patch_that_does_not_apply(self):
+        resource = self.create({'resourceType': 'Patient', 'active': True})
+
+        for operations in (
+            [{'op': 'test', 'path': '/active', 'value': False}],
+            [{'op': 'remove', 'path': '/gender'}],
+        ):
+            response = self.patch(resource, operations)
+            self.assertEqual(
+                response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        self.assertEqual(Resource.objects.get(id=resource.id).version_id, 1)
+
+    def test_server_should_400_for_invalid_patch(self):
+        resource = self.create({'resourceType': 'Patient'})
+
+        for operations in (
+            {'op': 'remove', 'path': '/active'},
+            [{'op': 'replace', 'path': '/id', 'value': 'other'}],
+        ):
+            response = self.patch(resource, operations)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_should_415_for_other_media_types(self):
+        resource = self.create({'resourceType': 'Patient'})
+
+        response = self.patch(
+            resource,
+            [{'op': 'add', 'path': '/active', 'value': True}],
+            content_type='application/json',
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    def test_server_should_not_patch_missing_or_deleted_resource(self):
+        resource = self.create({'resourceType': 'Patient'})
+        operations = [{'op': 'add', 'path': '/active', 'value': True}]
+
+        resource.delete()
+        response = self.patch(resource, operations)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+        resource.id = '8e7c1f70-1c4e-4a4b-9c5a-6a1b0e2c3d4f'
+        response = self.patch(resource, operations)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,11 +1,23 @@
+import io
+import json
+from unittest import mock
+
 from rest_framework import status
 from rest_framework.test import APITestCase, URLPatternsTestCase
 
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import path, reverse
 from django.urls.conf import include
 from django.utils import timezone
 
+from rest_fhir.cache import stats
 from rest_fhir.models import Resource
+from rest_fhir.projection import SUBSETTED_TAG
+from rest_fhir.serializers import RawResource
 
 from ..utils import to_http_date
 
@@ -101,6 +113,202 @@ class ReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
         self.assertTrue(response.has_header('Last-Modified'))
         self.assertEqual(response['Last-Modified'], last_modified)
 
+    def test_server_should_pass_stored_content_through(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Observation',
+                'status': 'final',
+                'valueString': 'Ærøskøbing',
+            }
+        )
+
+        response = self.read(resource)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data, RawResource)
+        self.assertEqual(
+            json.loads(response.content),
+            {
+                'resourceType': 'Observation',
+                'id': str(resource.id),
+                'meta': {
+                    'versionId': '1',
+                    'lastUpdated': resource.updated_at.strftime(
+                        '%Y-%m-%dT%H:%M:%S.%fZ'
+                    ),
+                },
+                'status': 'final',
+                'valueString': 'Ærøskøbing',
+            },
+        )
+
+    def test_read_shall_return_client_meta_elements(self):
+        tag = {'system': 'urn:test', 'code': 'vip'}
+        profile = 'http://hl7.org/fhir/StructureDefinition/Patient'
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Patient',
+                'meta': {
+                    'versionId': '7',
+                    'lastUpdated': '2001-01-01T00:00:00Z',
+                    'profile': [profile],
+                    'tag': [tag],
+                },
+            }
+        )
+        self.assertEqual(
+            resource.version.resource_content['meta'],
+            {'profile': [profile], 'tag': [tag]},
+        )
+
+        response = self.read(resource)
+        self.assertEqual(
+            response.data['meta'],
+            {
+                'profile': [profile],
+                'tag': [tag],
+                'versionId': '1',
+                'lastUpdated': resource.updated_at.strftime(
+                    '%Y-%m-%dT%H:%M:%S.%fZ'
+                ),
+            },
+        )
+
+        response = self.read(resource, data={'_summary': 'true'})
+        self.assertEqual(response.data['meta']['profile'], [profile])
+        self.assertEqual(response.data['meta']['tag'], [tag, SUBSETTED_TAG])
+
+    def test_server_should_answer_fhir_json_by_default(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        response = self.read(resource)
+        self.assertEqual(response['Content-Type'], 'application/fhir+json')
+
+        response = self.read(resource, HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_format_parameter_shall_override_accept_header(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        for value, content_type in (
+            ('json', 'application/fhir+json'),
+            ('application/json', 'application/json'),
+            ('application/fhir json', 'application/fhir+json'),
+            ('html', 'text/html; charset=utf-8'),
+        ):
+            response = self.read(
+                resource, data={'_format': value}, HTTP_ACCEPT='text/html'
+            )
+            self.assertEqual(response['Content-Type'], content_type)
+
+        response = self.read(resource, data={'_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_pretty_parameter_shall_indent_the_resource(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        response = self.read(resource, data={'_pretty': 'true'})
+
+        self.assertTrue(response.content.startswith(b'{\n  "id": '))
+        self.assertEqual(json.loads(response.content)['id'], str(resource.id))
+
+    def test_server_should_keep_decimal_precision(self):
+        response = self.client.post(
+            reverse('search-create', kwargs={'type': 'Observation'}),
+            data=b'{"resourceType":"Observation","valueQuantity":'
+            b'{"value":1.50,"unit":"mg"}}',
+            content_type='application/fhir+json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(b'"value":1.50,', response.content)
+
+        resource = Resource.objects.get(id=response.data['id'])
+        for params in ({}, {'_pretty': 'true'}):
+            response = self.read(resource, data=params)
+            self.assertIn(b'1.50', response.content)
+
+    def test_summary_and_elements_shall_be_projected_by_database(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Patient',
+                'text': {'status': 'generated', 'div': '<div>Jim</div>'},
+                'active': True,
+                'gender': 'male',
+                'maritalStatus': {'text': 'Married'},
+            }
+        )
+        subsetted = {
+            'versionId': '1',
+            'lastUpdated': resource.updated_at.strftime(
+                '%Y-%m-%dT%H:%M:%S.%fZ'
+            ),
+            'tag': [SUBSETTED_TAG],
+        }
+
+        for params, elements in (
+            ({'_elements': 'gender,Patient.text'}, ['text', 'gender']),
+            ({'_summary': 'true'}, ['active', 'gender']),
+            ({'_summary': 'text'}, ['text']),
+            ({'_summary': 'data'}, ['active', 'gender', 'maritalStatus']),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.read(resource, data=params)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsInstance(response.data, RawResource)
+            self.assertEqual(
+                set(json.loads(response.content)),
+                {'resourceType', 'id', 'meta', *elements},
+                params,
+            )
+            self.assertEqual(response.data['meta'], subsetted)
+            self.assertIn('json_', ctx.captured_queries[0]['sql'])
+
+        response = self.read(resource, data={'_summary': 'false'})
+        self.assertNotIn('tag', response.data['meta'])
+        self.assertIn('maritalStatus', response.data)
+
+    @override_settings(REST_FHIR={'COMPRESSION_THRESHOLD': 16})
+    def test_compressed_content_shall_be_projected_after_decoding(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Observation',
+                'text': {'status': 'generated', 'div': '<div>72</div>'},
+                'status': 'final',
+                'valueQuantity': {'value': 72.50, 'unit': '/min'},
+            }
+        )
+
+        response = self.read(resource, data={'_summary': 'true'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(response.data),
+            {'resourceType', 'id', 'meta', 'status', 'valueQuantity'},
+        )
+        self.assertEqual(response.data['meta']['tag'], [SUBSETTED_TAG])
+
+    def test_server_should_reject_invalid_summary_and_elements(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        for params in (
+            {'_summary': 'maybe'},
+            {'_elements': 'name.family'},
+            {'_elements': 'name', '_summary': 'true'},
+        ):
+            response = self.read(resource, data=params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST, params
+            )
+
     def test_server_should_returns_404_for_unknown_resource(self):
         # Non-persistent resource
         resource = Resource(resource_type='MedicationRequest')
@@ -147,3 +355,316 @@ class ReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
         self.assertEqual(
             response_if_modified_since.status_code, status.HTTP_304_NOT_MODIFIED
         )
+
+    def test_server_should_returns_304_without_loading_content(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Organization',
+                'name': 'Health Level Seven International',
+            }
+        )
+
+        with self.assertNumQueries(1) as ctx:
+            response = self.read(
+                resource,
+                HTTP_IF_NONE_MATCH='W/"%s"' % resource.version_id,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn('fhir_resource_ver', ctx.captured_queries[0]['sql'])
+
+    def test_server_should_returns_200_for_stale_precondition(self):
+        resource = Resource()
+        resource.save(
+            resource_content={
+                'resourceType': 'Organization',
+                'name': 'Health Level Seven International',
+            }
+        )
+
+        with self.assertNumQueries(2):
+            response = self.read(resource, HTTP_IF_NONE_MATCH='W/"0"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['name'], 'Health Level Seven International'
+        )
+        self.assertEqual(response['ETag'], 'W/"%s"' % resource.version_id)
+
+
+@override_settings(REST_FHIR={'CACHE_ALIAS': 'default'})
+class CachedReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+
+    def run_on_commit(self):
+        """
+        Run the on_commit callbacks right away, as if the test transaction
+        was committed (captureOnCommitCallbacks requires Django 3.2).
+        """
+        return mock.patch(
+            'django.db.transaction.on_commit',
+            lambda func, using=None: func(),
+        )
+
+    def create(self, resource_content):
+        resource = Resource()
+        with self.run_on_commit():
+            resource.save(resource_content=resource_content)
+        return resource
+
+    def read(self, resource, **kwargs):
+        return self.client.get(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': resource.resource_type, 'id': str(resource.id)},
+            ),
+            **kwargs,
+        )
+
+    def test_cached_read_shall_not_query_database(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+
+        with self.assertNumQueries(1):
+            first = self.read(resource)
+
+        with self.assertNumQueries(0):
+            second = self.read(resource)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+        self.assertEqual(stats.get('Patient', 'hits'), 1)
+
+    def test_cached_read_shall_answer_preconditions(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+
+        with self.assertNumQueries(0):
+            response = self.read(
+                resource,
+                HTTP_IF_NONE_MATCH='W/"%s"' % resource.version_id,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_version_shall_invalidate_cached_read(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+
+        with self.run_on_commit():
+            resource.save(
+                resource_content={'resourceType': 'Patient', 'gender': 'female'}
+            )
+        response = self.read(resource)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['gender'], 'female')
+        self.assertEqual(response['ETag'], 'W/"2"')
+        self.assertEqual(stats.get('Patient', 'misses'), 2)
+
+    def test_projected_read_shall_bypass_cache(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+
+        with self.assertNumQueries(1):
+            response = self.read(resource, data={'_elements': 'active'})
+
+        self.assertNotIn('gender', response.data)
+        self.assertEqual(self.read(resource).data['gender'], 'male')
+
+    def test_evicted_content_shall_be_read_through(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+        cache.delete(
+            'fhir:res:Patient:%s:%s' % (resource.id, resource.version_id)
+        )
+
+        with self.assertNumQueries(1):
+            response = self.read(resource)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(stats.get('Patient', 'evictions'), 1)
+
+    def test_deleted_resource_shall_invalidate_cached_read(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+
+        with self.run_on_commit():
+            resource.delete()
+
+        with self.assertNumQueries(0):
+            response = self.read(resource)
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    @override_settings(
+        REST_FHIR={
+            'CACHE_ALIAS': 'default',
+            'CACHE_RESOURCE_TYPES': {'Patient': {'ALIAS': None}},
+        }
+    )
+    def test_resource_type_mapped_to_no_alias_shall_not_be_cached(self):
+        resource = self.create({'resourceType': 'Patient', 'gender': 'male'})
+        self.read(resource)
+
+        with self.assertNumQueries(1):
+            self.read(resource)
+
+        self.assertEqual(stats.as_dict(), {})
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            },
+            'fhir-patient': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'fhir-patient',
+                'OPTIONS': {'MAX_ENTRIES': 4},
+            },
+        },
+        REST_FHIR={
+            'CACHE_ALIAS': 'default',
+            'CACHE_RESOURCE_TYPES': {'Patient': {'ALIAS': 'fhir-patient'}},
+        },
+    )
+    def test_resource_type_alias_shall_bound_its_entries(self):
+        patients = [
+            self.create({'resourceType': 'Patient', 'gender': 'male'})
+            for _ in range(10)
+        ]
+        observation = self.create(
+            {'resourceType': 'Observation', 'status': 'final'}
+        )
+        for resource in [*patients, observation]:
+            self.read(resource)
+
+        patient_keys = list(caches['fhir-patient']._cache)
+        default_keys = list(caches['default']._cache)
+        self.assertLessEqual(len(patient_keys), 4)
+        self.assertTrue(all(':Patient:' in key for key in patient_keys))
+        self.assertTrue(default_keys)
+        self.assertTrue(all(':Observation:' in key for key in default_keys))
+
+
+@override_settings(REST_FHIR={'DENORMALIZED_CONTENT': True})
+class DenormalizedContentTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def url(self, resource):
+        return reverse(
+            'read-update-delete',
+            kwargs={'type': resource.resource_type, 'id': resource.id},
+        )
+
+    def assertReadWithoutJoin(self, resource, expected):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url(resource))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('fhir_resource_ver', ctx.captured_queries[0]['sql'])
+        self.assertEqual(
+            {
+                key: value
+                for key, value in json.loads(response.content).items()
+                if key not in ('id', 'meta')
+            },
+            expected,
+        )
+
+    def test_read_shall_use_the_copy_of_the_current_version(self):
+        resource = Resource()
+        resource.save(
+            resource_content={'resourceType': 'Patient', 'active': True}
+        )
+        self.assertReadWithoutJoin(
+            resource, {'resourceType': 'Patient', 'active': True}
+        )
+
+        response = self.client.put(
+            self.url(resource),
+            {'resourceType': 'Patient', 'id': str(resource.id)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertReadWithoutJoin(resource, {'resourceType': 'Patient'})
+
+        response = self.client.patch(
+            self.url(resource),
+            data=json.dumps(
+                [{'op': 'add', 'path': '/gender', 'value': 'male'}]
+            ),
+            content_type='application/json-patch+json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertReadWithoutJoin(
+            resource, {'resourceType': 'Patient', 'gender': 'male'}
+        )
+
+        [created] = Resource.objects.bulk_create_resources(
+            [{'resourceType': 'Patient', 'gender': 'female'}]
+        )
+        self.assertReadWithoutJoin(
+            created, {'resourceType': 'Patient', 'gender': 'female'}
+        )
+
+        self.client.delete(self.url(resource))
+        resource.refresh_from_db()
+        self.assertIsNone(resource.current_content)
+
+    @override_settings(
+        REST_FHIR={'DENORMALIZED_CONTENT': True, 'COMPRESSION_THRESHOLD': 16}
+    )
+    def test_large_contents_shall_be_copied_compressed(self):
+        content = {
+            'resourceType': 'Observation',
+            'status': 'final',
+            'note': [{'text': 'Repeated measure. ' * 20}],
+        }
+        resource = Resource()
+        resource.save(resource_content=content)
+
+        resource.refresh_from_db()
+        self.assertIsNone(
+            Resource.objects.filter(pk=resource.pk)
+            .values_list('current_content', flat=True)
+            .get()
+        )
+        self.assertIsNotNone(resource.current_content_compressed)
+        self.assertReadWithoutJoin(resource, content)
+
+    def test_resources_without_copy_shall_be_read_from_their_version(self):
+        with override_settings(REST_FHIR={'DENORMALIZED_CONTENT': False}):
+            resource = Resource()
+            resource.save(resource_content={'resourceType': 'Patient'})
+            resource.save(
+                resource_content={'resourceType': 'Patient', 'active': False}
+            )
+
+        response = self.client.get(self.url(resource))
+        self.assertEqual(response.data['active'], False)
+
+        call_command('fhir_copy_content', stdout=io.StringIO())
+
+        self.assertReadWithoutJoin(
+            resource, {'resourceType': 'Patient', 'active': False}
+        )
+
+        # A write with the setting off clears the copy, which would be stale
+        # once the setting is on again
+        with override_settings(REST_FHIR={'DENORMALIZED_CONTENT': False}):
+            resource.save(resource_content={'resourceType': 'Patient'})
+        resource.refresh_from_db()
+        self.assertIsNone(resource.current_content)
+        self.assertIsNone(resource.current_content_compressed)
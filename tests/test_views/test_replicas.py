@@ -0,0 +1,166 @@
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.apps import apps
+from django.db import connections
+from django.test import override_settings
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource
+from rest_fhir.routers import is_resource_model
+from rest_fhir.settings import fhir_settings
+
+
+def replicate():
+    """
+    Copy the replicated tables of the default database to the replica.
+    Writes made after a call are the replication lag.
+    """
+    primary = connections['default'].cursor()
+    replica = connections['replica'].cursor()
+    for model in apps.get_app_config('rest_fhir').get_models():
+        if not is_resource_model(model):
+            continue
+        table = model._meta.db_table
+        primary.execute('SELECT * FROM %s' % table)
+        rows = primary.fetchall()
+        replica.execute('DELETE FROM %s' % table)
+        if rows:
+            replica.executemany(
+                'INSERT INTO %s VALUES (%s)'
+                % (table, ', '.join(['%s'] * len(rows[0]))),
+                rows,
+            )
+
+
+@override_settings(
+    DATABASE_ROUTERS=['rest_fhir.routers.ReplicaRouter'],
+    REST_FHIR={'REPLICA_DATABASES': ['replica']},
+)
+class ReplicaTestCase(APITestCase, URLPatternsTestCase):
+    databases = {'default', 'replica'}
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+        path('async/', include(('rest_fhir.async_urls', 'async'))),
+    ]
+
+    def setUp(self):
+        # Version 1 is replicated, version 2 isn't yet
+        self.resource = Resource()
+        self.resource.save(
+            resource_content={'resourceType': 'Patient', 'active': True}
+        )
+        replicate()
+        self.resource.save(
+            resource_content={'resourceType': 'Patient', 'active': False}
+        )
+
+    def url(self, name='read-update-delete', **kwargs):
+        kwargs = {'type': 'Patient', 'id': self.resource.id, **kwargs}
+        return reverse(
+            name, kwargs={key: str(value) for key, value in kwargs.items()}
+        )
+
+    def test_writes_shall_go_to_the_primary_database(self):
+        self.assertEqual(
+            Resource.objects.using('default')
+            .get(pk=self.resource.pk)
+            .version_id,
+            2,
+        )
+        self.assertEqual(
+            Resource.objects.using('replica')
+            .get(pk=self.resource.pk)
+            .version_id,
+            1,
+        )
+
+        response = self.client.post(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'resourceType': 'Patient'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        resource_id = response.data['id']
+        self.assertTrue(
+            Resource.objects.using('default').filter(pk=resource_id).exists()
+        )
+        self.assertFalse(
+            Resource.objects.using('replica').filter(pk=resource_id).exists()
+        )
+
+    def test_reads_should_go_to_replicas(self):
+        response = self.client.get(self.url())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], 'W/"1"')
+        self.assertEqual(response.data['active'], True)
+
+    def test_read_of_a_newer_version_shall_fall_back_to_the_primary(self):
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH='W/"2"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH='W/"3"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], 'W/"2"')
+        self.assertEqual(response.data['active'], False)
+
+    def test_read_of_an_unreplicated_resource_shall_fall_back_to_the_primary(
+        self,
+    ):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        response = self.client.get(self.url(id=resource.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.url(id=Resource().id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(
+            self.url('async:read-update-delete', id=resource.id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_vread_of_an_unreplicated_version_shall_fall_back_to_the_primary(
+        self,
+    ):
+        for name in ('vread', 'async:vread'):
+            response = self.client.get(self.url(name, vid=2))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['active'], False)
+
+    def test_reads_following_a_write_shall_use_the_primary(self):
+        response = self.client.put(
+            self.url(),
+            {'resourceType': 'Patient', 'id': str(self.resource.id)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(fhir_settings.REPLICA_COOKIE_NAME, response.cookies)
+
+        search_url = reverse('search-create', kwargs={'type': 'Patient'})
+        for url in (
+            self.url(),
+            search_url,
+            self.url('async:read-update-delete'),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('"versionId":"3"', response.content.decode())
+
+        # Once replicas caught up, the client reads from them again
+        del self.client.cookies[fhir_settings.REPLICA_COOKIE_NAME]
+        response = self.client.get(search_url)
+        self.assertEqual(response.data['entry'][0]['resource']['active'], True)
+
+    @override_settings(
+        DATABASE_ROUTERS=['rest_fhir.routers.ReplicaRouter'],
+        REST_FHIR={'REPLICA_DATABASES': ['replica'], 'REPLICA_MAX_LAG': 0},
+    )
+    def test_write_marker_shall_expire_after_the_replication_lag(self):
+        response = self.client.delete(self.url())
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
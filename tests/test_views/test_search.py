@@ -0,0 +1,422 @@
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.test import APITestCase, URLPatternsTestCase
+
+from django.test import override_settings
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource
+from rest_fhir.projection import SUBSETTED_TAG, Projection
+
+
+class SearchAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def setUp(self):
+        self.donald = self.create(
+            {
+                'resourceType': 'Patient',
+                'name': [{'family': 'Duck', 'given': ['Donald']}],
+                'gender': 'male',
+                'birthDate': '1934-06-09',
+                'identifier': [{'system': 'urn:duck', 'value': 'D1'}],
+            }
+        )
+        self.daisy = self.create(
+            {
+                'resourceType': 'Patient',
+                'name': [{'family': 'Duck', 'given': ['Daisy']}],
+                'gender': 'female',
+                'birthDate': '1940-01-07',
+            }
+        )
+        self.observation = self.create(
+            {
+                'resourceType': 'Observation',
+                'status': 'final',
+                'code': {
+                    'coding': [{'system': 'http://loinc.org', 'code': '8867-4'}]
+                },
+                'subject': {'reference': 'Patient/%s' % self.donald.id},
+                'effectiveDateTime': '2021-03-04T10:00:00Z',
+                'valueQuantity': {
+                    'value': 72,
+                    'system': 'http://unitsofmeasure.org',
+                    'code': '/min',
+                },
+            }
+        )
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def search(self, resource_type, **params):
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': resource_type}), params
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['type'], 'searchset')
+        return response
+
+    def assertSearch(self, resource_type, expected, **params):
+        response = self.search(resource_type, **params)
+        self.assertEqual(
+            {entry['resource']['id'] for entry in response.data['entry']},
+            {str(resource.id) for resource in expected},
+            params,
+        )
+
+    def test_search_shall_return_searchset_bundle(self):
+        response = self.search('Patient', given='donald')
+
+        [entry] = response.data['entry']
+        self.assertEqual(entry['search'], {'mode': 'match'})
+        self.assertTrue(
+            entry['fullUrl'].endswith('/fhir/Patient/%s/' % self.donald.id)
+        )
+        self.assertEqual(entry['resource']['meta']['versionId'], '1')
+
+    def test_search_by_string(self):
+        self.assertSearch('Patient', [self.donald, self.daisy], family='du')
+        self.assertSearch('Patient', [self.daisy], name='DAI')
+        self.assertSearch('Patient', [], **{'family:exact': 'duck'})
+        self.assertSearch('Patient', [self.donald], **{'given:contains': 'nal'})
+
+    def test_search_by_token(self):
+        self.assertSearch('Patient', [self.daisy], gender='female')
+        self.assertSearch(
+            'Patient', [self.donald, self.daisy], gender='male,female'
+        )
+        self.assertSearch('Patient', [self.donald], identifier='urn:duck|D1')
+        self.assertSearch('Patient', [], identifier='urn:goose|D1')
+        self.assertSearch('Patient', [self.donald], **{'gender:not': 'female'})
+        self.assertSearch(
+            'Observation', [self.observation], code='http://loinc.org|'
+        )
+
+    def test_search_by_date(self):
+        self.assertSearch('Patient', [self.donald], birthdate='1934')
+        self.assertSearch('Patient', [self.daisy], birthdate='gt1935')
+        self.assertSearch(
+            'Patient', [self.donald], birthdate=['ge1934-01', 'le1934-12-31']
+        )
+        self.assertSearch('Observation', [self.observation], date='2021-03-04')
+
+    def test_search_by_reference(self):
+        self.assertSearch(
+            'Observation', [self.observation], subject=str(self.donald.id)
+        )
+        self.assertSearch(
+            'Observation',
+            [self.observation],
+            patient='Patient/%s' % self.donald.id,
+        )
+        self.assertSearch(
+            'Observation', [], subject='Group/%s' % self.donald.id
+        )
+
+    def test_search_by_quantity(self):
+        self.assertSearch(
+            'Observation',
+            [self.observation],
+            **{'value-quantity': '72|http://unitsofmeasure.org|/min'},
+        )
+        self.assertSearch('Observation', [], **{'value-quantity': 'gt72'})
+
+    def test_search_by_missing_and_common_parameters(self):
+        self.assertSearch(
+            'Patient', [self.daisy], **{'identifier:missing': 'true'}
+        )
+        self.assertSearch('Patient', [self.donald], _id=str(self.donald.id))
+        self.assertSearch(
+            'Patient', [self.donald, self.daisy], _lastUpdated='gt2000'
+        )
+
+    def test_search_shall_exclude_deleted_and_updated_values(self):
+        self.daisy.delete()
+        self.donald.save(
+            resource_content={'resourceType': 'Patient', 'gender': 'other'}
+        )
+
+        self.assertSearch('Patient', [], family='duck')
+        self.assertSearch('Patient', [self.donald], gender='other')
+
+    def test_search_shall_ignore_unknown_parameters_unless_strict(self):
+        self.assertSearch('Patient', [self.donald, self.daisy], unknown='x')
+
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'unknown': 'x'},
+            HTTP_PREFER='handling=strict',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_shall_reject_invalid_values(self):
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'birthdate': 'yesterday'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_shall_count_matches_only(self):
+        response = self.search('Patient', family='duck', _summary='count')
+
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['entry'], [])
+
+    def test_search_shall_return_requested_elements(self):
+        response = self.search('Observation', _summary='true')
+        [entry] = response.data['entry']
+        self.assertEqual(
+            set(entry['resource']),
+            {
+                'resourceType',
+                'id',
+                'meta',
+                'status',
+                'code',
+                'subject',
+                'effectiveDateTime',
+                'valueQuantity',
+            },
+        )
+
+        response = self.search('Patient', gender='male', _elements='gender')
+        [entry] = response.data['entry']
+        self.assertEqual(
+            entry['resource'],
+            {
+                'resourceType': 'Patient',
+                'id': str(self.donald.id),
+                'meta': {
+                    'versionId': '1',
+                    'lastUpdated': mock.ANY,
+                    'tag': [SUBSETTED_TAG],
+                },
+                'gender': 'male',
+            },
+        )
+
+    def test_search_shall_project_contents_after_decoding_as_fallback(self):
+        with mock.patch.object(Projection, 'is_supported', return_value=False):
+            fallback = self.search('Observation', _elements='value[x]')
+        response = self.search('Observation', _elements='value[x]')
+
+        self.assertEqual(
+            fallback.data['entry'][0]['resource'],
+            response.data['entry'][0]['resource'],
+        )
+        self.assertEqual(
+            response.data['entry'][0]['resource']['valueQuantity']['value'],
+            72,
+        )
+
+    def test_search_shall_paginate_with_next_links(self):
+        response = self.search('Patient', _count=1, _total='accurate')
+
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(len(response.data['entry']), 1)
+        links = {
+            link['relation']: link['url'] for link in response.data['link']
+        }
+        self.assertIn('_cursor=', links['next'])
+
+        next_page = self.client.get(links['next'])
+        self.assertEqual(len(next_page.data['entry']), 1)
+        self.assertNotEqual(
+            next_page.data['entry'][0]['resource']['id'],
+            response.data['entry'][0]['resource']['id'],
+        )
+
+    @override_settings(REST_FHIR={'SEARCH_MAX_PAGE_SIZE': 1})
+    def test_search_shall_cap_page_size(self):
+        response = self.search('Patient', _count=100)
+
+        self.assertEqual(len(response.data['entry']), 1)
+
+    def test_search_shall_use_index_tables(self):
+        with self.assertNumQueries(1) as ctx:
+            self.client.get(
+                reverse('search-create', kwargs={'type': 'Patient'}),
+                {'family': 'duck', 'gender': 'male'},
+            )
+
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"fhir_idx_string"', sql)
+        self.assertIn('"fhir_idx_token"', sql)
+        self.assertNotIn('"resource_content" LIKE', sql)
+
+    def test_search_shall_be_driven_by_most_selective_parameter(self):
+        with self.assertNumQueries(1) as ctx:
+            self.search(
+                'Observation',
+                date='ge2021',
+                patient=str(self.donald.id),
+            )
+
+        # The reference selects the candidates, the date only probes them
+        sql = ctx.captured_queries[0]['sql']
+        self.assertEqual(sql.count('IN (SELECT'), 1)
+        self.assertIn('"fhir_idx_reference"', sql.split('EXISTS')[0])
+        self.assertIn('"fhir_idx_date"', sql.split('EXISTS')[1])
+
+    def test_batch_shall_search_type_level_get_entries(self):
+        response = self.client.post(
+            reverse('batch-transaction'),
+            {
+                'resourceType': 'Bundle',
+                'type': 'batch',
+                'entry': [
+                    {'request': {'method': 'GET', 'url': 'Patient?gender=male'}}
+                ],
+            },
+            format='json',
+        )
+
+        [entry] = response.data['entry']
+        self.assertEqual(entry['response']['status'], '200 OK')
+        self.assertEqual(entry['resource']['type'], 'searchset')
+        self.assertEqual(
+            [e['resource']['id'] for e in entry['resource']['entry']],
+            [str(self.donald.id)],
+        )
+
+    def assertIncludes(self, response, expected):
+        self.assertEqual(
+            {
+                entry['resource']['id']
+                for entry in response.data['entry']
+                if entry['search']['mode'] == 'include'
+            },
+            {str(resource.id) for resource in expected},
+        )
+
+    def test_search_shall_include_referenced_resources(self):
+        response = self.search(
+            'Observation', code='8867-4', _include='Observation:subject'
+        )
+        self.assertEqual(
+            [entry['search']['mode'] for entry in response.data['entry']],
+            ['match', 'include'],
+        )
+        self.assertIncludes(response, [self.donald])
+
+        response = self.search(
+            'Observation', _include='Observation:subject:Practitioner'
+        )
+        self.assertIncludes(response, [])
+        response = self.search('Observation', _include='*')
+        self.assertIncludes(response, [self.donald])
+
+    def test_search_shall_revinclude_referencing_resources(self):
+        response = self.search(
+            'Patient', family='duck', _revinclude='Observation:subject'
+        )
+        self.assertIncludes(response, [self.observation])
+
+        # Deleted resources aren't included
+        self.observation.delete()
+        response = self.search(
+            'Patient', family='duck', _revinclude='Observation:subject'
+        )
+        self.assertIncludes(response, [])
+
+    def test_search_shall_iterate_includes_in_batched_queries(self):
+        practitioners = [
+            self.create({'resourceType': 'Practitioner'}) for _ in range(3)
+        ]
+        encounter = self.create(
+            {
+                'resourceType': 'Encounter',
+                'status': 'finished',
+                'subject': {'reference': 'Patient/%s' % self.donald.id},
+            }
+        )
+        observations = [
+            self.create(
+                {
+                    'resourceType': 'Observation',
+                    'status': 'final',
+                    'encounter': {'reference': 'Encounter/%s' % encounter.id},
+                    'performer': [
+                        {'reference': 'Practitioner/%s' % practitioner.id}
+                    ],
+                }
+            )
+            for practitioner in practitioners * 10
+        ]
+
+        params = {
+            '_id': str(encounter.id),
+            '_include': 'Encounter:subject',
+            '_revinclude': 'Observation:encounter',
+            '_include:iterate': 'Observation:performer',
+        }
+        # The match, then per hop the index and the resources found
+        with self.assertNumQueries(6):
+            response = self.search('Encounter', **params)
+        self.assertIncludes(
+            response, [self.donald, *observations, *practitioners]
+        )
+
+        with override_settings(REST_FHIR={'SEARCH_MAX_INCLUDES': 5}):
+            response = self.search('Encounter', **params)
+        self.assertEqual(len(response.data['entry']), 6)
+
+    def test_search_shall_reject_invalid_includes(self):
+        for params in (
+            {'_include': 'subject'},
+            {'_include:reverse': 'Observation:subject'},
+            {'_revinclude': '*'},
+        ):
+            response = self.client.get(
+                reverse('search-create', kwargs={'type': 'Observation'}),
+                params,
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST, params
+            )
+
+        response = self.search('Observation', _include='Observation:unknown')
+        self.assertIncludes(response, [])
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': 'Observation'}),
+            {'_include': 'Observation:unknown'},
+            HTTP_PREFER='handling=strict',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_search_entries_shall_include_referenced_resources(self):
+        response = self.client.post(
+            reverse('batch-transaction'),
+            {
+                'resourceType': 'Bundle',
+                'type': 'batch',
+                'entry': [
+                    {
+                        'request': {
+                            'method': 'GET',
+                            'url': 'Observation?_include=Observation:subject',
+                        }
+                    }
+                ],
+            },
+            format='json',
+        )
+
+        [entry] = response.data['entry']
+        self.assertEqual(
+            [
+                (e['resource']['id'], e['search']['mode'])
+                for e in entry['resource']['entry']
+            ],
+            [
+                (str(self.observation.id), 'match'),
+                (str(self.donald.id), 'include'),
+            ],
+        )
@@ -0,0 +1,325 @@
+import io
+import json
+import shutil
+import tempfile
+import uuid
+from contextlib import ExitStack
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.test import (
+    APITestCase,
+    APITransactionTestCase,
+    URLPatternsTestCase,
+)
+
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from rest_fhir import sharding
+from rest_fhir.importer import NDJSONImporter
+from rest_fhir.models import Resource, ResourceVersion, TokenIndex
+from rest_fhir.sharding import shard_for
+
+SHARDS = ['default', 'shard_1', 'shard_2']
+
+
+@override_settings(
+    DATABASE_ROUTERS=['rest_fhir.sharding.ShardRouter'],
+    REST_FHIR={'SHARD_DATABASES': SHARDS},
+)
+class ShardingTestCase(APITestCase, URLPatternsTestCase):
+    databases = set(SHARDS)
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def create(self, count, resource_type='Patient'):
+        return Resource.objects.bulk_create_resources(
+            [
+                {
+                    'resourceType': resource_type,
+                    'identifier': [{'system': 'urn:test', 'value': str(i)}],
+                }
+                for i in range(count)
+            ]
+        )
+
+    def stored_ids(self, model=Resource, field='id'):
+        return {
+            alias: set(model.objects.using(alias).values_list(field, flat=True))
+            for alias in SHARDS
+        }
+
+    def assertStoredOnTheirShard(self, ids):
+        for model, field in (
+            (Resource, 'id'),
+            (ResourceVersion, 'resource_id'),
+            (TokenIndex, 'resource_id'),
+        ):
+            stored = self.stored_ids(model, field)
+            for resource_id in ids:
+                self.assertEqual(
+                    [alias for alias in SHARDS if resource_id in stored[alias]],
+                    [shard_for(resource_id)],
+                )
+
+    def test_resources_shall_be_stored_on_the_shard_of_their_id(self):
+        instances = self.create(30)
+        response = self.client.post(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'resourceType': 'Patient', 'gender': 'female'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        ids = [instance.id for instance in instances]
+        ids.append(uuid.UUID(response.data['id']))
+        self.assertStoredOnTheirShard(ids)
+        self.assertTrue(all(self.stored_ids().values()))
+
+    def test_interactions_on_an_id_shall_only_query_its_shard(self):
+        [instance] = self.create(1)
+        shard = shard_for(instance.id)
+        url = reverse(
+            'read-update-delete', kwargs={'type': 'Patient', 'id': instance.id}
+        )
+
+        with ExitStack() as stack:
+            contexts = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias])
+                )
+                for alias in SHARDS
+            }
+            self.assertEqual(
+                self.client.get(url).status_code, status.HTTP_200_OK
+            )
+            response = self.client.put(
+                url,
+                {'resourceType': 'Patient', 'id': str(instance.id)},
+                format='json',
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(
+                reverse(
+                    'vread',
+                    kwargs={'type': 'Patient', 'id': instance.id, 'vid': 2},
+                )
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        for alias, context in contexts.items():
+            if alias == shard:
+                self.assertTrue(context.captured_queries)
+            else:
+                self.assertEqual(context.captured_queries, [], alias)
+
+        self.assertEqual(
+            ResourceVersion.objects.using(shard)
+            .filter(resource_id=instance.id)
+            .count(),
+            3,
+        )
+
+    def test_search_shall_merge_the_shards(self):
+        instances = self.create(25)
+        self.create(5, resource_type='Practitioner')
+        url = reverse('search-create', kwargs={'type': 'Patient'})
+
+        ids = []
+        response = self.client.get(url, {'_count': 7, '_total': 'accurate'})
+        self.assertEqual(response.data['total'], 25)
+        while True:
+            bundle = json.loads(response.content)
+            ids.extend(entry['resource']['id'] for entry in bundle['entry'])
+            links = {link['relation']: link['url'] for link in bundle['link']}
+            if 'next' not in links:
+                break
+            response = self.client.get(links['next'])
+
+        self.assertEqual(
+            ids, sorted(str(instance.id) for instance in instances)
+        )
+
+        response = self.client.get(url, {'_summary': 'count'})
+        self.assertEqual(response.data['total'], 25)
+
+        response = self.client.get(url, {'identifier': 'urn:test|3'})
+        self.assertEqual(len(response.data['entry']), 1)
+
+    def test_includes_shall_be_resolved_across_the_shards(self):
+        [patient] = self.create(1)
+        observations = Resource.objects.bulk_create_resources(
+            [
+                {
+                    'resourceType': 'Observation',
+                    'status': 'final',
+                    'subject': {'reference': 'Patient/%s' % patient.id},
+                }
+                for _ in range(12)
+            ]
+        )
+
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': 'Patient'}),
+            {'_revinclude': 'Observation:subject'},
+        )
+        self.assertEqual(
+            sorted(entry['resource']['id'] for entry in response.data['entry']),
+            sorted(str(i.id) for i in [patient, *observations]),
+        )
+
+        response = self.client.get(
+            reverse('search-create', kwargs={'type': 'Observation'}),
+            {'_include': 'Observation:subject'},
+        )
+        self.assertEqual(
+            response.data['entry'][-1]['resource']['id'], str(patient.id)
+        )
+
+    def test_history_shall_merge_the_shards_newest_first(self):
+        instances = self.create(10)
+        for instance in instances[:4]:
+            instance.save(
+                resource_content={
+                    'resourceType': 'Patient',
+                    'id': str(instance.id),
+                    'active': True,
+                }
+            )
+
+        response = self.client.get(
+            reverse('type-history', kwargs={'type': 'Patient'}), {'_count': 5}
+        )
+        entries = response.data['entry']
+        self.assertEqual(
+            [entry['resource']['id'] for entry in entries[:4]],
+            [str(instance.id) for instance in reversed(instances[:4])],
+        )
+        self.assertEqual(len(entries), 5)
+
+        response = self.client.get(
+            reverse(
+                'instance-history',
+                kwargs={'type': 'Patient', 'id': instances[0].id},
+            )
+        )
+        self.assertEqual(len(response.data['entry']), 2)
+
+    def test_conditional_create_shall_search_every_shard(self):
+        instances = self.create(10)
+        url = reverse('search-create', kwargs={'type': 'Patient'})
+
+        for i, instance in enumerate(instances):
+            response = self.client.post(
+                url,
+                {'resourceType': 'Patient'},
+                format='json',
+                HTTP_IF_NONE_EXIST='identifier=urn:test|%d' % i,
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['id'], str(instance.id))
+
+    def test_failed_transaction_shall_roll_back_every_shard(self):
+        entries = [
+            {
+                'resource': {'resourceType': 'Patient'},
+                'request': {'method': 'POST', 'url': 'Patient'},
+            }
+            for _ in range(20)
+        ]
+        entries.append(
+            {
+                'resource': {'resourceType': 'Observation'},
+                'request': {
+                    'method': 'PUT',
+                    'url': 'Patient/%s' % Resource().id,
+                },
+            }
+        )
+        response = self.client.post(
+            reverse('batch-transaction'),
+            {'resourceType': 'Bundle', 'type': 'transaction', 'entry': entries},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(any(self.stored_ids().values()))
+
+    def test_export_shall_read_every_shard(self):
+        instances = self.create(12)
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+
+        with override_settings(
+            REST_FHIR={
+                'SHARD_DATABASES': SHARDS,
+                'EXPORT_DIR': export_dir,
+                'EXPORT_ASYNC': False,
+            }
+        ):
+            response = self.client.get(reverse('export'))
+            response = self.client.get(response['Content-Location'])
+            [output] = response.data['output']
+            response = self.client.get(output['url'])
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(
+            sorted(json.loads(line)['id'] for line in lines),
+            sorted(str(instance.id) for instance in instances),
+        )
+
+    def test_importer_shall_write_to_the_shards(self):
+        data = b''.join(
+            b'{"resourceType": "Patient", "gender": "male"}\n'
+            for _ in range(20)
+        )
+
+        [chunk] = NDJSONImporter().run(io.BytesIO(data))
+
+        self.assertEqual(chunk.created, 20)
+        ids = set().union(*self.stored_ids().values())
+        self.assertEqual(len(ids), 20)
+        self.assertStoredOnTheirShard(ids)
+
+
+@override_settings(
+    DATABASE_ROUTERS=['rest_fhir.sharding.ShardRouter'],
+    REST_FHIR={'SHARD_DATABASES': SHARDS},
+)
+class ParallelShardingTestCase(APITransactionTestCase, URLPatternsTestCase):
+    """
+    Outside of a test transaction, shards are queried in parallel threads.
+    """
+
+    databases = set(SHARDS)
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_search_shall_query_the_shards_in_parallel(self):
+        instances = Resource.objects.bulk_create_resources(
+            [{'resourceType': 'Patient'} for _ in range(15)]
+        )
+
+        with mock.patch.object(
+            sharding, 'run_on_shard', wraps=sharding.run_on_shard
+        ) as run_on_shard:
+            response = self.client.get(
+                reverse('search-create', kwargs={'type': 'Patient'}),
+                {'_count': 10, '_total': 'accurate'},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 15)
+        self.assertEqual(
+            [entry['resource']['id'] for entry in response.data['entry']],
+            sorted(str(instance.id) for instance in instances)[:10],
+        )
+        # A count and a page on each shard
+        self.assertEqual(run_on_shard.call_count, 2 * len(SHARDS))
@@ -0,0 +1,273 @@
+import threading
+import uuid
+from unittest import skipIf
+
+from rest_framework import status
+from rest_framework.test import (
+    APIClient,
+    APITestCase,
+    APITransactionTestCase,
+    URLPatternsTestCase,
+)
+
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from rest_fhir.models import Resource, StringIndex, VersionConflict
+
+
+class UpdateAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def create(self, resource_content):
+        resource = Resource()
+        resource.save(resource_content=resource_content)
+        return resource
+
+    def update(self, resource_type, resource_id, data, **kwargs):
+        return self.client.put(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': resource_type, 'id': str(resource_id)},
+            ),
+            data=data,
+            format='json',
+            **kwargs,
+        )
+
+    def test_server_should_write_next_version(self):
+        resource = self.create({'resourceType': 'Patient', 'active': True})
+
+        response = self.update(
+            'Patient',
+            resource.id,
+            {
+                'resourceType': 'Patient',
+                'id': str(resource.id),
+                'active': False,
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['active'], False)
+        self.assertEqual(response.data['meta']['versionId'], '2')
+        self.assertEqual(response['ETag'], 'W/"2"')
+        self.assertEqual(
+            response['Location'],
+            reverse(
+                'vread',
+                kwargs={'type': 'Patient', 'id': resource.id, 'vid': 2},
+            ),
+        )
+
+        resource = Resource.objects.get(id=resource.id)
+        self.assertEqual(resource.version_id, 2)
+        self.assertEqual(resource.resource_content['active'], False)
+        self.assertEqual(resource.history.count(), 2)
+
+    def test_server_should_apply_update_matching_if_match(self):
+        resource = self.create({'resourceType': 'Patient'})
+
+        response = self.update(
+            'Patient',
+            resource.id,
+            {'resourceType': 'Patient', 'id': str(resource.id)},
+            HTTP_IF_MATCH='W/"1"',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], 'W/"2"')
+
+    def test_server_should_412_for_stale_if_match(self):
+        resource = self.create({'resourceType': 'Patient'})
+        resource.save(resource_content={'resourceType': 'Patient'})
+
+        for etag in ('W/"1"', 'W/"3"', '"abc"', '*'):
+            response = self.update(
+                'Patient',
+                resource.id,
+                {'resourceType': 'Patient', 'id': str(resource.id)},
+                HTTP_IF_MATCH=etag,
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_412_PRECONDITION_FAILED
+            )
+
+        self.assertEqual(Resource.objects.get(id=resource.id).version_id, 2)
+
+    def test_update_shall_swap_the_version_without_locking(self):
+        resource = self.create({'resourceType': 'Patient', 'active': True})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.update(
+                'Patient',
+                resource.id,
+                {
+                    'resourceType': 'Patient',
+                    'id': str(resource.id),
+                    'active': False,
+                },
+                HTTP_IF_MATCH='W/"1"',
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # SELECT, compare-and-swap UPDATE, INSERT of the version, then the
+        # search index of the only parameter that changed
+        statements = [query['sql'] for query in ctx.captured_queries]
+        self.assertEqual(len(statements), 5)
+        self.assertNotIn('FOR UPDATE', statements[0])
+        self.assertIn('"vid" = ("fhir_resource"."vid" + 1)', statements[1])
+        self.assertIn('"fhir_resource"."vid" = 1)', statements[1])
+
+    def test_stale_instance_shall_not_overwrite_concurrent_version(self):
+        resource = self.create({'resourceType': 'Patient', 'name': [{}]})
+        stale = Resource.objects.select_related('version').get(id=resource.id)
+
+        resource.save(
+            resource_content={
+                'resourceType': 'Patient',
+                'name': [{'family': 'Chalmers'}],
+            }
+        )
+
+        # Conditional writes fail, the other ones apply on top of version 2
+        with self.assertRaises(VersionConflict):
+            stale.save(
+                resource_content={'resourceType': 'Patient'},
+                expected_version_id=1,
+            )
+        stale.save(resource_content={'resourceType': 'Patient'})
+
+        self.assertEqual(stale.version_id, 3)
+        self.assertEqual(
+            list(resource.history.values_list('version_id', flat=True)),
+            [1, 2, 3],
+        )
+        # The index rows of version 2 are not left behind
+        self.assertFalse(
+            StringIndex.objects.filter(resource_id=resource.id).exists()
+        )
+
+    def test_server_should_create_resource_with_the_id_of_the_url(self):
+        resource_id = uuid.uuid4()
+
+        response = self.update(
+            'Patient',
+            resource_id,
+            {'resourceType': 'Patient', 'id': str(resource_id)},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['id'], str(resource_id))
+        self.assertEqual(Resource.objects.get(id=resource_id).version_id, 1)
+
+        response = self.update(
+            'Patient',
+            uuid.uuid4(),
+            {'resourceType': 'Patient', 'id': str(resource_id)},
+            HTTP_IF_MATCH='W/"1"',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_should_400_for_mismatching_type_or_id(self):
+        resource = self.create({'resourceType': 'Patient'})
+
+        for data in (
+            {'resourceType': 'Patient'},
+            {'resourceType': 'Patient', 'id': str(uuid.uuid4())},
+            {'resourceType': 'Organization', 'id': str(resource.id)},
+        ):
+            response = self.update('Patient', resource.id, data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_server_should_restore_deleted_resource(self):
+        resource = self.create({'resourceType': 'Patient'})
+        resource.delete()
+
+        response = self.update(
+            'Patient',
+            resource.id,
+            {'resourceType': 'Patient', 'id': str(resource.id)},
+            HTTP_IF_MATCH='W/"2"',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        read_response = self.client.get(
+            reverse(
+                'read-update-delete',
+                kwargs={'type': 'Patient', 'id': str(resource.id)},
+            )
+        )
+        self.assertEqual(read_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_response.data['meta']['versionId'], '3')
+
+
+@skipIf(
+    connection.vendor == 'sqlite',
+    'SQLite test databases are shared by threads with table level locks, '
+    'see benchmarks/bench_update_contention.py',
+)
+class ConcurrentUpdateTestCase(APITransactionTestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def test_concurrent_updates_shall_not_lose_any_version(self):
+        resource = Resource()
+        resource.save(resource_content={'resourceType': 'Basic', 'count': 0})
+        url = reverse(
+            'read-update-delete',
+            kwargs={'type': 'Basic', 'id': str(resource.id)},
+        )
+        applied = []
+        errors = []
+
+        def increment(times):
+            # Read-modify-write loop: read the counter, write it back
+            # incremented if nobody else did in between, read again if
+            # someone did
+            client = APIClient()
+            try:
+                while times:
+                    try:
+                        read = client.get(url)
+                        response = client.put(
+                            url,
+                            {**read.data, 'count': read.data['count'] + 1},
+                            format='json',
+                            HTTP_IF_MATCH=read['ETag'],
+                        )
+                    except OperationalError:
+                        # Tables of the shared in-memory SQLite database
+                        # are locked by the other threads, nothing written
+                        continue
+
+                    if response.status_code == status.HTTP_200_OK:
+                        applied.append(response.data['meta']['versionId'])
+                        times -= 1
+                    elif response.status_code != 412:
+                        errors.append(response.status_code)
+                        return
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=increment, args=(10,)) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(applied), 80)
+        self.assertEqual(len(set(applied)), 80)
+
+        resource = Resource.objects.get(id=resource.id)
+        self.assertEqual(resource.version_id, 81)
+        self.assertEqual(resource.resource_content['count'], 80)
+        self.assertEqual(resource.history.count(), 81)
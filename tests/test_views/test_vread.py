@@ -1,6 +1,8 @@
 from rest_framework import status
 from rest_framework.test import APITestCase, URLPatternsTestCase
 
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import include, path, reverse
 from django.utils import timezone
 
@@ -64,6 +66,17 @@ class VReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
             },
         )
 
+    def test_summary_shall_apply_to_versions(self):
+        version = self.previous
+        response = self.vread(version, data={'_elements': 'intent'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'resourceType', 'id', 'meta'})
+        self.assertEqual(response.data['meta']['versionId'], '1')
+
+        response = self.vread(version, data={'_summary': 'true'})
+        self.assertEqual(response.data['status'], 'draft')
+
     def test_server_should_returns_etag_header_with_version_id(self):
         version = self.previous
         response = self.vread(version)
@@ -105,3 +118,76 @@ class VReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
         self.assertEqual(
             response_if_modified_since.status_code, status.HTTP_304_NOT_MODIFIED
         )
+
+    def test_server_should_returns_304_without_loading_content(self):
+        version = self.current
+
+        with self.assertNumQueries(1) as ctx:
+            response = self.vread(
+                version,
+                HTTP_IF_NONE_MATCH='W/"%s"' % version.version_id,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn('resource_content', ctx.captured_queries[0]['sql'])
+
+    def test_server_should_returns_200_for_stale_precondition(self):
+        version = self.current
+
+        with self.assertNumQueries(2):
+            response = self.vread(version, HTTP_IF_NONE_MATCH='W/"0"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'active')
+
+
+@override_settings(
+    REST_FHIR={'HISTORY_SNAPSHOT_INTERVAL': 10, 'CACHE_ALIAS': 'default'}
+)
+class DeltaHistoryVReadAPIViewTestCase(APITestCase, URLPatternsTestCase):
+    urlpatterns = [
+        path('fhir/', include('rest_fhir.urls')),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.resource = Resource()
+        for status_code in ('draft', 'active', 'completed'):
+            self.resource.save(
+                {'resourceType': 'MedicationRequest', 'status': status_code}
+            )
+
+    def test_server_should_rebuild_and_cache_delta_encoded_version(self):
+        url = reverse(
+            'vread',
+            kwargs={
+                'type': 'MedicationRequest',
+                'id': self.resource.id,
+                'vid': 1,
+            },
+        )
+        self.assertIsNotNone(
+            self.resource.history.get(version_id=1).resource_delta
+        )
+
+        for queries in (2, 1):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['status'], 'draft')
+            self.assertEqual(response.data['meta']['versionId'], '1')
+
+    def test_history_shall_rebuild_delta_encoded_versions(self):
+        response = self.client.get(
+            reverse(
+                'instance-history',
+                kwargs={'type': 'MedicationRequest', 'id': self.resource.id},
+            )
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entry['resource']['status'] for entry in response.data['entry']],
+            ['completed', 'active', 'draft'],
+        )